@@ -1,10 +1,11 @@
 # src/antlr/ast_builder.py
 from antlr.parser.generated.CompiscriptVisitor import CompiscriptVisitor
 from antlr.parser.generated.CompiscriptParser import CompiscriptParser
-from antlr4 import ParserRuleContext
+from antlr4 import ParserRuleContext, Token
 
 from antlr.sema.ast import (
     Loc,
+    Node,
     Program,
     Block,
     VarDecl,
@@ -42,7 +43,23 @@ def loc_of(ctx):
     return Loc(t.line, t.column)
 
 
+# posición tras el último token de ctx (None si termina en EOF)
+def end_of(ctx):
+    t = getattr(ctx, "stop", None)
+    if t is None or t.type == Token.EOF or t.text is None:
+        return None
+    return Loc(t.line, t.column + len(t.text))
+
+
 class ASTBuilder(CompiscriptVisitor):
+    # cada nodo guarda también dónde termina (tras su último token); el
+    # nodo más interno es el primero en recibirla
+    def visit(self, tree):
+        node = tree.accept(self)
+        if isinstance(node, Node) and getattr(node, "end", None) is None:
+            node.end = end_of(tree)
+        return node
+
     # --- Programa / Bloques ---
     def visitProgram(self, ctx):
         stmts = []
@@ -341,7 +358,9 @@ class ASTBuilder(CompiscriptVisitor):
                 tann = None
                 if pctx.type_() is not None:
                     tann = pctx.type_().getText()
-                params.append(Param(loc_of(pctx), pname, tann))
+                p = Param(loc_of(pctx), pname, tann)
+                p.end = end_of(pctx)
+                params.append(p)
                 i += 1
 
         # tipo de retorno
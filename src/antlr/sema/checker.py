@@ -15,6 +15,7 @@ class Checker:
     def __init__(self):
         self.errors = []
         self.env = Env()
+        self.class_bases = {}       # clase -> base, para el upcast implícito
         self.loop_depth = 0
         self._dead_stack = []
         self._in_collect = False
@@ -134,6 +135,7 @@ class Checker:
 
     # ejecuta los dos pases: colección y chequeo
     def run(self, root):
+        self.class_bases.clear()
         self._declare_builtins()
         self._in_collect = True
         self._collect(root)
@@ -307,6 +309,7 @@ class Checker:
 
         if getattr(n, "base_name", None):
             C.base_name = n.base_name
+            self.class_bases[n.name] = n.base_name
 
         self.env.pop()
 
@@ -328,6 +331,46 @@ class Checker:
             f.is_builtin = True
         except Exception:
             pass
+        # throw(mensaje): lanza una excepción que atrapa el try/catch más cercano
+        try:
+            f = self.env.declare_func("throw", T_VOID())
+            f.typ = T_FUNC([T_UNKNOWN()], T_VOID())
+            f.return_type = T_VOID()
+            f.is_builtin = True
+        except Exception:
+            pass
+        # arreglos que crecen: push(a, v) -> nueva longitud, pop(a), length(a).
+        # Son nombres comunes: una declaración global del usuario los reemplaza.
+        for name, nparams, ret_t in (("push", 2, T_INT()), ("pop", 1, T_UNKNOWN()), ("length", 1, T_INT())):
+            try:
+                f = self.env.declare_func(name, ret_t)
+                f.typ = T_FUNC([T_UNKNOWN()] * nparams, ret_t)
+                f.return_type = ret_t
+                f.is_builtin = True
+                f.shadowable = True
+            except Exception:
+                pass
+
+    # push/pop/length: el primer argumento es un arreglo y push respeta su tipo
+    def _check_array_builtin(self, n, name, args):
+        if len(args) != (2 if name == "push" else 1):
+            self.err(n.loc, "Llamada a '" + name + "' con argumentos incompatibles")
+            return T_UNKNOWN()
+        arr_t = args[0]
+        if not is_array(arr_t):
+            if not is_unknown(arr_t):
+                self.err(n.loc, "'" + name + "' espera un arreglo, recibió " + str(arr_t))
+            return T_UNKNOWN() if name == "pop" else T_INT()
+        if name == "push":
+            if not is_unknown(arr_t.info) and not assignable(args[1], arr_t.info, self.class_bases):
+                self.err(
+                    n.loc,
+                    "No se puede agregar " + str(args[1]) + " a un arreglo de " + str(arr_t.info),
+                )
+            return T_INT()
+        if name == "pop":
+            return arr_t.info
+        return T_INT()
 
     def _is_void_type(self, t):
         # Evita depender de helpers externos; str(t) suele ser "void"
@@ -353,6 +396,12 @@ class Checker:
         k = s.__class__.__name__
         if k == "Return":
             return True
+        if k == "ExprStmt":
+            # throw(...) no vuelve: cuenta como salida de la función
+            e = getattr(s, "expr", None)
+            return (e.__class__.__name__ == "Call"
+                    and e.callee.__class__.__name__ == "Identifier"
+                    and e.callee.name == "throw")
         if k == "Block":
             return self._block_guarantees_return(s)
         if k == "If":
@@ -387,9 +436,13 @@ class Checker:
         if node is None:
             return None
         name = node.__class__.__name__
+        node.scope = self.env.scope     # ámbito activo en el nodo (hover del IDE)
         m = getattr(self, "visit_" + name, None)
         if m is not None:
-            return m(node)
+            t = m(node)
+            if t is not None:
+                node.sem_type = t   # tipo estático (lo usa IRGen: strings, print)
+            return t
         if self._is_func_like(node):
             return self.visit_FunctionLike(node)
         return T_UNKNOWN()
@@ -432,6 +485,7 @@ class Checker:
         except Exception as e:
             self.err(n.loc, str(e))
             sym = None
+        n.sym = sym     # IRGen: variables capturadas y asignadas (sym.boxed)
         if getattr(n, "init", None) is not None:
             rhs = self.visit(n.init)
             if sym is not None:
@@ -439,7 +493,7 @@ class Checker:
                     sym.typ = rhs
                     sym.inited = True
                 else:
-                    if not assignable(rhs, sym.typ):
+                    if not assignable(rhs, sym.typ, self.class_bases):
                         self.err(
                             n.loc,
                             "Asignación incompatible en declaración de '"
@@ -471,7 +525,7 @@ class Checker:
         if sym is not None:
             if sym.typ is None or is_unknown(sym.typ):
                 sym.typ = rhs
-            elif not assignable(rhs, sym.typ):
+            elif not assignable(rhs, sym.typ, self.class_bases):
                 self.err(
                     n.loc,
                     "Const '"
@@ -487,7 +541,8 @@ class Checker:
     # funciones y clases
     def visit_FunctionLike(self, n):
         fun_sym, _ = self.env.resolve(n.name)
-        if fun_sym is None or fun_sym.kind != "func":
+        # una anidada llamada push/pop/length no es el builtin: la declara aquí
+        if fun_sym is None or fun_sym.kind != "func" or getattr(fun_sym, "shadowable", False):
             ret_t = T_VOID()
             ra = self._func_ret_ann(n)
             if ra is not None:
@@ -514,6 +569,7 @@ class Checker:
             except Exception as e:
                 self.err(p.loc, str(e))
                 psym = None
+            p.sym = psym
             if psym is not None:
                 fun_sym.params.append(psym)
             i += 1
@@ -531,6 +587,8 @@ class Checker:
         if body is not None:
             self.visit(body)
         self._dead_pop()
+        # capturas de variables (IRGen: parámetros ocultos de la closure)
+        n.captures = [c for c in fun_sym.captures if c.kind in ("var", "const", "param")]
 
         if not self._is_void_type(rt):
             if body is None or not self._block_or_stmt_returns(body):
@@ -562,7 +620,7 @@ class Checker:
                     if (
                         fld is not None
                         and fld.typ is not None
-                        and not assignable(rhs, fld.typ)
+                        and not assignable(rhs, fld.typ, self.class_bases)
                     ):
                         self.err(
                             m.loc,
@@ -584,7 +642,7 @@ class Checker:
                     if (
                         fld is not None
                         and fld.typ is not None
-                        and not assignable(rhs, fld.typ)
+                        and not assignable(rhs, fld.typ, self.class_bases)
                     ):
                         self.err(
                             m.loc,
@@ -615,6 +673,7 @@ class Checker:
                             ps = None
                         if ps is not None:
                             ctor.params.append(ps)
+                        p.scope = self.env.scope
                         j += 1
                     self._dead_push()
                     self.visit(m.body)
@@ -641,6 +700,7 @@ class Checker:
                             ps = None
                         if ps is not None:
                             meth.params.append(ps)
+                        p.scope = self.env.scope
                         j += 1
                     if getattr(m, "ret_ann", None) is not None:
                         meth.return_type = parse_type_text(m.ret_ann)
@@ -656,6 +716,7 @@ class Checker:
                             self.err(m.loc, "Método '" + m.name + "' debe retornar un tipo de dato "
                                     + str(meth.return_type) + " en todos los caminos")
             i += 1
+        self.env.pop()
 
         if getattr(class_sym, "base_name", None):
             base_sym, _ = self.env.resolve(class_sym.base_name)
@@ -672,7 +733,10 @@ class Checker:
         tn = n.target.__class__.__name__
 
         if tn == "Identifier":
-            lhs_sym, _ = self.env.resolve(n.target.name)
+            lhs_sym, def_scope = self.env.resolve(n.target.name)
+            if (lhs_sym is not None and lhs_sym.kind in ("var", "param")
+                    and self.env.note_capture_if_needed(def_scope, lhs_sym)):
+                lhs_sym.boxed = True    # asignada desde una función anidada
             if lhs_sym is None:
                 # ¿campo implícito de this?
                 cls = self.env.current_class_symbol()
@@ -725,13 +789,13 @@ class Checker:
                 lhs_sym.typ = rhs_t
                 lhs_sym.inited = True
             else:
-                if not assignable(rhs_t, lhs_sym.typ):
+                if not assignable(rhs_t, lhs_sym.typ, self.class_bases):
                     self.err(n.loc, "Asignación incompatible: " + str(rhs_t) + " → " + str(lhs_sym.typ))
                 else:
                     lhs_sym.inited = True
         else:
             # LHS no es símbolo local/param; si conocemos su tipo declarado, validar compatibilidad
-            if not is_unknown(lhs_t) and not is_unknown(rhs_t) and not assignable(rhs_t, lhs_t):
+            if not is_unknown(lhs_t) and not is_unknown(rhs_t) and not assignable(rhs_t, lhs_t, self.class_bases):
                 self.err(n.loc, "Asignación incompatible: " + str(rhs_t) + " → " + str(lhs_t))
 
         return None
@@ -767,7 +831,7 @@ class Checker:
         if getattr(n, "value", None) is not None:
             rt = self.visit(n.value)
         exp = funsym.return_type if funsym.return_type is not None else T_VOID()
-        if not assignable(rt, exp):
+        if not assignable(rt, exp, self.class_bases):
             self.err(
                 n.loc, "Tipo de return incompatible: " + str(rt) + " → " + str(exp)
             )
@@ -797,6 +861,7 @@ class Checker:
     # resuelve un identificador y devuelve su tipo
     def visit_Identifier(self, n):
         sym, def_scope = self.env.resolve(n.name)
+        n.sym = sym
         if sym is not None:
             self.env.note_capture_if_needed(def_scope, sym)
             return sym.typ if sym.typ is not None else T_UNKNOWN()
@@ -807,6 +872,7 @@ class Checker:
         if cls is not None and fun is not None and fun.is_method:
             mem = self.env.class_lookup_member(cls, n.name)
             if mem is not None:
+                n.sym = mem
                 return mem.typ if mem.typ is not None else T_UNKNOWN()
 
         self.err(n.loc, "Uso de variable no declarada: '" + n.name + "'")
@@ -948,8 +1014,18 @@ class Checker:
                     "Llamada a identificador no declarado: '" + n.callee.name + "'",
                 )
                 return T_UNKNOWN()
+            # para el IRGen: la llamada no resuelve a una función del usuario
+            n.array_builtin = (sym.kind == "func" and getattr(sym, "is_builtin", False)
+                               and sym.name in ("push", "pop", "length"))
+            if n.array_builtin:
+                return self._check_array_builtin(n, sym.name, args)
             if sym.kind == "func":
-                ok, bad = call_compatible(sym.typ, args)
+                # quien llama a una closure también necesita lo que ella captura
+                for c in list(sym.captures):
+                    cs, cdef = self.env.resolve(c.name)
+                    if cs is c:
+                        self.env.note_capture_if_needed(cdef, c)
+                ok, bad = call_compatible(sym.typ, args, self.class_bases)
                 if not ok:
                     self.err(
                         n.loc,
@@ -967,7 +1043,7 @@ class Checker:
                             + "' no declarado; se esperaba 0 argumentos",
                         )
                 else:
-                    ok, bad = call_compatible(ctor.typ, args)
+                    ok, bad = call_compatible(ctor.typ, args, self.class_bases)
                     if not ok:
                         self.err(
                             n.loc,
@@ -995,7 +1071,7 @@ class Checker:
                     "Método '" + n.callee.name + "' no existe en clase " + obj_t.info,
                 )
                 return T_UNKNOWN()
-            ok, bad = call_compatible(mem.typ, args)
+            ok, bad = call_compatible(mem.typ, args, self.class_bases)
             if not ok:
                 self.err(
                     n.loc,
@@ -1067,7 +1143,8 @@ class Checker:
         while i < len(n.cases):
             c = n.cases[i]
             ct = self.visit(c.expr)
-            if not (assignable(ct, discr_t) and assignable(discr_t, ct)):
+            bases = self.class_bases
+            if not (assignable(ct, discr_t, bases) and assignable(discr_t, ct, bases)):
                 self.err(
                     c.loc,
                     "Tipo de 'case' "
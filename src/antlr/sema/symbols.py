@@ -52,6 +52,7 @@ class VarSymbol(Symbol):
         self.offset = None     # desplazamiento en el frame (si aplica)
         self.storage = "stack" # "stack", "global", etc.
         self.is_param = False  # true si proviene de parámetro
+        self.boxed = False     # una función anidada la asigna: vive en el entorno
 
 
 class ConstSymbol(Symbol):
@@ -79,6 +80,7 @@ class FunctionSymbol(Symbol):
         self.frame = None      # frame del backend (llena IR/x86)
         self.label = None      # etiqueta ASM (p.ej. 'main' o '_f_nombre')
         self.is_builtin = False
+        self.shadowable = False  # builtin cuyo nombre puede tomar una declaración del usuario
 
 
 class ClassSymbol(Symbol):
@@ -100,8 +102,9 @@ class Scope:
         self.owner_symbol = owner_symbol
 
     def declare(self, sym):
-        # valida redeclaración en el mismo ámbito
-        if sym.name in self.table:
+        # valida redeclaración en el mismo ámbito (salvo sobre un builtin 'shadowable')
+        old = self.table.get(sym.name)
+        if old is not None and not getattr(old, "shadowable", False):
             raise Exception("Redeclaración en el mismo ámbito: " + sym.name)
         self.table[sym.name] = sym
         return sym
@@ -179,37 +182,21 @@ class Env:
     # --- capturas (closures) ---
     def note_capture_if_needed(self, defining_scope, sym):
         """
-        Si estamos dentro de una función y 'sym' proviene de un scope por encima
-        de dicha función, registra la captura en el símbolo de la función activa.
+        Si 'sym' proviene de un scope por encima de la función activa, registra
+        la captura en esa función y en cada función que la contiene hasta
+        'defining_scope' (closures planas: una función intermedia recibe lo
+        que capturan sus anidadas para pasárselo). True si hubo captura.
         """
-        # localizar scope de función más cercano
+        captured = False
         cur = self.scope
-        nearest_fun_scope = None
-        while cur is not None and nearest_fun_scope is None:
+        while cur is not None and cur is not defining_scope:
             if cur.is_function_scope():
-                nearest_fun_scope = cur
-                break
+                funsym = cur.owner_symbol
+                if funsym is not None and funsym.kind == "func":
+                    funsym.add_capture(sym)
+                    captured = True
             cur = cur.parent
-        if nearest_fun_scope is None:
-            return
-
-        # ¿'defining_scope' está por encima del scope de función?
-        s_fun = nearest_fun_scope
-        above = False
-        t = defining_scope
-        while t is not None:
-            if t is s_fun:
-                above = False
-                break
-            if t.parent is None:
-                above = True
-                break
-            t = t.parent
-
-        if above:
-            funsym = nearest_fun_scope.owner_symbol
-            if funsym is not None and funsym.kind == "func":
-                funsym.add_capture(sym)
+        return captured
 
     # --- utilidades para clases ---
     def class_add_field(self, classsym, name, typ):
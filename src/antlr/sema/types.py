@@ -145,18 +145,37 @@ def can_widen(src, dst):
     return is_int(src) and is_float(dst)
 
 
+# verifica si la clase sub es base o deriva (directa o indirectamente) de
+# base; bases: herencia conocida (clase -> base), la del checker que pregunta
+def is_subclass(sub, base, bases=None):
+    bases = bases or {}
+    visited = set()
+    while sub is not None and sub not in visited:
+        if sub == base:
+            return True
+        visited.add(sub)
+        sub = bases.get(sub)
+    return False
+
+
 # define si un valor de tipo src puede asignarse a una variable de tipo dst
-def assignable(src, dst):
+# (bases: ver is_subclass; sin ella no hay upcast implícito)
+def assignable(src, dst, bases=None):
     if src is None or dst is None:
         return False
     if src == dst:
         return True
     if can_widen(src, dst):
         return True
+    if is_class(src) and is_class(dst) and is_subclass(src.info, dst.info, bases):
+        return True
     if is_null(src) and is_reference_like(dst):
         return True
     if is_array(src) and is_array(dst):
-        return assignable(src.info, dst.info) and (src.info == dst.info)
+        # '[]' (elemento desconocido) sirve para cualquier arreglo
+        if is_unknown(src.info):
+            return True
+        return assignable(src.info, dst.info, bases) and (src.info == dst.info)
     return False
 
 
@@ -266,7 +285,7 @@ def array_literal_element_type(elem_types):
 
 
 # valida compatibilidad de llamada: aridad y asignabilidad por posición
-def call_compatible(fun_t, arg_types):
+def call_compatible(fun_t, arg_types, bases=None):
     if not is_func(fun_t):
         return (False, -1)
     params, ret = fun_t.info
@@ -277,7 +296,7 @@ def call_compatible(fun_t, arg_types):
         if is_unknown(params[i]):
             i = i + 1
             continue
-        if not assignable(arg_types[i], params[i]):
+        if not assignable(arg_types[i], params[i], bases):
             return (False, i)
         i = i + 1
     return (True, -1)
@@ -1,4 +1,4 @@
-﻿import sys, os, shutil, subprocess
+﻿import sys, os, shutil, subprocess, copy
 from antlr4 import FileStream, CommonTokenStream
 from antlr4.error.ErrorListener import ErrorListener
 
@@ -13,9 +13,14 @@ from antlr.sema.checker import Checker
 
 from compiscript.codegen.irgen import IRGen
 from compiscript.ir.pretty import format_ir
+from compiscript.ir.tac import Call, CheckIndex
 from compiscript.ir.optimize import optimize_program
+from compiscript.ir.interp import TACInterpreter
+from compiscript.ir.profile import profile_program, format_profile
 from compiscript.codegen.x86_naive import X86Naive
 from compiscript.codegen.ass_mips import MIPSNaive
+from compiscript.codegen.asm import count_mips_instructions, count_x86_instructions
+from compiscript.codegen.mips_sim import MIPSSim
 
 
 class SyntaxErrorListener(ErrorListener):
@@ -37,9 +42,38 @@ def _mk_out_dirs(repo_root: str, src_path: str):
     return out_root, ast_dir, ir_dir, asm_dir, base
 
 
+def _print_peephole(st):
+    if not st:
+        return
+    print(f"  peephole: {st['ins_in']} -> {st['ins_out']} instrucciones "
+          f"(-{st['removed']}; forwarding: {st['forwarded']}, inmediatos: {st['imm_folded']}, "
+          f"saltos: {st['jumps']}, moves: {st['moves']})")
+
+
+def _print_isel(backend_cls, count, prog):
+    """Instrucciones con/sin la selección de isel.py (sin peephole, para aislarla)."""
+    before = count(backend_cls(peephole=False, imm_select=False).compile(prog).split("\n"))
+    after = count(backend_cls(peephole=False).compile(prog).split("\n"))
+    print(f"  selección (árboles + inmediatos): {before} -> {after} instrucciones")
+
+
+def _print_sim(asm_text: str):
+    """--sim: ejecuta el ASM MIPS en el simulador y muestra los contadores."""
+    sim = MIPSSim(asm_text)
+    try:
+        sim.run()
+    except RuntimeError as e:
+        print("  ✗ simulador:", e)
+    st = sim.stats
+    print(f"  simulador: {st['instructions']} instrucciones, {st['cycles']} ciclos, "
+          f"loads: {st['loads']}, stores: {st['stores']}, "
+          f"branches: {st['branches']} (tomados: {st['taken']}), saltos: {st['jumps']}")
+    return sim.output
+
+
 def main():
     if len(sys.argv) < 2:
-        print("Uso: python -m compiscript.cli <archivo.cps>")
+        print("Uso: python -m compiscript.cli <archivo.cps> [--safe] [--run] [--sim] [--profile] [--ds]")
         sys.exit(2)
 
     src_path = sys.argv[1]
@@ -94,8 +128,11 @@ def main():
         sys.exit(1)
     print("✓ Análisis semántico: OK")
 
-    # IR
-    ir_prog = IRGen().build(ast)
+    # IR (--safe: checks de índice en cada arr[i])
+    safe = "--safe" in sys.argv[2:]
+    ir_prog = IRGen(safe=safe).build(ast)
+    nchecks = lambda p: sum(isinstance(i, CheckIndex) for fn in p.functions.values() for i in fn.body)
+    checks_raw = nchecks(ir_prog)
     # 1) Guardar IR "tal cual" (sin optimizar)
     ir_txt = os.path.join(ir_dir, "program.ir.txt")
     with open(ir_txt, "w", encoding="utf-8") as f:
@@ -104,24 +141,87 @@ def main():
 
     # 2) Optimizar y guardar IR optimizado
     ir_prog_opt = optimize_program(ir_prog)   # nota: modifica en sitio y retorna prog
+    # (queda marcado con opt_level: los backends ya no repiten los pases)
     ir_txt_op = os.path.join(ir_dir, "program_op.ir.txt")
     with open(ir_txt_op, "w", encoding="utf-8") as f:
         f.write(format_ir(ir_prog_opt))
     print("IR optimizado guardado en:", ir_txt_op)
+    if safe:
+        print(f"  checks de índice: {checks_raw} -> {nchecks(ir_prog_opt)} tras el análisis de rangos")
+
+    # --run: ejecutar el IR optimizado con el intérprete TAC
+    if "--run" in sys.argv[2:]:
+        it = TACInterpreter(ir_prog_opt)
+        err = None
+        try:
+            it.run()
+        except RuntimeError as e:
+            err = e
+        print("--- salida (intérprete TAC) ---")
+        print(it.output, end="" if it.output.endswith("\n") or not it.output else "\n")
+        print(f"--- {it.steps} instrucciones TAC ejecutadas ---")
+        if err is not None:
+            print("✗ Error de ejecución:", err)
+
+    # --profile: perfil del IR optimizado + IR con inlining guiado por perfil
+    if "--profile" in sys.argv[2:]:
+        prof = profile_program(ir_prog_opt)
+        report = format_profile(prof)
+        with open(os.path.join(ir_dir, "profile.txt"), "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+        print("--- perfil (intérprete TAC) ---")
+        print(report)
+        pgo = optimize_program(copy.deepcopy(ir_prog_opt), profile=prof)
+        ir_txt_pgo = os.path.join(ir_dir, "program_pgo.ir.txt")
+        with open(ir_txt_pgo, "w", encoding="utf-8") as f:
+            f.write(format_ir(pgo))
+        ncalls = lambda p: sum(isinstance(i, Call) for fn in p.functions.values() for i in fn.body)
+        print(f"IR con PGO guardado en: {ir_txt_pgo} "
+              f"(llamadas estáticas: {ncalls(ir_prog_opt)} -> {ncalls(pgo)})")
 
     # x86 ASM (.asm)
-    asm_text_x86 = X86Naive().compile(ir_prog_opt)
+    x86 = X86Naive()
+    asm_text_x86 = x86.compile(ir_prog_opt)
     asm_path_x86 = os.path.join(asm_dir, f"{base}.asm")
     with open(asm_path_x86, "w", encoding="utf-8") as f:
         f.write(asm_text_x86)
     print("ASM (x86) guardado en:", asm_path_x86)
+    _print_isel(X86Naive, count_x86_instructions, ir_prog_opt)
+    _print_peephole(x86.peephole_stats)
 
     # MIPS ASM (.s)  ← NUEVO
-    mips_text = MIPSNaive().compile(ir_prog_opt)
+    mips = MIPSNaive()
+    mips_text = mips.compile(ir_prog_opt)
     mips_path = os.path.join(asm_dir, f"{base}.s")
     with open(mips_path, "w", encoding="utf-8") as f:
         f.write(mips_text)
     print("ASM (MIPS) guardado en:", mips_path)
+    _print_isel(MIPSNaive, count_mips_instructions, ir_prog_opt)
+    _print_peephole(mips.peephole_stats)
+    if "--sim" in sys.argv[2:]:
+        out = _print_sim(mips_text)
+        print("--- salida (simulador MIPS) ---")
+        print(out, end="" if out.endswith("\n") or not out else "\n")
+
+    # --ds: MIPS con delay slots llenos (.ds.s); requiere delayed branching
+    # en el simulador. Con --sim se compara con el mismo código con un nop
+    # en cada slot (también en modo delayed)
+    if "--ds" in sys.argv[2:]:
+        mips_ds = MIPSNaive(delay_slots=True)
+        mips_ds_text = mips_ds.compile(ir_prog_opt)
+        mips_ds_path = os.path.join(asm_dir, f"{base}.ds.s")
+        with open(mips_ds_path, "w", encoding="utf-8") as f:
+            f.write(mips_ds_text)
+        st = mips_ds.sched_stats
+        print("ASM (MIPS, delayed branches) guardado en:", mips_ds_path)
+        print(f"  delay slots: {st['nops_in']} nops -> {st['nops_out']} "
+              f"(subidos: {st['filled_above']}, destino: {st['filled_target']}, "
+              f"saltos eliminados: {st['jumps_removed']})")
+        if "--sim" in sys.argv[2:]:
+            print("  con un nop en cada slot:")
+            _print_sim(MIPSNaive(delay_slots=True, fill_slots=False).compile(ir_prog_opt))
+            print("  con los slots llenos:")
+            _print_sim(mips_ds_text)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,438 @@
+# src/compiscript/codegen/asm.py
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+# -------------------------------------------------------------------
+# Representación estructurada (línea a línea) del ASM que emiten los
+# backends. Los backends siguen escribiendo texto en self.lines; los
+# post-pases lo parsean aquí, lo transforman y lo vuelven a renderizar.
+# Las líneas que no se tocan conservan su texto original.
+# -------------------------------------------------------------------
+
+
+@dataclass
+class AsmLine:
+    kind: str                       # 'ins' | 'label' | 'directive' | 'comment' | 'blank'
+    op: str = ""                    # mnemónico (ins) o nombre (label)
+    args: List[str] = field(default_factory=list)
+    comment: str = ""
+    text: Optional[str] = None      # texto original; None si la línea fue modificada
+
+    def is_ins(self, *ops: str) -> bool:
+        return self.kind == "ins" and (not ops or self.op in ops)
+
+    def touch(self) -> "AsmLine":
+        self.text = None
+        return self
+
+
+def mk_ins(op: str, *args: str, comment: str = "") -> AsmLine:
+    return AsmLine(kind="ins", op=op, args=list(args), comment=comment)
+
+
+def mk_label(name: str) -> AsmLine:
+    return AsmLine(kind="label", op=name)
+
+
+# ------------------------------- MIPS -------------------------------
+
+def parse_mips(lines: List[str]) -> List[AsmLine]:
+    out: List[AsmLine] = []
+    for raw in lines:
+        # una línea del backend puede contener '\n' (raro, pero no rompemos)
+        for s in raw.split("\n"):
+            out.append(_parse_mips_line(s))
+    return out
+
+
+def _parse_mips_line(s: str) -> AsmLine:
+    t = s.strip()
+    if not t:
+        return AsmLine(kind="blank", text=s)
+    if t.startswith("#"):
+        return AsmLine(kind="comment", comment=t, text=s)
+    if t.startswith("."):
+        return AsmLine(kind="directive", op=t, text=s)
+    # 'lab: .byte ...' / 'lab: .word ...' (datos con etiqueta)
+    head, sep, rest = t.partition(":")
+    if sep and " " not in head and rest.strip().startswith("."):
+        return AsmLine(kind="directive", op=t, text=s)
+    if t.endswith(":") and " " not in t:
+        return AsmLine(kind="label", op=t[:-1], text=s)
+
+    body, _, com = t.partition("#")
+    body = body.strip()
+    parts = body.split(None, 1)
+    op = parts[0]
+    args: List[str] = []
+    if len(parts) > 1:
+        args = [a.strip() for a in parts[1].split(",")]
+    return AsmLine(kind="ins", op=op, args=args, comment=com.strip(), text=s)
+
+
+def render_mips(items: List[AsmLine]) -> List[str]:
+    out: List[str] = []
+    for it in items:
+        if it.text is not None:
+            out.append(it.text)
+        elif it.kind == "label":
+            out.append(f"{it.op}:")
+        elif it.kind == "ins":
+            s = f"  {it.op}"
+            if it.args:
+                s += " " + ", ".join(it.args)
+            if it.comment:
+                s += f"  # {it.comment}"
+            out.append(s)
+        elif it.kind == "comment":
+            out.append(it.comment)
+        elif it.kind == "directive":
+            out.append(it.op)
+        else:
+            out.append("")
+    return out
+
+
+# Tablas de efectos por mnemónico: qué posiciones de args escribe/lee.
+_R3 = {"addu", "add", "subu", "sub", "and", "or", "xor", "nor",
+       "slt", "sltu", "mul", "sllv", "srlv", "srav"}
+_RI = {"addiu", "addi", "andi", "ori", "xori", "slti", "sltiu", "sll", "srl", "sra"}
+_LOADS = {"lw", "lb", "lbu", "lh", "lhu"}
+_STORES = {"sw", "sb", "sh"}
+_HILO = {"div", "divu", "mult", "multu"}
+_BR2 = {"beq", "bne"}
+_BR1 = {"bltz", "bgez", "blez", "bgtz", "beqz", "bnez"}
+
+MIPS_BRANCHES: FrozenSet[str] = frozenset(_BR2 | _BR1 | {"b"})
+MIPS_JUMPS: FrozenSet[str] = frozenset({"j", "jal", "jr", "jalr"})
+
+# inversión de condicionales (para saltar al camino contrario)
+MIPS_INVERT = {
+    "beq": "bne", "bne": "beq",
+    "bltz": "bgez", "bgez": "bltz",
+    "blez": "bgtz", "bgtz": "blez",
+    "beqz": "bnez", "bnez": "beqz",
+}
+
+# registros que una llamada puede destruir (o32: caller-saved)
+_CALL_CLOBBERS = frozenset(
+    ["$at", "$v0", "$v1", "$a0", "$a1", "$a2", "$a3", "$ra", "hi", "lo"]
+    + [f"$t{i}" for i in range(10)]
+)
+
+# rutinas del runtime con convención de registros propia (ver
+# MIPSNaive._emit_runtime_alloc/_itoa): nombre -> (leídos, escritos)
+MIPS_RUNTIME_REGS: Dict[str, Tuple[FrozenSet[str], FrozenSet[str]]] = {
+    "__alloc": (frozenset({"$a0", "$sp"}),
+                frozenset({"$v0", "$v1", "$a0", "$a1", "$t8", "$t9", "$ra"})),
+    "__free": (frozenset({"$a0", "$sp"}),
+               frozenset({"$t8", "$t9", "$ra"})),
+    "__itoa": (frozenset({"$a0", "$sp"}),
+               frozenset({"$v0", "$v1", "$a0", "$a1", "$a2", "$a3", "$t8", "$t9",
+                          "hi", "lo", "$ra"})),
+}
+
+
+def mips_mem_base(arg: str) -> Optional[str]:
+    """'-12($fp)' -> '$fp'; 'label' -> None."""
+    i = arg.find("(")
+    if i >= 0 and arg.endswith(")"):
+        return arg[i + 1:-1]
+    return None
+
+
+def mips_defs_uses(it: AsmLine) -> Tuple[Set[str], Set[str]]:
+    """Registros escritos y leídos por una instrucción MIPS."""
+    op, a = it.op, it.args
+    d: Set[str] = set()
+    u: Set[str] = set()
+    if op in _R3:
+        d.add(a[0]); u.update(a[1:3])
+    elif op in _RI:
+        d.add(a[0]); u.add(a[1])
+    elif op in ("li", "la", "lui"):
+        d.add(a[0])
+    elif op == "move":
+        d.add(a[0]); u.add(a[1])
+    elif op in _LOADS:
+        d.add(a[0])
+        b = mips_mem_base(a[1])
+        if b: u.add(b)
+    elif op in _STORES:
+        u.add(a[0])
+        b = mips_mem_base(a[1])
+        if b: u.add(b)
+    elif op in _HILO:
+        u.update(a[0:2]); d.update(("hi", "lo"))
+    elif op == "mflo":
+        d.add(a[0]); u.add("lo")
+    elif op == "mfhi":
+        d.add(a[0]); u.add("hi")
+    elif op in _BR2:
+        u.update(a[0:2])
+    elif op in _BR1:
+        u.add(a[0])
+    elif op == "jr":
+        u.add(a[0])
+    elif op == "jal" and a and a[0] in MIPS_RUNTIME_REGS:
+        ru, rd = MIPS_RUNTIME_REGS[a[0]]
+        u.update(ru); d.update(rd)
+    elif op in ("jal", "jalr"):
+        if op == "jalr": u.add(a[0])
+        u.update(("$sp", "$a0", "$a1", "$a2", "$a3"))
+        d.update(_CALL_CLOBBERS)
+    elif op == "syscall":
+        u.update(("$v0", "$a0", "$a1")); d.add("$v0")
+    d.discard("$zero"); u.discard("$zero")
+    return d, u
+
+
+def _fits16(v: int) -> bool:
+    return -32768 <= v <= 65535
+
+
+def mips_single_word(it: AsmLine) -> bool:
+    """True si la (pseudo)instrucción ensambla a exactamente una palabra."""
+    op, a = it.op, it.args
+    if op == "la":
+        return False
+    if op == "li":
+        try:
+            return _fits16(int(a[1], 0))
+        except (ValueError, IndexError):
+            return False
+    if op in _LOADS or op in _STORES:
+        return len(a) > 1 and mips_mem_base(a[1]) is not None
+    return True
+
+
+def mips_branch_target(it: AsmLine) -> Optional[str]:
+    if it.op in ("j", "jal", "b"):
+        return it.args[0] if it.args else None
+    if it.op in MIPS_BRANCHES:
+        return it.args[-1] if it.args else None
+    return None
+
+
+def count_mips_instructions(lines: List[str]) -> int:
+    """Cuenta instrucciones (no etiquetas/directivas/comentarios) en la sección .text."""
+    n = 0
+    in_text = False
+    for it in parse_mips(lines):
+        if it.kind == "directive":
+            if it.op.startswith(".text"):
+                in_text = True
+            elif it.op.startswith(".data"):
+                in_text = False
+        elif it.kind == "ins" and in_text:
+            n += 1
+    return n
+
+
+# ------------------------------- x86 --------------------------------
+
+_X86_DATA = ("db", "dw", "dd", "dq", "resb", "resd", "equ")
+X86_REGS = ("eax", "ebx", "ecx", "edx", "esi", "edi", "ebp", "esp")
+_X86_SUB = {"al": "eax", "ah": "eax", "ax": "eax", "bl": "ebx", "bx": "ebx",
+            "cl": "ecx", "cx": "ecx", "dl": "edx", "dx": "edx"}
+
+X86_JCC = frozenset({"je", "jne", "jl", "jle", "jg", "jge", "jz", "jnz",
+                     "jb", "jbe", "ja", "jae"})
+X86_INVERT = {
+    "je": "jne", "jne": "je", "jz": "jnz", "jnz": "jz",
+    "jl": "jge", "jge": "jl", "jle": "jg", "jg": "jle",
+    "jb": "jae", "jae": "jb", "jbe": "ja", "ja": "jbe",
+}
+
+# cdecl: lo que una llamada puede destruir
+_X86_CALL_CLOBBERS = frozenset({"eax", "ecx", "edx", "flags"})
+
+
+def parse_x86(lines: List[str]) -> List[AsmLine]:
+    out: List[AsmLine] = []
+    for raw in lines:
+        for s in raw.split("\n"):
+            out.append(_parse_x86_line(s))
+    return out
+
+
+def _parse_x86_line(s: str) -> AsmLine:
+    t = s.strip()
+    if not t:
+        return AsmLine(kind="blank", text=s)
+    if t.startswith(";"):
+        return AsmLine(kind="comment", comment=t, text=s)
+    parts = t.split(None, 2)
+    if parts[0] in ("section", "extern", "global") or (len(parts) > 1 and parts[1] in _X86_DATA):
+        return AsmLine(kind="directive", op=t, text=s)
+    if t.endswith(":") and " " not in t:
+        return AsmLine(kind="label", op=t[:-1], text=s)
+
+    body, _, com = t.partition(";")
+    body = body.strip()
+    parts = body.split(None, 1)
+    args: List[str] = []
+    if len(parts) > 1:
+        args = [a.strip() for a in parts[1].split(",")]
+    return AsmLine(kind="ins", op=parts[0], args=args, comment=com.strip(), text=s)
+
+
+def render_x86(items: List[AsmLine]) -> List[str]:
+    out: List[str] = []
+    for it in items:
+        if it.text is not None:
+            out.append(it.text)
+        elif it.kind == "label":
+            out.append(f"{it.op}:")
+        elif it.kind == "ins":
+            s = f"    {it.op}"
+            if it.args:
+                s += " " + ", ".join(it.args)
+            if it.comment:
+                s += f"  ; {it.comment}"
+            out.append(s)
+        elif it.kind == "comment":
+            out.append(it.comment)
+        elif it.kind == "directive":
+            out.append(it.op)
+        else:
+            out.append("")
+    return out
+
+
+def x86_reg(arg: str) -> Optional[str]:
+    """Registro de 32 bits al que se refiere 'arg' (o None si no es registro)."""
+    if arg in X86_REGS:
+        return arg
+    return _X86_SUB.get(arg)
+
+
+def x86_is_mem(arg: str) -> bool:
+    return "[" in arg
+
+
+def x86_mem_regs(arg: str) -> Set[str]:
+    """Registros usados para direccionar un operando de memoria."""
+    i = arg.find("[")
+    j = arg.rfind("]")
+    regs: Set[str] = set()
+    if i < 0 or j < i:
+        return regs
+    tok = ""
+    for ch in arg[i + 1:j] + " ":
+        if ch.isalnum() or ch == "_":
+            tok += ch
+        else:
+            r = x86_reg(tok)
+            if r:
+                regs.add(r)
+            tok = ""
+    return regs
+
+
+def x86_mem_key(arg: str) -> Optional[Tuple[str, int]]:
+    """'dword [ebp-12]' -> ('ebp', -12); None si no es [reg±k]."""
+    i = arg.find("[")
+    j = arg.rfind("]")
+    if i < 0 or j < i:
+        return None
+    inner = arg[i + 1:j].replace(" ", "")
+    k = 0
+    while k < len(inner) and inner[k] not in "+-":
+        k += 1
+    base = inner[:k]
+    if base not in X86_REGS:
+        return None
+    if k == len(inner):
+        return base, 0
+    try:
+        return base, int(inner[k:], 0)
+    except ValueError:
+        return None
+
+
+def _x86_src(a: str, u: Set[str]):
+    r = x86_reg(a)
+    if r:
+        u.add(r)
+    elif x86_is_mem(a):
+        u.update(x86_mem_regs(a))
+
+
+def x86_defs_uses(it: AsmLine) -> Tuple[Set[str], Set[str]]:
+    """Registros (y 'flags') escritos y leídos por una instrucción x86."""
+    op, a = it.op, it.args
+    d: Set[str] = set()
+    u: Set[str] = set()
+
+    def dst(x: str, read: bool):
+        r = x86_reg(x)
+        if r:
+            d.add(r)
+            # escritura parcial (al, ...) conserva el resto del registro
+            if read or r != x:
+                u.add(r)
+        elif x86_is_mem(x):
+            u.update(x86_mem_regs(x))
+
+    if op in ("mov", "movzx", "movsx", "lea"):
+        dst(a[0], False)
+        if op == "lea":
+            u.update(x86_mem_regs(a[1]))
+        else:
+            _x86_src(a[1], u)
+    elif op in ("add", "sub", "and", "or", "xor", "adc", "sbb", "shl", "shr", "sar"):
+        dst(a[0], True)
+        _x86_src(a[1], u)
+        d.add("flags")
+    elif op == "imul":
+        if len(a) == 3:
+            dst(a[0], False); _x86_src(a[1], u)
+        elif len(a) == 2:
+            dst(a[0], True); _x86_src(a[1], u)
+        else:
+            _x86_src(a[0], u); u.add("eax"); d.update(("eax", "edx"))
+        d.add("flags")
+    elif op in ("cmp", "test"):
+        _x86_src(a[0], u); _x86_src(a[1], u)
+        d.add("flags")
+    elif op in ("neg", "not", "inc", "dec"):
+        dst(a[0], True)
+        if op != "not":
+            d.add("flags")
+    elif op == "cdq":
+        u.add("eax"); d.add("edx")
+    elif op in ("idiv", "div"):
+        _x86_src(a[0], u); u.update(("eax", "edx")); d.update(("eax", "edx", "flags"))
+    elif op.startswith("set"):
+        dst(a[0], False); u.add("flags")
+    elif op in X86_JCC:
+        u.add("flags")
+    elif op == "push":
+        _x86_src(a[0], u); u.add("esp"); d.add("esp")
+    elif op == "pop":
+        dst(a[0], False); u.add("esp"); d.add("esp")
+    elif op == "call":
+        u.add("esp"); d.update(_X86_CALL_CLOBBERS)
+    elif op == "ret":
+        u.update(("eax", "esp"))
+    return d, u
+
+
+def x86_branch_target(it: AsmLine) -> Optional[str]:
+    if it.op == "jmp" or it.op in X86_JCC:
+        return it.args[0] if it.args else None
+    return None
+
+
+def count_x86_instructions(lines: List[str]) -> int:
+    n = 0
+    in_text = False
+    for it in parse_x86(lines):
+        if it.kind == "directive":
+            if it.op.startswith("section"):
+                in_text = ".text" in it.op
+        elif it.kind == "ins" and in_text:
+            n += 1
+    return n
@@ -1,12 +1,21 @@
 from __future__ import annotations
-from typing import Dict, List
+import copy
+from typing import Dict, List, Optional, Tuple
 
 from compiscript.codegen.frame import Frame
+from compiscript.codegen.delay_slots import fill_delay_slots, pad_delay_slots
+from compiscript.codegen.peephole import peephole_mips
+from compiscript.codegen.switch_plan import jump_table, search_tree
+from compiscript.codegen.strength import strength_plan
+from compiscript.codegen.isel import (
+    LoadIK, StoreIK, imm_binop, imm_compare, fits_s16, fits_u16, select_trees,
+)
+from compiscript.ir.optimize import is_optimized, optimize_program
 from compiscript.ir.tac import (
     IRProgram, IRFunction, Instr, Operand,
     Label, Jump, CJump, Move, BinOp, UnaryOp, Cmp, Call, Return,
     Temp, Local, Param, ConstInt, ConstStr,
-    Load, Store, LoadI, StoreI
+    Load, Store, LoadI, StoreI, CheckIndex, SwitchJump, Throw, Catch, vtable_label, ARR_HEADER
 )
 
 class MIPSNaive:
@@ -16,50 +25,117 @@ class MIPSNaive:
       - Retorno en $v0.
       - Callee guarda $fp/$ra y usa $fp como marco.
       - Locales/temps: -offset($fp). Params: (offset-8)($fp).
+      - Excepciones: __eh_table con rangos (inicio, fin, manejador) por
+        tramos de bloques con el mismo manejador; el camino sin throw no
+        ejecuta nada extra. __throw recorre los frames por $fp.
+      - CheckIndex: lw/sltu/beq no tomado; el throw va en un stub al final
+        de la función, con su propio rango si el check está en un try.
+    Con delay_slots=True el resultado se reprograma para *delayed branches*
+    (MARS: Settings > Delayed branching; SPIM: -delayed_branches). Con
+    fill_slots=False cada slot queda con un 'nop': la línea base contra la
+    que se mide el relleno. imm_select=False apaga la selección de isel.py
+    (árboles e inmediatos).
     """
     SAVE_AREA = 8
+    # allocator del runtime (__alloc/__free): clases pequeñas de 1..ALLOC_CLASSES
+    # palabras con free list propia; el heap se pide a sbrk en trozos
+    ALLOC_CLASSES = 32
+    ALLOC_CHUNK = 4096
 
-    def __init__(self):
+    def __init__(self, delay_slots: bool = False, peephole: bool = True, imm_select: bool = True,
+                 fill_slots: bool = True):
         self.lines: List[str] = []
         self.temp_slots: Dict[str, int] = {}
+        self.delay_slots = delay_slots
+        self.fill_slots = fill_slots
+        self.peephole = peephole
+        self.imm_select = imm_select
+        self.sched_stats: Dict[str, int] = {}
+        self.peephole_stats: Dict[str, int] = {}
+        # tablas de saltos de los switch: (etiqueta, destinos)
+        self.jump_tables: List[Tuple[str, List[str]]] = []
+        self._sw_count = 0
+        self._uid_count = 0
+        # id de clase (argumento de __new) -> clase, en orden de prog.vtables
+        self.vtable_classes: List[str] = []
+        # rangos de excepción (inicio, fin, manejador) y manejador abierto;
+        # uses_eh: el programa tiene algún throw (si no, no hay tabla)
+        self.eh_ranges: List[Tuple[str, str, str]] = []
+        self._eh_open: Optional[str] = None
+        self.uses_eh = False
+        # stubs de CheckIndex de la función en curso: (etiqueta, mensaje, manejador)
+        self.oob_stubs: List[Tuple[str, str, Optional[str]]] = []
+
+    def _uid(self) -> int:
+        """Sufijo para etiquetas locales; determinista por compilación."""
+        self._uid_count += 1
+        return self._uid_count
 
     #  API principal 
     def compile(self, prog: IRProgram) -> str:
         self.lines = []
+        self.jump_tables = []
+        self._sw_count = 0
+        self._uid_count = 0
+        self.eh_ranges = []
 
-        # 1) Intentar optimizar con módulo externo (único optimizador del proyecto)
-        try:
-            import compiscript.ir.optimize as opt
-        except Exception:
-            opt = None
-        if opt and hasattr(opt, "optimize_program"):
-            result = opt.optimize_program(prog)
-            if result is not None:
-                prog = result
+        # 1) IR ya optimizado (cli/app) se usa tal cual; si no, se optimiza
+        #    una copia para no alterar el IR del llamador.
+        if not is_optimized(prog):
+            prog = optimize_program(copy.deepcopy(prog))
 
         # 2) Emitir
+        self.vtable_classes = list(prog.vtables)
+        self.uses_eh = any(isinstance(i, (Throw, CheckIndex))
+                           for fn in prog.functions.values() for i in fn.body)
         self._emit_header()
         self._emit_data(prog)
         self._emit_text(prog)
-        # runtime auxiliar (concat) siempre disponible
+        # runtime auxiliar (concat + itoa + allocator) siempre disponible
         self._emit_runtime_concat()
+        self._emit_runtime_itoa()
+        self._emit_runtime_alloc()
+        self._emit_runtime_push()
+        if self.uses_eh:
+            self._emit_runtime_throw()
         # wrapper main si no existe un 'main' del usuario
         if "main" not in prog.functions:
             entry = prog.entry or "__toplevel"
             self._emit_main_wrapper(entry)
+        self._emit_jump_tables()
+        self._emit_eh_table()
+        # 3) Post-pases: peephole y llenado de delay slots (opcional)
+        if self.peephole:
+            self.lines, self.peephole_stats = peephole_mips(self.lines)
+        if self.delay_slots:
+            sched = fill_delay_slots if self.fill_slots else pad_delay_slots
+            self.lines, self.sched_stats = sched(self.lines)
         return "\n".join(self.lines)
 
     #  secciones 
     def _emit_header(self):
         self._w("# Compiscript MIPS (o32)")
+        if self.delay_slots:
+            self._w("# delayed branches: ON")
 
     def _emit_data(self, prog: IRProgram):
         self._w(".data")
-        # strings del programa como bytes (incluye NUL)
+        # strings del programa: palabra de longitud + bytes (incluye NUL);
+        # el valor string apunta a los bytes, la longitud queda en -4(p)
         for lab, b in prog.strings.items():
             b = self._normalize_string_bytes(list(b))
             bs = ", ".join(str(x) for x in b)
+            self._w(".align 2")
+            self._w(f".word {self._string_length(b)}")
             self._w(f"{lab}: .byte {bs}")
+        # vtables: direcciones de los métodos por slot (vacía: una palabra en 0)
+        for cls, slots in prog.vtables.items():
+            self._w(".align 2")
+            self._w(f"{vtable_label(cls)}: .word {', '.join(slots) or '0'}")
+        # estado del allocator (__alloc/__free)
+        self._w(".align 2")
+        self._w("__heap_state: .word 0, 0, 0     # cur, end, lista de grandes")
+        self._w(f"__free_lists: .space {(self.ALLOC_CLASSES + 1) * 4}")
         self._w("")
         self._w(".text")
         # exportar el entry real (útil para depurar y para wrapper)
@@ -115,11 +191,13 @@ class MIPSNaive:
     #  función 
     def _emit_function(self, fn: IRFunction, is_entry: bool):
         self.temp_slots.clear()
-        frame = fn.frame or Frame(fn.name, fn.params)
+        # copia: los slots de temps no deben filtrarse al IR ni a otro backend
+        frame = copy.deepcopy(fn.frame) if fn.frame else Frame(fn.name, fn.params)
 
         # Primera pasada: asignar slots a todos los Temp
         for ins in fn.body:
-            if isinstance(ins, (Move, BinOp, UnaryOp, Cmp, Call, Return, CJump, Load, Store, LoadI, StoreI)):
+            if isinstance(ins, (Move, BinOp, UnaryOp, Cmp, Call, Return, CJump, Load, Store, LoadI, StoreI,
+                                CheckIndex, SwitchJump, Throw, Catch)):
                 ops: List[Operand] = []
                 if isinstance(ins, Move):      ops = [ins.dst, ins.src]
                 if isinstance(ins, BinOp):     ops = [ins.dst, ins.a, ins.b]
@@ -132,6 +210,8 @@ class MIPSNaive:
                     if ins.value is not None: ops.append(ins.value)
                 if isinstance(ins, CJump):
                     ops = [ins.a, ins.b]
+                if isinstance(ins, SwitchJump):
+                    ops = [ins.value]
                 if isinstance(ins, Load):
                     ops = [ins.dst, ins.base]
                 if isinstance(ins, Store):
@@ -140,6 +220,12 @@ class MIPSNaive:
                     ops = [ins.dst, ins.base, ins.index]
                 if isinstance(ins, StoreI):
                     ops = [ins.base, ins.index, ins.src]
+                if isinstance(ins, CheckIndex):
+                    ops = [ins.base, ins.index]
+                if isinstance(ins, Throw):
+                    ops = [ins.value]
+                if isinstance(ins, Catch):
+                    ops = [ins.dst]
                 for o in ops:
                     if isinstance(o, Temp):
                         _ = self._addr(frame, o)
@@ -154,9 +240,14 @@ class MIPSNaive:
         self._w(f"  sw $fp, {lsize}($sp)")
         self._w(f"  addiu $fp, $sp, {lsize + 8}")  # $fp = SP de entrada (top de args)
 
-        # cuerpo
-        for ins in fn.body:
+        # cuerpo (cada bloque abre/cierra su rango de excepción)
+        body = select_trees(fn) if self.imm_select else fn.body
+        for ins in body:
+            if self.uses_eh and isinstance(ins, Label):
+                self._eh_range(fn.handlers.get(ins.name))
             self._emit_instr(frame, ins, lsize)
+        if self.uses_eh:
+            self._eh_range(None)
 
         # epílogo sólo si la última instr real NO fue Return
         last = None
@@ -166,6 +257,19 @@ class MIPSNaive:
                 break
         if not isinstance(last, Return):
             self._emit_epilogue(lsize)
+        self._emit_oob_stubs()
+
+    def _emit_oob_stubs(self):
+        """Lanzamientos de los CheckIndex fallidos, fuera del camino normal;
+        cada uno en el rango de excepción del check que lo usa."""
+        for lab, msg, pad in self.oob_stubs:
+            self._eh_range(pad)
+            self._lbl(lab)
+            self._w(f"  la $a0, {msg}")
+            self._w("  jal __throw")
+        if self.oob_stubs:
+            self._eh_range(None)
+        self.oob_stubs = []
 
     def _emit_epilogue(self, lsize: int):
         self._w(f"  lw $fp, {lsize}($sp)")
@@ -185,6 +289,9 @@ class MIPSNaive:
             return
 
         if isinstance(ins, CJump):
+            m = imm_compare(ins.op, ins.a, ins.b) if self.imm_select else None
+            if m is not None and self._emit_cjump_imm(frame, m, ins.if_true, ins.if_false):
+                return
             self._load_reg(frame, "$t0", ins.a)
             if isinstance(ins.b, ConstInt):
                 self._w(f"  li $t1, {ins.b.value}")
@@ -218,13 +325,30 @@ class MIPSNaive:
                 self._w(f"  j {ins.if_false}"); self._w("  nop"); return
             raise RuntimeError(f"CJump op desconocido: {op}")
 
+        if isinstance(ins, SwitchJump):
+            self._emit_switch(frame, ins)
+            return
+
         if isinstance(ins, Move):
             self._load_reg(frame, "$t0", ins.src)
             self._store_from_reg(frame, ins.dst, "$t0")
             return
 
         if isinstance(ins, BinOp):
-            # Caso general (sin micro‑opts: el IR ya viene optimizado)
+            # '*', '/', '%' con constante: shifts/sumas o número mágico
+            plan, x = strength_plan(ins)
+            if plan is not None:
+                self._load_reg(frame, "$t0", x)
+                self._emit_plan(plan)
+                self._store_from_reg(frame, ins.dst, "$t2")
+                return
+            m = imm_binop(ins) if self.imm_select else None
+            if m is not None and m[0] == "add" and fits_s16(m[2]):
+                self._load_reg(frame, "$t0", m[1])
+                self._w(f"  addiu $t0, $t0, {m[2]}")
+                self._store_from_reg(frame, ins.dst, "$t0")
+                return
+            # Caso general
             self._load_reg(frame, "$t0", ins.a)
             self._load_reg(frame, "$t1", ins.b)
             if ins.op == "+": self._w("  addu $t0, $t0, $t1")
@@ -244,9 +368,13 @@ class MIPSNaive:
             if ins.op == "neg":
                 self._w("  subu $t0, $zero, $t0")
                 self._store_from_reg(frame, ins.dst, "$t0"); return
+            if ins.op == "not" and self.imm_select:
+                self._w("  sltiu $t0, $t0, 1")      # (a == 0)
+                self._store_from_reg(frame, ins.dst, "$t0"); return
             if ins.op == "not":
-                Lt = f"u_not_true_{id(ins)}"
-                Le = f"u_not_end_{id(ins)}"
+                u = self._uid()
+                Lt = f"u_not_true_{u}"
+                Le = f"u_not_end_{u}"
                 self._w(f"  beq $t0, $zero, {Lt}")
                 self._w("  li $t0, 0")
                 self._w(f"  j {Le}"); self._w("  nop")
@@ -256,6 +384,9 @@ class MIPSNaive:
             raise RuntimeError(f"Unary op no soportado: {ins.op}")
 
         if isinstance(ins, Cmp):
+            m = imm_compare(ins.op, ins.a, ins.b) if self.imm_select else None
+            if m is not None and self._emit_cmp_imm(frame, m, ins.dst):
+                return
             self._load_reg(frame, "$t0", ins.a)
             if isinstance(ins.b, ConstInt):
                 self._w(f"  li $t1, {ins.b.value}")
@@ -264,8 +395,9 @@ class MIPSNaive:
             else:
                 self._w(f"  lw $t1, {self._addr(frame, ins.b)}")
 
-            L_true = f"cmp_true_{id(ins)}"
-            L_end  = f"cmp_end_{id(ins)}"
+            u = self._uid()
+            L_true = f"cmp_true_{u}"
+            L_end  = f"cmp_end_{u}"
             if ins.op == "==":
                 self._w(f"  beq $t0, $t1, {L_true}")
             elif ins.op == "!=":
@@ -308,24 +440,28 @@ class MIPSNaive:
             self._w(f"  sw $t1, {ins.offset}($t0)")
             return
 
-        if isinstance(ins, LoadI):
+        if isinstance(ins, (LoadI, LoadIK)):
+            disp = ins.disp * 4 if isinstance(ins, LoadIK) else 0
             self._load_reg(frame, "$t0", ins.base)      # base
+            self._w("  lw $t0, 8($t0)")                 # datos
             if isinstance(ins.index, ConstInt):
-                byte_off = 4 + ins.index.value * 4
+                byte_off = ins.index.value * 4
                 self._w(f"  lw $t1, {byte_off}($t0)")
                 self._store_from_reg(frame, ins.dst, "$t1")
             else:
                 self._load_reg(frame, "$t1", ins.index) # idx
                 self._w("  sll $t1, $t1, 2")            # idx*4
-                self._w("  addu $t1, $t1, $t0")         # base + idx*4
-                self._w("  lw $t2, 4($t1)")             # *(base + 4 + idx*4)
+                self._w("  addu $t1, $t1, $t0")         # datos + idx*4
+                self._w(f"  lw $t2, {disp}($t1)")
                 self._store_from_reg(frame, ins.dst, "$t2")
             return
 
-        if isinstance(ins, StoreI):
+        if isinstance(ins, (StoreI, StoreIK)):
+            disp = ins.disp * 4 if isinstance(ins, StoreIK) else 0
             self._load_reg(frame, "$t0", ins.base)
+            self._w("  lw $t0, 8($t0)")                 # datos
             if isinstance(ins.index, ConstInt):
-                byte_off = 4 + ins.index.value * 4
+                byte_off = ins.index.value * 4
                 if isinstance(ins.src, ConstInt):
                     self._w(f"  li $t1, {ins.src.value}")
                 elif isinstance(ins.src, ConstStr):
@@ -336,96 +472,30 @@ class MIPSNaive:
             else:
                 self._load_reg(frame, "$t1", ins.index)
                 self._w("  sll $t1, $t1, 2")
-                self._w("  addu $t1, $t1, $t0")   # $t1 = base + idx*4
+                self._w("  addu $t1, $t1, $t0")   # $t1 = datos + idx*4
                 if isinstance(ins.src, ConstInt):
                     self._w(f"  li $t2, {ins.src.value}")
                 elif isinstance(ins.src, ConstStr):
                     self._w(f"  la $t2, {ins.src.label}")
                 else:
                     self._w(f"  lw $t2, {self._addr(frame, ins.src)}")
-                self._w("  sw $t2, 4($t1)")
+                self._w(f"  sw $t2, {disp}($t1)")
             return
 
         if isinstance(ins, Call):
             # --- Intrínseco: toString(int) -> string ---
             if ins.func == "toString":
-                # Cargar arg en $t0
+                # itoa del runtime: $a0 = entero -> $v0 = string
                 arg = ins.args[0] if len(ins.args) >= 1 else None
                 if arg is not None:
-                    self._load_reg(frame, "$t0", arg)
+                    self._load_reg(frame, "$a0", arg)
                 else:
-                    self._w("  move $t0, $zero")
-
-                # Reservar 12 bytes: signo + 10 dígitos + NUL
-                self._w("  li $a0, 12")
-                self._w("  li $v0, 9")  # sbrk
-                self._w("  syscall")
-                self._w("  move $t3, $v0    # buf base")
-
-                # $t2 apunta al final y escribimos NUL
-                self._w("  addiu $t2, $t3, 12")
-                self._w("  addiu $t2, $t2, -1")
-                self._w("  sb $zero, 0($t2)")
-
-                Lzero = f"itoa_zero_{id(ins)}"
-                Lneg  = f"itoa_neg_{id(ins)}"
-                Lloop = f"itoa_loop_{id(ins)}"
-                Ldone = f"itoa_done_{id(ins)}"
-                Lpos  = f"itoa_pos_{id(ins)}"
-                Lend  = f"itoa_end_{id(ins)}"
-
-                # x == 0 ? -> "0"
-                self._w(f"  beq $t0, $zero, {Lzero}")
-
-                # signflag en $t6 (1 si negativo)
-                self._w("  slt $t6, $t0, $zero")      # $t6 = 1 si $t0 < 0
-                self._w(f"  bne $t6, $zero, {Lneg}")
-                # positivo
-                self._w("  move $t5, $t0")            # $t5 = valor positivo
-                self._w(f"  j {Lpos}"); self._w("  nop")
-
-                # negativo: $t5 = -$t0
-                self._w(f"{Lneg}:")
-                self._w("  subu $t5, $zero, $t0")
-
-                # conversión (común) - escribir dígitos de derecha a izquierda
-                self._w(f"{Lpos}:")
-                self._w("  li $t4, 10")
-                self._w(f"{Lloop}:")
-                self._w("  div $t5, $t4")
-                self._w("  mfhi $t7          # rem = $t5 % 10")
-                self._w("  mflo $t5          # $t5 = $t5 / 10")
-                self._w("  addiu $t7, $t7, 48 # '0' + rem")
-                self._w("  addiu $t2, $t2, -1")
-                self._w("  sb $t7, 0($t2)")
-                self._w(f"  bne $t5, $zero, {Lloop}")
-
-                # si era negativo, prepende '-'
-                self._w(f"  beq $t6, $zero, {Ldone}")
-                self._w("  addiu $t2, $t2, -1")
-                self._w("  li $t7, 45        # '-'")
-                self._w("  sb $t7, 0($t2)")
-
-                # listo: retorno en $v0
-                self._w(f"{Ldone}:")
-                self._w("  move $v0, $t2")
-                self._w(f"  j {Lend}")
-                self._w("  nop")
-
-                # caso x == 0 -> "0"
-                self._w(f"{Lzero}:")
-                self._w("  addiu $t2, $t2, -1")
-                self._w("  li $t7, 48")      # '0'
-                self._w("  sb $t7, 0($t2)")
-                self._w("  move $v0, $t2")
-
-                # unir y almacenar el dst si aplica
-                self._w(f"{Lend}:")
+                    self._w("  move $a0, $zero")
+                self._w("  jal __itoa")
                 if ins.dst is not None:
                     self._store_from_reg(frame, ins.dst, "$v0")
                 return
 
-
             # print -> syscalls (int=1 / string=4) + '\n' (11)
             if ins.func == "printInteger":
                 arg = ins.args[0] if len(ins.args) >= 1 else None
@@ -456,9 +526,15 @@ class MIPSNaive:
                 return
 
             # ---- Caso legado: print (imprime y agrega '\n') ----
-            if ins.func == "print":
+            # __print_str: print de un string no literal (IRGen lo distingue)
+            if ins.func in ("print", "__print_str"):
                 arg = ins.args[0] if len(ins.args) == 1 else None
-                if isinstance(arg, ConstStr):
+                if ins.func == "__print_str" and arg is not None:
+                    self._load_reg(frame, "$a0", arg)
+                    self._w("  li $v0, 4"); self._w("  syscall")
+                    self._w("  li $a0, 10")  # '\n'
+                    self._w("  li $v0, 11"); self._w("  syscall")
+                elif isinstance(arg, ConstStr):
                     self._w(f"  la $a0, {arg.label}")
                     self._w("  li $v0, 4"); self._w("  syscall")
                     self._w("  li $a0, 10")  # '\n'
@@ -476,17 +552,55 @@ class MIPSNaive:
                     self._store_from_reg(frame, ins.dst, "$v0")
                 return
 
-            # malloc -> syscall 9 (sbrk)
-            if ins.func == "malloc":
+            # malloc / free -> allocator del runtime (argumento en $a0)
+            if ins.func in ("malloc", "free", "__str_free"):
                 if len(ins.args) != 1:
                     self._emit_generic_call(frame, ins); return
                 self._load_reg(frame, "$a0", ins.args[0])
-                self._w("  li $v0, 9")
-                self._w("  syscall")
+                if ins.func == "malloc":
+                    self._w("  jal __alloc")
+                else:
+                    if ins.func == "__str_free":
+                        self._w("  addiu $a0, $a0, -4   # bloque = cabecera de longitud")
+                    self._w("  jal __free")
+                    self._w("  move $v0, $zero")
+                if ins.dst is not None:
+                    self._store_from_reg(frame, ins.dst, "$v0")
+                return
+
+            # __new(size, id): objeto del allocator con su vtable en 0($v0)
+            if ins.func == "__new":
+                size, cid = ins.args
+                self._load_reg(frame, "$a0", size)
+                self._w("  jal __alloc")
+                self._w(f"  la $t0, {vtable_label(self.vtable_classes[cid.value])}")
+                self._w("  sw $t0, 0($v0)")
                 if ins.dst is not None:
                     self._store_from_reg(frame, ins.dst, "$v0")
                 return
 
+            # __vcall(slot, recv, args...): args en pila como una llamada
+            # normal; el destino sale de la vtable del receptor (0($sp))
+            if ins.func == "__vcall":
+                slot, args = ins.args[0], ins.args[1:]
+                self._emit_generic_call(frame, Call(ins.dst, "", args),
+                                        target=("0($sp)", slot.value * 4))
+                return
+
+            # __push(arr, v): $a0/$a1 -> $v0 = longitud nueva
+            if ins.func == "__push":
+                self._load_reg(frame, "$a0", ins.args[0])
+                self._load_reg(frame, "$a1", ins.args[1])
+                self._w("  jal __push")
+                if ins.dst is not None:
+                    self._store_from_reg(frame, ins.dst, "$v0")
+                return
+
+            # __concat(s1, ..., sn): args en pila como siempre y n en $a0
+            if ins.func == "__concat":
+                self._emit_generic_call(frame, ins, argc_in_a0=True)
+                return
+
             # llamada genérica: push args, jal, caller limpia
             self._emit_generic_call(frame, ins)
             return
@@ -497,23 +611,336 @@ class MIPSNaive:
             self._emit_epilogue(lsize)
             return
 
+        if isinstance(ins, CheckIndex):
+            # sin signo: un índice negativo también queda fuera
+            lab = f"oob_{self._uid()}"
+            self.oob_stubs.append((lab, ins.msg.label, self._eh_open))
+            self._load_reg(frame, "$t0", ins.base)
+            self._load_reg(frame, "$t1", ins.index)
+            self._w("  lw $t2, 0($t0)")
+            self._w("  sltu $t2, $t1, $t2")
+            self._w(f"  beq $t2, $zero, {lab}")
+            return
+
+        if isinstance(ins, Throw):
+            self._load_reg(frame, "$a0", ins.value)
+            self._w("  jal __throw")
+            return
+
+        if isinstance(ins, Catch):
+            # __throw deja $fp del frame y el valor en $v0; $sp se repone
+            # (la llamada interrumpida pudo dejar argumentos empujados)
+            self._w(f"  addiu $sp, $fp, -{lsize + 8}")
+            self._store_from_reg(frame, ins.dst, "$v0")
+            return
+
         # fallback
         self._w(f"  # instr desconocida {ins}")
 
-    def _emit_generic_call(self, frame: Frame, ins: Call):
+    def _emit_generic_call(self, frame: Frame, ins: Call, argc_in_a0: bool = False,
+                           target: Optional[Tuple[str, int]] = None):
+        """target=(receptor, offset en la vtable): llamada indirecta."""
         argc = len(ins.args)
         for a in reversed(ins.args):
             self._load_reg(frame, "$t0", a)
             self._w("  addiu $sp, $sp, -4")
             self._w("  sw $t0, 0($sp)")
-        self._w(f"  jal {ins.func}")
+        if argc_in_a0:
+            self._w(f"  li $a0, {argc}")
+        if target is not None:
+            recv, off = target
+            self._w(f"  lw $t0, {recv}")
+            self._w("  lw $t0, 0($t0)       # vtable")
+            self._w(f"  lw $t0, {off}($t0)")
+            self._w("  jalr $t0")
+        else:
+            self._w(f"  jal {ins.func}")
         if argc > 0:
             self._w(f"  addiu $sp, $sp, {argc*4}")
         if ins.dst is not None:
             self._store_from_reg(frame, ins.dst, "$v0")
 
     #  runtime auxiliar 
+    # --- formas inmediatas (isel.py) ---
+    def _emit_cjump_imm(self, frame: Frame, m, if_true: str, if_false: str) -> bool:
+        op, x, k = m
+        if op in ("==", "!=") and k == 0:
+            self._load_reg(frame, "$t0", x)
+            br = "beq" if op == "==" else "bne"
+            self._w(f"  {br} $t0, $zero, {if_true}")
+            self._w(f"  j {if_false}"); self._w("  nop")
+            return True
+        if op in ("<", ">="):
+            kk = k
+        elif op in ("<=", ">"):
+            kk = k + 1          # x <= K  <=>  x < K+1
+        else:
+            return False
+        if not fits_s16(kk):
+            return False
+        self._load_reg(frame, "$t0", x)
+        self._w(f"  slti $t2, $t0, {kk}")
+        br = "bne" if op in ("<", "<=") else "beq"
+        self._w(f"  {br} $t2, $zero, {if_true}")
+        self._w(f"  j {if_false}"); self._w("  nop")
+        return True
+
+    def _emit_cmp_imm(self, frame: Frame, m, dst: Operand) -> bool:
+        op, x, k = m
+        if op in ("==", "!="):
+            if k == 0:
+                pre = None
+            elif fits_u16(k):
+                pre = f"  xori $t0, $t0, {k}"
+            elif fits_s16(-k):
+                pre = f"  addiu $t0, $t0, {-k}"
+            else:
+                return False
+            self._load_reg(frame, "$t0", x)
+            if pre:
+                self._w(pre)                       # $t0 == 0  <=>  x == K
+            if op == "==":
+                self._w("  sltiu $t0, $t0, 1")
+            else:
+                self._w("  sltu $t0, $zero, $t0")
+        else:
+            kk = k if op in ("<", ">=") else k + 1
+            if not fits_s16(kk):
+                return False
+            self._load_reg(frame, "$t0", x)
+            self._w(f"  slti $t0, $t0, {kk}")
+            if op in (">=", ">"):
+                self._w("  xori $t0, $t0, 1")
+        self._store_from_reg(frame, dst, "$t0")
+        return True
+
+    # registros de los planes de strength.py
+    _PLAN_REG = {"x": "$t0", "t": "$t1", "r": "$t2"}
+
+    def _emit_plan(self, plan):
+        R = self._PLAN_REG
+        for st in plan:
+            op, d = st[0], R[st[1]]
+            if op == "li":
+                self._w(f"  li {d}, {st[2]}")
+            elif op == "mov":
+                self._w(f"  move {d}, {R[st[2]]}")
+            elif op in ("sll", "sra", "srl"):
+                self._w(f"  {op} {d}, {R[st[2]]}, {st[3]}")
+            elif op == "add":
+                self._w(f"  addu {d}, {R[st[2]]}, {R[st[3]]}")
+            elif op == "sub":
+                self._w(f"  subu {d}, {R[st[2]]}, {R[st[3]]}")
+            elif op == "and":
+                if 0 <= st[3] <= 0xFFFF:
+                    self._w(f"  andi {d}, {R[st[2]]}, {st[3]}")
+                else:
+                    self._w(f"  li $t9, {st[3]}")
+                    self._w(f"  and {d}, {R[st[2]]}, $t9")
+            elif op == "neg":
+                self._w(f"  subu {d}, $zero, {R[st[2]]}")
+            elif op == "mulhi":
+                self._w(f"  li $t9, {st[3]}")
+                self._w(f"  mult {R[st[2]]}, $t9")
+                self._w(f"  mfhi {d}")
+            elif op == "mul":
+                self._w(f"  li $t9, {st[3]}")
+                self._w(f"  mul {d}, {R[st[2]]}, $t9")
+            else:
+                raise RuntimeError(f"Paso de plan desconocido: {op}")
+
+    def _emit_switch(self, frame: Frame, ins: SwitchJump):
+        n = self._sw_count
+        self._sw_count += 1
+        self._load_reg(frame, "$t0", ins.value)
+        plan = jump_table(ins.cases, ins.default)
+        if plan is not None:
+            lo, slots = plan
+            tab = f"swtab_{n}"
+            if lo != 0:
+                self._w(f"  li $t1, {lo}")
+                self._w("  subu $t0, $t0, $t1")
+            # sin signo: negativos y > span caen al default
+            self._w(f"  sltiu $t1, $t0, {len(slots)}")
+            self._w(f"  beq $t1, $zero, {ins.default}")
+            self._w("  sll $t0, $t0, 2")
+            self._w(f"  la $t1, {tab}")
+            self._w("  addu $t0, $t0, $t1")
+            self._w("  lw $t0, 0($t0)")
+            self._w("  jr $t0")
+            self._w("  nop")
+            self.jump_tables.append((tab, slots))
+            return
+
+        cnt = [0]
+        def new_label() -> str:
+            cnt[0] += 1
+            return f"sw{n}_{cnt[0]}"
+        for st in search_tree(ins.cases, ins.default, new_label):
+            if st[0] == "eq":
+                self._w(f"  li $t1, {st[1]}")
+                self._w(f"  beq $t0, $t1, {st[2]}")
+            elif st[0] == "lt":
+                self._w(f"  li $t1, {st[1]}")
+                self._w("  slt $t2, $t0, $t1")
+                self._w(f"  bne $t2, $zero, {st[2]}")
+            elif st[0] == "goto":
+                self._w(f"  j {st[1]}"); self._w("  nop")
+            else:
+                self._lbl(st[1])
+
+    def _emit_jump_tables(self):
+        if not self.jump_tables:
+            return
+        self._w("")
+        self._w(".data")
+        self._w(".align 2")
+        for tab, slots in self.jump_tables:
+            self._w(f"{tab}: .word {', '.join(slots)}")
+
+    def _eh_range(self, pad: Optional[str]):
+        """Pasa al manejador pad: cierra el rango abierto y abre otro si hay pad."""
+        if pad == self._eh_open:
+            return
+        if self._eh_open is not None:
+            k = len(self.eh_ranges)
+            self._lbl(f"__eh{k}_e")
+            self.eh_ranges.append((f"__eh{k}_b", f"__eh{k}_e", self._eh_open))
+        if pad is not None:
+            self._lbl(f"__eh{len(self.eh_ranges)}_b")
+        self._eh_open = pad
+
+    def _emit_eh_table(self):
+        if not self.uses_eh:
+            return
+        self._w("")
+        self._w(".data")
+        self._w(".align 2")
+        words = [w for r in self.eh_ranges for w in r] + ["0"]
+        self._w(f"__eh_table: .word {', '.join(words)}")
+        msg = list("Excepción no capturada: ".encode("utf-8")) + [0]
+        self._w(f"__eh_uncaught: .byte {', '.join(str(x) for x in msg)}")
+
+    def _emit_runtime_throw(self):
+        """
+        __throw: $a0 = string lanzado; no vuelve. Para cada frame, desde el
+        que lanzó hacia sus llamadores, busca en __eh_table el rango que
+        contiene su 'jal' pendiente ($ra en -4($fp), $fp anterior en -8($fp)).
+        Encontrado: $fp del frame, $v0 = valor y salto al manejador (que
+        repone $sp). Al llegar a $fp = 0 (frame de main): mensaje y exit(1).
+        """
+        back = 8 if self.delay_slots else 4     # $ra -> dirección del jal
+        self._w(".globl __throw")
+        self._lbl("__throw")
+        self._w(f"  addiu $t8, $ra, -{back}")
+        self._w("  move $t9, $fp")
+        self._lbl("L_eh_frame")
+        self._w("  la $v1, __eh_table")
+        self._lbl("L_eh_scan")
+        self._w("  lw $v0, 0($v1)       # inicio (0: fin de la tabla)")
+        self._w("  beq $v0, $zero, L_eh_up")
+        self._w("  sltu $a1, $t8, $v0")
+        self._w("  bne $a1, $zero, L_eh_next")
+        self._w("  lw $a1, 4($v1)")
+        self._w("  sltu $a1, $t8, $a1")
+        self._w("  bne $a1, $zero, L_eh_found")
+        self._lbl("L_eh_next")
+        self._w("  addiu $v1, $v1, 12")
+        self._w("  j L_eh_scan"); self._w("  nop")
+        self._lbl("L_eh_up")
+        self._w("  lw $t8, -4($t9)      # $ra guardado: jal del llamador")
+        self._w(f"  addiu $t8, $t8, -{back}")
+        self._w("  lw $t9, -8($t9)      # $fp del llamador")
+        self._w("  bne $t9, $zero, L_eh_frame")
+        # sin manejador
+        self._w("  move $t8, $a0")
+        self._w("  la $a0, __eh_uncaught")
+        self._w("  li $v0, 4")
+        self._w("  syscall")
+        self._w("  move $a0, $t8")
+        self._w("  li $v0, 4")
+        self._w("  syscall")
+        self._w("  li $a0, 10")
+        self._w("  li $v0, 11")
+        self._w("  syscall")
+        self._w("  li $a0, 1")
+        self._w("  li $v0, 17   # exit2")
+        self._w("  syscall")
+        self._lbl("L_eh_found")
+        self._w("  lw $v1, 8($v1)")
+        self._w("  move $fp, $t9")
+        self._w("  move $v0, $a0")
+        self._w("  jr $v1")
+        self._w("  nop")
+
+    def _emit_runtime_push(self):
+        """
+        __push(arr, v): $a0 = arreglo, $a1 = valor -> $v0 = longitud nueva.
+        Con lugar, sin frame: guarda en datos[longitud]. Lleno: capacidad
+        x2 (4 si era 0), bloque nuevo de __alloc, copia de las palabras y
+        __free del anterior salvo que sean los elementos del literal
+        (arr + ARR_HEADER). Llamada normal: no preserva $t0-$t9.
+        """
+        self._w(".globl __push")
+        self._lbl("__push")
+        self._w("  lw $t0, 0($a0)           # longitud")
+        self._w("  lw $t1, 4($a0)           # capacidad")
+        self._w("  beq $t0, $t1, __push_grow")
+        self._lbl("__push_store")
+        self._w("  lw $t1, 8($a0)           # datos")
+        self._w("  sll $t2, $t0, 2")
+        self._w("  addu $t1, $t1, $t2")
+        self._w("  sw $a1, 0($t1)")
+        self._w("  addiu $v0, $t0, 1")
+        self._w("  sw $v0, 0($a0)")
+        self._w("  jr $ra")
+        self._w("  nop")
+        self._lbl("__push_grow")
+        self._w("  addiu $sp, $sp, -12")
+        self._w("  sw $ra, 8($sp)")
+        self._w("  sw $a0, 4($sp)")
+        self._w("  sw $a1, 0($sp)")
+        self._w("  sll $t1, $t1, 1")
+        self._w("  bne $t1, $zero, __push_cap")
+        self._w("  li $t1, 4")
+        self._lbl("__push_cap")
+        self._w("  sw $t1, 4($a0)           # capacidad nueva")
+        self._w("  sll $a0, $t1, 2")
+        self._w("  jal __alloc")
+        self._w("  lw $a0, 4($sp)")
+        self._w("  lw $t0, 0($a0)")
+        self._w("  lw $t3, 8($a0)           # datos viejos")
+        self._w("  sw $v0, 8($a0)")
+        self._w("  move $t4, $zero")
+        self._w("  sll $t5, $t0, 2")
+        self._lbl("__push_copy")
+        self._w("  beq $t4, $t5, __push_copied")
+        self._w("  addu $t6, $t3, $t4")
+        self._w("  lw $t7, 0($t6)")
+        self._w("  addu $t6, $v0, $t4")
+        self._w("  sw $t7, 0($t6)")
+        self._w("  addiu $t4, $t4, 4")
+        self._w("  j __push_copy"); self._w("  nop")
+        self._lbl("__push_copied")
+        self._w(f"  addiu $t6, $a0, {ARR_HEADER}")
+        self._w("  beq $t3, $t6, __push_kept")
+        self._w("  move $a0, $t3")
+        self._w("  jal __free")
+        self._lbl("__push_kept")
+        self._w("  lw $ra, 8($sp)")
+        self._w("  lw $a0, 4($sp)")
+        self._w("  lw $a1, 0($sp)")
+        self._w("  addiu $sp, $sp, 12")
+        self._w("  lw $t0, 0($a0)")
+        self._w("  j __push_store"); self._w("  nop")
+
     def _emit_runtime_concat(self):
+        """
+        __concat(s1, ..., sn): n en $a0, s_i en (4*i)($fp) (empujados por el llamador).
+        Suma las longitudes de las cabeceras, hace una sola reserva y copia
+        cada operando: por palabras mientras el destino esté alineado (los
+        strings siempre empiezan alineados), el resto byte a byte.
+        """
         self._w(".globl __concat")
         self._lbl("__concat")
         # prólogo
@@ -521,62 +948,55 @@ class MIPSNaive:
         self._w("  sw $ra, 4($sp)")
         self._w("  sw $fp, 0($sp)")
         self._w("  addiu $fp, $sp, 8")
-        # a=0($fp), b=4($fp)
-        self._w("  lw $t0, 0($fp)     # a")
-        self._w("  lw $t1, 4($fp)     # b")
-        # len(a) -> $t2
+        self._w("  sll $t3, $a0, 2      # fin de la lista de args (bytes)")
+        # total de longitudes -> $t2
+        self._w("  move $t1, $zero")
         self._w("  move $t2, $zero")
-        self._lbl("L_len_a")
-        self._w("  addu $t5, $t0, $t2")
-        self._w("  lbu  $t6, 0($t5)")
-        self._w("  beq  $t6, $zero, L_len_a_done")
-        self._w("  addiu $t2, $t2, 1")
-        self._w("  j L_len_a"); self._w("  nop")
-        self._lbl("L_len_a_done")
-        # len(b) -> $t3
-        self._w("  move $t3, $zero")
-        self._lbl("L_len_b")
-        self._w("  addu $t5, $t1, $t3")
-        self._w("  lbu  $t6, 0($t5)")
-        self._w("  beq  $t6, $zero, L_len_b_done")
-        self._w("  addiu $t3, $t3, 1")
-        self._w("  j L_len_b"); self._w("  nop")
-        self._lbl("L_len_b_done")
-        # total = lenA + lenB + 1 ; alloc
-        self._w("  addu $t6, $t2, $t3")
-        self._w("  addiu $a0, $t6, 1")
-        self._w("  li $v0, 9")      # sbrk
-        self._w("  syscall")
-        self._w("  move $t4, $v0")  # dst
-        # copy A
-        self._w("  move $t6, $zero")
-        self._lbl("L_cp_a")
-        self._w("  beq $t6, $t2, L_cp_a_done")
-        self._w("  addu $t5, $t0, $t6")
+        self._lbl("L_cat_len")
+        self._w("  beq $t1, $t3, L_cat_len_done")
+        self._w("  addu $t5, $fp, $t1")
+        self._w("  lw $t5, 0($t5)")
+        self._w("  lw $t5, -4($t5)      # longitud del operando")
+        self._w("  addu $t2, $t2, $t5")
+        self._w("  addiu $t1, $t1, 4")
+        self._w("  j L_cat_len"); self._w("  nop")
+        self._lbl("L_cat_len_done")
+        # una sola reserva: cabecera + bytes + NUL
+        self._w("  addiu $a0, $t2, 5")
+        self._w("  jal __alloc")
+        self._w("  sw $t2, 0($v0)")
+        self._w("  addiu $v0, $v0, 4    # resultado")
+        self._w("  move $t4, $v0        # cursor destino")
+        self._w("  move $t1, $zero")
+        self._lbl("L_cat_arg")
+        self._w("  beq $t1, $t3, L_cat_done")
+        self._w("  addu $t5, $fp, $t1")
+        self._w("  lw $t5, 0($t5)       # origen")
+        self._w("  lw $t6, -4($t5)      # bytes restantes")
+        self._w("  andi $t7, $t4, 3")
+        self._w("  bne $t7, $zero, L_cat_bytes")
+        self._lbl("L_cat_words")
+        self._w("  slti $t7, $t6, 4")
+        self._w("  bne $t7, $zero, L_cat_bytes")
+        self._w("  lw $t7, 0($t5)")
+        self._w("  sw $t7, 0($t4)")
+        self._w("  addiu $t5, $t5, 4")
+        self._w("  addiu $t4, $t4, 4")
+        self._w("  addiu $t6, $t6, -4")
+        self._w("  j L_cat_words"); self._w("  nop")
+        self._lbl("L_cat_bytes")
+        self._w("  beq $t6, $zero, L_cat_next")
         self._w("  lbu $t7, 0($t5)")
-        self._w("  addu $t5, $t4, $t6")
-        self._w("  sb  $t7, 0($t5)")
-        self._w("  addiu $t6, $t6, 1")
-        self._w("  j L_cp_a"); self._w("  nop")
-        self._lbl("L_cp_a_done")
-        # copy B
-        self._w("  move $t6, $zero")
-        self._lbl("L_cp_b")
-        self._w("  beq $t6, $t3, L_cp_b_done")
-        self._w("  addu $t5, $t1, $t6")
-        self._w("  lbu $t7, 0($t5)")
-        self._w("  addu $t5, $t4, $t2")
-        self._w("  addu $t5, $t5, $t6")
-        self._w("  sb  $t7, 0($t5)")
-        self._w("  addiu $t6, $t6, 1")
-        self._w("  j L_cp_b"); self._w("  nop")
-        self._lbl("L_cp_b_done")
-        # NUL final
-        self._w("  addu $t5, $t4, $t2")
-        self._w("  addu $t5, $t5, $t3")
-        self._w("  sb  $zero, 0($t5)")
-        # return dst
-        self._w("  move $v0, $t4")
+        self._w("  sb $t7, 0($t4)")
+        self._w("  addiu $t5, $t5, 1")
+        self._w("  addiu $t4, $t4, 1")
+        self._w("  addiu $t6, $t6, -1")
+        self._w("  j L_cat_bytes"); self._w("  nop")
+        self._lbl("L_cat_next")
+        self._w("  addiu $t1, $t1, 4")
+        self._w("  j L_cat_arg"); self._w("  nop")
+        self._lbl("L_cat_done")
+        self._w("  sb $zero, 0($t4)     # NUL final")
         # epílogo
         self._w("  lw $fp, 0($sp)")
         self._w("  lw $ra, 4($sp)")
@@ -584,6 +1004,166 @@ class MIPSNaive:
         self._w("  jr $ra")
         self._w("  nop")
 
+    def _emit_runtime_itoa(self):
+        """
+        __itoa: $a0 = entero -> $v0 = string con cabecera de longitud (16 bytes
+        de __alloc). Dígitos de derecha a izquierda al final del bloque y luego
+        copiados tras la cabecera. divu sobre |x| cubre también -2^31.
+        Sólo toca $v0-$v1, $a0-$a3, $t8, $t9, hi/lo (asm.MIPS_RUNTIME_REGS).
+        """
+        self._w(".globl __itoa")
+        self._lbl("__itoa")
+        self._w("  addiu $sp, $sp, -8")
+        self._w("  sw $ra, 4($sp)")
+        self._w("  sw $a0, 0($sp)")
+        self._w("  li $a0, 16")
+        self._w("  jal __alloc")
+        self._w("  lw $a0, 0($sp)")
+        self._w("  move $a3, $v0          # bloque")
+        self._w("  addiu $a2, $v0, 15     # cursor (el NUL ya está: bloque limpio)")
+        self._w("  slt $a1, $a0, $zero    # negativo?")
+        self._w("  bgez $a0, __itoa_pos")
+        self._w("  subu $a0, $zero, $a0")
+        self._lbl("__itoa_pos")
+        self._w("  li $t9, 10")
+        self._lbl("__itoa_loop")
+        self._w("  divu $a0, $t9")
+        self._w("  mfhi $t8")
+        self._w("  mflo $a0")
+        self._w("  addiu $t8, $t8, 48")
+        self._w("  addiu $a2, $a2, -1")
+        self._w("  sb $t8, 0($a2)")
+        self._w("  bne $a0, $zero, __itoa_loop")
+        self._w("  beq $a1, $zero, __itoa_move")
+        self._w("  li $t8, 45             # '-'")
+        self._w("  addiu $a2, $a2, -1")
+        self._w("  sb $t8, 0($a2)")
+        self._lbl("__itoa_move")
+        self._w("  addiu $t8, $a3, 15")
+        self._w("  subu $t8, $t8, $a2     # longitud")
+        self._w("  sw $t8, 0($a3)")
+        self._w("  addiu $v0, $a3, 4")
+        self._w("  move $t9, $v0")
+        self._lbl("__itoa_mv")
+        self._w("  lbu $t8, 0($a2)")
+        self._w("  sb $t8, 0($t9)")
+        self._w("  addiu $a2, $a2, 1")
+        self._w("  addiu $t9, $t9, 1")
+        self._w("  bne $t8, $zero, __itoa_mv")
+        self._w("  lw $ra, 4($sp)")
+        self._w("  addiu $sp, $sp, 8")
+        self._w("  jr $ra"); self._w("  nop")
+
+    def _emit_runtime_alloc(self):
+        """
+        __alloc: $a0 = bytes -> $v0 = bloque (limpio a cero).
+        __free:  $a0 = bloque (0 se ignora).
+        Sólo tocan $v0, $v1, $a0, $a1, $t8, $t9 (ver asm.MIPS_RUNTIME_REGS),
+        así que los intrínsecos pueden llamarlas con $t0-$t7 vivos.
+        Cada bloque lleva una palabra de cabecera con su tamaño en palabras (c):
+          - c <= ALLOC_CLASSES: free list por clase; si está vacía, se corta
+            del trozo actual (cur/end) y se pide otro trozo a sbrk al agotarse
+          - c mayor: lista única de bloques grandes (first fit) o sbrk directo
+        Las listas se enlazan por la primera palabra de la carga útil.
+        """
+        K, CH = self.ALLOC_CLASSES, self.ALLOC_CHUNK
+        self._w(".globl __alloc")
+        self._lbl("__alloc")
+        self._w("  addiu $a0, $a0, 3")
+        self._w("  srl $a0, $a0, 2          # c = palabras")
+        self._w("  bne $a0, $zero, __alloc_c")
+        self._w("  li $a0, 1")
+        self._lbl("__alloc_c")
+        self._w(f"  sltiu $t8, $a0, {K + 1}")
+        self._w("  beq $t8, $zero, __alloc_big")
+        self._w("  la $t9, __free_lists")
+        self._w("  sll $t8, $a0, 2")
+        self._w("  addu $t9, $t9, $t8")
+        self._w("  lw $v0, 0($t9)")
+        self._w("  beq $v0, $zero, __alloc_bump")
+        self._w("  lw $t8, 0($v0)")
+        self._w("  sw $t8, 0($t9)           # free list = siguiente")
+        self._w("  move $v1, $a0")
+        self._w("  j __alloc_zero"); self._w("  nop")
+        self._lbl("__alloc_bump")
+        self._w("  la $t9, __heap_state")
+        self._w("  lw $v0, 0($t9)           # cur")
+        self._w("  lw $v1, 4($t9)           # end")
+        self._w("  sll $t8, $a0, 2")
+        self._w("  addiu $t8, $t8, 4        # cabecera + carga")
+        self._w("  addu $a1, $v0, $t8")
+        self._w("  sltu $t8, $v1, $a1")
+        self._w("  bne $t8, $zero, __alloc_refill")
+        self._w("  sw $a1, 0($t9)")
+        self._w("  sw $a0, 0($v0)")
+        self._w("  addiu $v0, $v0, 4")
+        self._w("  jr $ra"); self._w("  nop")
+        self._lbl("__alloc_refill")
+        self._w("  move $t8, $a0")
+        self._w(f"  li $a0, {CH}")
+        self._w("  li $v0, 9                # sbrk de un trozo")
+        self._w("  syscall")
+        self._w(f"  addiu $a1, $v0, {CH}")
+        self._w("  sw $a1, 4($t9)")
+        self._w("  beq $v0, $v1, __alloc_grow   # contiguo: se extiende el trozo")
+        self._w("  sw $v0, 0($t9)           # si no, el resto del anterior se abandona")
+        self._lbl("__alloc_grow")
+        self._w("  move $a0, $t8")
+        self._w("  j __alloc_bump"); self._w("  nop")
+        self._lbl("__alloc_big")
+        self._w("  la $t9, __heap_state")
+        self._w("  addiu $t9, $t9, 8        # &lista de grandes")
+        self._lbl("__alloc_big_loop")
+        self._w("  lw $v0, 0($t9)")
+        self._w("  beq $v0, $zero, __alloc_big_new")
+        self._w("  lw $t8, -4($v0)")
+        self._w("  sltu $t8, $t8, $a0")
+        self._w("  beq $t8, $zero, __alloc_big_hit")
+        self._w("  move $t9, $v0")
+        self._w("  j __alloc_big_loop"); self._w("  nop")
+        self._lbl("__alloc_big_hit")
+        self._w("  lw $t8, 0($v0)")
+        self._w("  sw $t8, 0($t9)")
+        self._w("  move $v1, $a0")
+        self._w("  j __alloc_zero"); self._w("  nop")
+        self._lbl("__alloc_big_new")
+        self._w("  move $t8, $a0")
+        self._w("  sll $a0, $a0, 2")
+        self._w("  addiu $a0, $a0, 4")
+        self._w("  li $v0, 9")
+        self._w("  syscall")
+        self._w("  sw $t8, 0($v0)")
+        self._w("  addiu $v0, $v0, 4")
+        self._w("  jr $ra"); self._w("  nop")
+        self._lbl("__alloc_zero")         # limpia $v1 palabras desde $v0
+        self._w("  move $t8, $v0")
+        self._lbl("__alloc_zero_loop")
+        self._w("  sw $zero, 0($t8)")
+        self._w("  addiu $v1, $v1, -1")
+        self._w("  addiu $t8, $t8, 4")
+        self._w("  bne $v1, $zero, __alloc_zero_loop")
+        self._w("  jr $ra"); self._w("  nop")
+
+        self._w(".globl __free")
+        self._lbl("__free")
+        self._w("  beq $a0, $zero, __free_done")
+        self._w("  lw $t8, -4($a0)")
+        self._w(f"  sltiu $t9, $t8, {K + 1}")
+        self._w("  beq $t9, $zero, __free_big")
+        self._w("  la $t9, __free_lists")
+        self._w("  sll $t8, $t8, 2")
+        self._w("  addu $t9, $t9, $t8")
+        self._w("  j __free_push"); self._w("  nop")
+        self._lbl("__free_big")
+        self._w("  la $t9, __heap_state")
+        self._w("  addiu $t9, $t9, 8")
+        self._lbl("__free_push")
+        self._w("  lw $t8, 0($t9)")
+        self._w("  sw $t8, 0($a0)")
+        self._w("  sw $a0, 0($t9)")
+        self._lbl("__free_done")
+        self._w("  jr $ra"); self._w("  nop")
+
     def _emit_main_wrapper(self, entry: str):
         # Pequeño 'main' para contentar a QtSPIM/MARS
         self._w(".globl main")
@@ -593,7 +1173,13 @@ class MIPSNaive:
         self._w("  li $v0, 10   # exit")
         self._w("  syscall")
 
-    def _normalize_string_bytes(self, b: List[int]) -> List[int]:
+    @staticmethod
+    def _string_length(b: List[int]) -> int:
+        """Longitud de la cabecera: bytes normalizados sin el NUL final."""
+        return len(b) - 1 if b and b[-1] == 0 else len(b)
+
+    @staticmethod
+    def _normalize_string_bytes(b: List[int]) -> List[int]:
         """
         Convierte secuencias de escape estilo '\\n' en su byte real (LF=10),
         para que syscall 4 imprima saltos de línea reales.
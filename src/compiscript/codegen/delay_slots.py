@@ -0,0 +1,198 @@
+# src/compiscript/codegen/delay_slots.py
+from __future__ import annotations
+from copy import copy
+from typing import Dict, List, Optional, Set, Tuple
+
+from compiscript.codegen.asm import (
+    AsmLine, parse_mips, render_mips, mk_ins, mk_label,
+    mips_defs_uses, mips_single_word, mips_branch_target,
+    MIPS_BRANCHES, MIPS_JUMPS, MIPS_INVERT, _LOADS, _STORES,
+)
+
+# Cuántas instrucciones hacia arriba buscamos un candidato para el slot
+_WINDOW = 6
+
+
+def _is_cti(it: AsmLine) -> bool:
+    """Control transfer instruction (tiene delay slot)."""
+    return it.kind == "ins" and (it.op in MIPS_BRANCHES or it.op in MIPS_JUMPS)
+
+
+def _label_run(items: List[AsmLine], i: int) -> Set[str]:
+    """Nombres de las etiquetas consecutivas a partir de items[i]."""
+    names: Set[str] = set()
+    while i < len(items) and items[i].kind == "label":
+        names.add(items[i].op)
+        i += 1
+    return names
+
+
+def _simplify_jumps(items: List[AsmLine], stats: Dict[str, int]) -> List[AsmLine]:
+    """
+    Con semántica secuencial (sin nops):
+      b<c> L1 ; j L2 ; L1:   ->  b<!c> L2 ; L1:
+      j L ; L:               ->  L:
+      b<c> L ; L:            ->  L:
+    """
+    out: List[AsmLine] = []
+    i = 0
+    n = len(items)
+    while i < n:
+        it = items[i]
+        if it.kind == "ins" and it.op in MIPS_INVERT and i + 1 < n and items[i + 1].is_ins("j"):
+            jmp = items[i + 1]
+            if mips_branch_target(it) in _label_run(items, i + 2):
+                inv = copy(it)
+                inv.args = list(it.args)
+                inv.op = MIPS_INVERT[it.op]
+                inv.args[-1] = jmp.args[0]
+                out.append(inv.touch())
+                stats["branches_inverted"] += 1
+                stats["jumps_removed"] += 1
+                i += 2
+                continue
+        if it.kind == "ins" and (it.op in ("j", "b") or it.op in MIPS_INVERT):
+            if mips_branch_target(it) in _label_run(items, i + 1):
+                stats["jumps_removed"] += 1
+                i += 1
+                continue
+        out.append(it)
+        i += 1
+    return out
+
+
+def _movable(it: AsmLine) -> bool:
+    return (it.kind == "ins"
+            and not _is_cti(it)
+            and it.op not in ("syscall", "nop")
+            and mips_single_word(it))
+
+
+def _touches_mem(it: AsmLine) -> Tuple[bool, bool]:
+    """(lee memoria, escribe memoria)"""
+    return it.op in _LOADS, it.op in _STORES
+
+
+def _independent(x: AsmLine, y: AsmLine) -> bool:
+    """¿Se pueden intercambiar x e y sin cambiar la semántica?"""
+    dx, ux = mips_defs_uses(x)
+    dy, uy = mips_defs_uses(y)
+    if dx & uy or dy & ux or dx & dy:
+        return False
+    rx, wx = _touches_mem(x)
+    ry, wy = _touches_mem(y)
+    if (wx and (ry or wy)) or (wy and rx):
+        return False
+    return True
+
+
+def _pick_above(out: List[AsmLine], cti: AsmLine, slot_ids: Set[int]) -> Optional[int]:
+    """Índice en 'out' de una instrucción del mismo bloque que puede pasar al slot."""
+    k = len(out) - 1
+    seen: List[AsmLine] = []
+    while k >= 0 and len(seen) < _WINDOW:
+        x = out[k]
+        if x.kind != "ins" or _is_cti(x) or x.op == "syscall" or id(x) in slot_ids:
+            return None  # inicio de bloque
+        if _movable(x) and _independent(x, cti) and all(_independent(x, y) for y in seen):
+            return k
+        seen.append(x)
+        k -= 1
+    return None
+
+
+def pad_delay_slots(lines: List[str]) -> Tuple[List[str], Dict[str, int]]:
+    """
+    Línea base de fill_delay_slots: el mismo código para *delayed branches*
+    pero sin reprogramar, con un 'nop' en el slot de cada salto/branch.
+    """
+    items = parse_mips(lines)
+    stats = {"nops_in": sum(1 for it in items if it.is_ins("nop")), "nops_out": 0}
+    out: List[AsmLine] = []
+    for it in items:
+        if it.is_ins("nop"):
+            continue
+        out.append(it)
+        if _is_cti(it):
+            out.append(mk_ins("nop"))
+            stats["nops_out"] += 1
+    return render_mips(out), stats
+
+
+def fill_delay_slots(lines: List[str]) -> Tuple[List[str], Dict[str, int]]:
+    """
+    Convierte ASM MIPS escrito con semántica secuencial (los 'nop' tras saltos
+    son relleno inútil) a código válido con *delayed branches*:
+      1) elimina nops y saltos redundantes, invierte b<c>+j hacia la etiqueta siguiente;
+      2) cada salto/branch recibe un delay slot: primero se intenta subir una
+         instrucción independiente del mismo bloque, si no, para 'j L' se copia
+         la primera instrucción de L y se salta a la siguiente; si nada aplica, 'nop'.
+    Devuelve (líneas, estadísticas).
+    """
+    stats = {"nops_in": 0, "nops_out": 0, "jumps_removed": 0, "branches_inverted": 0,
+             "filled_above": 0, "filled_target": 0}
+    items = parse_mips(lines)
+    stats["nops_in"] = sum(1 for it in items if it.is_ins("nop"))
+    items = [it for it in items if not it.is_ins("nop")]
+    items = _simplify_jumps(items, stats)
+
+    # --- 1) relleno desde arriba ---
+    out: List[AsmLine] = []
+    slot_ids: Set[int] = set()
+    for it in items:
+        if not _is_cti(it):
+            out.append(it)
+            continue
+        k = _pick_above(out, it, slot_ids)
+        if k is not None:
+            x = out.pop(k)
+            stats["filled_above"] += 1
+        else:
+            x = mk_ins("nop")
+        out.append(it)
+        out.append(x)
+        slot_ids.add(id(x))
+
+    # --- 2) 'j L' con nop: copiar la primera instrucción del destino ---
+    label_pos: Dict[str, int] = {}
+    for idx, it in enumerate(out):
+        if it.kind == "label":
+            label_pos[it.op] = idx
+
+    new_labels: Dict[str, str] = {}      # L -> etiqueta tras su 1ª instrucción
+    insert_after: Dict[int, str] = {}    # idx de la instrucción -> etiqueta nueva
+    for idx, it in enumerate(out):
+        if not it.is_ins("j") or idx + 1 >= len(out) or not out[idx + 1].is_ins("nop"):
+            continue
+        tgt = it.args[0]
+        p = label_pos.get(tgt)
+        if p is None:
+            continue
+        q = p
+        while q < len(out) and out[q].kind == "label":
+            q += 1
+        if q >= len(out):
+            continue
+        t = out[q]
+        if not _movable(t) or id(t) in slot_ids:
+            continue
+        lab = new_labels.get(tgt)
+        if lab is None:
+            lab = f"{tgt}_ds"
+            while lab in label_pos:
+                lab += "_"
+            new_labels[tgt] = lab
+            insert_after[q] = lab
+        it.args = [lab]
+        it.touch()
+        out[idx + 1] = copy(t)
+        stats["filled_target"] += 1
+
+    final: List[AsmLine] = []
+    for idx, it in enumerate(out):
+        final.append(it)
+        if idx in insert_after:
+            final.append(mk_label(insert_after[idx]))
+
+    stats["nops_out"] = sum(1 for it in final if it.is_ins("nop"))
+    return render_mips(final), stats
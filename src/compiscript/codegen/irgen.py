@@ -1,6 +1,9 @@
 from __future__ import annotations
-from typing import Dict, List, Optional, Tuple
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple, Union
 
+from antlr.sema.ast import Node
+from antlr.sema.types import is_bool, is_class, is_int, is_string, is_unknown
 from compiscript.codegen.temp_pool import TempPool
 from compiscript.codegen.frame import Frame
 from compiscript.ir.tac import (
@@ -8,7 +11,8 @@ from compiscript.ir.tac import (
     Instr, Operand,
     Temp, Local, Param, ConstInt, ConstStr,
     Label, Jump, CJump, Move, BinOp, UnaryOp, Cmp, Call, Return,
-    Load, Store, LoadI, StoreI
+    Load, Store, LoadI, StoreI, CheckIndex, SwitchJump, Throw, Catch, OBJ_HEADER,
+    ARR_HEADER
 )
 
 # Utilidad para nombres de etiquetas
@@ -22,6 +26,22 @@ class LabelGen:
         return s
 
 
+@dataclass
+class _Boxed:
+    """Variable que una función anidada asigna: vive en el registro de
+    entorno 'env' (Local en la función que la declara, Param en las closures)."""
+    env: str
+    offset: int
+
+
+@dataclass
+class _Closure:
+    """Función anidada convertida: nombre IR y parámetros ocultos (capturas
+    por valor con el nombre de la variable y luego punteros a entornos)."""
+    irname: str
+    hidden: List[str]
+
+
 class IRGen:
     """
     Generador de IR desde el AST de tu proyecto.
@@ -31,9 +51,22 @@ class IRGen:
       - If, While, Return, ExprStmt
       - Binary, Unary, Identifier, Literal, Call
       - ClassDecl (métodos y campos), This, MemberAccess (get/set)
-      - Switch/SwitchCase, Foreach (sobre ArrayLiteral), TryCatch (compila solo try)
+      - Switch/SwitchCase, Foreach (sobre cualquier arreglo), TryCatch y throw(msg)
+      - funciones anidadas (closure conversion, ver _compile_function)
+      - push/pop/length sobre arreglos (push crece en el runtime)
+    Con safe=True cada acceso arr[i] va precedido de CheckIndex (lanza
+    INDEX_ERROR fuera de rango); optimize quita las redundantes.
     """
-    def __init__(self):
+    INDEX_ERROR = "Índice fuera de rango"
+    POP_ERROR = "pop de un arreglo vacío"
+    # llamadas que nunca mueven los datos de un arreglo (ver _visit_Foreach)
+    NO_REALLOC = frozenset({
+        "print", "__print_str", "printInteger", "printString", "toString",
+        "__concat", "malloc", "free", "__str_free", "__new",
+    })
+
+    def __init__(self, safe: bool = False):
+        self.safe = safe
         self.prog = IRProgram()
         self.tpool = TempPool()
         self.lgen = LabelGen()
@@ -41,8 +74,18 @@ class IRGen:
         self.current_fn: Optional[IRFunction] = None
         self.frame: Optional[Frame] = None
 
-        # pila de scopes {name: Operand(Local|Param)}
-        self.scopes: List[Dict[str, Operand]] = []
+        # pila de scopes {name: Operand(Local|Param) | _Boxed}
+        self.scopes: List[Dict[str, Union[Operand, _Boxed]]] = []
+        # funciones anidadas visibles {nombre fuente: _Closure}; a diferencia
+        # de scopes, una closure ve las de las funciones que la contienen
+        self.fn_scopes: List[Dict[str, _Closure]] = []
+        # entorno de la función actual (Local) y slots de las variables
+        # encajonadas (id del símbolo del checker -> _Boxed)
+        self.env_local: Optional[str] = None
+        self.env_slots: Dict[int, _Boxed] = {}
+        # manejador que libera el entorno si una excepción sale de la función
+        self.env_pad: Optional[str] = None
+        self.program = None
         # pila de tipos de variables {name: class_name or None}
         self.type_scopes: List[Dict[str, Optional[str]]] = []
 
@@ -57,9 +100,15 @@ class IRGen:
         # pila de break/continue (pares de labels)
         self.break_stack: List[str] = []
         self.cont_stack: List[str] = []
+        # try activos: (función, etiqueta del manejador); cada Label emitada
+        # dentro de un try de la función actual queda en fn.handlers
+        self.eh_stack: List[Tuple[IRFunction, str]] = []
 
         # herencia: clase -> base
         self.class_base: Dict[str, Optional[str]] = {}
+        # clase -> métodos propios en orden de declaración (sin constructor);
+        # se llena antes de generar código para conocer toda la jerarquía
+        self.class_methods: Dict[str, List[str]] = {}
 
         # función sintética para sentencias top-level
         self.toplevel: Optional[IRFunction] = None
@@ -75,23 +124,38 @@ class IRGen:
         self.scopes.append({})
         self.type_scopes.append({})
         self.prim_scopes.append({})
+        self.fn_scopes.append({})
     def _pop_scope(self):
         self.scopes.pop()
         self.type_scopes.pop()
         self.prim_scopes.pop()
+        self.fn_scopes.pop()
     def _bind(self, name: str, op: Operand):
         assert self.scopes, "No hay scope activo"
         self.scopes[-1][name] = op
     def _bind_type(self, name: str, cls: Optional[str]):
         assert self.type_scopes, "No hay scope activo"
         self.type_scopes[-1][name] = cls
-    def _lookup(self, name: str) -> Optional[Operand]:
+    def _lookup(self, name: str) -> Optional[Union[Operand, _Boxed]]:
         for m in reversed(self.scopes):
             if name in m:
                 return m[name]
         if self.current_fn and name in self.current_fn.params:
             return Param(name)
         return None
+    def _read_var(self, name: str) -> Optional[Operand]:
+        """Valor de una variable (las encajonadas se leen del entorno)."""
+        op = self._lookup(name)
+        if isinstance(op, _Boxed):
+            dst = Temp(self.tpool.new())
+            self._emit(Load(dst, self._lookup(op.env), op.offset))
+            return dst
+        return op
+    def _lookup_closure(self, name: str) -> Optional[_Closure]:
+        for m in reversed(self.fn_scopes):
+            if name in m:
+                return m[name]
+        return None
     def _lookup_type(self, name: str) -> Optional[str]:
         for m in reversed(self.type_scopes):
             if name in m:
@@ -130,7 +194,11 @@ class IRGen:
         # scopes frescos para el toplevel (no limpiar los ya existentes si venimos de otro lado)
         self.scopes = []
         self.type_scopes = []
+        self.fn_scopes = []
         self._push_scope()
+        # entorno de las globales que asignan funciones anidadas en bloques
+        stmts = self.program.statements if self.program is not None else []
+        self._open_env(stmts, [])
 
     def _bind_prim(self, name: str, typ: Optional[str]):
         if typ:
@@ -153,9 +221,17 @@ class IRGen:
             c = self.class_base.get(c)
         return None
 
+    def _sem_type(self, e):
+        """Tipo que dejó el Checker en el nodo (None si no se chequeó o es desconocido)."""
+        t = getattr(e, "sem_type", None)
+        return None if t is None or is_unknown(t) else t
+
     def _ast_is_string(self, e) -> bool:
         if e is None:
             return False
+        t = self._sem_type(e)
+        if t is not None:
+            return is_string(t)
         k = e.__class__.__name__
         if k == "Literal":
             return getattr(e, "kind", None) == "string"
@@ -200,6 +276,8 @@ class IRGen:
         Recorre el AST y llena self.prog con funciones y strings.
         Espera que el código defina una función 'main' como punto de entrada.
         """
+        self._collect_classes(ast_root)
+        self.program = ast_root
         self._visit(ast_root)
         if self.prog.entry is None:
             if "main" in self.prog.functions:
@@ -224,7 +302,9 @@ class IRGen:
         while i < len(n.statements):
             s = n.statements[i]
             k = s.__class__.__name__
-            if k in ("FunctionDecl", "ClassDecl"):
+            if k == "FunctionDecl":
+                self._compile_function(s)
+            elif k == "ClassDecl":
                 self._visit(s)
             else:
                 self._ensure_toplevel()
@@ -235,45 +315,176 @@ class IRGen:
             self.toplevel.frame = self.frame
 
     def _visit_FunctionDecl(self, n):
+        # sólo llegan aquí las funciones declaradas dentro de un bloque
+        self._compile_function(n, nested=True)
+
+    def _compile_function(self, n, nested: bool = False):
+        """
+        Función del programa o anidada. Closure conversion de las anidadas
+        (capturas según el checker, n.captures):
+          - nombre IR '<contenedora>__<nombre>' y visible sólo en su bloque
+          - cada captura es un parámetro oculto; las llamadas pasan el valor
+            actual (no hay valores función, así que la closure nunca escapa
+            y no hace falta reservar un registro por closure)
+          - las variables que una anidada asigna viven en un registro de
+            entorno plano de la función que las declara (una reserva por
+            activación, liberada al retornar o cuando una excepción sale de
+            la función); las closures reciben el puntero como parámetro oculto
+        """
         fname = n.name
+        irname = f"{self.current_fn.name}__{fname}" if nested else fname
 
         # Registrar tipo de retorno (para detectar concat de strings en _expr_Binary)
-        ret_ann = (getattr(n, "ret_type", None) or getattr(n, "type_ann", None))
+        ret_ann = (getattr(n, "ret_ann", None) or getattr(n, "ret_type", None)
+                   or getattr(n, "type_ann", None))
         if isinstance(ret_ann, str) and ret_ann.strip() == "string":
             self.func_ret[fname] = "string"
 
+        # capturas resueltas en el contexto de la declaración
+        values: List[Tuple[str, Operand, Optional[str], Optional[str]]] = []
+        envs: List[str] = []
+        boxed: Dict[str, _Boxed] = {}
+        for c in (getattr(n, "captures", []) if nested else []):
+            b = self._lookup(c.name)
+            if b is None or c.name in boxed or any(v[0] == c.name for v in values):
+                continue                    # global fuera de alcance o repetida
+            if isinstance(b, _Boxed):
+                boxed[c.name] = b
+                if b.env not in envs:
+                    envs.append(b.env)
+            elif getattr(c, "boxed", False):
+                raise RuntimeError(f"'{c.name}' se asigna desde la función anidada '{fname}' "
+                                   f"y no es una variable local")
+            else:
+                values.append((c.name, b, self._lookup_type(c.name), self._lookup_prim(c.name)))
+
         ps = (getattr(n, "params", []) or [])
-        params = [p.name for p in ps]
-        fn = IRFunction(name=fname, params=params)
-        self.prog.functions[fname] = fn
-        if fname == "main":
+        params = [p.name for p in ps] + [v[0] for v in values] + envs
+        fn = IRFunction(name=irname, params=params)
+        self.prog.functions[irname] = fn
+        if fname == "main" and not nested:
             self.prog.entry = "main"
+        if nested:
+            # visible desde aquí (también dentro de sí misma: recursión)
+            self.fn_scopes[-1][fname] = _Closure(irname, params[len(ps):])
 
         # guardar contexto actual
         prev_fn, prev_frame, prev_class = self.current_fn, self.frame, self.cur_class
         prev_scopes, prev_types, prev_prims = self.scopes, self.type_scopes, self.prim_scopes
+        prev_fns, prev_env, prev_pad = self.fn_scopes, self.env_local, self.env_pad
 
         # preparar contexto de la función
-        self.current_fn, self.frame = fn, Frame(fname, params)
+        self.current_fn, self.frame = fn, Frame(irname, params)
         self.cur_class = None
         self.scopes, self.type_scopes, self.prim_scopes = [], [], []
+        if not nested:
+            self.fn_scopes = []
         self._push_scope()
+        for name, _, cls, prim in values:
+            self._bind(name, Param(name))
+            self._bind_type(name, cls)
+            self._bind_prim(name, prim)
+        for name, b in boxed.items():
+            self._bind(name, b)
         for p in ps:
             self._bind(p.name, Param(p.name))
             self._bind_type(p.name, None)
             ptyp = (getattr(p, "type_ann", None) or getattr(p, "type", None))
             if isinstance(ptyp, str) and ptyp.strip() == "string":
                 self._bind_prim(p.name, "string")
+        self._open_env(n.body.statements if n.body is not None else [], ps)
 
         # cuerpo
         self._visit(n.body)
+        self._close_env()
+        self._end_env()
 
         # cerrar y restaurar
         self._pop_scope()
         fn.frame = self.frame
         self.current_fn, self.frame, self.cur_class = prev_fn, prev_frame, prev_class
         self.scopes, self.type_scopes, self.prim_scopes = prev_scopes, prev_types, prev_prims
-
+        self.fn_scopes, self.env_local, self.env_pad = prev_fns, prev_env, prev_pad
+
+    @staticmethod
+    def _boxed_decls(stmts) -> list:
+        """Símbolos de las VarDecl encajonadas (sym.boxed) de un cuerpo, sin
+        entrar en funciones ni clases anidadas."""
+        out = []
+
+        def walk(x):
+            if isinstance(x, list):
+                for y in x:
+                    walk(y)
+                return
+            if not isinstance(x, Node):
+                return
+            k = x.__class__.__name__
+            if k in ("FunctionDecl", "ClassDecl"):
+                return
+            sym = getattr(x, "sym", None) if k == "VarDecl" else None
+            if sym is not None and sym.boxed:
+                out.append(sym)
+            for v in vars(x).values():
+                walk(v)
+
+        walk(stmts)
+        return out
+
+    def _open_env(self, stmts, params):
+        """Registro de entorno de la función actual con las variables (y
+        parámetros) que asignan sus funciones anidadas."""
+        self.env_local = None
+        self.env_pad = None
+        psyms = [(p.name, p.sym) for p in params if getattr(getattr(p, "sym", None), "boxed", False)]
+        syms = [s for _, s in psyms] + self._boxed_decls(stmts)
+        if not syms:
+            return
+        env = f"__env_{self.current_fn.name}"
+        self.frame.ensure_local(env)
+        if env not in self.current_fn.locals:
+            self.current_fn.locals.append(env)
+        self._bind(env, Local(env))
+        self.env_local = env
+        self._emit(Call(Local(env), "malloc", [ConstInt(4 * len(syms))]))
+        for i, sym in enumerate(syms):
+            self.env_slots[id(sym)] = _Boxed(env, 4 * i)
+        for name, sym in psyms:
+            b = self.env_slots[id(sym)]
+            self._emit(Store(Local(env), b.offset, Param(name)))
+            self._bind(name, b)
+        if self.current_fn is not self.toplevel:
+            # el resto del cuerpo queda dentro de un try implícito (ver _end_env)
+            self.env_pad = self.lgen.new()
+            self.eh_stack.append((self.current_fn, self.env_pad))
+            self._emit(Label(self.lgen.new()))
+
+    def _close_env(self):
+        """Libera el entorno antes de salir (ninguna closure lo sobrevive)."""
+        body = self.current_fn.body
+        if body and isinstance(body[-1], Return):
+            return                      # ya liberado por ese return
+        if self.env_local is not None and self.current_fn is not self.toplevel:
+            self._emit(Call(None, "free", [Local(self.env_local)]))
+
+    def _end_env(self):
+        """Cierra el cuerpo: una excepción que sale de la función pasa por
+        un manejador que libera el entorno y la vuelve a lanzar.
+          L_pad: exc = catch ; free(env) ; throw exc"""
+        if self.env_pad is None:
+            return
+        self.eh_stack.pop()
+        body = self.current_fn.body
+        if not (body and isinstance(body[-1], Return)):
+            self._emit(Return(None))
+        exc = "__env_exc"
+        self.frame.ensure_local(exc)
+        if exc not in self.current_fn.locals:
+            self.current_fn.locals.append(exc)
+        self._emit(Label(self.env_pad))
+        self._emit(Catch(Local(exc)))
+        self._emit(Call(None, "free", [Local(self.env_local)]))
+        self._emit(Throw(Local(exc)))
 
     def _visit_Block(self, n):
         self._push_scope()
@@ -286,6 +497,15 @@ class IRGen:
     # ---------------- declaraciones ----------------
     def _visit_VarDecl(self, n):
         name = n.name
+        b = self.env_slots.get(id(getattr(n, "sym", None)))
+        if b is not None:
+            self._bind(name, b)
+            self._bind_type(name, None)
+            if getattr(n, "init", None) is not None:
+                val = self._eval_expr(n.init)
+                self._emit(Store(self._lookup(b.env), b.offset, val))
+                self._release_if_temp(val)
+            return
         # reserva slot local
         self.frame.ensure_local(name)
         if name not in self.current_fn.locals:
@@ -326,6 +546,10 @@ class IRGen:
 
     # ---------------- statements ----------------
     def _visit_ExprStmt(self, n):
+        # 'a[i] = v;' llega como expresión de asignación
+        if n.expr.__class__.__name__ == "Assign":
+            self._visit_Assign(n.expr)
+            return
         self._eval_expr(n.expr)
 
     def _visit_Assign(self, n):
@@ -335,6 +559,11 @@ class IRGen:
             op = self._lookup(tgt.name)
             if op is None:
                 raise RuntimeError(f"Variable no encontrada: {tgt.name}")
+            if isinstance(op, _Boxed):
+                val = self._eval_expr(n.value)
+                self._emit(Store(self._lookup(op.env), op.offset, val))
+                self._release_if_temp(val)
+                return
             # rastreo de tipo por asignación con constructor
             ctor_class: Optional[str] = None
             if n.value.__class__.__name__ == "Call":
@@ -359,6 +588,7 @@ class IRGen:
             base = self._eval_expr(tgt.obj)
             idx  = self._eval_expr(tgt.index)
             src  = self._eval_expr(n.value)
+            self._check_index(base, idx)
             self._emit(StoreI(base, idx, src))
             # reciclar
             self._release_if_temp(base); self._release_if_temp(idx); self._release_if_temp(src)
@@ -369,9 +599,11 @@ class IRGen:
 
     def _visit_Return(self, n):
         if getattr(n, "value", None) is None:
+            self._close_env()
             self._emit(Return(None))
         else:
             v = self._eval_expr(n.value)
+            self._close_env()
             self._emit(Return(v))
 
     def _visit_If(self, n):
@@ -418,6 +650,17 @@ class IRGen:
         self._emit(Label(L_end))
 
 
+    def _case_const(self, e) -> Optional[int]:
+        """Valor entero de una etiqueta 'case' constante (o None)."""
+        k = e.__class__.__name__
+        if k == "Literal" and e.kind in ("int", "boolean"):
+            v = self._expr_Literal(e)
+            return v.value
+        if k == "Unary" and e.op == "-":
+            v = self._case_const(e.expr)
+            return -v if v is not None else None
+        return None
+
     def _visit_Switch(self, n):
         disc = self._eval_expr(n.expr)
         cases = getattr(n, "cases", []) or []
@@ -426,14 +669,24 @@ class IRGen:
         labels = [self.lgen.new() for _ in cases]
         L_default = self.lgen.new() if has_default else L_end
 
-        # cadena de comparaciones
-        next_label = L_default
-        for i, c in enumerate(cases):
-            L_case = labels[i]
-            L_next = labels[i+1] if i+1 < len(cases) else L_default
-            cv = self._eval_expr(c.expr)
-            self._emit(CJump("==", disc, cv, L_case, L_next))
-            self._release_if_temp(cv)
+        consts = [self._case_const(c.expr) for c in cases]
+        if cases and all(v is not None for v in consts):
+            # casos constantes: salto indexado (tabla o árbol en el backend);
+            # un valor repetido despacha al primer caso, como la cadena.
+            table: Dict[int, str] = {}
+            for v, L_case in zip(consts, labels):
+                table.setdefault(v, L_case)
+            self._emit(SwitchJump(disc, sorted(table.items()), L_default))
+        else:
+            # cadena de comparaciones: case_i falla -> prueba case_{i+1}
+            for i, c in enumerate(cases):
+                L_case = labels[i]
+                L_next = self.lgen.new() if i+1 < len(cases) else L_default
+                cv = self._eval_expr(c.expr)
+                self._emit(CJump("==", disc, cv, L_case, L_next))
+                self._release_if_temp(cv)
+                if i+1 < len(cases):
+                    self._emit(Label(L_next))
 
         # compilar casos (fallthrough por omisión)
         self._loop_push(None, L_end)  # sólo break válido
@@ -451,7 +704,8 @@ class IRGen:
 
 
     def _visit_Foreach(self, n):
-        # variable del foreach
+        # recorre los elementos que el arreglo tiene al entrar (longitud
+        # fija) con un puntero:  p = datos; end = p + len*4; x = *p; p += 4
         var_name = n.var_name
         self._push_scope()
         self.frame.ensure_local(var_name)
@@ -461,40 +715,56 @@ class IRGen:
         self._bind(var_name, loc_var)
         self._bind_type(var_name, None)
 
-        arr = self._eval_expr(n.iterable)           # puntero al arreglo
+        arr = self._eval_expr(n.iterable)           # cualquier expresión arreglo
+        if not isinstance(arr, Temp):
+            # el cuerpo puede reasignar la variable: el bucle sigue con el original
+            t = Temp(self.tpool.new())
+            self._emit(Move(t, arr))
+            arr = t
+        data = Temp(self.tpool.new())
         length = Temp(self.tpool.new())
-        self._emit(Load(length, arr, 0))            # length = *(arr + 0)
-
-        idx = Temp(self.tpool.new())
-        self._emit(Move(idx, ConstInt(0)))
+        p = Temp(self.tpool.new())
+        end = Temp(self.tpool.new())
+        self._emit(Load(data, arr, 8))
+        self._emit(Load(length, arr, 0))
+        self._emit(BinOp("*", end, length, ConstInt(4)))
+        self._emit(BinOp("+", end, data, end))
+        self._emit(Move(p, data))
 
         L_cond = self.lgen.new()
         L_body = self.lgen.new()
+        L_next = self.lgen.new()
         L_end  = self.lgen.new()
 
         self._emit(Label(L_cond))
-        self._emit(CJump("<", idx, length, L_body, L_end))
+        self._emit(CJump("<", p, end, L_body, L_end))
 
-        # cuerpo
-        self._loop_push(L_cond, L_end)
+        # cuerpo ('continue' salta al avance, no a la condición)
+        self._loop_push(L_next, L_end)
         self._emit(Label(L_body))
-        cur = Temp(self.tpool.new())
-        self._emit(LoadI(cur, arr, idx))           # cur = arr[idx]
-        self._emit(Move(loc_var, cur))
-        self._release_if_temp(cur)
+        start = len(self.current_fn.body)
+        self._emit(Load(loc_var, p, 0))
         self._visit(n.body)
-        # idx++
-        one = ConstInt(1)
-        nxt = Temp(self.tpool.new())
-        self._emit(BinOp("+", nxt, idx, one))
-        self._emit(Move(idx, nxt))
-        self._release_if_temp(nxt)
+        self._emit(Label(L_next))
+        if any(isinstance(i, Call) and i.func not in self.NO_REALLOC
+               for i in self.current_fn.body[start:]):
+            # un push (directo o en una llamada) pudo mover los datos:
+            # p y end se trasladan al bloque nuevo
+            moved = Temp(self.tpool.new())
+            self._emit(Load(moved, arr, 8))
+            self._emit(BinOp("-", moved, moved, data))
+            self._emit(BinOp("+", p, p, moved))
+            self._emit(BinOp("+", end, end, moved))
+            self._emit(BinOp("+", data, data, moved))
+            self._release_if_temp(moved)
+        self._emit(BinOp("+", p, p, ConstInt(4)))
         self._emit(Jump(L_cond))
         self._loop_pop()
 
         self._emit(Label(L_end))
         # limpiar
-        self._release_if_temp(arr); self._release_if_temp(length); self._release_if_temp(idx)
+        for t in (arr, data, length, p, end):
+            self._release_if_temp(t)
         self._pop_scope()
 
 
@@ -526,10 +796,23 @@ class IRGen:
 
 
     def _visit_TryCatch(self, n):
-        # Sin runtime de excepciones: compilar solo el try
-        # Creamos el scope del catch (y variable) para coincidir con checker
+        # Sin costo en el camino normal: el try es sólo una etiqueta de
+        # bloque; los bloques del try apuntan al manejador (fn.handlers) y
+        # el backend arma la tabla de rangos que recorre el unwinder.
+        #   L_try: <try> ; goto L_end
+        #   L_pad: err = catch ; <catch>
+        #   L_end:
+        L_try, L_pad, L_end = self.lgen.new(), self.lgen.new(), self.lgen.new()
+        self.eh_stack.append((self.current_fn, L_pad))
+        self._emit(Label(L_try))
+        self._push_scope()
+        self._visit(n.try_block)
+        self._pop_scope()
+        self.eh_stack.pop()
+        self._emit(Jump(L_end))
+
+        self._emit(Label(L_pad))
         self._push_scope()
-        # err_name es la variable del catch; la declaramos pero NO se usa
         err_name = getattr(n, "err_name", None)
         if err_name:
             self.frame.ensure_local(err_name)
@@ -537,12 +820,79 @@ class IRGen:
                 self.current_fn.locals.append(err_name)
             self._bind(err_name, Local(err_name))
             self._bind_type(err_name, None)
-        self._visit(n.try_block)
+            self._bind_prim(err_name, "string")     # lo lanzado es siempre un string
+            self._emit(Catch(Local(err_name)))
+        else:
+            tmp = Temp(self.tpool.new())
+            self._emit(Catch(tmp))
+            self._release_if_temp(tmp)
+        self._visit(n.catch_block)
         self._pop_scope()
+        self._emit(Label(L_end))
+
+    # ---------------- clases: jerarquía y vtables ----------------
+    def _collect_classes(self, root):
+        """Jerarquía y métodos de las clases top-level, antes de generar
+        código: una llamada puede preceder a la declaración de una subclase."""
+        for s in getattr(root, "statements", []) or []:
+            if s.__class__.__name__ == "ClassDecl":
+                self._register_class(s)
+        for c in self.class_methods:
+            self.prog.vtables[c] = [ir for _, ir in self._vtable(c)]
+
+    def _register_class(self, n):
+        self.class_base[n.name] = getattr(n, "base_name", None)
+        self.class_methods[n.name] = [m.name for m in n.members
+                                      if m.__class__.__name__ == "FunctionDecl"
+                                      and m.name != "constructor"]
+
+    def _vtable(self, cls: str, seen: Optional[set] = None) -> List[Tuple[str, str]]:
+        """[(método, nombre IR)] por slot: los de la base primero (una
+        redefinición reusa el slot), luego los métodos nuevos."""
+        seen = seen or set()
+        if cls in seen or cls not in self.class_methods:
+            return []
+        seen.add(cls)
+        vt = list(self._vtable(self.class_base.get(cls), seen)) if self.class_base.get(cls) else []
+        for m in self.class_methods[cls]:
+            ir = f"{cls}__{m}"
+            slot = next((i for i, (name, _) in enumerate(vt) if name == m), None)
+            if slot is None:
+                vt.append((m, ir))
+            else:
+                vt[slot] = (m, ir)
+        return vt
+
+    def _subclasses(self, cls: str) -> List[str]:
+        """cls y todas sus subclases (directas o no)."""
+        out = []
+        for c in self.class_methods:
+            k, seen = c, set()
+            while k and k not in seen:
+                if k == cls:
+                    out.append(c)
+                    break
+                seen.add(k)
+                k = self.class_base.get(k)
+        return out
+
+    def _method_dispatch(self, cls: str, meth: str) -> Tuple[int, Optional[str]]:
+        """(slot, destino directo): el destino es único si ninguna subclase
+        de cls redefine el método (análisis de jerarquía de clases)."""
+        vt = self._vtable(cls)
+        slot = next((i for i, (name, _) in enumerate(vt) if name == meth), None)
+        if slot is None:
+            return -1, self._lookup_method_irname(cls, meth)
+        targets = {self.prog.vtables[c][slot] for c in self._subclasses(cls)}
+        return slot, (targets.pop() if len(targets) == 1 else None)
 
     def _visit_ClassDecl(self, n):
         cname = n.name
         base = getattr(n, "base_name", None)
+        if cname not in self.class_methods:
+            # clase no top-level: se registra al encontrarla
+            self._register_class(n)
+            self.prog.vtables[cname] = [ir for _, ir in self._vtable(cname)]
         self.class_base[cname] = base
 
         # 1) layout de campos (+ herencia)
@@ -567,7 +917,7 @@ class IRGen:
 
         fields = base_fields + own_fields
         offmap: Dict[str, int] = {}
-        off = 0
+        off = OBJ_HEADER
         for f in fields:
             offmap[f] = off
             off += 4
@@ -587,7 +937,8 @@ class IRGen:
                 self.method_irname[(cname, mname)] = ir_name
 
                 # Registrar tipo de retorno del método (para _ast_is_string)
-                r = getattr(m, "ret_type", None) or getattr(m, "type_ann", None)
+                r = (getattr(m, "ret_ann", None) or getattr(m, "ret_type", None)
+                     or getattr(m, "type_ann", None))
                 if isinstance(r, str) and r.strip() == "string":
                     self.method_ret[(cname, mname)] = "string"
 
@@ -616,11 +967,13 @@ class IRGen:
         # guardar contexto actual (incluyendo scopes)
         prev_fn, prev_frame, prev_class = self.current_fn, self.frame, self.cur_class
         prev_scopes, prev_types, prev_prims = self.scopes, self.type_scopes, self.prim_scopes
+        prev_fns, prev_env, prev_pad = self.fn_scopes, self.env_local, self.env_pad
 
         # activar contexto del método
         self.current_fn, self.frame = fn, Frame(ir_name, params)
         self.cur_class = cname
         self.scopes, self.type_scopes, self.prim_scopes = [], [], []
+        self.fn_scopes = []
         self._push_scope()
 
         # bind this y parámetros
@@ -634,15 +987,19 @@ class IRGen:
             ptyp = (getattr(p, "type_ann", None) or getattr(p, "type", None))
             if isinstance(ptyp, str) and ptyp.strip() == "string":
                 self._bind_prim(p.name, "string")
+        self._open_env(mdecl.body.statements if mdecl.body is not None else [], ps)
 
         # cuerpo
         self._visit(mdecl.body)
+        self._close_env()
+        self._end_env()
 
         # cerrar y restaurar
         self._pop_scope()
         fn.frame = self.frame
         self.current_fn, self.frame, self.cur_class = prev_fn, prev_frame, prev_class
         self.scopes, self.type_scopes, self.prim_scopes = prev_scopes, prev_types, prev_prims
+        self.fn_scopes, self.env_local, self.env_pad = prev_fns, prev_env, prev_pad
 
 
     # ---------------- expresiones ----------------
@@ -654,8 +1011,11 @@ class IRGen:
         return meth(e)
 
     def _expr_Identifier(self, e) -> Operand:
-        op = self._lookup(e.name)
+        op = self._read_var(e.name)
         if op is None:
+            if self._lookup_closure(e.name) is not None:
+                raise RuntimeError(f"La función anidada '{e.name}' sólo puede llamarse "
+                                   f"(no hay valores función)")
             raise RuntimeError(f"Identificador no encontrado: {e.name}")
         return op
 
@@ -672,18 +1032,23 @@ class IRGen:
         return dst
     
     def _expr_ArrayLiteral(self, e) -> Operand:
-        # tamaño en bytes = 4 (length) + n*4
+        # cabecera [longitud, capacidad, datos] + n*4; datos apunta a los
+        # elementos del propio bloque hasta que push necesite crecer
         n = len(e.elements)
-        size = 4 + n*4
+        size = ARR_HEADER + n*4
         arr = Temp(self.tpool.new())
         self._emit(Call(arr, "malloc", [ConstInt(size)]))
-        # length
         self._emit(Store(arr, 0, ConstInt(n)))
+        self._emit(Store(arr, 4, ConstInt(n)))
+        data = Temp(self.tpool.new())
+        self._emit(BinOp("+", data, arr, ConstInt(ARR_HEADER)))
+        self._emit(Store(arr, 8, data))
+        self._release_if_temp(data)
         # elementos
         i = 0
         while i < n:
             val = self._eval_expr(e.elements[i])
-            self._emit(Store(arr, 4 + i*4, val))
+            self._emit(Store(arr, ARR_HEADER + i*4, val))
             self._release_if_temp(val)
             i += 1
         return arr
@@ -692,12 +1057,17 @@ class IRGen:
         base = self._eval_expr(e.obj)
         idx  = self._eval_expr(e.index)
         dst  = Temp(self.tpool.new())
+        self._check_index(base, idx)
         self._emit(LoadI(dst, base, idx))
         # reciclar
         self._release_if_temp(base); self._release_if_temp(idx)
         return dst
 
 
+    def _check_index(self, base: Operand, idx: Operand):
+        if self.safe:
+            self._emit(CheckIndex(base, idx, ConstStr(self._new_string_label(self.INDEX_ERROR))))
+
     def _resolve_member_target(self, e):
         """Devuelve (base_operand, class_name, field_name) para MemberAccess."""
         obj = e.obj
@@ -708,16 +1078,31 @@ class IRGen:
                 raise RuntimeError("Uso de 'this' fuera de método")
             return Param("this"), self.cur_class, field
         if ck == "Identifier":
-            base = self._lookup(obj.name)
+            base = self._read_var(obj.name)
             if base is None:
                 raise RuntimeError(f"Variable no encontrada: {obj.name}")
-            c = self._lookup_type(obj.name)
+            c = self._class_of(obj)
             if not c:
                 raise RuntimeError(f"No se conoce clase de '{obj.name}' para acceso a miembro")
             if c not in self.class_field_off:
                 raise RuntimeError(f"Clase '{c}' sin layout registrado")
             return base, c, field
-        raise NotImplementedError("MemberAccess: solo 'this.x' o 'var.x' por ahora")
+        # receptor arbitrario (a.b.c, f().x, ...): la clase la da el checker
+        c = self._class_of(obj)
+        if not c or c not in self.class_field_off:
+            raise RuntimeError(f"No se conoce la clase del receptor de '{field}'")
+        return self._eval_expr(obj), c, field
+
+    def _class_of(self, obj) -> Optional[str]:
+        """Clase estática de una expresión receptora (None si no se sabe)."""
+        if obj.__class__.__name__ == "This":
+            return self.cur_class
+        t = self._sem_type(obj)
+        if t is not None and is_class(t):
+            return t.info
+        if obj.__class__.__name__ == "Identifier":
+            return self._lookup_type(obj.name)
+        return None
 
     def _expr_Literal(self, e) -> Operand:
         if e.kind == "int":
@@ -742,14 +1127,50 @@ class IRGen:
             return dst
         raise NotImplementedError(f"Unary op {e.op} no soportado")
 
+    def _concat_operands(self, e) -> List:
+        """Operandos (AST) de una cadena de '+' de strings, de izquierda a derecha."""
+        if (e.__class__.__name__ == "Binary" and e.op == "+"
+                and (self._ast_is_string(e.left) or self._ast_is_string(e.right))):
+            return self._concat_operands(e.left) + self._concat_operands(e.right)
+        return [e]
+
+    def _concat_piece(self, e) -> Operand:
+        """Operando de __concat como string: enteros vía toString (itoa del
+        runtime; las constantes se convierten aquí), booleanos a 'true'/'false'."""
+        v = self._eval_expr(e)
+        t = self._sem_type(e)
+        if t is None or is_string(t):
+            return v
+        if is_int(t):
+            if isinstance(v, ConstInt):
+                return ConstStr(self._new_string_label(str(v.value)))
+            dst = Temp(self.tpool.new())
+            self._emit(Call(dst, "toString", [v]))
+            self._release_if_temp(v)
+            return dst
+        if is_bool(t):
+            if isinstance(v, ConstInt):
+                return ConstStr(self._new_string_label("true" if v.value else "false"))
+            dst = Temp(self.tpool.new())
+            L_true, L_end = self.lgen.new(), self.lgen.new()
+            self._emit(Move(dst, ConstStr(self._new_string_label("false"))))
+            self._emit(CJump("!=", v, ConstInt(0), L_true, L_end))
+            self._emit(Label(L_true))
+            self._emit(Move(dst, ConstStr(self._new_string_label("true"))))
+            self._emit(Label(L_end))
+            self._release_if_temp(v)
+            return dst
+        return v
+
     def _expr_Binary(self, e) -> Operand:
-        # '+' de strings: reescribir SIEMPRE a __concat cuando algún lado es string
+        # '+' de strings: reescribir SIEMPRE a __concat cuando algún lado es string;
+        # una cadena a + b + c + ... es una sola llamada n-aria (una reserva)
         if e.op == "+" and (self._ast_is_string(e.left) or self._ast_is_string(e.right)):
-            a = self._eval_expr(e.left)
-            b = self._eval_expr(e.right)
+            args = [self._concat_piece(x) for x in self._concat_operands(e)]
             dst = Temp(self.tpool.new())
-            self._emit(Call(dst, "__concat", [a, b]))  # __concat(a,b) respeta orden
-            self._release_if_temp(a); self._release_if_temp(b)
+            self._emit(Call(dst, "__concat", args))  # respeta el orden de los operandos
+            for a in args:
+                self._release_if_temp(a)
             return dst
 
         if e.op in ("+","-","*","/","%"):
@@ -784,8 +1205,9 @@ class IRGen:
                 self._emit(Move(dst, ConstInt(1)))
                 self._emit(Jump(L_end))
             else:
-                self._emit_cond_jump(e.left, L_true, L_false)
-                self._emit(Label(L_false))
+                L_right = self.lgen.new()
+                self._emit_cond_jump(e.left, L_true, L_right)
+                self._emit(Label(L_right))
                 self._emit_cond_jump(e.right, L_true, L_false)
                 self._emit(Label(L_true))
                 self._emit(Move(dst, ConstInt(1)))
@@ -804,36 +1226,50 @@ class IRGen:
         #   - constructor:  Clase(args)  => malloc + Clase__constructor(this, args)
         #   - método:       obj.metodo(args) => Clase__metodo(obj, args)
         cn = e.callee.__class__.__name__
+        # print(string no literal): la versión string del intrínseco; la fusión
+        # print(__concat(...)) -> prints por operando la hace optimize (PASO W)
+        if (cn == "Identifier" and e.callee.name == "print" and len(e.args) == 1
+                and "print" not in self.prog.functions
+                and e.args[0].__class__.__name__ != "Literal"
+                and self._ast_is_string(e.args[0])):
+            v = self._eval_expr(e.args[0])
+            dst = Temp(self.tpool.new())
+            self._emit(Call(dst, "__print_str", [v]))
+            self._release_if_temp(v)
+            return dst
+
+        # el receptor de obj.metodo(...) se evalúa antes que los argumentos
+        recv: Optional[Operand] = None
+        cls: Optional[str] = None
+        if cn == "MemberAccess":
+            cls = self._class_of(e.callee.obj)
+            if not cls:
+                raise RuntimeError(f"No se conoce la clase del receptor de '{e.callee.name}'")
+            recv = self._eval_expr(e.callee.obj)
+
+        # throw(x): se lanza x como string (enteros/booleanos convertidos)
+        if (cn == "Identifier" and e.callee.name == "throw" and len(e.args) == 1
+                and "throw" not in self.prog.functions):
+            v = self._concat_piece(e.args[0])
+            self._emit(Throw(v))
+            self._release_if_temp(v)
+            return ConstInt(0)
+
         args_ops: List[Operand] = []
         i = 0
         while i < len(e.args):
             args_ops.append(self._eval_expr(e.args[i]))
             i += 1
 
-        # 1) método obj.metodo(...)
+        # 1) método obj.metodo(...): llamada directa si la jerarquía prueba
+        #    que el destino es único; si no, por la vtable del receptor
         if cn == "MemberAccess":
-            obj = e.callee.obj
-            meth = e.callee.name
-            cls: Optional[str] = None
-            base_op: Operand
-
-            ok_simple = False
-            if obj.__class__.__name__ == "This":
-                base_op = Param("this")
-                cls = self.cur_class
-                ok_simple = True
-            elif obj.__class__.__name__ == "Identifier":
-                base_op = self._lookup(obj.name)
-                if base_op is None:
-                    raise RuntimeError(f"Variable no encontrada: {obj.name}")
-                cls = self._lookup_type(obj.name)
-                ok_simple = (cls is not None)
-            if not ok_simple or not cls:
-                raise NotImplementedError("Llamada a método solo soporta 'this.m()' o 'var.m()' con tipo conocido")
-
-            irname = self._lookup_method_irname(cls, meth)
+            slot, irname = self._method_dispatch(cls, e.callee.name)
             dst = Temp(self.tpool.new())
-            self._emit(Call(dst, irname, [base_op] + args_ops))
+            if irname is not None:
+                self._emit(Call(dst, irname, [recv] + args_ops))
+            else:
+                self._emit(Call(dst, "__vcall", [ConstInt(slot), recv] + args_ops))
             return dst
 
         # 2) constructor Clase(...)
@@ -841,15 +1277,29 @@ class IRGen:
             cname = e.callee.name
             size = self._class_size(cname)
             this_tmp = Temp(self.tpool.new())
-            # this = malloc(size)
-            self._emit(Call(this_tmp, "malloc", [ConstInt(size)]))
+            # this = malloc(size) con la vtable de la clase en la palabra 0
+            cid = list(self.prog.vtables).index(cname)
+            self._emit(Call(this_tmp, "__new", [ConstInt(size), ConstInt(cid)]))
             # llamar constructor si existe
             ctor_ir = self.method_irname.get((cname, "constructor"))
             if ctor_ir:
                 self._emit(Call(None, ctor_ir, [this_tmp] + args_ops))
             return this_tmp
 
-        # 3) función global normal
+        # push/pop/length sobre arreglos (el checker marca las llamadas que
+        # no resuelven a una función del usuario con el mismo nombre)
+        if getattr(e, "array_builtin", False):
+            return self._array_builtin(e.callee.name, args_ops)
+
+        # 3) función anidada: argumentos + capturas (parámetros ocultos)
+        clo = self._lookup_closure(e.callee.name) if cn == "Identifier" else None
+        if clo is not None:
+            hidden = [self._read_var(h) for h in clo.hidden]
+            dst = Temp(self.tpool.new())
+            self._emit(Call(dst, clo.irname, args_ops + hidden))
+            return dst
+
+        # 4) función global normal
         if cn == "Identifier":
             fname = e.callee.name
             dst = Temp(self.tpool.new())
@@ -858,6 +1308,28 @@ class IRGen:
 
         raise NotImplementedError("Call no soportada para este tipo de callee")
 
+    def _array_builtin(self, name: str, args: List[Operand]) -> Operand:
+        arr = args[0]
+        dst = Temp(self.tpool.new())
+        if name == "push":
+            # crecer es raro (capacidad doble): lo resuelve el runtime
+            self._emit(Call(dst, "__push", args))
+            self._release_if_temp(args[1])
+        elif name == "length":
+            self._emit(Load(dst, arr, 0))
+        else:
+            # pop: n - 1 debe ser un índice válido; el check va siempre
+            n = Temp(self.tpool.new())
+            last = Temp(self.tpool.new())
+            self._emit(Load(n, arr, 0))
+            self._emit(BinOp("-", last, n, ConstInt(1)))
+            self._emit(CheckIndex(arr, last, ConstStr(self._new_string_label(self.POP_ERROR))))
+            self._emit(LoadI(dst, arr, last))
+            self._emit(Store(arr, 0, last))
+            self._release_if_temp(n); self._release_if_temp(last)
+        self._release_if_temp(arr)
+        return dst
+
     def _lookup_method_irname(self, cls: str, meth: str) -> str:
         c = cls
         visited = set()
@@ -893,6 +1365,8 @@ class IRGen:
     # ---------------- util ----------------
     def _emit(self, instr: Instr):
         assert self.current_fn is not None
+        if isinstance(instr, Label) and self.eh_stack and self.eh_stack[-1][0] is self.current_fn:
+            self.current_fn.handlers[instr.name] = self.eh_stack[-1][1]
         self.current_fn.body.append(instr)
 
     def _new_string_label(self, text: str) -> str:
@@ -908,5 +1382,5 @@ class IRGen:
 
     def _class_size(self, cname: str) -> int:
         offmap = self.class_field_off.get(cname, {})
-        # tamaño = (num_campos) * 4
-        return 4 * len(offmap)
+        # tamaño = puntero a vtable + (num_campos) * 4
+        return OBJ_HEADER + 4 * len(offmap)
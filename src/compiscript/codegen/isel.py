@@ -0,0 +1,194 @@
+# src/compiscript/codegen/isel.py
+from __future__ import annotations
+from dataclasses import dataclass, replace
+from typing import List, Optional, Set, Tuple
+
+from compiscript.ir.tac import (
+    Operand, Temp, ConstInt, ConstStr, Instr, Label, Jump, CJump, SwitchJump, Return, Throw,
+    Move, BinOp, UnaryOp, Cmp, Load, LoadI, StoreI, IRFunction,
+)
+from compiscript.ir.optimize import _instr_def_temp, _instr_uses
+
+# -------------------------------------------------------------------
+# Selección de instrucciones (común a MIPS y x86), en dos niveles:
+#
+# 1) Árboles (select_trees): un temp definido justo antes de su único
+#    consumidor y muerto después (liveness de temps sobre los bloques) es
+#    un subárbol de éste. Se cubren los árboles con plantilla propia; la
+#    definición desaparece:
+#
+#   Move(x, Op(a, ...))                  -> Op con destino x
+#                                           (Op: BinOp, UnaryOp, Cmp, Load, LoadI)
+#   CJump(!=, Cmp(op, a, b), 0)          -> CJump(op, a, b)
+#   CJump(==, Cmp(op, a, b), 0)          -> CJump(NEG[op], a, b)
+#   LoadI(base, BinOp(+|-, i, K))        -> LoadIK(base, i, ±K)
+#   StoreI(base, BinOp(+|-, i, K), src)  -> StoreIK(base, i, ±K, src)
+#
+# 2) Hojas inmediatas: cada patrón reconoce un nodo con una hoja ConstInt
+#    y lo normaliza a (patrón, operando variable, constante); el backend
+#    decide si la constante cabe en su forma inmediata y qué plantilla
+#    emitir.
+#
+#   BinOp('+', x, K) | BinOp('+', K, x)  -> ("add", x, K)
+#   BinOp('-', x, K)                     -> ("add", x, -K)
+#   BinOp('*', x, K) | BinOp('*', K, x)  -> ("mul", x, K)
+#   (op, x, K) | (op, K, x)  relacional  -> (op normalizado, x, K)
+# -------------------------------------------------------------------
+
+# a op b  <=>  b FLIP[op] a
+_FLIP = {"==": "==", "!=": "!=", "<": ">", "<=": ">=", ">": "<", ">=": "<="}
+# not (a op b)  <=>  a NEG[op] b
+_NEG = {"<": ">=", "<=": ">", ">": "<=", ">=": "<", "==": "!=", "!=": "=="}
+
+
+@dataclass
+class LoadIK(Instr):
+    """dst = elemento (index + disp) del arreglo base (LoadI con desplazamiento)."""
+    dst: Operand
+    base: Operand
+    index: Operand
+    disp: int
+
+
+@dataclass
+class StoreIK(Instr):
+    """elemento (index + disp) del arreglo base = src."""
+    base: Operand
+    index: Operand
+    disp: int
+    src: Operand
+
+
+def _var(op: Operand) -> bool:
+    return not isinstance(op, (ConstInt, ConstStr))
+
+
+def fits_s16(v: int) -> bool:
+    return -0x8000 <= v <= 0x7FFF
+
+
+def fits_u16(v: int) -> bool:
+    return 0 <= v <= 0xFFFF
+
+
+def imm_binop(ins: BinOp) -> Optional[Tuple[str, Operand, int]]:
+    a, b = ins.a, ins.b
+    if ins.op in ("+", "*"):
+        kind = "add" if ins.op == "+" else "mul"
+        if _var(a) and isinstance(b, ConstInt):
+            return kind, a, b.value
+        if _var(b) and isinstance(a, ConstInt):
+            return kind, b, a.value
+    if ins.op == "-" and _var(a) and isinstance(b, ConstInt):
+        return "add", a, -b.value
+    return None
+
+
+def imm_compare(op: str, a: Operand, b: Operand) -> Optional[Tuple[str, Operand, int]]:
+    """Relación con la constante a la derecha: (op, x, K)."""
+    if _var(a) and isinstance(b, ConstInt):
+        return op, a, b.value
+    if _var(b) and isinstance(a, ConstInt):
+        return _FLIP[op], b, a.value
+    return None
+
+
+def _index_disp(ins: Instr) -> Optional[Tuple[Operand, int]]:
+    """t = i + K | t = i - K  ->  (i, ±K)."""
+    if not isinstance(ins, BinOp) or not isinstance(ins.b, ConstInt) or not _var(ins.a):
+        return None
+    k = ins.b.value if ins.op == "+" else -ins.b.value if ins.op == "-" else None
+    if k is None or not fits_s16(k * 4):        # desplazamiento en bytes
+        return None
+    return ins.a, k
+
+
+def _cover(d: Instr, ins: Instr) -> Optional[Instr]:
+    """Plantilla para ins con el subárbol d (que define su operando temp)."""
+    t = d.dst
+    if isinstance(ins, Move) and ins.src == t and isinstance(d, (BinOp, UnaryOp, Cmp, Load, LoadI)):
+        return replace(d, dst=ins.dst)
+    if (isinstance(d, Cmp) and isinstance(ins, CJump) and ins.a == t
+            and ins.op in ("==", "!=") and ins.b == ConstInt(0)):
+        op = d.op if ins.op == "!=" else _NEG[d.op]
+        return CJump(op, d.a, d.b, ins.if_true, ins.if_false)
+    m = _index_disp(d)
+    if m is None:
+        return None
+    if isinstance(ins, LoadI) and ins.index == t:
+        return LoadIK(ins.dst, ins.base, m[0], m[1])
+    if isinstance(ins, StoreI) and ins.index == t:
+        return StoreIK(ins.base, m[0], m[1], ins.src)
+    return None
+
+
+def _temps_live_after(fn: IRFunction) -> List[Set[str]]:
+    """Temps vivos tras cada instrucción de fn.body. El manejador de un bloque
+    es sucesor de cada una de sus instrucciones (cualquiera puede lanzar)."""
+    body = fn.body
+    starts = [0] + [k for k, ins in enumerate(body) if isinstance(ins, Label) and k > 0]
+    spans = list(zip(starts, starts[1:] + [len(body)]))
+    labels = [body[a].name if a < b and isinstance(body[a], Label) else None for a, b in spans]
+    index = {lab: k for k, lab in enumerate(labels) if lab is not None}
+
+    def succs(k: int) -> List[int]:
+        a, b = spans[k]
+        last = body[b - 1] if b > a else None
+        if isinstance(last, Jump):
+            out = [last.target]
+        elif isinstance(last, CJump):
+            out = [last.if_true, last.if_false]
+        elif isinstance(last, SwitchJump):
+            out = [lab for _, lab in last.cases] + [last.default]
+        elif isinstance(last, (Return, Throw)) or k + 1 == len(spans):
+            out = []
+        else:
+            return [k + 1]
+        return [index[lab] for lab in out if lab in index]
+
+    live_in: List[Set[str]] = [set() for _ in spans]
+    after: List[Set[str]] = [set() for _ in body]
+
+    def scan(k: int) -> Set[str]:
+        pad = fn.handlers.get(labels[k]) if labels[k] is not None else None
+        pad_in = live_in[index[pad]] if pad in index else set()
+        live: Set[str] = set(pad_in)
+        for s in succs(k):
+            live |= live_in[s]
+        a, b = spans[k]
+        for j in range(b - 1, a - 1, -1):
+            after[j] = live | pad_in
+            d = _instr_def_temp(body[j])
+            live = (live - {d}) | {u.name for u in _instr_uses(body[j]) if isinstance(u, Temp)}
+        return live | pad_in
+
+    changed = True
+    while changed:
+        changed = False
+        for k in reversed(range(len(spans))):
+            new = scan(k)
+            if new != live_in[k]:
+                live_in[k], changed = new, True
+    return after
+
+
+def select_trees(fn: IRFunction) -> List[Instr]:
+    """Cuerpo de fn con los árboles de dos niveles ya cubiertos (ver arriba).
+    El IR no se modifica: el resultado es sólo para emitir."""
+    body = fn.body
+    after = _temps_live_after(fn)
+    out: List[Instr] = []
+    k = 0
+    while k < len(body):
+        ins, t = body[k], getattr(body[k], "dst", None)
+        nxt = body[k + 1] if k + 1 < len(body) else None
+        if (isinstance(t, Temp) and nxt is not None and t.name not in after[k + 1]
+                and _instr_uses(nxt).count(t) == 1):
+            new = _cover(ins, nxt)
+            if new is not None:
+                out.append(new)
+                k += 2
+                continue
+        out.append(ins)
+        k += 1
+    return out
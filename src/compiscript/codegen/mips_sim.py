@@ -0,0 +1,510 @@
+# src/compiscript/codegen/mips_sim.py
+from __future__ import annotations
+import struct
+from typing import Dict, List, Optional, Tuple
+
+from compiscript.codegen.asm import parse_mips
+
+# -------------------------------------------------------------------
+# Simulador MIPS o32 (subconjunto) para el ASM de MIPSNaive.
+# Sustituto local de QtSPIM/MARS: ensambla el texto, lo ejecuta con las
+# syscalls 1, 4, 9, 10, 11, 17 y cuenta instrucciones, accesos a memoria y
+# saltos.
+#
+# Mapa de memoria (igual que MARS, y que compiscript.ir.interp):
+#   .text  desde TEXT_BASE (una palabra por instrucción fuente)
+#   .data  desde DATA_BASE, heap (sbrk) desde HEAP_BASE alineado a 4
+#   pila   crece hacia abajo desde STACK_TOP
+#
+# Saltos: por defecto sin delay slot (MARS/SPIM por defecto). Con
+# delayed=True (o si el ASM trae '# delayed branches: ON') la instrucción
+# siguiente a un salto se ejecuta siempre, como en el hardware.
+#
+# Ciclos: modelo simple tipo R2000. Cada instrucción máquina cuesta 1
+# ciclo (las pseudo 'li'/'la' pueden expandirse a 2), más la latencia
+# de mult/div.
+# -------------------------------------------------------------------
+
+TEXT_BASE = 0x00400000
+DATA_BASE = 0x10010000
+HEAP_BASE = 0x10040000
+STACK_TOP = 0x7FFFEFFC
+STACK_SIZE = 8 * 1024 * 1024
+EXIT_ADDR = 0x00000004           # $ra inicial: volver aquí termina el programa
+DEFAULT_MAX_STEPS = 200_000_000
+
+MUL_CYCLES = 12
+DIV_CYCLES = 35
+
+_WORD = struct.Struct("<i")
+
+_NAMES = (["$zero", "$at", "$v0", "$v1", "$a0", "$a1", "$a2", "$a3"]
+          + [f"$t{i}" for i in range(8)] + [f"$s{i}" for i in range(8)]
+          + ["$t8", "$t9", "$k0", "$k1", "$gp", "$sp", "$fp", "$ra"])
+REGS: Dict[str, int] = {n: i for i, n in enumerate(_NAMES)}
+REGS.update({f"${i}": i for i in range(32)})
+REGS["$s8"] = 30
+
+# opcodes internos
+(_ADDU, _SUBU, _AND, _OR, _XOR, _NOR, _SLT, _SLTU, _MUL, _SLLV, _SRLV, _SRAV,
+ _ADDIU, _ANDI, _ORI, _XORI, _SLTI, _SLTIU, _SLL, _SRL, _SRA, _LI, _MOVE,
+ _LW, _LB, _LBU, _SW, _SB, _MULT, _MULTU, _DIV, _DIVU, _MFHI, _MFLO,
+ _BEQ, _BNE, _BLTZ, _BGEZ, _BLEZ, _BGTZ, _J, _JAL, _JR, _JALR,
+ _SYSCALL, _NOP) = range(46)
+
+_R3 = {"addu": _ADDU, "add": _ADDU, "subu": _SUBU, "sub": _SUBU, "and": _AND,
+       "or": _OR, "xor": _XOR, "nor": _NOR, "slt": _SLT, "sltu": _SLTU,
+       "mul": _MUL, "sllv": _SLLV, "srlv": _SRLV, "srav": _SRAV}
+_RI = {"addiu": _ADDIU, "addi": _ADDIU, "andi": _ANDI, "ori": _ORI, "xori": _XORI,
+       "slti": _SLTI, "sltiu": _SLTIU, "sll": _SLL, "srl": _SRL, "sra": _SRA}
+_MEM = {"lw": _LW, "lb": _LB, "lbu": _LBU, "sw": _SW, "sb": _SB}
+_HILO = {"mult": _MULT, "multu": _MULTU, "div": _DIV, "divu": _DIVU}
+_BR1 = {"bltz": _BLTZ, "bgez": _BGEZ, "blez": _BLEZ, "bgtz": _BGTZ}
+
+_BRANCH_OPS = frozenset({_BEQ, _BNE, _BLTZ, _BGEZ, _BLEZ, _BGTZ})
+
+
+def _s32(v: int) -> int:
+    v &= 0xFFFFFFFF
+    return v - 0x100000000 if v & 0x80000000 else v
+
+
+def _int(tok: str) -> int:
+    t = tok.strip()
+    if len(t) == 3 and t[0] == t[2] == "'":
+        return ord(t[1])
+    return int(t, 0)
+
+
+class MIPSSim:
+    """
+    sim = MIPSSim(asm_text); sim.run()
+    sim.output -> lo impreso; sim.stats -> contadores dinámicos.
+    """
+
+    def __init__(self, asm_text: str, *, delayed: Optional[bool] = None,
+                 max_steps: int = DEFAULT_MAX_STEPS):
+        if delayed is None:
+            delayed = "# delayed branches: ON" in asm_text
+        self.delayed = delayed
+        self.max_steps = max_steps
+        self.out = bytearray()
+        self.exit_code: Optional[int] = None
+        self.fault: Optional[str] = None     # motivo del último error de ejecución
+
+        self.text: List[Tuple] = []       # instrucciones resueltas
+        self.words: List[int] = []        # palabras máquina por instrucción
+        self.src: List[str] = []          # texto fuente (para errores)
+        self.labels: Dict[str, int] = {}  # etiqueta -> dirección
+
+        self.data = bytearray(HEAP_BASE - DATA_BASE)
+        self.brk = HEAP_BASE
+        self.stack = bytearray(STACK_SIZE)
+        self.stack_lo = STACK_TOP + 4 - STACK_SIZE
+
+        self.regs = [0] * 32
+        self.hi = 0
+        self.lo = 0
+        self.stats: Dict[str, int] = {}
+        self._assemble(asm_text)
+
+    # ---------------- ensamblado ----------------
+    def _assemble(self, asm_text: str):
+        items = parse_mips(asm_text.split("\n"))
+        text_pending: List[Tuple[str, List[str], str]] = []
+        data_words: List[Tuple[int, str]] = []    # (offset, etiqueta) de .word
+        seg = "text"
+        dpos = 0
+        for it in items:
+            if it.kind == "label":
+                if it.op in self.labels:
+                    raise RuntimeError(f"Etiqueta duplicada: {it.op}")
+                if seg == "text":
+                    self.labels[it.op] = TEXT_BASE + 4 * len(text_pending)
+                else:
+                    self.labels[it.op] = DATA_BASE + dpos
+            elif it.kind == "directive":
+                t = it.op
+                head, sep, rest = t.partition(":")
+                if sep and " " not in head and rest.strip().startswith("."):
+                    if head in self.labels:
+                        raise RuntimeError(f"Etiqueta duplicada: {head}")
+                    self.labels[head] = DATA_BASE + dpos
+                    t = rest.strip()
+                name, _, arg = t.partition(" ")
+                arg = arg.split("#", 1)[0].strip()
+                if name == ".data":
+                    seg = "data"
+                elif name == ".text":
+                    seg = "text"
+                elif name in (".globl", ".extern"):
+                    pass
+                elif name == ".align":
+                    a = 1 << _int(arg)
+                    dpos = (dpos + a - 1) // a * a
+                elif name == ".byte":
+                    for x in arg.split(","):
+                        self._data_put(dpos, bytes([_int(x) & 0xFF]))
+                        dpos += 1
+                elif name == ".word":
+                    dpos = (dpos + 3) // 4 * 4
+                    for x in arg.split(","):
+                        x = x.strip()
+                        try:
+                            self._data_put(dpos, _WORD.pack(_s32(_int(x))))
+                        except ValueError:
+                            data_words.append((dpos, x))   # etiqueta: se resuelve al final
+                        dpos += 4
+                elif name == ".space":
+                    dpos += _int(arg)
+                else:
+                    raise RuntimeError(f"Directiva no soportada: {it.op}")
+            elif it.kind == "ins":
+                if seg != "text":
+                    raise RuntimeError(f"Instrucción fuera de .text: {it.text}")
+                text_pending.append((it.op, it.args, (it.text or it.op).strip()))
+        if DATA_BASE + dpos > HEAP_BASE:
+            raise RuntimeError("Segmento .data excede el inicio del heap")
+
+        for off, lab in data_words:
+            self._data_put(off, _WORD.pack(_s32(self._label_addr(lab))))
+        for op, args, src in text_pending:
+            ins, words = self._encode(op, args, src)
+            self.text.append(ins)
+            self.words.append(words)
+            self.src.append(src)
+
+    def _data_put(self, off: int, b: bytes):
+        if DATA_BASE + off + len(b) > HEAP_BASE:
+            raise RuntimeError("Segmento .data excede el inicio del heap")
+        self.data[off:off + len(b)] = b
+
+    def _label_addr(self, lab: str) -> int:
+        if lab not in self.labels:
+            raise RuntimeError(f"Etiqueta sin definir: {lab}")
+        return self.labels[lab]
+
+    def _target(self, lab: str) -> int:
+        a = self._label_addr(lab)
+        if a >= DATA_BASE:
+            raise RuntimeError(f"Salto a etiqueta de datos: {lab}")
+        return (a - TEXT_BASE) // 4
+
+    @staticmethod
+    def _reg(tok: str) -> int:
+        r = REGS.get(tok.strip())
+        if r is None:
+            raise RuntimeError(f"Registro desconocido: {tok}")
+        return r
+
+    def _mem(self, tok: str) -> Tuple[int, int]:
+        t = tok.strip()
+        i = t.find("(")
+        if i < 0 or not t.endswith(")"):
+            raise RuntimeError(f"Operando de memoria no soportado: {tok}")
+        off = _int(t[:i]) if t[:i].strip() else 0
+        return off, self._reg(t[i + 1:-1])
+
+    def _encode(self, op: str, a: List[str], src: str) -> Tuple[Tuple, int]:
+        try:
+            if op in _R3:
+                return (_R3[op], self._reg(a[0]), self._reg(a[1]), self._reg(a[2])), 1
+            if op in _RI:
+                return (_RI[op], self._reg(a[0]), self._reg(a[1]), _int(a[2])), 1
+            if op in _MEM:
+                off, base = self._mem(a[1])
+                return (_MEM[op], self._reg(a[0]), base, off), 1
+            if op in _HILO:
+                return (_HILO[op], self._reg(a[0]), self._reg(a[1])), 1
+            if op in ("mfhi", "mflo"):
+                return (_MFHI if op == "mfhi" else _MFLO, self._reg(a[0])), 1
+            if op in ("beq", "bne"):
+                return ((_BEQ if op == "beq" else _BNE), self._reg(a[0]), self._reg(a[1]),
+                        self._target(a[2])), 1
+            if op in ("beqz", "bnez"):
+                return ((_BEQ if op == "beqz" else _BNE), self._reg(a[0]), 0,
+                        self._target(a[1])), 1
+            if op == "b":
+                return (_BEQ, 0, 0, self._target(a[0])), 1
+            if op in _BR1:
+                return (_BR1[op], self._reg(a[0]), self._target(a[1])), 1
+            if op in ("j", "jal"):
+                return ((_J if op == "j" else _JAL), self._target(a[0])), 1
+            if op == "jr":
+                return (_JR, self._reg(a[0])), 1
+            if op == "jalr":
+                return (_JALR, self._reg(a[0])), 1
+            if op == "li":
+                v = _int(a[1])
+                return (_LI, self._reg(a[0]), _s32(v)), (1 if -0x8000 <= v <= 0xFFFF else 2)
+            if op == "la":
+                return (_LI, self._reg(a[0]), self._label_addr(a[1])), 2
+            if op == "lui":
+                return (_LI, self._reg(a[0]), _s32(_int(a[1]) << 16)), 1
+            if op == "move":
+                return (_MOVE, self._reg(a[0]), self._reg(a[1])), 1
+            if op == "nop":
+                return (_NOP,), 1
+            if op == "syscall":
+                return (_SYSCALL,), 1
+        except (IndexError, ValueError) as e:
+            raise RuntimeError(f"Instrucción mal formada: {src} ({e})") from None
+        raise RuntimeError(f"Instrucción no soportada: {src}")
+
+    # ---------------- memoria ----------------
+    def _seg(self, addr: int, size: int) -> Tuple[bytearray, int]:
+        if addr >= self.stack_lo:
+            i = addr - self.stack_lo
+            if i + size <= STACK_SIZE:
+                return self.stack, i
+        else:
+            i = addr - DATA_BASE
+            if 0 <= i and addr + size <= self.brk:
+                return self.data, i
+        raise RuntimeError(f"Acceso a memoria inválido: 0x{addr & 0xFFFFFFFF:08x}")
+
+    def load_word(self, addr: int) -> int:
+        if addr & 3:
+            raise RuntimeError(f"Lectura no alineada: 0x{addr & 0xFFFFFFFF:08x}")
+        seg, i = self._seg(addr, 4)
+        return _WORD.unpack_from(seg, i)[0]
+
+    def store_word(self, addr: int, v: int):
+        if addr & 3:
+            raise RuntimeError(f"Escritura no alineada: 0x{addr & 0xFFFFFFFF:08x}")
+        seg, i = self._seg(addr, 4)
+        _WORD.pack_into(seg, i, v)
+
+    def read_cstring(self, addr: int) -> bytes:
+        seg, i = self._seg(addr, 1)
+        end = seg.find(0, i)
+        if end < 0:
+            raise RuntimeError(f"String sin NUL en 0x{addr:08x}")
+        return bytes(seg[i:end])
+
+    def sbrk(self, n: int) -> int:
+        if n < 0:
+            raise RuntimeError(f"sbrk con tamaño negativo: {n}")
+        addr = self.brk
+        n = (n + 3) & ~3
+        self.data.extend(bytes(n))
+        self.brk += n
+        return addr
+
+    # ---------------- ejecución ----------------
+    @property
+    def output(self) -> str:
+        return self.out.decode("utf-8", errors="replace")
+
+    def _pc_of(self, addr: int) -> int:
+        if addr == EXIT_ADDR:
+            return -1
+        i = (addr - TEXT_BASE) >> 2
+        if addr & 3 or not (0 <= i < len(self.text)):
+            raise RuntimeError(f"Salto a dirección inválida: 0x{addr & 0xFFFFFFFF:08x}")
+        return i
+
+    def _syscall(self) -> bool:
+        """Ejecuta la syscall de $v0; False si el programa terminó."""
+        r = self.regs
+        code = r[2]
+        if code == 1:
+            self.out += b"%d" % r[4]
+        elif code == 4:
+            self.out += self.read_cstring(r[4])
+        elif code == 9:
+            r[2] = self.sbrk(r[4])
+        elif code == 10:
+            self.exit_code = 0
+            return False
+        elif code == 11:
+            self.out.append(r[4] & 0xFF)
+        elif code == 17:
+            self.exit_code = r[4]
+            return False
+        else:
+            raise RuntimeError(f"Syscall no soportada: {code}")
+        return True
+
+    def run(self, entry: str = "main") -> str:
+        r = self.regs
+        r[29] = STACK_TOP       # $sp
+        r[28] = 0x10008000      # $gp
+        r[31] = EXIT_ADDR       # $ra: volver de main termina
+        text, words = self.text, self.words
+        pc = self._target(entry)
+        npc = pc + 1
+        delayed = self.delayed
+        n = loads = stores = branches = taken = jumps = calls = syscalls = 0
+        machine = extra = 0
+        limit = self.max_steps
+        try:
+            while pc >= 0:
+                if pc >= len(text):
+                    raise RuntimeError("Ejecución fuera del segmento .text")
+                ins = text[pc]
+                op = ins[0]
+                n += 1
+                machine += words[pc]
+                nxt = npc + 1 if delayed else npc
+                tgt = -2                                   # -2: sin salto
+                if op == _LW:
+                    a = r[ins[2]] + ins[3]
+                    if a & 3:
+                        raise RuntimeError(f"Lectura no alineada: 0x{a & 0xFFFFFFFF:08x}")
+                    seg, i = self._seg(a, 4)
+                    r[ins[1]] = _WORD.unpack_from(seg, i)[0]
+                    loads += 1
+                elif op == _SW:
+                    a = r[ins[2]] + ins[3]
+                    if a & 3:
+                        raise RuntimeError(f"Escritura no alineada: 0x{a & 0xFFFFFFFF:08x}")
+                    seg, i = self._seg(a, 4)
+                    _WORD.pack_into(seg, i, r[ins[1]])
+                    stores += 1
+                elif op == _ADDIU:
+                    r[ins[1]] = _s32(r[ins[2]] + ins[3])
+                elif op == _LI:
+                    r[ins[1]] = ins[2]
+                elif op == _ADDU:
+                    r[ins[1]] = _s32(r[ins[2]] + r[ins[3]])
+                elif op == _SUBU:
+                    r[ins[1]] = _s32(r[ins[2]] - r[ins[3]])
+                elif op == _MOVE:
+                    r[ins[1]] = r[ins[2]]
+                elif op == _BEQ or op == _BNE:
+                    branches += 1
+                    if (r[ins[1]] == r[ins[2]]) == (op == _BEQ):
+                        taken += 1
+                        tgt = ins[3]
+                elif op == _J:
+                    jumps += 1
+                    tgt = ins[1]
+                elif op == _JAL:
+                    jumps += 1
+                    calls += 1
+                    r[31] = TEXT_BASE + 4 * nxt
+                    tgt = ins[1]
+                elif op == _JR:
+                    jumps += 1
+                    tgt = self._pc_of(r[ins[1]])
+                elif op == _NOP:
+                    pass
+                elif op == _SLT:
+                    r[ins[1]] = 1 if r[ins[2]] < r[ins[3]] else 0
+                elif op == _SLTI:
+                    r[ins[1]] = 1 if r[ins[2]] < ins[3] else 0
+                elif op == _SLTIU:
+                    r[ins[1]] = 1 if (r[ins[2]] & 0xFFFFFFFF) < (ins[3] & 0xFFFFFFFF) else 0
+                elif op == _SLTU:
+                    r[ins[1]] = 1 if (r[ins[2]] & 0xFFFFFFFF) < (r[ins[3]] & 0xFFFFFFFF) else 0
+                elif op == _SLL:
+                    r[ins[1]] = _s32(r[ins[2]] << (ins[3] & 31))
+                elif op == _SRA:
+                    r[ins[1]] = r[ins[2]] >> (ins[3] & 31)
+                elif op == _SRL:
+                    r[ins[1]] = _s32((r[ins[2]] & 0xFFFFFFFF) >> (ins[3] & 31))
+                elif op == _MUL:
+                    r[ins[1]] = _s32(r[ins[2]] * r[ins[3]])
+                    extra += MUL_CYCLES - 1
+                elif op == _MULT or op == _MULTU:
+                    x, y = r[ins[1]], r[ins[2]]
+                    if op == _MULTU:
+                        x, y = x & 0xFFFFFFFF, y & 0xFFFFFFFF
+                    p = x * y
+                    self.hi, self.lo = _s32(p >> 32), _s32(p)
+                    extra += MUL_CYCLES - 1
+                elif op == _DIV or op == _DIVU:
+                    x, y = r[ins[1]], r[ins[2]]
+                    if op == _DIVU:
+                        x, y = x & 0xFFFFFFFF, y & 0xFFFFFFFF
+                    if y == 0:
+                        raise RuntimeError("División entre cero")
+                    q = abs(x) // abs(y)
+                    if (x < 0) != (y < 0):
+                        q = -q
+                    self.lo, self.hi = _s32(q), _s32(x - q * y)
+                    extra += DIV_CYCLES - 1
+                elif op == _MFHI:
+                    r[ins[1]] = self.hi
+                elif op == _MFLO:
+                    r[ins[1]] = self.lo
+                elif op == _LBU or op == _LB:
+                    seg, i = self._seg(r[ins[2]] + ins[3], 1)
+                    b = seg[i]
+                    r[ins[1]] = b - 256 if op == _LB and b > 127 else b
+                    loads += 1
+                elif op == _SB:
+                    seg, i = self._seg(r[ins[2]] + ins[3], 1)
+                    seg[i] = r[ins[1]] & 0xFF
+                    stores += 1
+                elif op == _SYSCALL:
+                    syscalls += 1
+                    if not self._syscall():
+                        break
+                elif op == _ANDI:
+                    r[ins[1]] = r[ins[2]] & (ins[3] & 0xFFFF)
+                elif op == _ORI:
+                    r[ins[1]] = _s32(r[ins[2]] | (ins[3] & 0xFFFF))
+                elif op == _XORI:
+                    r[ins[1]] = _s32(r[ins[2]] ^ (ins[3] & 0xFFFF))
+                elif op == _AND:
+                    r[ins[1]] = r[ins[2]] & r[ins[3]]
+                elif op == _OR:
+                    r[ins[1]] = r[ins[2]] | r[ins[3]]
+                elif op == _XOR:
+                    r[ins[1]] = r[ins[2]] ^ r[ins[3]]
+                elif op == _NOR:
+                    r[ins[1]] = ~(r[ins[2]] | r[ins[3]])
+                elif op == _SLLV:
+                    r[ins[1]] = _s32(r[ins[2]] << (r[ins[3]] & 31))
+                elif op == _SRAV:
+                    r[ins[1]] = r[ins[2]] >> (r[ins[3]] & 31)
+                elif op == _SRLV:
+                    r[ins[1]] = _s32((r[ins[2]] & 0xFFFFFFFF) >> (r[ins[3]] & 31))
+                elif op == _JALR:
+                    jumps += 1
+                    calls += 1
+                    dest = r[ins[1]]
+                    r[31] = TEXT_BASE + 4 * nxt
+                    tgt = self._pc_of(dest)
+                elif op in _BRANCH_OPS:
+                    branches += 1
+                    v = r[ins[1]]
+                    if ((op == _BLTZ and v < 0) or (op == _BGEZ and v >= 0)
+                            or (op == _BLEZ and v <= 0) or (op == _BGTZ and v > 0)):
+                        taken += 1
+                        tgt = ins[2]
+                else:
+                    raise RuntimeError(f"Opcode desconocido: {op}")
+                r[0] = 0
+
+                if n > limit:
+                    raise RuntimeError(f"Límite de pasos excedido ({limit})")
+                if delayed:
+                    pc, npc = npc, (tgt if tgt != -2 else npc + 1)
+                else:
+                    pc = tgt if tgt != -2 else npc
+                    npc = pc + 1
+        except RuntimeError as e:
+            self.fault = str(e)
+            where = self.src[pc] if 0 <= pc < len(self.src) else "?"
+            raise RuntimeError(f"pc=0x{TEXT_BASE + 4 * pc:08x} ({where}): {e}") from None
+        finally:
+            self.stats = {
+                "instructions": n, "machine": machine, "cycles": machine + extra,
+                "loads": loads, "stores": stores,
+                "branches": branches, "taken": taken,
+                "jumps": jumps, "calls": calls, "syscalls": syscalls,
+            }
+        if self.exit_code is None:
+            self.exit_code = 0
+        return self.output
+
+
+def run_mips(asm_text: str, *, delayed: Optional[bool] = None,
+             max_steps: int = DEFAULT_MAX_STEPS) -> Tuple[str, Dict[str, int]]:
+    """Ensambla y ejecuta; devuelve (salida, estadísticas)."""
+    sim = MIPSSim(asm_text, delayed=delayed, max_steps=max_steps)
+    out = sim.run()
+    return out, sim.stats
@@ -0,0 +1,528 @@
+# src/compiscript/codegen/peephole.py
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Callable, Dict, FrozenSet, List, Optional, Set, Tuple
+
+from compiscript.codegen.asm import (
+    AsmLine, mk_ins,
+    parse_mips, render_mips, mips_defs_uses, mips_mem_base, MIPS_BRANCHES, MIPS_INVERT,
+    parse_x86, render_x86, x86_defs_uses, x86_reg, x86_is_mem, x86_mem_key, x86_mem_regs,
+    X86_JCC, X86_INVERT,
+)
+
+# -------------------------------------------------------------------
+# Peephole sobre el ASM ya emitido (semántica secuencial de saltos).
+# Cada ISA se describe con una tabla (_ISA) y las reglas son genéricas:
+#   - forwarding store->load / load->load dentro del bloque
+#   - eliminación de moves redundantes
+#   - colapso de saltos (salto a salto, salto a la siguiente línea, b<c>+j)
+#   - plegado de 'li/mov reg, K' + op en la forma inmediata
+# -------------------------------------------------------------------
+
+_ALL = "*"          # "todos los registros vivos" (p.ej. el live set aún no calculado)
+_MAX_ROUNDS = 8
+
+
+@dataclass(frozen=True)
+class _ISA:
+    parse: Callable[[List[str]], List[AsmLine]]
+    render: Callable[[List[AsmLine]], List[str]]
+    defs_uses: Callable[[AsmLine], Tuple[Set[str], Set[str]]]
+    uncond: FrozenSet[str]              # saltos incondicionales
+    cond: FrozenSet[str]                # saltos condicionales (destino = último arg)
+    invert: Dict[str, str]
+    exits: FrozenSet[str]               # retorno de función / salto indirecto
+    ret_reg: Optional[str]              # 'jr $ra' es retorno; 'jr $t0' es salto por tabla
+    exit_live: FrozenSet[str]           # vivos al retornar
+    all_regs: FrozenSet[str]            # vivos tras un salto a destino desconocido
+    barriers: FrozenSet[str]            # llamadas/syscalls: invalidan la memoria conocida
+    move: str
+    pad: Optional[str]                  # relleno tras 'j' (MIPS: nop)
+    load: Callable[[AsmLine], Optional[Tuple[str, Tuple[str, int]]]]
+    store: Callable[[AsmLine], Optional[Tuple[Optional[str], Optional[Tuple[str, int, int]]]]]
+    fold: Callable[[AsmLine, AsmLine, Set[str]], Optional[AsmLine]]
+
+
+# ------------------------------- MIPS -------------------------------
+
+def _mips_key(arg: str) -> Optional[Tuple[str, int]]:
+    base = mips_mem_base(arg)
+    if base is None:
+        return None
+    try:
+        return base, int(arg[:arg.find("(")] or "0", 0)
+    except ValueError:
+        return None
+
+
+def _mips_load(it: AsmLine):
+    if it.op == "lw" and len(it.args) == 2:
+        k = _mips_key(it.args[1])
+        if k is not None:
+            return it.args[0], k
+    return None
+
+
+_MIPS_WIDTH = {"sw": 4, "sh": 2, "sb": 1}
+
+
+def _mips_store(it: AsmLine):
+    if it.op not in _MIPS_WIDTH:
+        return None
+    k = _mips_key(it.args[1]) if len(it.args) == 2 else None
+    if k is None:
+        return None, None
+    src = it.args[0] if it.op == "sw" else None
+    return src, (k[0], k[1], _MIPS_WIDTH[it.op])
+
+
+# op R3 -> (op inmediato, conmutativa, rango)
+_MIPS_IMM = {
+    "addu": ("addiu", True, "s"),
+    "subu": ("addiu", False, "neg"),
+    "and":  ("andi", True, "u"),
+    "or":   ("ori", True, "u"),
+    "xor":  ("xori", True, "u"),
+    "slt":  ("slti", False, "s"),
+    "sltu": ("sltiu", False, "s"),
+}
+
+
+def _imm_ok(v: int, rng: str) -> bool:
+    if rng == "u":
+        return 0 <= v <= 0xFFFF
+    return -0x8000 <= v <= 0x7FFF
+
+
+def _int(s: str) -> Optional[int]:
+    try:
+        return int(s, 0)
+    except ValueError:
+        return None
+
+
+def _mips_fold(li: AsmLine, it: AsmLine, live: Set[str]) -> Optional[AsmLine]:
+    """li R, K ; op d, x, R  ->  opi d, x, K  (R muerto después). li R, 0 ; sw R, X -> sw $zero, X."""
+    if not li.is_ins("li") or len(li.args) != 2:
+        return None
+    r, k = li.args[0], _int(li.args[1])
+    if (k == 0 and it.op in _MIPS_WIDTH and len(it.args) == 2 and it.args[0] == r
+            and mips_mem_base(it.args[1]) != r and not _is_live(r, live)):
+        return mk_ins(it.op, "$zero", it.args[1], comment=it.comment)
+    spec = _MIPS_IMM.get(it.op)
+    if k is None or spec is None or len(it.args) != 3:
+        return None
+    iop, comm, rng = spec
+    d, x, y = it.args
+    if y != r and comm and x == r:
+        x, y = y, x
+    if y != r or x == r:
+        return None
+    if _is_live(r, live) and d != r:
+        return None
+    if rng == "neg":
+        k, rng = -k, "s"
+    if not _imm_ok(k, rng):
+        return None
+    return mk_ins(iop, d, x, str(k), comment=it.comment)
+
+
+_MIPS = _ISA(
+    parse=parse_mips, render=render_mips, defs_uses=mips_defs_uses,
+    uncond=frozenset({"j", "b"}),
+    cond=frozenset(MIPS_BRANCHES - {"b"}),
+    invert=MIPS_INVERT,
+    exits=frozenset({"jr"}), ret_reg="$ra",
+    exit_live=frozenset(["$v0", "$v1", "$sp", "$fp", "$ra", "$gp"]
+                        + [f"$s{i}" for i in range(8)]),
+    all_regs=frozenset(["$at", "$v0", "$v1", "$a0", "$a1", "$a2", "$a3", "$gp", "$sp", "$fp",
+                        "$ra", "hi", "lo"]
+                       + [f"$t{i}" for i in range(10)] + [f"$s{i}" for i in range(8)]),
+    barriers=frozenset({"jal", "jalr", "syscall"}),
+    move="move", pad="nop",
+    load=_mips_load, store=_mips_store, fold=_mips_fold,
+)
+
+
+# ------------------------------- x86 --------------------------------
+
+def _x86_load(it: AsmLine):
+    if it.op == "mov" and len(it.args) == 2 and it.args[0] in ("eax", "ebx", "ecx", "edx", "esi", "edi"):
+        k = x86_mem_key(it.args[1])
+        if k is not None:
+            return it.args[0], k
+    return None
+
+
+def _x86_store(it: AsmLine):
+    if not it.args or not x86_is_mem(it.args[0]) or it.op in ("cmp", "test", "push"):
+        return None
+    k = x86_mem_key(it.args[0])
+    width = 1 if it.args[0].startswith("byte") else 2 if it.args[0].startswith("word") else 4
+    src = None
+    if it.op == "mov" and len(it.args) == 2 and x86_reg(it.args[1]) == it.args[1] and width == 4:
+        src = it.args[1]
+    if k is None:
+        return src, None
+    return src, (k[0], k[1], width)
+
+
+_X86_IMM = frozenset({"add", "sub", "and", "or", "xor", "cmp", "imul"})
+
+
+def _x86_fold(mv: AsmLine, it: AsmLine, live: Set[str]) -> Optional[AsmLine]:
+    """mov R, K ; op x, R  ->  op x, K  (R muerto después)."""
+    if not mv.is_ins("mov") or len(mv.args) != 2 or x86_reg(mv.args[0]) != mv.args[0]:
+        return None
+    r, k = mv.args[0], _int(mv.args[1])
+    if k is None or _is_live(r, live):
+        return None
+    a = it.args
+    if it.op == "push" and a == [r]:
+        return mk_ins("push", str(k), comment=it.comment)
+    if len(a) != 2 or a[1] != r or r in x86_mem_regs(a[0]):
+        return None
+    if it.op == "mov" and x86_is_mem(a[0]) and a[0].startswith("dword"):
+        return mk_ins("mov", a[0], str(k), comment=it.comment)
+    if it.op not in _X86_IMM or a[0] == r:
+        return None
+    if it.op == "imul":
+        if x86_reg(a[0]) != a[0]:
+            return None
+        return mk_ins("imul", a[0], a[0], str(k), comment=it.comment)
+    return mk_ins(it.op, a[0], str(k), comment=it.comment)
+
+
+_X86 = _ISA(
+    parse=parse_x86, render=render_x86, defs_uses=x86_defs_uses,
+    uncond=frozenset({"jmp"}),
+    cond=X86_JCC,
+    invert=X86_INVERT,
+    exits=frozenset({"ret"}), ret_reg=None,
+    # X86Naive usa ebx/ecx como scratch sin preservarlos: al retornar sólo
+    # importan el valor (eax) y el marco.
+    exit_live=frozenset({"eax", "esp", "ebp"}),
+    all_regs=frozenset({"eax", "ebx", "ecx", "edx", "esi", "edi", "ebp", "esp", "flags"}),
+    barriers=frozenset({"call"}),
+    move="mov", pad=None,
+    load=_x86_load, store=_x86_store, fold=_x86_fold,
+)
+
+
+# ---------------------------- utilidades ----------------------------
+
+def _is_live(r: str, live: Set[str]) -> bool:
+    return r in live or _ALL in live
+
+
+def _is_cti(isa: _ISA, it: AsmLine) -> bool:
+    return it.kind == "ins" and (it.op in isa.uncond or it.op in isa.cond or it.op in isa.exits)
+
+
+def _target(isa: _ISA, it: AsmLine) -> Optional[str]:
+    if it.kind == "ins" and (it.op in isa.uncond or it.op in isa.cond) and it.args:
+        return it.args[-1]
+    return None
+
+
+def _next_ins(items: List[AsmLine], i: int) -> Optional[int]:
+    """Siguiente instrucción a partir de i (saltando etiquetas, comentarios, directivas)."""
+    while i < len(items):
+        if items[i].kind == "ins":
+            return i
+        i += 1
+    return None
+
+
+def _label_index(items: List[AsmLine]) -> Dict[str, int]:
+    return {it.op: i for i, it in enumerate(items) if it.kind == "label"}
+
+
+def _labels_before(items: List[AsmLine], i: int) -> Set[str]:
+    """Etiquetas que caen justo antes de items[i] (sin instrucciones en medio)."""
+    names: Set[str] = set()
+    k = i - 1
+    while k >= 0 and items[k].kind in ("label", "comment", "blank"):
+        if items[k].kind == "label":
+            names.add(items[k].op)
+        k -= 1
+    return names
+
+
+def _liveness(isa: _ISA, items: List[AsmLine]) -> Dict[int, Set[str]]:
+    """Live-out por índice de instrucción (análisis hacia atrás sobre todo el .text)."""
+    labels = _label_index(items)
+    idx = [i for i, it in enumerate(items) if it.kind == "ins"]
+    succ: Dict[int, List[int]] = {}
+    unknown: Set[int] = set()
+    rets: Set[int] = set()
+    for i in idx:
+        it = items[i]
+        s: List[int] = []
+        if it.op in isa.exits:
+            if isa.ret_reg is None or it.args == [isa.ret_reg]:
+                rets.add(i)
+            else:
+                unknown.add(i)
+            succ[i] = s
+            continue
+        tgt = _target(isa, it)
+        if tgt is not None:
+            p = labels.get(tgt)
+            q = _next_ins(items, p) if p is not None else None
+            if q is None:
+                unknown.add(i)
+            else:
+                s.append(q)
+        if it.op not in isa.uncond:
+            q = _next_ins(items, i + 1)
+            if q is not None:
+                s.append(q)
+        succ[i] = s
+
+    du = {i: isa.defs_uses(items[i]) for i in idx}
+    live_in: Dict[int, Set[str]] = {i: set() for i in idx}
+    live_out: Dict[int, Set[str]] = {i: set() for i in idx}
+    changed = True
+    while changed:
+        changed = False
+        for i in reversed(idx):
+            if i in rets:
+                out = set(isa.exit_live)
+            elif i in unknown:
+                out = set(isa.all_regs)
+            else:
+                out = set()
+            for s in succ[i]:
+                out |= live_in[s]
+            d, u = du[i]
+            inn = u | (out - d)
+            if out != live_out[i] or inn != live_in[i]:
+                live_out[i], live_in[i] = out, inn
+                changed = True
+    return live_out
+
+
+# ------------------------------ reglas ------------------------------
+
+def _rule_forward(isa: _ISA, items: List[AsmLine]) -> Tuple[List[AsmLine], int]:
+    """
+    Recuerda qué registro contiene el valor de cada slot de memoria dentro del
+    bloque básico: un 'load' repetido se borra y uno desde otro registro pasa a move.
+    """
+    facts: Dict[str, Tuple[str, int]] = {}   # reg -> (base, off)
+    out: List[AsmLine] = []
+    n = 0
+
+    def kill_regs(regs: Set[str]):
+        for r in list(facts):
+            if r in regs or facts[r][0] in regs:
+                del facts[r]
+
+    for it in items:
+        if it.kind in ("label", "directive"):
+            facts.clear()
+            out.append(it)
+            continue
+        if it.kind != "ins":
+            out.append(it)
+            continue
+
+        ld = isa.load(it)
+        if ld is not None:
+            r, key = ld
+            holder = None
+            for h, k in facts.items():
+                if k == key:
+                    holder = h
+                    if h == r:
+                        break
+            if holder == r:
+                n += 1
+                continue
+            if holder is not None:
+                it = mk_ins(isa.move, r, holder, comment=it.comment)
+                n += 1
+            kill_regs({r})
+            if key[0] != r:
+                facts[r] = key
+            out.append(it)
+            continue
+
+        st = isa.store(it)
+        if st is not None:
+            src, mem = st
+            if mem is None:
+                facts.clear()
+            else:
+                b, o, w = mem
+                for r in list(facts):
+                    fb, fo = facts[r]
+                    if fb != b or (fo < o + w and o < fo + 4):
+                        del facts[r]
+                if src is not None and src != b and w == 4:
+                    facts[src] = (b, o)
+            out.append(it)
+            continue
+
+        d, _ = isa.defs_uses(it)
+        kill_regs(d)
+        if it.op in isa.barriers or _is_cti(isa, it):
+            facts.clear()
+        out.append(it)
+    return out, n
+
+
+def _rule_moves(isa: _ISA, items: List[AsmLine]) -> Tuple[List[AsmLine], int]:
+    """move r, r  /  move a, b ; move b, a."""
+    out: List[AsmLine] = []
+    prev: Optional[AsmLine] = None
+    n = 0
+    for it in items:
+        if it.is_ins(isa.move) and len(it.args) == 2:
+            a, b = it.args
+            if a == b:
+                n += 1
+                continue
+            if prev is not None and prev.args == [b, a]:
+                n += 1
+                continue
+            prev = it
+        elif it.kind in ("ins", "label"):
+            prev = None
+        out.append(it)
+    return out, n
+
+
+def _rule_jumps(isa: _ISA, items: List[AsmLine]) -> Tuple[List[AsmLine], int]:
+    """Salto a salto, salto a la siguiente instrucción y b<c> L1 ; j L2 ; L1:."""
+    labels = _label_index(items)
+    n = 0
+
+    def final_target(lab: str) -> str:
+        seen = {lab}
+        while True:
+            p = labels.get(lab)
+            q = _next_ins(items, p) if p is not None else None
+            if q is None or items[q].op not in isa.uncond:
+                return lab
+            nxt = items[q].args[-1]
+            if nxt in seen:
+                return lab
+            seen.add(nxt)
+            lab = nxt
+
+    for it in items:
+        tgt = _target(isa, it)
+        if tgt is None:
+            continue
+        ft = final_target(tgt)
+        if ft != tgt:
+            it.args[-1] = ft
+            it.touch()
+            n += 1
+
+    def pad_len(i: int) -> int:
+        """Índice tras el salto incondicional en i (y su relleno)."""
+        j = i + 1
+        if isa.pad and j < len(items) and items[j].is_ins(isa.pad):
+            j += 1
+        return j
+
+    out: List[AsmLine] = []
+    i = 0
+    while i < len(items):
+        it = items[i]
+        if it.kind == "ins" and it.op in isa.cond:
+            q = _next_ins(items, i + 1)
+            if (q is not None and items[q].op in isa.uncond and it.op in isa.invert
+                    and _labels_before(items, q) == set()):
+                j = pad_len(q)
+                if it.args[-1] in _labels_before(items, _next_ins(items, j) or len(items)) \
+                        and all(items[k].kind != "label" for k in range(i + 1, j)):
+                    inv = mk_ins(isa.invert[it.op], *it.args[:-1], items[q].args[-1], comment=it.comment)
+                    out.append(inv)
+                    n += 1
+                    i = j
+                    continue
+            nxt = _next_ins(items, i + 1)
+            if it.args[-1] in _labels_before(items, nxt if nxt is not None else len(items)):
+                n += 1
+                i += 1
+                continue
+        if it.kind == "ins" and it.op in isa.uncond:
+            j = pad_len(i)
+            nxt = _next_ins(items, j)
+            if it.args[-1] in _labels_before(items, nxt if nxt is not None else len(items)) \
+                    and all(items[k].kind != "label" for k in range(i + 1, j)):
+                n += 1
+                i = j
+                continue
+        out.append(it)
+        i += 1
+    return out, n
+
+
+def _rule_fold(isa: _ISA, items: List[AsmLine]) -> Tuple[List[AsmLine], int]:
+    """Constante en registro + operación -> forma inmediata."""
+    live = _liveness(isa, items)
+    out: List[AsmLine] = []
+    n = 0
+    i = 0
+    while i < len(items):
+        it = items[i]
+        if it.kind == "ins":
+            j = i + 1
+            while j < len(items) and items[j].kind in ("comment", "blank"):
+                j += 1
+            if j < len(items) and items[j].kind == "ins":
+                new = isa.fold(it, items[j], live.get(j, {_ALL}))
+                if new is not None:
+                    out.extend(items[i + 1:j])
+                    out.append(new)
+                    n += 1
+                    i = j + 1
+                    continue
+        out.append(it)
+        i += 1
+    return out, n
+
+
+# (nombre, regla): se aplican en orden hasta que ninguna cambie nada
+_RULES = (
+    ("forwarded", _rule_forward),
+    ("moves", _rule_moves),
+    ("jumps", _rule_jumps),
+    ("imm_folded", _rule_fold),
+)
+
+
+def _count_ins(items: List[AsmLine]) -> int:
+    return sum(1 for it in items if it.kind == "ins")
+
+
+def _run(isa: _ISA, lines: List[str]) -> Tuple[List[str], Dict[str, int]]:
+    items = isa.parse(lines)
+    stats = {name: 0 for name, _ in _RULES}
+    stats["ins_in"] = _count_ins(items)
+    for _ in range(_MAX_ROUNDS):
+        changed = 0
+        for name, rule in _RULES:
+            items, k = rule(isa, items)
+            stats[name] += k
+            changed += k
+        if changed == 0:
+            break
+    stats["ins_out"] = _count_ins(items)
+    stats["removed"] = stats["ins_in"] - stats["ins_out"]
+    return isa.render(items), stats
+
+
+def peephole_mips(lines: List[str]) -> Tuple[List[str], Dict[str, int]]:
+    """Peephole sobre ASM MIPS con semántica secuencial. Devuelve (líneas, estadísticas)."""
+    return _run(_MIPS, lines)
+
+
+def peephole_x86(lines: List[str]) -> Tuple[List[str], Dict[str, int]]:
+    """Peephole sobre ASM x86 (NASM). Devuelve (líneas, estadísticas)."""
+    return _run(_X86, lines)
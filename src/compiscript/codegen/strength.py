@@ -0,0 +1,205 @@
+# src/compiscript/codegen/strength.py
+from __future__ import annotations
+from typing import List, Optional, Tuple
+
+from compiscript.ir.tac import Operand, ConstInt, ConstStr, BinOp
+
+# -------------------------------------------------------------------
+# Reducción de fuerza para '*', '/', '%' con divisor/factor constante.
+# Semántica: enteros de 32 bits con signo, división truncada (como
+# 'div' de MIPS e 'idiv' de x86).
+#
+# Un plan es una lista de pasos sobre tres registros simbólicos:
+#   'x' (operando), 't' (temporal) y 'r' (resultado)
+#   ("li", d, k)        d = k
+#   ("mov", d, a)       d = a
+#   ("sll"|"sra"|"srl", d, a, k)
+#   ("add"|"sub", d, a, b)
+#   ("and", d, a, k)    d = a & k
+#   ("neg", d, a)
+#   ("mulhi", d, a, M)  d = (a * M) >> 32   (con signo)
+#   ("mul", d, a, k)    d = a * k           (32 bits bajos)
+# Cada backend traduce los pasos 1:1 a su ISA.
+# -------------------------------------------------------------------
+
+Plan = List[Tuple]
+
+MAX_MUL_STEPS = 4
+
+
+def _s32(v: int) -> int:
+    v &= 0xFFFFFFFF
+    return v - (1 << 32) if v & 0x80000000 else v
+
+
+def _log2(v: int) -> Optional[int]:
+    if v > 0 and v & (v - 1) == 0:
+        return v.bit_length() - 1
+    return None
+
+
+def mul_plan(c: int) -> Optional[Plan]:
+    """x * c con shifts y sumas; None si no sale más barato que 'mul'."""
+    if c == 0:
+        return [("li", "r", 0)]
+    if c == 1:
+        return [("mov", "r", "x")]
+    if c == -1:
+        return [("neg", "r", "x")]
+    n = abs(c)
+    plan: Optional[Plan] = None
+    k = _log2(n)
+    if k is not None:
+        plan = [("sll", "r", "x", k)]
+    else:
+        # n = 2^a + 2^b  ó  n = 2^a - 2^b  (b < a)
+        for a in range(1, 32):
+            for rest, op in ((n - (1 << a), "add"), ((1 << a) - n, "sub")):
+                b = _log2(rest) if rest > 0 else None
+                if b is None or b >= a:
+                    continue
+                low = ("sll", "r", "x", b) if b > 0 else ("mov", "r", "x")
+                plan = [("sll", "t", "x", a), low, (op, "r", "t", "r")]
+                break
+            if plan is not None:
+                break
+    if plan is None:
+        return None
+    if c < 0:
+        plan.append(("neg", "r", "r"))
+    return plan if len(plan) <= MAX_MUL_STEPS else None
+
+
+def magic_signed(d: int) -> Tuple[int, int]:
+    """Número mágico (M, s) para división con signo entre d (Hacker's Delight, 10-1)."""
+    two31 = 1 << 31
+    ad = abs(d)
+    t = two31 + ((d & 0xFFFFFFFF) >> 31)
+    anc = t - 1 - t % ad
+    p = 31
+    q1, r1 = divmod(two31, anc)
+    q2, r2 = divmod(two31, ad)
+    while True:
+        p += 1
+        q1, r1 = 2 * q1, 2 * r1
+        if r1 >= anc:
+            q1, r1 = q1 + 1, r1 - anc
+        q2, r2 = 2 * q2, 2 * r2
+        if r2 >= ad:
+            q2, r2 = q2 + 1, r2 - ad
+        delta = ad - r2
+        if not (q1 < delta or (q1 == delta and r1 == 0)):
+            break
+    m = (q2 + 1) & 0xFFFFFFFF
+    if d < 0:
+        m = (-m) & 0xFFFFFFFF
+    return _s32(m), p - 32
+
+
+def _div_pow2(k: int, neg: bool) -> Plan:
+    plan: Plan = [
+        ("sra", "t", "x", 31),
+        ("srl", "t", "t", 32 - k),      # sesgo: 2^k-1 si x < 0
+        ("add", "t", "x", "t"),
+        ("sra", "r", "t", k),
+    ]
+    if neg:
+        plan.append(("neg", "r", "r"))
+    return plan
+
+
+def div_plan(d: int) -> Optional[Plan]:
+    """x / d (truncada) sin 'div'; None si d no aplica (0 o -2^31)."""
+    if d == 0 or d == -(1 << 31) or not (-(1 << 31) < d < (1 << 31)):
+        return None
+    if d == 1:
+        return [("mov", "r", "x")]
+    if d == -1:
+        return [("neg", "r", "x")]
+    k = _log2(abs(d))
+    if k is not None:
+        return _div_pow2(k, d < 0)
+    m, s = magic_signed(d)
+    plan: Plan = [("mulhi", "r", "x", m)]
+    if d > 0 and m < 0:
+        plan.append(("add", "r", "r", "x"))
+    if d < 0 and m > 0:
+        plan.append(("sub", "r", "r", "x"))
+    if s > 0:
+        plan.append(("sra", "r", "r", s))
+    plan.append(("srl", "t", "r", 31))  # +1 si el cociente es negativo
+    plan.append(("add", "r", "r", "t"))
+    return plan
+
+
+def mod_plan(d: int) -> Optional[Plan]:
+    """x % d (signo del dividendo, como 'div'+'mfhi')."""
+    if d == 0 or d == -(1 << 31) or not (-(1 << 31) < d < (1 << 31)):
+        return None
+    if d in (1, -1):
+        return [("li", "r", 0)]
+    k = _log2(abs(d))
+    if k is not None:
+        return [
+            ("sra", "t", "x", 31),
+            ("srl", "t", "t", 32 - k),
+            ("add", "r", "x", "t"),
+            ("and", "r", "r", (1 << k) - 1),
+            ("sub", "r", "r", "t"),
+        ]
+    q = div_plan(d)
+    if q is None:
+        return None
+    return q + [("mul", "t", "r", d), ("sub", "r", "x", "t")]
+
+
+def plan_for(op: str, c: int) -> Optional[Plan]:
+    if op == "*":
+        return mul_plan(c)
+    if op == "/":
+        return div_plan(c)
+    if op == "%":
+        return mod_plan(c)
+    return None
+
+
+def strength_plan(ins: BinOp) -> Tuple[Optional[Plan], Optional[Operand]]:
+    """Plan para un BinOp con factor/divisor constante y su operando 'x'; (None, None) si no aplica."""
+    x, c = ins.a, ins.b
+    if ins.op == "*" and isinstance(x, ConstInt) and not isinstance(c, ConstInt):
+        x, c = c, x
+    if not isinstance(c, ConstInt) or isinstance(x, ConstStr):
+        return None, None
+    return plan_for(ins.op, c.value), x
+
+
+def run_plan(plan: Plan, x: int) -> int:
+    """Ejecuta un plan con aritmética de 32 bits (referencia para pruebas)."""
+    regs = {"x": _s32(x), "t": 0, "r": 0}
+    for st in plan:
+        op = st[0]
+        if op == "li":
+            regs[st[1]] = _s32(st[2])
+        elif op == "mov":
+            regs[st[1]] = regs[st[2]]
+        elif op == "sll":
+            regs[st[1]] = _s32(regs[st[2]] << st[3])
+        elif op == "sra":
+            regs[st[1]] = regs[st[2]] >> st[3]
+        elif op == "srl":
+            regs[st[1]] = _s32((regs[st[2]] & 0xFFFFFFFF) >> st[3])
+        elif op == "add":
+            regs[st[1]] = _s32(regs[st[2]] + regs[st[3]])
+        elif op == "sub":
+            regs[st[1]] = _s32(regs[st[2]] - regs[st[3]])
+        elif op == "and":
+            regs[st[1]] = _s32(regs[st[2]] & st[3])
+        elif op == "neg":
+            regs[st[1]] = _s32(-regs[st[2]])
+        elif op == "mulhi":
+            regs[st[1]] = _s32((regs[st[2]] * st[3]) >> 32)
+        elif op == "mul":
+            regs[st[1]] = _s32(regs[st[2]] * st[3])
+        else:
+            raise RuntimeError(f"Paso desconocido: {op}")
+    return regs["r"]
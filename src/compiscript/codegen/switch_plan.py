@@ -0,0 +1,56 @@
+# src/compiscript/codegen/switch_plan.py
+from __future__ import annotations
+from typing import Callable, List, Optional, Tuple
+
+# -------------------------------------------------------------------
+# Estrategia de despacho para SwitchJump (común a MIPS y x86):
+#   - tabla de saltos si los valores son densos  -> O(1)
+#   - árbol de búsqueda binaria si son dispersos -> O(log n)
+# -------------------------------------------------------------------
+
+TABLE_MIN_CASES = 4     # con menos casos, comparar es igual de rápido
+TABLE_MAX_SPAN = 4096   # tamaño máximo de tabla (entradas)
+TABLE_MIN_DENSITY = 3   # span <= 3 * casos  (≥ 1/3 de la tabla ocupada)
+LEAF_CASES = 3          # hojas del árbol: comparación lineal
+
+
+def jump_table(cases: List[Tuple[int, str]], default: str) -> Optional[Tuple[int, List[str]]]:
+    """(valor mínimo, etiquetas por posición) si conviene tabla; si no, None."""
+    if len(cases) < TABLE_MIN_CASES:
+        return None
+    lo, hi = cases[0][0], cases[-1][0]
+    span = hi - lo + 1
+    if span > TABLE_MAX_SPAN or span > TABLE_MIN_DENSITY * len(cases):
+        return None
+    slots = [default] * span
+    for k, lab in cases:
+        slots[k - lo] = lab
+    return lo, slots
+
+
+def search_tree(cases: List[Tuple[int, str]], default: str,
+                new_label: Callable[[], str]) -> List[Tuple]:
+    """
+    Árbol de búsqueda linealizado en pasos que cada backend traduce 1:1:
+      ("eq", k, L)   si v == k goto L
+      ("lt", k, L)   si v <  k goto L
+      ("goto", L)
+      ("label", L)
+    """
+    steps: List[Tuple] = []
+
+    def emit(lo: int, hi: int):
+        if hi - lo <= LEAF_CASES:
+            for k, lab in cases[lo:hi]:
+                steps.append(("eq", k, lab))
+            steps.append(("goto", default))
+            return
+        mid = (lo + hi) // 2
+        L_left = new_label()
+        steps.append(("lt", cases[mid][0], L_left))
+        emit(mid, hi)
+        steps.append(("label", L_left))
+        emit(lo, mid)
+
+    emit(0, len(cases))
+    return steps
@@ -1,12 +1,17 @@
 from __future__ import annotations
-from typing import Dict, List
+import copy
+from typing import Dict, List, Optional, Tuple
 
 from compiscript.codegen.frame import Frame
+from compiscript.codegen.peephole import peephole_x86
+from compiscript.codegen.switch_plan import jump_table, search_tree
+from compiscript.codegen.strength import strength_plan
+from compiscript.codegen.isel import LoadIK, StoreIK, imm_binop, select_trees
 from compiscript.ir.tac import (
     IRProgram, IRFunction, Instr, Operand,
     Label, Jump, CJump, Move, BinOp, UnaryOp, Cmp, Call, Return,
     Temp, Local, Param, ConstInt, ConstStr,
-    Load, Store, LoadI, StoreI
+    Load, Store, LoadI, StoreI, CheckIndex, SwitchJump, Throw, Catch, vtable_label
 )
 
 # Mapeo de cond a jcc
@@ -26,17 +31,53 @@ class X86Naive:
       - retorno en EAX
       - caller limpia el stack de argumentos
     Emite 'printf' para print enteros/strings.
+    Excepciones: __eh_table (inicio, fin, manejador) como en MIPS; el
+    runtime externo __throw busca ret-1 de cada frame (cadena de ebp).
+    CheckIndex: cmp/jae no tomado hacia un stub al final de la función.
+    imm_select=False apaga la selección de isel.py (árboles e inmediatos).
     """
-    def __init__(self):
+    def __init__(self, peephole: bool = True, imm_select: bool = True):
         self.lines: List[str] = []
         # mapeo de temporales a slots de stack (como locales)
         self.temp_slots: Dict[str, int] = {}
+        self.peephole = peephole
+        self.imm_select = imm_select
+        self.peephole_stats: Dict[str, int] = {}
+        # tablas de saltos de los switch: (etiqueta, destinos)
+        self.jump_tables: List[Tuple[str, List[str]]] = []
+        self._sw_count = 0
+        self._uid_count = 0
+        # id de clase (argumento de __new) -> clase, en orden de prog.vtables
+        self.vtable_classes: List[str] = []
+        # rangos de excepción (inicio, fin, manejador), ver MIPSNaive
+        self.eh_ranges: List[Tuple[str, str, str]] = []
+        self._eh_open: Optional[str] = None
+        self._lsize = 0
+        self.uses_eh = False
+        # stubs de CheckIndex de la función en curso: (etiqueta, mensaje, manejador)
+        self.oob_stubs: List[Tuple[str, str, Optional[str]]] = []
+
+    def _uid(self) -> int:
+        """Sufijo para etiquetas locales; determinista por compilación."""
+        self._uid_count += 1
+        return self._uid_count
 
     def compile(self, prog: IRProgram) -> str:
         self.lines = []
+        self.jump_tables = []
+        self._sw_count = 0
+        self._uid_count = 0
+        self.vtable_classes = list(prog.vtables)
+        self.eh_ranges = []
+        self.uses_eh = any(isinstance(i, (Throw, CheckIndex))
+                           for fn in prog.functions.values() for i in fn.body)
         self._emit_header()
         self._emit_data(prog)
         self._emit_text(prog)
+        self._emit_jump_tables()
+        self._emit_eh_table()
+        if self.peephole:
+            self.lines, self.peephole_stats = peephole_x86(self.lines)
         return "\n".join(self.lines)
 
     # ---------------- secciones ----------------
@@ -44,16 +85,28 @@ class X86Naive:
         self.lines.append("; Compiscript x86 (NASM, Intel syntax)")
         self.lines.append("extern printf")
         self.lines.append("extern malloc")
+        self.lines.append("extern free")
+        self.lines.append("extern __str_free")
         self.lines.append("extern __concat")
+        self.lines.append("extern __push")
+        self.lines.append("extern __throw")
         self.lines.append("section .data")
 
     def _emit_data(self, prog: IRProgram):
         # formatos para print
         self.lines.append("fmt_int db \"%d\", 10, 0")
         self.lines.append("fmt_str db \"%s\", 10, 0")
-        # strings del programa
+        self.lines.append("fmt_int_raw db \"%d\", 0")
+        self.lines.append("fmt_str_raw db \"%s\", 0")
+        # strings del programa (longitud en la palabra anterior, como en MIPS)
         for lab, b in prog.strings.items():
+            self.lines.append("align 4")
+            self.lines.append(f"    dd {len(b) - 1 if b and b[-1] == 0 else len(b)}")
             self.lines.append(f"{lab} db " + ", ".join(str(x) for x in b))
+        # vtables: direcciones de los métodos por slot
+        for cls, slots in prog.vtables.items():
+            self.lines.append("align 4")
+            self.lines.append(f"{vtable_label(cls)} dd {', '.join(slots) or '0'}")
         self.lines.append("section .text")
         # exportar main si existe
         if prog.entry:
@@ -113,11 +166,13 @@ class X86Naive:
     # ---------------- función ----------------
     def _emit_function(self, fn: IRFunction, is_entry: bool):
         self.temp_slots.clear()
-        frame = fn.frame or Frame(fn.name, fn.params)
+        # copia: los slots de temps no deben filtrarse al IR ni a otro backend
+        frame = copy.deepcopy(fn.frame) if fn.frame else Frame(fn.name, fn.params)
 
         # Primera pasada: asignar slots a todos los Temp que aparezcan
         for ins in fn.body:
-            if isinstance(ins, (Move, BinOp, UnaryOp, Cmp, Call, Return, CJump, Load, Store)):
+            if isinstance(ins, (Move, BinOp, UnaryOp, Cmp, Call, Return, CJump, Load, Store, SwitchJump,
+                                Throw, Catch)):
                 ops = []
                 if isinstance(ins, Move):      ops = [ins.dst, ins.src]
                 if isinstance(ins, BinOp):     ops = [ins.dst, ins.a, ins.b]
@@ -130,10 +185,16 @@ class X86Naive:
                     if ins.value is not None: ops.append(ins.value)
                 if isinstance(ins, CJump):
                     ops = [ins.a, ins.b]
+                if isinstance(ins, SwitchJump):
+                    ops = [ins.value]
                 if isinstance(ins, Load):
                     ops = [ins.dst, ins.base]
                 if isinstance(ins, Store):
                     ops = [ins.base, ins.src]
+                if isinstance(ins, Throw):
+                    ops = [ins.value]
+                if isinstance(ins, Catch):
+                    ops = [ins.dst]
                 for o in ops:
                     if isinstance(o, Temp):
                         self._mem_operand(frame, o)  # fuerza asignación
@@ -142,13 +203,18 @@ class X86Naive:
         self._lbl(fn.name)
         self._w("    push ebp")
         self._w("    mov ebp, esp")
-        lsize = frame.local_size()
+        lsize = self._lsize = frame.local_size()
         if lsize > 0:
             self._w(f"    sub esp, {lsize}")
 
-        # cuerpo
-        for ins in fn.body:
+        # cuerpo (cada bloque abre/cierra su rango de excepción)
+        body = select_trees(fn) if self.imm_select else fn.body
+        for ins in body:
+            if self.uses_eh and isinstance(ins, Label):
+                self._eh_range(fn.handlers.get(ins.name))
             self._emit_instr(frame, ins)
+        if self.uses_eh:
+            self._eh_range(None)
 
         # Epílogo solo si el último ins (no etiqueta) NO es Return
         last = None
@@ -158,6 +224,17 @@ class X86Naive:
                 break
         if not isinstance(last, Return):
             self._emit_epilogue(frame)
+        self._emit_oob_stubs()
+
+    def _emit_oob_stubs(self):
+        for lab, msg, pad in self.oob_stubs:
+            self._eh_range(pad)
+            self._lbl(lab)
+            self._w(f"    push {msg}")
+            self._w("    call __throw")
+        if self.oob_stubs:
+            self._eh_range(None)
+        self.oob_stubs = []
 
     def _emit_epilogue(self, frame: Frame, ensure: bool = False):
         # epílogo estándar
@@ -165,6 +242,118 @@ class X86Naive:
         self._w("    pop ebp")
         self._w("    ret")
 
+    @staticmethod
+    def _disp(ins: Instr) -> str:
+        """Desplazamiento de LoadIK/StoreIK en el direccionamiento ('' si no hay)."""
+        k = getattr(ins, "disp", 0) * 4
+        return f"+{k}" if k > 0 else f"-{-k}" if k < 0 else ""
+
+    # ---------------- strength reduction ----------------
+    # registros de los planes de strength.py (r = eax para el store final)
+    _PLAN_REG = {"x": "ecx", "t": "ebx", "r": "eax"}
+    _PLAN_OP = {"sll": "shl", "sra": "sar", "srl": "shr"}
+
+    def _emit_plan(self, plan):
+        R = self._PLAN_REG
+        for st in plan:
+            op, d = st[0], R[st[1]]
+            if op == "li":
+                self._w(f"    mov {d}, {st[2]}")
+            elif op == "mov":
+                self._w(f"    mov {d}, {R[st[2]]}")
+            elif op in ("sll", "sra", "srl", "and", "neg"):
+                a = R[st[2]]
+                if a != d:
+                    self._w(f"    mov {d}, {a}")
+                if op == "neg":
+                    self._w(f"    neg {d}")
+                elif op == "and":
+                    self._w(f"    and {d}, {st[3]}")
+                else:
+                    self._w(f"    {self._PLAN_OP[op]} {d}, {st[3]}")
+            elif op in ("add", "sub"):
+                a, b = R[st[2]], R[st[3]]
+                if d == a:
+                    self._w(f"    {op} {d}, {b}")
+                elif d == b and op == "add":
+                    self._w(f"    add {d}, {a}")
+                elif d == b:
+                    self._w(f"    neg {d}")
+                    self._w(f"    add {d}, {a}")
+                else:
+                    self._w(f"    mov {d}, {a}")
+                    self._w(f"    {op} {d}, {b}")
+            elif op == "mulhi":
+                # edx:eax = eax * a  (a != eax/edx)
+                self._w(f"    mov eax, {st[3]}")
+                self._w(f"    imul {R[st[2]]}")
+                self._w(f"    mov {d}, edx")
+            elif op == "mul":
+                self._w(f"    imul {d}, {R[st[2]]}, {st[3]}")
+            else:
+                raise RuntimeError(f"Paso de plan desconocido: {op}")
+
+    # ---------------- switch ----------------
+    def _emit_switch(self, frame: Frame, ins: SwitchJump):
+        n = self._sw_count
+        self._sw_count += 1
+        self._load_eax(frame, ins.value)
+        plan = jump_table(ins.cases, ins.default)
+        if plan is not None:
+            lo, slots = plan
+            tab = f"swtab_{n}"
+            if lo != 0:
+                self._w(f"    sub eax, {lo}")
+            # sin signo: negativos y > span caen al default
+            self._w(f"    cmp eax, {len(slots)}")
+            self._w(f"    jae {ins.default}")
+            self._w(f"    jmp [{tab} + eax*4]")
+            self.jump_tables.append((tab, slots))
+            return
+
+        cnt = [0]
+        def new_label() -> str:
+            cnt[0] += 1
+            return f"sw{n}_{cnt[0]}"
+        for st in search_tree(ins.cases, ins.default, new_label):
+            if st[0] == "eq":
+                self._w(f"    cmp eax, {st[1]}")
+                self._w(f"    je {st[2]}")
+            elif st[0] == "lt":
+                self._w(f"    cmp eax, {st[1]}")
+                self._w(f"    jl {st[2]}")
+            elif st[0] == "goto":
+                self._w(f"    jmp {st[1]}")
+            else:
+                self._lbl(st[1])
+
+    def _emit_jump_tables(self):
+        if not self.jump_tables:
+            return
+        self._w("section .data")
+        for tab, slots in self.jump_tables:
+            self._w(f"{tab} dd {', '.join(slots)}")
+
+    def _eh_range(self, pad: Optional[str]):
+        """Pasa al manejador pad: cierra el rango abierto y abre otro si hay pad."""
+        if pad == self._eh_open:
+            return
+        if self._eh_open is not None:
+            k = len(self.eh_ranges)
+            self._lbl(f"__eh{k}_e")
+            self.eh_ranges.append((f"__eh{k}_b", f"__eh{k}_e", self._eh_open))
+        if pad is not None:
+            self._lbl(f"__eh{len(self.eh_ranges)}_b")
+        self._eh_open = pad
+
+    def _emit_eh_table(self):
+        if not self.uses_eh:
+            return
+        self._w("section .data")
+        self._w("global __eh_table")
+        words = [w for r in self.eh_ranges for w in r] + ["0"]
+        self._w(f"__eh_table dd {', '.join(words)}")
+
     # ---------------- instrucciones ----------------
     def _emit_instr(self, frame: Frame, ins: Instr):
         if isinstance(ins, Label):
@@ -187,12 +376,36 @@ class X86Naive:
             self._w(f"    {jcc} {ins.if_true}")
             self._w(f"    jmp {ins.if_false}")
             return
+        if isinstance(ins, SwitchJump):
+            self._emit_switch(frame, ins)
+            return
         if isinstance(ins, Move):
             # dst = src
             self._load_eax(frame, ins.src)
             self._store_from_eax(frame, ins.dst)
             return
         if isinstance(ins, BinOp):
+            # '*', '/', '%' con constante: shifts/sumas o número mágico
+            plan, x = strength_plan(ins)
+            if plan is not None:
+                self._load_eax(frame, x)
+                self._w("    mov ecx, eax")
+                self._emit_plan(plan)
+                self._store_from_eax(frame, ins.dst)
+                return
+            # x op K: forma inmediata (add/sub/imul reg, imm)
+            m = imm_binop(ins) if self.imm_select else None
+            if m is not None:
+                kind, x, k = m
+                self._load_eax(frame, x)
+                if kind == "mul":
+                    self._w(f"    imul eax, eax, {k}")
+                elif ins.op == "-":
+                    self._w(f"    sub eax, {-k}")
+                else:
+                    self._w(f"    add eax, {k}")
+                self._store_from_eax(frame, ins.dst)
+                return
             # dst = a op b
             self._load_eax(frame, ins.a)
             if ins.op in ("+","-","*"):
@@ -239,8 +452,9 @@ class X86Naive:
             jcc = _JCC.get(ins.op)
             if not jcc:
                 raise RuntimeError(f"Cmp op desconocido: {ins.op}")
-            L_true = f"cmp_true_{id(ins)}"
-            L_end  = f"cmp_end_{id(ins)}"
+            u = self._uid()
+            L_true = f"cmp_true_{u}"
+            L_end  = f"cmp_end_{u}"
             self._w(f"    {jcc} {L_true}")
             # false -> 0
             self._w("    mov eax, 0")
@@ -268,44 +482,36 @@ class X86Naive:
                 self._load_ebx(frame, ins.src)
                 self._w(f"    mov dword [eax+{ins.offset}], ebx")
             return
-        if isinstance(ins, LoadI):
-            # eax = base; ebx = index
+        if isinstance(ins, (LoadI, LoadIK)):
+            # eax = datos del arreglo; ebx = index
+            disp = self._disp(ins)
             self._load_eax(frame, ins.base)
-            # index a EBX
+            self._w("    mov eax, dword [eax+8]")
             if isinstance(ins.index, ConstInt):
-                # [eax + 4 + idx*4]
-                byte_off = 4 + ins.index.value * 4
-                self._w(f"    mov ebx, dword [eax+{byte_off}]")
+                self._w(f"    mov ebx, dword [eax+{ins.index.value * 4}]")
             else:
                 self._load_ebx(frame, ins.index)
-                self._w("    mov ecx, dword [eax + ebx*4 + 4]")
-                self._w("    mov ebx, ecx")
+                self._w(f"    mov ebx, dword [eax + ebx*4{disp}]")
             self._w(f"    mov dword {self._mem_operand(frame, ins.dst)}, ebx")
             return
 
-        if isinstance(ins, StoreI):
-            # eax = base; escribir src en [eax + 4 + idx*4]
+        if isinstance(ins, (StoreI, StoreIK)):
+            # eax = datos; escribir src en [eax + idx*4]
+            disp = self._disp(ins)
             self._load_eax(frame, ins.base)
+            self._w("    mov eax, dword [eax+8]")
+            if isinstance(ins.src, ConstInt):
+                src = str(ins.src.value)
+            elif isinstance(ins.src, ConstStr):
+                src = ins.src.label
+            else:
+                self._w(f"    mov ecx, dword {self._mem_operand(frame, ins.src)}")
+                src = "ecx"
             if isinstance(ins.index, ConstInt):
-                byte_off = 4 + ins.index.value * 4
-                if isinstance(ins.src, ConstInt):
-                    self._w(f"    mov dword [eax+{byte_off}], {ins.src.value}")
-                elif isinstance(ins.src, ConstStr):
-                    self._w(f"    mov dword [eax+{byte_off}], {ins.src.label}")
-                else:
-                    self._load_ebx(frame, ins.src)
-                    self._w(f"    mov dword [eax+{byte_off}], ebx")
+                self._w(f"    mov dword [eax+{ins.index.value * 4}], {src}")
             else:
                 self._load_ebx(frame, ins.index)
-                if isinstance(ins.src, ConstInt):
-                    self._w(f"    mov ecx, {ins.src.value}")
-                elif isinstance(ins.src, ConstStr):
-                    self._w(f"    mov ecx, {ins.src.label}")
-                else:
-                    self._load_ebx(frame, ins.src)   # src -> ebx
-                    self._w("    mov ecx, ebx")
-                # [eax + ebx*4 + 4] = ecx
-                self._w("    mov dword [eax + ebx*4 + 4], ecx")
+                self._w(f"    mov dword [eax + ebx*4{disp}], {src}")
             return
         if isinstance(ins, Call):
             # caso especial: print
@@ -334,8 +540,39 @@ class X86Naive:
                     self._store_from_eax(frame, ins.dst)
                 return
 
+            # printInteger / printString (sin '\n', devuelven su argumento)
+            # y __print_str (string no literal + '\n')
+            fmt = {"printInteger": "fmt_int_raw", "printString": "fmt_str_raw",
+                   "__print_str": "fmt_str"}.get(ins.func)
+            if fmt is not None and len(ins.args) == 1:
+                self._load_eax(frame, ins.args[0])
+                self._w("    push eax")
+                self._w(f"    push {fmt}")
+                self._w("    call printf")
+                self._w("    pop eax")
+                self._w("    pop eax                 ; eax = argumento (valor de retorno)")
+                if ins.dst is not None:
+                    if ins.func == "__print_str":
+                        self._w("    mov eax, 0")
+                    self._store_from_eax(frame, ins.dst)
+                return
+
+            # __new(size, id): malloc + vtable de la clase en [eax]
+            if ins.func == "__new":
+                size, cid = ins.args
+                self._w(f"    push {size.value}")
+                self._w("    call malloc")
+                self._w("    add esp, 4")
+                self._w(f"    mov dword [eax], {vtable_label(self.vtable_classes[cid.value])}")
+                if ins.dst is not None:
+                    self._store_from_eax(frame, ins.dst)
+                return
+
+            # __vcall(slot, recv, args...): el slot no se apila; el destino
+            # sale de la vtable del receptor (primer argumento apilado)
+            args = ins.args[1:] if ins.func == "__vcall" else ins.args
             # llamada genérica: push args (derecha->izquierda)
-            for a in reversed(ins.args):
+            for a in reversed(args):
                 if isinstance(a, ConstInt):
                     self._w(f"    push {a.value}")
                 elif isinstance(a, ConstStr):
@@ -343,9 +580,19 @@ class X86Naive:
                 else:
                     self._load_eax(frame, a)
                     self._w("    push eax")
-            self._w(f"    call {ins.func}")
-            if len(ins.args) > 0:
-                self._w(f"    add esp, {4*len(ins.args)}")
+            # __concat(n, s1, ..., sn): el runtime necesita la cantidad de operandos
+            nargs = len(args)
+            if ins.func == "__concat":
+                self._w(f"    push {nargs}")
+                nargs += 1
+            if ins.func == "__vcall":
+                self._w("    mov eax, dword [esp]")
+                self._w("    mov eax, dword [eax]     ; vtable")
+                self._w(f"    call dword [eax+{ins.args[0].value * 4}]")
+            else:
+                self._w(f"    call {ins.func}")
+            if nargs > 0:
+                self._w(f"    add esp, {4*nargs}")
             if ins.dst is not None:
                 self._store_from_eax(frame, ins.dst)
             return
@@ -355,5 +602,27 @@ class X86Naive:
             self._emit_epilogue(frame)
             return
 
+        if isinstance(ins, CheckIndex):
+            # sin signo: un índice negativo también queda fuera
+            lab = f"oob_{self._uid()}"
+            self.oob_stubs.append((lab, ins.msg.label, self._eh_open))
+            self._load_eax(frame, ins.base)
+            self._load_ebx(frame, ins.index)
+            self._w("    cmp ebx, dword [eax]")
+            self._w(f"    jae {lab}")
+            return
+
+        if isinstance(ins, Throw):
+            self._load_eax(frame, ins.value)
+            self._w("    push eax")
+            self._w("    call __throw")
+            return
+
+        if isinstance(ins, Catch):
+            # __throw deja ebp del frame y el valor en eax
+            self._w(f"    lea esp, [ebp-{self._lsize}]")
+            self._store_from_eax(frame, ins.dst)
+            return
+
         # fallback:
         self._w(f"    ; instr desconocida {ins}")
@@ -0,0 +1,227 @@
+import sys, os, copy, glob
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from antlr4 import FileStream, CommonTokenStream
+from antlr4.error.ErrorListener import ErrorListener
+
+BASE = os.path.dirname(os.path.dirname(__file__))  # .../src
+sys.path.append(BASE)
+
+from antlr.parser.generated.CompiscriptLexer import CompiscriptLexer
+from antlr.parser.generated.CompiscriptParser import CompiscriptParser
+from antlr.sema.ast_builder import ASTBuilder
+from antlr.sema.checker import Checker
+
+from compiscript.codegen.irgen import IRGen
+from compiscript.ir.tac import IRProgram
+from compiscript.ir.optimize import optimize_program
+from compiscript.ir.interp import TACInterpreter
+from compiscript.codegen.ass_mips import MIPSNaive
+from compiscript.codegen.mips_sim import MIPSSim
+
+# -------------------------------------------------------------------
+# Ejecución diferencial: el mismo programa en cada etapa del pipeline
+#   ir        IR sin optimizar            (intérprete TAC)
+#   ir_opt    IR optimizado               (intérprete TAC)
+#   mips_base MIPS sin inmediatos/peephole (simulador)
+#   mips      MIPS por defecto            (simulador)
+#   mips_pad  MIPS con un nop en cada delay slot (simulador, delayed branches)
+#   mips_ds   MIPS con delay slots llenos (simulador, delayed branches)
+# Todas deben imprimir lo mismo, fallar (si fallan) por el mismo motivo y
+# salir con el mismo código (1 si escapó una excepción).
+# Con --safe el IR lleva checks de índice (IRGen(safe=True)).
+# Las instrucciones ejecutadas permiten medir la ganancia de cada etapa;
+# el relleno de delay slots se mide contra mips_pad (mismo modo de saltos).
+# -------------------------------------------------------------------
+
+REPO_ROOT = os.path.dirname(BASE)
+DEFAULT_DIRS = ("examples/ok", "examples/codegen")
+DEFAULT_MAX_STEPS = 5_000_000      # instrucciones TAC
+# presupuesto MIPS: proporcional a lo que ejecutó el IR (cubre los bucles
+# por carácter de __concat) para cortar rápido un bucle infinito del backend
+MIPS_STEP_FACTOR = 50
+MIPS_STEP_SLACK = 1_000_000
+
+
+@dataclass
+class StageResult:
+    name: str
+    output: str = ""
+    fault: Optional[str] = None     # motivo del error de ejecución (sin ubicación)
+    steps: int = 0                  # instrucciones ejecutadas (TAC o MIPS)
+    cycles: int = 0                 # sólo MIPS
+    limit: bool = False             # se agotó el presupuesto de pasos
+    exit_code: int = 0              # 1: excepción no capturada
+
+
+@dataclass
+class DiffResult:
+    path: str
+    error: Optional[str] = None     # no compila (sintaxis/semántica/IRGen)
+    stages: List[StageResult] = field(default_factory=list)
+
+    def stage(self, name: str) -> Optional[StageResult]:
+        for s in self.stages:
+            if s.name == name:
+                return s
+        return None
+
+    @property
+    def complete(self) -> bool:
+        # sólo cuenta el presupuesto de la referencia: si otra etapa se
+        # queda sin pasos, es una divergencia (p.ej. bucle infinito)
+        return self.error is None and bool(self.stages) and not self.stages[0].limit
+
+    def mismatches(self) -> List[str]:
+        """Etapas cuya salida o fallo difiere de la referencia (ir)."""
+        if not self.complete or not self.stages:
+            return []
+        ref = self.stages[0]
+        return [s.name for s in self.stages[1:]
+                if s.output != ref.output or s.fault != ref.fault or s.exit_code != ref.exit_code]
+
+
+class _SyntaxErrors(ErrorListener):
+    def __init__(self):
+        self.errors = []
+    def syntaxError(self, recognizer, offendingSymbol, line, column, msg, e):
+        self.errors.append(f"[{line}:{column}] {msg}")
+
+
+def build_ir(path: str, safe: bool = False) -> IRProgram:
+    """Parsea, chequea y genera IR (sin optimizar); RuntimeError si falla."""
+    parser = CompiscriptParser(CommonTokenStream(CompiscriptLexer(FileStream(path, encoding="utf-8"))))
+    listener = _SyntaxErrors()
+    parser.removeErrorListeners()
+    parser.addErrorListener(listener)
+    tree = parser.program()
+    if listener.errors:
+        raise RuntimeError("sintaxis: " + listener.errors[0])
+    ast = ASTBuilder().visit(tree)
+    checker = Checker()
+    checker.run(ast)
+    if checker.errors:
+        raise RuntimeError("semántica: " + checker.errors[0])
+    try:
+        return IRGen(safe=safe).build(ast)
+    except (NotImplementedError, RuntimeError) as e:
+        raise RuntimeError(f"IRGen: {e}")
+
+
+def _run_ir(name: str, prog: IRProgram, max_steps: int) -> StageResult:
+    res = StageResult(name)
+    try:
+        it = TACInterpreter(prog, max_steps=max_steps)
+    except RuntimeError as e:
+        res.fault = str(e)
+        return res
+    try:
+        it.run()
+    except RuntimeError:
+        res.fault = it.fault
+    res.output, res.steps = it.output, it.steps
+    res.exit_code = it.exit_code
+    res.limit = it.steps > max_steps
+    return res
+
+
+def _run_mips(name: str, asm_text: str, max_steps: int) -> StageResult:
+    res = StageResult(name)
+    try:
+        sim = MIPSSim(asm_text, max_steps=max_steps)
+    except RuntimeError as e:
+        res.fault = str(e)
+        return res
+    try:
+        sim.run()
+    except RuntimeError:
+        res.fault = sim.fault
+    res.output = sim.output
+    res.exit_code = sim.exit_code or 0
+    res.steps, res.cycles = sim.stats["instructions"], sim.stats["cycles"]
+    res.limit = res.steps > max_steps
+    return res
+
+
+def run_stages(prog: IRProgram, max_steps: int = DEFAULT_MAX_STEPS) -> List[StageResult]:
+    """Ejecuta todas las etapas; si el IR sin optimizar agota el presupuesto,
+    no se corre el resto (el resultado queda incompleto)."""
+    ref = _run_ir("ir", copy.deepcopy(prog), max_steps)
+    if ref.limit:
+        return [ref]
+    opt = optimize_program(prog)
+    mips_steps = ref.steps * MIPS_STEP_FACTOR + MIPS_STEP_SLACK
+    return [
+        ref,
+        _run_ir("ir_opt", opt, max_steps),
+        _run_mips("mips_base", MIPSNaive(peephole=False, imm_select=False).compile(opt), mips_steps),
+        _run_mips("mips", MIPSNaive().compile(opt), mips_steps),
+        _run_mips("mips_pad", MIPSNaive(delay_slots=True, fill_slots=False).compile(opt), mips_steps),
+        _run_mips("mips_ds", MIPSNaive(delay_slots=True).compile(opt), mips_steps),
+    ]
+
+
+def diff_file(path: str, max_steps: int = DEFAULT_MAX_STEPS, safe: bool = False) -> DiffResult:
+    res = DiffResult(path)
+    try:
+        prog = build_ir(path, safe)
+    except RuntimeError as e:
+        res.error = str(e)
+        return res
+    res.stages = run_stages(prog, max_steps)
+    return res
+
+
+def example_files(dirs=DEFAULT_DIRS) -> List[str]:
+    out: List[str] = []
+    for d in dirs:
+        out += sorted(glob.glob(os.path.join(REPO_ROOT, d, "*.cps")))
+    return out
+
+
+def _ratio(a: int, b: int) -> str:
+    return f"x{a / b:.2f}" if b else "-"
+
+
+def format_report(results: List[DiffResult]) -> str:
+    lines = [f"{'programa':<38} {'estado':<10} {'TAC sin opt -> opt':>26} "
+             f"{'MIPS base -> final':>28} {'ciclos pad -> ds':>24}"]
+    for r in results:
+        name = os.path.relpath(r.path, REPO_ROOT)
+        if r.error is not None:
+            lines.append(f"{name:<38} {'no compila':<10} {r.error}")
+            continue
+        if not r.complete:
+            lines.append(f"{name:<38} {'límite':<10} más de {r.stages[0].steps - 1} instrucciones TAC")
+            continue
+        ir, ir_opt = r.stage("ir"), r.stage("ir_opt")
+        base, mips = r.stage("mips_base"), r.stage("mips")
+        pad, ds = r.stage("mips_pad"), r.stage("mips_ds")
+        if r.mismatches():
+            state = "DIFIERE"
+        else:
+            state = "ok" if ir.fault is None else "ok(fallo)"
+        tac = f"{ir.steps} -> {ir_opt.steps} ({_ratio(ir.steps, ir_opt.steps)})"
+        asm = f"{base.steps} -> {mips.steps} ({_ratio(base.steps, mips.steps)})"
+        cyc = f"{pad.cycles} -> {ds.cycles} ({_ratio(pad.cycles, ds.cycles)})"
+        lines.append(f"{name:<38} {state:<10} {tac:>26} {asm:>28} {cyc:>24}")
+        if state == "DIFIERE":
+            for s in r.stages:
+                lines.append(f"    {s.name:<9} fallo={s.fault!r} salida={s.output[:60]!r}")
+        elif ir.fault is not None:
+            lines.append(f"    fallo en todas las etapas: {ir.fault}")
+    return "\n".join(lines)
+
+
+def main():
+    paths = [a for a in sys.argv[1:] if not a.startswith("--")] or example_files()
+    safe = "--safe" in sys.argv[1:]
+    results = [diff_file(p, safe=safe) for p in paths]
+    print(format_report(results))
+    bad = [r for r in results if r.mismatches()]
+    sys.exit(1 if bad else 0)
+
+
+if __name__ == "__main__":
+    main()
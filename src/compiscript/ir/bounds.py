@@ -0,0 +1,251 @@
+# src/compiscript/ir/bounds.py
+from __future__ import annotations
+from typing import FrozenSet, List, Optional, Set, Tuple
+
+from compiscript.ir.tac import (
+    IRProgram, IRFunction, Instr, Operand, Label, Jump, CJump, SwitchJump, Return, Throw,
+    Move, BinOp, UnaryOp, Cmp, Call, Load, Store, LoadI, Catch, CheckIndex, ConstInt,
+)
+
+# -------------------------------------------------------------------
+# Eliminación de CheckIndex redundantes (modo seguro, IRGen(safe=True)).
+# Análisis de rangos hacia adelante, "must" (intersección en las
+# uniones, optimista en los bucles), sobre hechos simples:
+#   ("nn", x)       x >= 0
+#   ("lt", x, a)    x < longitud de a
+#   ("ub", x, c)    x < c          (c constante)
+#   ("len", t, a)   t <= longitud de a        (t = *(a + 0))
+#   ("clen", a, n)  longitud de a >= n        (arreglo literal)
+# Un check de (a, i) sobra si valen i >= 0 e i < longitud de a. Fuentes:
+# constantes, i + c / i % c, copias, las ramas de 'if i < t' con t una
+# longitud (el foreach de IRGen) o una constante, y los checks previos.
+# Las longitudes son cotas inferiores: push sólo hace crecer. Lo que
+# achica (pop: Store no constante en el offset 0, quizá sobre un alias)
+# y las llamadas que podrían hacer pop (shrinking_functions) borran
+# todos los hechos de longitud; el Store constante en el offset 0 es la cabecera de un
+# literal recién creado.
+# -------------------------------------------------------------------
+
+Fact = Tuple
+Facts = FrozenSet[Fact]
+
+# intrínsecos y runtime que nunca achican un arreglo
+_KEEPS_LENGTHS = {
+    "print", "__print_str", "printInteger", "printString", "toString", "__concat",
+    "malloc", "free", "__str_free", "__new", "__push",
+}
+
+_NEG = {"<": ">=", "<=": ">", ">": "<=", ">=": "<", "==": "!=", "!=": "=="}
+
+
+def _defined(ins: Instr) -> Optional[Operand]:
+    if isinstance(ins, (Move, BinOp, UnaryOp, Cmp, Load, LoadI, Catch)):
+        return ins.dst
+    if isinstance(ins, Call):
+        return ins.dst
+    return None
+
+
+def _nonneg(x: Operand, facts: Facts) -> bool:
+    if isinstance(x, ConstInt):
+        return x.value >= 0
+    return ("nn", x) in facts
+
+
+def _upper(x: Operand, facts: Facts) -> Optional[int]:
+    """Menor c conocido con x < c."""
+    if isinstance(x, ConstInt):
+        return x.value + 1
+    cs = [f[2] for f in facts if f[0] == "ub" and f[1] == x]
+    return min(cs) if cs else None
+
+
+def _no_overflow(x: Operand, c: int, facts: Facts) -> bool:
+    """x + c no da la vuelta: x acotado por una longitud (un arreglo
+    nunca llega a 2^28 elementos) o por una constante."""
+    if c < (1 << 28) and any(f[0] == "lt" and f[1] == x for f in facts):
+        return True
+    ub = _upper(x, facts)
+    return ub is not None and ub + c <= (1 << 31)
+
+
+def in_bounds(a: Operand, i: Operand, facts: Facts) -> bool:
+    if not _nonneg(i, facts):
+        return False
+    if ("lt", i, a) in facts:
+        return True
+    ub = _upper(i, facts)
+    return ub is not None and any(f[0] == "clen" and f[1] == a and ub <= f[2] for f in facts)
+
+
+def _kill(facts: set, x: Operand) -> None:
+    for f in [f for f in facts if x in f[1:]]:
+        facts.discard(f)
+
+
+def _kill_lengths(facts: set) -> None:
+    for f in [f for f in facts if f[0] in ("lt", "len", "clen")]:
+        facts.discard(f)
+
+
+def _pops(ins: Instr) -> bool:
+    return isinstance(ins, Store) and ins.offset == 0 and not isinstance(ins.src, ConstInt)
+
+
+def shrinking_functions(prog: IRProgram) -> Set[str]:
+    """Nombres cuya llamada puede achicar un arreglo: funciones con pop
+    (directo o a través de otra llamada), __vcall y lo desconocido."""
+    shrinks = {"__vcall"}
+    for fn in prog.functions.values():
+        for ins in fn.body:
+            if isinstance(ins, Call) and ins.func not in prog.functions and ins.func not in _KEEPS_LENGTHS:
+                shrinks.add(ins.func)
+    changed = True
+    while changed:
+        changed = False
+        for name, fn in prog.functions.items():
+            if name in shrinks:
+                continue
+            if any(_pops(i) or (isinstance(i, Call) and i.func in shrinks) for i in fn.body):
+                shrinks.add(name)
+                changed = True
+    return shrinks
+
+
+def _transfer(ins: Instr, facts: set, shrinks: Optional[Set[str]] = None) -> None:
+    if isinstance(ins, CheckIndex):
+        # a partir de aquí el check pasó
+        facts.add(("nn", ins.index))
+        facts.add(("lt", ins.index, ins.base))
+        return
+    if isinstance(ins, Store):
+        if ins.offset == 0:
+            if isinstance(ins.src, ConstInt):
+                for f in [f for f in facts if f[0] == "clen" and f[1] == ins.base]:
+                    facts.discard(f)
+                facts.add(("clen", ins.base, ins.src.value))
+            else:
+                _kill_lengths(facts)
+        return
+    if isinstance(ins, Call) and (ins.func in shrinks if shrinks is not None
+                                  else ins.func not in _KEEPS_LENGTHS):
+        _kill_lengths(facts)
+    d = _defined(ins)
+    if d is None:
+        return
+    gen: List[Fact] = []
+    if isinstance(ins, Move):
+        s = ins.src
+        if s == d:
+            return
+        if isinstance(s, ConstInt):
+            if s.value >= 0:
+                gen.append(("nn", d))
+            gen.append(("ub", d, s.value + 1))
+        gen += [(f[0], d) + f[2:] for f in facts if f[0] != "clen" and f[1] == s]
+        gen += [("clen", d, f[2]) for f in facts if f[0] == "clen" and f[1] == s]
+        gen += [f[:2] + (d,) for f in facts if f[0] in ("lt", "len") and f[2] == s]
+    elif isinstance(ins, BinOp) and isinstance(ins.b, ConstInt) and ins.b.value >= 0:
+        x, c = ins.a, ins.b.value
+        if ins.op == "+" and _nonneg(x, facts) and _no_overflow(x, c, facts):
+            gen.append(("nn", d))
+        elif ins.op == "-" and _nonneg(x, facts):
+            gen += [f[:1] + (d,) + f[2:] for f in facts if f[0] == "lt" and f[1] == x]
+            gen += [("ub", d, f[2] - c) for f in facts if f[0] == "ub" and f[1] == x]
+        elif ins.op == "%" and c > 0 and _nonneg(x, facts):
+            gen += [("nn", d), ("ub", d, c)]
+        elif ins.op == "/" and c > 0 and _nonneg(x, facts):
+            gen.append(("nn", d))
+            gen += [f[:1] + (d,) + f[2:] for f in facts if f[0] == "lt" and f[1] == x]
+    elif isinstance(ins, Load) and ins.offset == 0:
+        gen += [("len", d, ins.base), ("nn", d)]
+    _kill(facts, d)
+    # lo que nombra a d fuera de la primera posición habla de su valor anterior
+    facts.update(f for f in gen if d not in f[2:])
+
+
+def _branch(op: str, x: Operand, y: Operand, facts: set) -> None:
+    """Hechos que agrega saber que 'x op y' es verdad."""
+    if op in (">", ">="):
+        op, x, y = ("<" if op == ">" else "<="), y, x
+    if op == "<":
+        facts.update(("lt", x, f[2]) for f in list(facts) if f[0] == "len" and f[1] == y)
+        if isinstance(y, ConstInt):
+            facts.add(("ub", x, y.value))
+        if isinstance(x, ConstInt) and x.value >= -1:
+            facts.add(("nn", y))
+    elif op == "<=":
+        if isinstance(y, ConstInt):
+            facts.add(("ub", x, y.value + 1))
+        if isinstance(x, ConstInt) and x.value >= 0:
+            facts.add(("nn", y))
+
+
+def eliminate_bounds_checks(fn: IRFunction, shrinks: Optional[Set[str]] = None) -> int:
+    """Quita de fn los CheckIndex probados; devuelve cuántos. shrinks: las
+    llamadas que pueden hacer pop (por defecto, todo lo que no es runtime)."""
+    if not any(isinstance(i, CheckIndex) for i in fn.body):
+        return 0
+    # bloques: (etiqueta, instrucciones)
+    blocks: List[Tuple[Optional[str], List[Instr]]] = [(None, [])]
+    for ins in fn.body:
+        if isinstance(ins, Label):
+            blocks.append((ins.name, []))
+        else:
+            blocks[-1][1].append(ins)
+    index = {lab: k for k, (lab, _) in enumerate(blocks) if lab is not None}
+    pads = set(fn.handlers.values())
+
+    def edges(k: int, facts: set) -> List[Tuple[int, Facts]]:
+        body = blocks[k][1]
+        last = body[-1] if body else None
+        if isinstance(last, CJump):
+            t, f = set(facts), set(facts)
+            _branch(last.op, last.a, last.b, t)
+            _branch(_NEG[last.op], last.a, last.b, f)
+            return [(index[last.if_true], frozenset(t)), (index[last.if_false], frozenset(f))]
+        fs = frozenset(facts)
+        if isinstance(last, Jump):
+            return [(index[last.target], fs)]
+        if isinstance(last, SwitchJump):
+            return [(index[lab], fs) for _, lab in last.cases] + [(index[last.default], fs)]
+        if isinstance(last, (Return, Throw)) or k + 1 == len(blocks):
+            return []
+        return [(k + 1, fs)]
+
+    # IN de cada bloque; None = aún no alcanzado (todo vale)
+    inn: List[Optional[Facts]] = [None] * len(blocks)
+    inn[0] = frozenset()
+    for lab in pads:
+        inn[index[lab]] = frozenset()   # se llega desde cualquier punto del try
+    changed = True
+    while changed:
+        changed = False
+        for k, (_, body) in enumerate(blocks):
+            if inn[k] is None:
+                continue
+            facts = set(inn[k])
+            for ins in body:
+                _transfer(ins, facts, shrinks)
+            for s, out in edges(k, facts):
+                new = out if inn[s] is None else inn[s] & out
+                if blocks[s][0] in pads:
+                    new = frozenset()
+                if new != inn[s]:
+                    inn[s], changed = new, True
+
+    removed = 0
+    new_body: List[Instr] = []
+    for k, (lab, body) in enumerate(blocks):
+        if lab is not None:
+            new_body.append(Label(lab))
+        facts = set(inn[k]) if inn[k] is not None else None
+        for ins in body:
+            if facts is not None:
+                if isinstance(ins, CheckIndex) and in_bounds(ins.base, ins.index, facts):
+                    removed += 1
+                    continue
+                _transfer(ins, facts, shrinks)
+            new_body.append(ins)
+    fn.body = new_body
+    return removed
@@ -0,0 +1,651 @@
+# src/compiscript/ir/interp.py
+from __future__ import annotations
+import operator
+import struct
+from typing import Callable, Dict, List, Optional, Tuple
+
+from compiscript.ir.tac import (
+    IRProgram, IRFunction, Operand,
+    Temp, Local, Param, ConstInt, ConstStr,
+    Label, Jump, CJump, SwitchJump, Move, BinOp, UnaryOp, Cmp, Call, Return,
+    Load, Store, LoadI, StoreI, CheckIndex, Throw, Catch, ARR_HEADER,
+)
+
+# -------------------------------------------------------------------
+# Intérprete de TAC: ejecuta un IRProgram sin ensamblar.
+#
+# Imita el modelo de memoria del backend MIPS (MARS/SPIM):
+#   - strings en .data a partir de DATA_BASE, en orden: cada uno alineado
+#     a 4 con su longitud en la palabra anterior (el valor apunta a los bytes)
+#   - vtables después de los strings; cada entrada es la "dirección" de
+#     la función (TEXT_BASE + 4 * posición en prog.functions)
+#   - heap a partir de HEAP_BASE con el mismo allocator que el runtime
+#     MIPS (__alloc/__free: clases por tamaño + trozos de sbrk), de modo
+#     que las direcciones y los fallos coinciden con el simulador
+#   - arreglos con cabecera [longitud, capacidad, datos] (ARR_HEADER);
+#     __push crece igual que el runtime MIPS (capacidad doble)
+#   - palabras de 32 bits little-endian, aritmética con signo y wrap,
+#     división truncada ('div' + mflo/mfhi)
+#
+# Cada función se "carga" una vez:
+#   - etiquetas resueltas a índices de instrucción
+#   - Temp/Local/Param -> índice en una lista (el frame); las constantes
+#     ocupan slots precargados en la plantilla del frame
+#   - cada instrucción es una tupla (opcode, ...) con índices ya resueltos
+# Las llamadas usan una pila explícita (sin recursión de Python).
+#
+# Excepciones: cada instrucción cargada sabe el índice de su manejador
+# (fn.handlers del bloque al que pertenece). 'throw' busca el de la
+# instrucción actual y, si no hay, el de la llamada pendiente de cada
+# frame de la pila (como el unwinder del runtime MIPS). Sin manejador:
+# se imprime 'Excepción no capturada: <msg>' y el programa sale con 1.
+# CheckIndex fuera de rango lanza su mensaje igual que 'throw'.
+#
+# Con profile=True se instrumenta el código cargado: cada etiqueta (y la
+# entrada de la función) lleva un contador de bloque, y se cuentan las
+# llamadas por arista (llamador, llamado). Ver compiscript.ir.profile.
+# -------------------------------------------------------------------
+
+TEXT_BASE = 0x00400000
+DATA_BASE = 0x10010000
+HEAP_BASE = 0x10040000
+DEFAULT_MAX_STEPS = 50_000_000
+
+_WORD = struct.Struct("<i")
+
+# opcodes
+(_MOVE, _ADD, _SUB, _MUL, _DIV, _MOD, _NEG, _NOT, _CMP, _JUMP, _CJUMP,
+ _SWITCH, _LOAD, _STORE, _LOADI, _STOREI, _CALL, _VCALL, _BUILTIN, _RET, _COUNT,
+ _THROW, _CATCH, _CHECK) = range(24)
+
+ENTRY_BLOCK = "@entry"   # bloque de entrada sin etiqueta (modo profile)
+
+_BINOPS = {"+": _ADD, "-": _SUB, "*": _MUL, "/": _DIV, "%": _MOD}
+_REL: Dict[str, Callable[[int, int], bool]] = {
+    "==": operator.eq, "!=": operator.ne,
+    "<": operator.lt, "<=": operator.le,
+    ">": operator.gt, ">=": operator.ge,
+}
+
+
+def _s32(v: int) -> int:
+    if -0x80000000 <= v <= 0x7FFFFFFF:
+        return v
+    v &= 0xFFFFFFFF
+    return v - 0x100000000 if v & 0x80000000 else v
+
+
+def _div(a: int, b: int) -> int:
+    if b == 0:
+        raise RuntimeError("División entre cero")
+    q = abs(a) // abs(b)
+    return _s32(-q if (a < 0) != (b < 0) else q)
+
+
+def _mod(a: int, b: int) -> int:
+    if b == 0:
+        raise RuntimeError("División entre cero")
+    return _s32(a - _div(a, b) * b)
+
+
+class _Fn:
+    """Función cargada: código resuelto + plantilla de frame."""
+    __slots__ = ("name", "code", "template", "nparams", "handler_at",
+                 "blocks", "block_hits", "block_sizes")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.code: List[Tuple] = []
+        self.template: List[int] = []
+        self.nparams = 0
+        self.handler_at: List[Optional[int]] = []    # instrucción -> índice del manejador
+        # modo profile: nombre, ejecuciones e instrucciones de cada bloque
+        self.blocks: List[str] = []
+        self.block_hits: List[int] = []
+        self.block_sizes: List[int] = []
+
+
+class TACInterpreter:
+    """
+    Ejecuta un IRProgram (optimizado o no).
+      out = TACInterpreter(prog).run_output()
+    Intrínsecos nativos: malloc, free, print, printInteger, printString,
+    toString, __concat, __new y __vcall (mismo comportamiento que el
+    backend MIPS).
+    """
+
+    def __init__(self, prog: IRProgram, *, max_steps: int = DEFAULT_MAX_STEPS,
+                 profile: bool = False):
+        self.prog = prog
+        self.max_steps = max_steps
+        self.profile = profile
+        self.steps = 0
+        self.calls: Dict[str, int] = {}
+        self.call_edges: Dict[Tuple[str, str], int] = {}   # sólo en modo profile
+        self.out = bytearray()
+        self.fault: Optional[str] = None     # motivo del último error de ejecución
+        self.exit_code = 0                   # 1 si terminó por una excepción no capturada
+        self.exc = 0                         # valor lanzado (lo lee 'catch')
+
+        # memoria: [DATA_BASE, brk)
+        self.mem = bytearray(HEAP_BASE - DATA_BASE)
+        self.brk = HEAP_BASE
+        self._init_alloc()
+        self.str_addr: Dict[str, int] = {}
+        self.vt_addr: List[int] = []          # id de clase -> dirección de su vtable
+        self._layout_strings()
+
+        self.fns: Dict[str, _Fn] = {name: _Fn(name) for name in prog.functions}
+        self.fn_at: Dict[int, _Fn] = {TEXT_BASE + 4 * i: lf for i, lf in enumerate(self.fns.values())}
+        self._layout_vtables(pos=self._data_end)
+        for name, fn in prog.functions.items():
+            self._load_function(fn, self.fns[name])
+
+    # ---------------- carga ----------------
+    def _layout_strings(self):
+        from compiscript.codegen.ass_mips import MIPSNaive
+        pos = 0
+        for lab, b in self.prog.strings.items():
+            nb = MIPSNaive._normalize_string_bytes(list(b))
+            data = bytes(nb)
+            pos = (pos + 3) & ~3
+            _WORD.pack_into(self.mem, pos, MIPSNaive._string_length(nb))
+            pos += 4
+            self.str_addr[lab] = DATA_BASE + pos
+            self.mem[pos:pos + len(data)] = data
+            pos += len(data)
+        if DATA_BASE + pos > HEAP_BASE:
+            raise RuntimeError("Segmento .data excede el inicio del heap")
+        self._data_end = pos
+
+    def _layout_vtables(self, pos: int):
+        addr = {lf.name: a for a, lf in self.fn_at.items()}
+        for cls, slots in self.prog.vtables.items():
+            pos = (pos + 3) & ~3
+            self.vt_addr.append(DATA_BASE + pos)
+            for name in slots or ["0"]:          # vtable vacía: una palabra en 0
+                if name != "0" and name not in addr:
+                    raise RuntimeError(f"vtable de {cls}: función desconocida {name}")
+                _WORD.pack_into(self.mem, pos, addr.get(name, 0))
+                pos += 4
+        if DATA_BASE + pos > HEAP_BASE:
+            raise RuntimeError("Segmento .data excede el inicio del heap")
+
+    def _load_function(self, fn: IRFunction, lf: _Fn):
+        slots: Dict[Tuple[str, object], int] = {}
+        template: List[int] = []
+
+        def slot(op: Operand) -> int:
+            if isinstance(op, Temp):
+                key: Tuple[str, object] = ("t", op.name)
+            elif isinstance(op, Local):
+                key = ("l", op.name)
+            elif isinstance(op, Param):
+                key = ("p", op.name)
+            elif isinstance(op, ConstInt):
+                key = ("k", _s32(op.value))
+            elif isinstance(op, ConstStr):
+                if op.label not in self.str_addr:
+                    raise RuntimeError(f"String sin definir: {op.label}")
+                key = ("k", self.str_addr[op.label])
+            else:
+                raise RuntimeError(f"Operando no soportado: {op}")
+            i = slots.get(key)
+            if i is None:
+                i = slots[key] = len(template)
+                template.append(key[1] if key[0] == "k" else 0)
+            return i
+
+        for p in fn.params:
+            slot(Param(p))
+        lf.nparams = len(fn.params)
+
+        # etiquetas -> índice de la siguiente instrucción real
+        # (en modo profile, índice del contador del bloque)
+        prof = self.profile
+        labels: Dict[str, int] = {}
+        n = 0
+        if prof and not (fn.body and isinstance(fn.body[0], Label)):
+            n += 1
+        for ins in fn.body:
+            if isinstance(ins, Label):
+                if ins.name in labels:
+                    raise RuntimeError(f"{fn.name}: etiqueta duplicada '{ins.name}'")
+                labels[ins.name] = n
+                if prof:
+                    n += 1
+            else:
+                n += 1
+
+        def target(name: str) -> int:
+            if name not in labels:
+                raise RuntimeError(f"{fn.name}: etiqueta sin definir '{name}'")
+            return labels[name]
+
+        code = lf.code
+
+        def count(block: str):
+            code.append((_COUNT, lf.block_hits, len(lf.blocks)))
+            lf.blocks.append(block)
+            lf.block_hits.append(0)
+            lf.block_sizes.append(0)
+
+        handler_at = lf.handler_at
+        pad: Optional[int] = None
+
+        if prof and not (fn.body and isinstance(fn.body[0], Label)):
+            count(ENTRY_BLOCK)
+        for ins in fn.body:
+            handler_at += [pad] * (len(code) - len(handler_at))
+            if isinstance(ins, Label):
+                h = fn.handlers.get(ins.name)
+                pad = None if h is None else target(h)
+                if prof:
+                    count(ins.name)
+                continue
+            if prof:
+                lf.block_sizes[-1] += 1
+            if isinstance(ins, Move):
+                code.append((_MOVE, slot(ins.dst), slot(ins.src)))
+            elif isinstance(ins, BinOp):
+                if ins.op not in _BINOPS:
+                    raise RuntimeError(f"BinOp desconocido: {ins.op}")
+                code.append((_BINOPS[ins.op], slot(ins.dst), slot(ins.a), slot(ins.b)))
+            elif isinstance(ins, UnaryOp):
+                if ins.op not in ("neg", "not"):
+                    raise RuntimeError(f"UnaryOp desconocido: {ins.op}")
+                code.append((_NEG if ins.op == "neg" else _NOT, slot(ins.dst), slot(ins.a)))
+            elif isinstance(ins, Cmp):
+                code.append((_CMP, slot(ins.dst), _REL[ins.op], slot(ins.a), slot(ins.b)))
+            elif isinstance(ins, Jump):
+                code.append((_JUMP, target(ins.target)))
+            elif isinstance(ins, CJump):
+                code.append((_CJUMP, _REL[ins.op], slot(ins.a), slot(ins.b),
+                             target(ins.if_true), target(ins.if_false)))
+            elif isinstance(ins, SwitchJump):
+                table = {_s32(k): target(lab) for k, lab in ins.cases}
+                code.append((_SWITCH, slot(ins.value), table, target(ins.default)))
+            elif isinstance(ins, Load):
+                code.append((_LOAD, slot(ins.dst), slot(ins.base), ins.offset))
+            elif isinstance(ins, Store):
+                code.append((_STORE, slot(ins.base), ins.offset, slot(ins.src)))
+            elif isinstance(ins, LoadI):
+                code.append((_LOADI, slot(ins.dst), slot(ins.base), slot(ins.index)))
+            elif isinstance(ins, StoreI):
+                code.append((_STOREI, slot(ins.base), slot(ins.index), slot(ins.src)))
+            elif isinstance(ins, CheckIndex):
+                code.append((_CHECK, slot(ins.base), slot(ins.index), slot(ins.msg)))
+            elif isinstance(ins, Call):
+                code.append(self._load_call(ins, slot))
+            elif isinstance(ins, Return):
+                code.append((_RET, None if ins.value is None else slot(ins.value)))
+            elif isinstance(ins, Throw):
+                code.append((_THROW, slot(ins.value)))
+            elif isinstance(ins, Catch):
+                code.append((_CATCH, slot(ins.dst)))
+            else:
+                raise RuntimeError(f"{fn.name}: instrucción no soportada {ins}")
+        # caer al final de la función = return sin valor
+        code.append((_RET, None))
+        handler_at += [pad] * (len(code) - len(handler_at))
+        lf.template = template
+
+    def _load_call(self, ins: Call, slot) -> Tuple:
+        dst = None if ins.dst is None else slot(ins.dst)
+        args = tuple(slot(a) for a in ins.args)
+        if ins.func == "print":
+            # igual que el backend: string solo si el argumento es literal
+            # (los strings no literales llegan como __print_str)
+            arg = ins.args[0] if len(ins.args) == 1 else None
+            fn = self._b_print_str if isinstance(arg, ConstStr) else self._b_print_int
+            return (_BUILTIN, fn, dst, args)
+        if ins.func == "__vcall":
+            # args[0] = slot (constante), args[1] = receptor
+            if len(ins.args) < 2 or not isinstance(ins.args[0], ConstInt):
+                raise RuntimeError(f"__vcall mal formado: {ins}")
+            return (_VCALL, ins.args[0].value * 4, dst, args[1:])
+        b = self._BUILTINS.get(ins.func)
+        if b is not None and not (ins.func in ("malloc", "free", "__str_free") and len(ins.args) != 1):
+            return (_BUILTIN, getattr(self, b), dst, args)
+        if ins.func not in self.fns:
+            raise RuntimeError(f"Función desconocida: {ins.func}")
+        return (_CALL, self.fns[ins.func], dst, args)
+
+    # ---------------- memoria ----------------
+    def _index(self, addr: int, size: int) -> int:
+        i = addr - DATA_BASE
+        if i < 0 or i + size > len(self.mem) or (size == 4 and addr & 3):
+            raise RuntimeError(f"Acceso a memoria inválido: 0x{addr & 0xFFFFFFFF:08x}")
+        return i
+
+    def load_word(self, addr: int) -> int:
+        return _WORD.unpack_from(self.mem, self._index(addr, 4))[0]
+
+    def store_word(self, addr: int, value: int):
+        _WORD.pack_into(self.mem, self._index(addr, 4), value)
+
+    def read_cstring(self, addr: int) -> bytes:
+        i = self._index(addr, 1)
+        end = self.mem.find(0, i)
+        if end < 0:
+            raise RuntimeError(f"String sin NUL en 0x{addr:08x}")
+        return bytes(self.mem[i:end])
+
+    def sbrk(self, n: int) -> int:
+        if n < 0:
+            raise RuntimeError(f"malloc con tamaño negativo: {n}")
+        addr = self.brk
+        n = (n + 3) & ~3
+        self.mem.extend(bytes(n))
+        self.brk += n
+        return addr
+
+    # ---------------- allocator (espejo de MIPSNaive._emit_runtime_alloc) ----------------
+    def _init_alloc(self):
+        from compiscript.codegen.ass_mips import MIPSNaive
+        self.alloc_classes = MIPSNaive.ALLOC_CLASSES
+        self.alloc_chunk = MIPSNaive.ALLOC_CHUNK
+        self.heap_cur = self.heap_end = 0
+        self.big_head = 0
+        self.free_lists = [0] * (self.alloc_classes + 1)
+
+    def alloc(self, n: int) -> int:
+        c = ((n + 3) & 0xFFFFFFFF) >> 2 or 1
+        if c <= self.alloc_classes:
+            p = self.free_lists[c]
+            if p:
+                self.free_lists[c] = self.load_word(p)
+                return self._zero_words(p, c)
+            need = 4 + 4 * c
+            while self.heap_cur + need > self.heap_end:
+                v = self.sbrk(self.alloc_chunk)
+                if v != self.heap_end:
+                    self.heap_cur = v          # el resto del trozo anterior se abandona
+                self.heap_end = v + self.alloc_chunk
+            hdr = self.heap_cur
+            self.heap_cur += need
+            self.store_word(hdr, c)
+            return hdr + 4
+        prev, p = None, self.big_head
+        while p:
+            nxt = self.load_word(p)
+            if (self.load_word(p - 4) & 0xFFFFFFFF) >= c:
+                if prev is None:
+                    self.big_head = nxt
+                else:
+                    self.store_word(prev, nxt)
+                return self._zero_words(p, c)
+            prev, p = p, nxt
+        v = self.sbrk(_s32((c << 2) + 4))
+        self.store_word(v, _s32(c))
+        return v + 4
+
+    def _zero_words(self, p: int, c: int) -> int:
+        i = self._index(p, 4 * c)
+        self.mem[i:i + 4 * c] = bytes(4 * c)
+        return p
+
+    def free(self, p: int):
+        if p == 0:
+            return
+        c = self.load_word(p - 4) & 0xFFFFFFFF
+        if c <= self.alloc_classes:
+            self.store_word(p, self.free_lists[c])
+            self.free_lists[c] = p
+        else:
+            self.store_word(p, self.big_head)
+            self.big_head = p
+
+    # ---------------- intrínsecos ----------------
+    _BUILTINS = {
+        "malloc": "_b_malloc",
+        "free": "_b_free",
+        "__str_free": "_b_str_free",
+        "printInteger": "_b_print_integer",
+        "printString": "_b_print_string",
+        "toString": "_b_to_string",
+        "__print_str": "_b_print_str",
+        "__concat": "_b_concat",
+        "__new": "_b_new",
+        "__push": "_b_push",
+    }
+
+    @staticmethod
+    def _arg(args: List[int]) -> int:
+        return args[0] if args else 0
+
+    def _b_malloc(self, args: List[int]) -> int:
+        return self.alloc(args[0])
+
+    def _b_new(self, args: List[int]) -> int:
+        # objeto: vtable de la clase args[1] en la palabra 0, campos en cero
+        p = self.alloc(args[0])
+        self.store_word(p, self.vt_addr[args[1]])
+        return p
+
+    def _b_push(self, args: List[int]) -> int:
+        # como __push del runtime MIPS: duplica la capacidad si está lleno
+        arr, v = args
+        n, cap, data = self.load_word(arr), self.load_word(arr + 4), self.load_word(arr + 8)
+        if n == cap:
+            cap = 2 * cap or 4
+            new = self.alloc(4 * cap)
+            for k in range(n):
+                self.store_word(new + 4 * k, self.load_word(data + 4 * k))
+            if data != arr + ARR_HEADER:
+                self.free(data)
+            data = new
+            self.store_word(arr + 4, cap)
+            self.store_word(arr + 8, data)
+        self.store_word(data + 4 * n, v)
+        self.store_word(arr, n + 1)
+        return n + 1
+
+    def _b_free(self, args: List[int]) -> int:
+        self.free(args[0])
+        return 0
+
+    def _b_str_free(self, args: List[int]) -> int:
+        self.free(args[0] - 4 if args[0] else 0)
+        return 0
+
+    def _b_print_int(self, args: List[int]) -> int:
+        self.out += b"%d\n" % self._arg(args)
+        return 0
+
+    def _b_print_str(self, args: List[int]) -> int:
+        self.out += self.read_cstring(args[0]) + b"\n"
+        return 0
+
+    def _b_print_integer(self, args: List[int]) -> int:
+        v = self._arg(args)
+        self.out += b"%d" % v
+        return v
+
+    def _b_print_string(self, args: List[int]) -> int:
+        v = self._arg(args)
+        self.out += self.read_cstring(v)
+        return v
+
+    def read_string(self, addr: int) -> bytes:
+        """Bytes de un string según su cabecera de longitud."""
+        n = self.load_word(addr - 4)
+        i = self._index(addr, n)
+        return bytes(self.mem[i:i + n])
+
+    def _b_to_string(self, args: List[int]) -> int:
+        # búfer de 16 bytes como el backend: dígitos alineados a la derecha
+        # y luego copiados (con NUL) tras la cabecera de longitud
+        digits = b"%d" % self._arg(args)
+        buf = self.alloc(16)
+        i = self._index(buf, 16)
+        self.mem[i + 15 - len(digits):i + 15] = digits
+        self.mem[i + 4:i + 5 + len(digits)] = digits + b"\0"
+        _WORD.pack_into(self.mem, i, len(digits))
+        return buf + 4
+
+    def _b_concat(self, args: List[int]) -> int:
+        data = b"".join(self.read_string(a) for a in args)
+        buf = self.alloc(len(data) + 5)
+        i = self._index(buf, len(data) + 5)
+        _WORD.pack_into(self.mem, i, len(data))
+        self.mem[i + 4:i + 4 + len(data)] = data
+        return buf + 4
+
+    # ---------------- ejecución ----------------
+    def entry_name(self) -> str:
+        """Mismo punto de entrada que el ejecutable MIPS."""
+        if "main" in self.prog.functions:
+            return "main"
+        return self.prog.entry or "__toplevel"
+
+    def run(self, entry: Optional[str] = None, args: Optional[List[int]] = None) -> int:
+        name = entry or self.entry_name()
+        if name not in self.fns:
+            raise RuntimeError(f"Función de entrada inexistente: {name}")
+        return self._execute(self.fns[name], [_s32(a) for a in (args or [])])
+
+    def run_output(self, entry: Optional[str] = None) -> str:
+        self.run(entry)
+        return self.output
+
+    @property
+    def output(self) -> str:
+        return self.out.decode("utf-8", errors="replace")
+
+    def _enter(self, fn: _Fn, argv: List[int]) -> List[int]:
+        self.calls[fn.name] = self.calls.get(fn.name, 0) + 1
+        f = fn.template[:]
+        f[:min(len(argv), fn.nparams)] = argv[:fn.nparams]
+        return f
+
+    def _unwind(self, fn: _Fn, f: List[int], pc: int, stack: list):
+        """Manejador de self.exc lanzado en pc - 1: (fn, frame, pc del
+        manejador), o None si no hay (mensaje y exit_code = 1)."""
+        h = fn.handler_at[pc - 1]
+        while h is None and stack:
+            # desenrollar: la llamada pendiente del llamador
+            fn, f, pc, _ = stack.pop()
+            h = fn.handler_at[pc - 1]
+        if h is None:
+            self.out += "Excepción no capturada: ".encode() + self.read_cstring(self.exc) + b"\n"
+            self.exit_code = 1
+            return None
+        return fn, f, h
+
+    def _execute(self, fn: _Fn, argv: List[int]) -> int:
+        stack: List[Tuple[_Fn, List[int], int, Optional[int]]] = []
+        code, f, pc = fn.code, self._enter(fn, argv), 0
+        steps, limit = self.steps, self.max_steps
+        try:
+            while True:
+                ins = code[pc]
+                pc += 1
+                steps += 1
+                op = ins[0]
+                if op == _MOVE:
+                    f[ins[1]] = f[ins[2]]
+                elif op == _CJUMP:
+                    pc = ins[4] if ins[1](f[ins[2]], f[ins[3]]) else ins[5]
+                    if steps > limit:
+                        raise RuntimeError(f"Límite de pasos excedido ({limit})")
+                elif op == _ADD:
+                    v = f[ins[2]] + f[ins[3]]
+                    f[ins[1]] = v if -0x80000000 <= v <= 0x7FFFFFFF else _s32(v)
+                elif op == _SUB:
+                    v = f[ins[2]] - f[ins[3]]
+                    f[ins[1]] = v if -0x80000000 <= v <= 0x7FFFFFFF else _s32(v)
+                elif op == _CMP:
+                    f[ins[1]] = 1 if ins[2](f[ins[3]], f[ins[4]]) else 0
+                elif op == _JUMP:
+                    pc = ins[1]
+                    if steps > limit:
+                        raise RuntimeError(f"Límite de pasos excedido ({limit})")
+                elif op == _LOADI:
+                    f[ins[1]] = self.load_word(self.load_word(f[ins[2]] + 8) + f[ins[3]] * 4)
+                elif op == _STOREI:
+                    self.store_word(self.load_word(f[ins[1]] + 8) + f[ins[2]] * 4, f[ins[3]])
+                elif op == _LOAD:
+                    f[ins[1]] = self.load_word(f[ins[2]] + ins[3])
+                elif op == _STORE:
+                    self.store_word(f[ins[1]] + ins[2], f[ins[3]])
+                elif op == _MUL:
+                    f[ins[1]] = _s32(f[ins[2]] * f[ins[3]])
+                elif op == _DIV:
+                    f[ins[1]] = _div(f[ins[2]], f[ins[3]])
+                elif op == _MOD:
+                    f[ins[1]] = _mod(f[ins[2]], f[ins[3]])
+                elif op == _NEG:
+                    f[ins[1]] = _s32(-f[ins[2]])
+                elif op == _NOT:
+                    f[ins[1]] = 1 if f[ins[2]] == 0 else 0
+                elif op == _SWITCH:
+                    pc = ins[2].get(f[ins[1]], ins[3])
+                elif op == _BUILTIN:
+                    v = ins[1]([f[a] for a in ins[3]])
+                    if ins[2] is not None:
+                        f[ins[2]] = v
+                elif op == _COUNT:
+                    ins[1][ins[2]] += 1
+                    steps -= 1
+                elif op == _CALL:
+                    if steps > limit:
+                        raise RuntimeError(f"Límite de pasos excedido ({limit})")
+                    callee = ins[1]
+                    if self.profile:
+                        e = (fn.name, callee.name)
+                        self.call_edges[e] = self.call_edges.get(e, 0) + 1
+                    stack.append((fn, f, pc, ins[2]))
+                    f = self._enter(callee, [f[a] for a in ins[3]])
+                    fn, code, pc = callee, callee.code, 0
+                elif op == _VCALL:
+                    if steps > limit:
+                        raise RuntimeError(f"Límite de pasos excedido ({limit})")
+                    argv = [f[a] for a in ins[3]]
+                    target = self.load_word(self.load_word(argv[0]) + ins[1])
+                    callee = self.fn_at.get(target)
+                    if callee is None:
+                        raise RuntimeError(f"Salto a dirección inválida: 0x{target & 0xFFFFFFFF:08x}")
+                    if self.profile:
+                        e = (fn.name, callee.name)
+                        self.call_edges[e] = self.call_edges.get(e, 0) + 1
+                    stack.append((fn, f, pc, ins[2]))
+                    f = self._enter(callee, argv)
+                    fn, code, pc = callee, callee.code, 0
+                elif op == _RET:
+                    v = 0 if ins[1] is None else f[ins[1]]
+                    if not stack:
+                        return v
+                    fn, f, pc, dst = stack.pop()
+                    code = fn.code
+                    if dst is not None:
+                        f[dst] = v
+                elif op == _CHECK:
+                    if not 0 <= f[ins[2]] < self.load_word(f[ins[1]]):
+                        self.exc = f[ins[3]]
+                        caught = self._unwind(fn, f, pc, stack)
+                        if caught is None:
+                            return 1
+                        fn, f, pc = caught
+                        code = fn.code
+                elif op == _THROW:
+                    self.exc = f[ins[1]]
+                    caught = self._unwind(fn, f, pc, stack)
+                    if caught is None:
+                        return 1
+                    fn, f, pc = caught
+                    code = fn.code
+                elif op == _CATCH:
+                    f[ins[1]] = self.exc
+                else:
+                    raise RuntimeError(f"Opcode desconocido: {op}")
+        except RuntimeError as e:
+            self.fault = str(e)
+            raise RuntimeError(f"{fn.name}@{pc - 1}: {e}") from None
+        finally:
+            self.steps = steps
+
+
+def run_program(prog: IRProgram, *, max_steps: int = DEFAULT_MAX_STEPS) -> str:
+    """Ejecuta prog desde su entrada y devuelve lo impreso."""
+    return TACInterpreter(prog, max_steps=max_steps).run_output()
@@ -0,0 +1,158 @@
+# src/compiscript/ir/layout.py
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from compiscript.ir.tac import IRFunction, Instr, Label, Jump, CJump, SwitchJump, Return, Throw
+
+# -------------------------------------------------------------------
+# Layout de bloques básicos (por función).
+#   1) rotación de bucles: el 'goto H' del latch se reemplaza por una
+#      copia de la cabecera H cuando H es sólo la prueba (pocas
+#      instrucciones + CJump) -> la prueba queda abajo y cada iteración
+#      ahorra un salto tomado.
+#   2) encadenado: a partir de la entrada, el sucesor más caliente que
+#      aún no esté colocado va a continuación (fall-through).
+#   3) bloques fríos al final de la función; los manejadores de
+#      excepción (fn.handlers) siempre son fríos.
+# Peso de un bloque: conteo del perfil (ir/profile.py) si hay, si no
+# LOOP_WEIGHT ** profundidad de bucle (back edges en el orden original).
+# Sin perfil no hay bloques fríos. Los 'goto' al bloque siguiente que
+# queden los limpia optimize (PASO D) y el peephole invierte b<c>+j.
+# El manejador va con cada bloque (etiqueta), así que mover bloques no
+# cambia qué try cubre a cada instrucción.
+# -------------------------------------------------------------------
+
+ROTATE_MAX_INSTRS = 4   # instrucciones de la cabecera (sin contar el CJump)
+LOOP_WEIGHT = 8
+ENTRY_BLOCK = "@entry"  # mismo nombre que usa el perfil para la entrada
+
+
+@dataclass
+class _Block:
+    label: Optional[str]            # None: entrada sin etiqueta
+    body: List[Instr] = field(default_factory=list)
+    index: int = 0                  # posición en el orden original
+
+    @property
+    def name(self) -> str:
+        return self.label if self.label is not None else ENTRY_BLOCK
+
+    def terminated(self) -> bool:
+        return bool(self.body) and isinstance(self.body[-1], (Jump, CJump, SwitchJump, Return, Throw))
+
+    def succs(self) -> List[str]:
+        last = self.body[-1] if self.body else None
+        if isinstance(last, Jump):
+            return [last.target]
+        if isinstance(last, CJump):
+            return [last.if_true, last.if_false]
+        if isinstance(last, SwitchJump):
+            return [lab for _, lab in last.cases] + [last.default]
+        return []
+
+
+def _split_blocks(fn: IRFunction) -> List[_Block]:
+    blocks: List[_Block] = [_Block(None)]
+    for ins in fn.body:
+        if isinstance(ins, Label):
+            if blocks[-1].label is None and not blocks[-1].body and len(blocks) == 1:
+                blocks[-1].label = ins.name
+            else:
+                blocks.append(_Block(ins.name, index=len(blocks)))
+        else:
+            blocks[-1].body.append(ins)
+    # caídas explícitas: así el orden de los bloques queda libre
+    for b, nxt in zip(blocks, blocks[1:]):
+        if not b.terminated():
+            b.body.append(Jump(nxt.label))
+    return blocks
+
+
+def _rotate_loops(blocks: List[_Block], handlers: Dict[str, str]) -> int:
+    by_name = {b.name: b for b in blocks}
+    n = 0
+    for b in blocks:
+        last = b.body[-1] if b.body else None
+        if not isinstance(last, Jump):
+            continue
+        h = by_name.get(last.target)
+        if h is None or h is b or h.index > b.index:
+            continue
+        if handlers.get(h.name) != handlers.get(b.name):
+            continue                    # la copia quedaría bajo otro try
+        if not h.body or not isinstance(h.body[-1], CJump) or len(h.body) - 1 > ROTATE_MAX_INSTRS:
+            continue
+        b.body[-1:] = list(h.body)      # prueba duplicada al fondo del bucle
+        n += 1
+    return n
+
+
+def _static_weights(blocks: List[_Block]) -> Dict[str, int]:
+    pos = {b.name: b.index for b in blocks}
+    depth = [0] * len(blocks)
+    for b in blocks:
+        for t in b.succs():
+            h = pos.get(t)
+            if h is not None and h <= b.index:       # back edge h..b
+                for i in range(h, b.index + 1):
+                    depth[i] += 1
+    return {b.name: LOOP_WEIGHT ** depth[b.index] for b in blocks}
+
+
+def layout_function(fn: IRFunction, counts: Optional[Dict[str, int]] = None) -> None:
+    """Reordena los bloques de fn; counts: ejecuciones por bloque (perfil)."""
+    if not any(isinstance(i, Label) for i in fn.body):
+        return
+    blocks = _split_blocks(fn)
+    weights = _static_weights(blocks)
+    profiled = bool(counts) and counts.get(blocks[0].name, 0) > 0
+    if profiled:
+        # bloques que el perfil no vio (p.ej. código inlineado) heredan el
+        # peso del bloque anterior, que es donde estaba la llamada
+        w = 0
+        for b in blocks:
+            w = weights[b.name] = counts.get(b.name, w)
+    _rotate_loops(blocks, fn.handlers)
+
+    by_name = {b.name: b for b in blocks}
+    preds: Dict[str, int] = {b.name: 0 for b in blocks}
+    for b in blocks:
+        for t in set(b.succs()):
+            if t in preds:
+                preds[t] += 1
+
+    # el último bloque sin terminador cae al epílogo: se queda al final
+    tail = blocks[-1] if not blocks[-1].terminated() else None
+    pads = set(fn.handlers.values())
+    cold = {b.name for b in blocks[1:] if (profiled and weights[b.name] == 0) or b.name in pads}
+    placed = {blocks[0].name}
+    order = [blocks[0]]
+
+    def free(b: _Block) -> bool:
+        return b.name not in placed and b.name not in cold and b is not tail
+
+    cur = blocks[0]
+    while True:
+        cands = [by_name[t] for t in cur.succs() if t in by_name and free(by_name[t])]
+        if cands:
+            # más caliente; a igualdad, el de un solo predecesor y luego el orden original
+            cur = max(cands, key=lambda s: (weights[s.name], preds[s.name] == 1, -s.index))
+        else:
+            rest = [b for b in blocks if free(b)]
+            if not rest:
+                break
+            cur = rest[0]
+        placed.add(cur.name)
+        order.append(cur)
+
+    order += [b for b in blocks if b.name in cold and b is not tail]
+    if tail is not None and tail is not blocks[0]:
+        order.append(tail)
+
+    body: List[Instr] = []
+    for b in order:
+        if b.label is not None:
+            body.append(Label(b.label))
+        body += b.body
+    fn.body = body
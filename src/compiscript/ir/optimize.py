@@ -6,9 +6,15 @@ from compiscript.ir.tac import (
     IRProgram, IRFunction, Instr, Operand,
     Label, Jump, CJump, Move, BinOp, UnaryOp, Cmp, Call, Return,
     Temp, Local, Param, ConstInt, ConstStr,
-    Load, Store, LoadI, StoreI
+    Load, Store, LoadI, StoreI, CheckIndex, SwitchJump, Throw, Catch
 )
 
+from compiscript.ir.layout import layout_function
+from compiscript.ir.bounds import eliminate_bounds_checks, shrinking_functions
+
+# Nivel que deja optimize_program en IRProgram.opt_level
+OPT_LEVEL = 1
+
 # Utilidades de operandos/constantes
 
 def _is_const_int(op: Operand) -> bool:
@@ -32,16 +38,26 @@ def _normalize_commutative(op: str, akey: str, bkey: str) -> Tuple[str,str,str]:
         akey, bkey = sorted((akey, bkey))
     return (op, akey, bkey)
 
+def _wrap32(v: int) -> int:
+    # enteros de 32 bits con signo, como en los backends
+    v &= 0xFFFFFFFF
+    return v - 0x100000000 if v & 0x80000000 else v
+
+def _div_trunc(av: int, bv: int) -> int:
+    # división truncada hacia 0 ('div' de MIPS / 'idiv' de x86), no floor
+    q = abs(av) // abs(bv)
+    return q if (av < 0) == (bv < 0) else -q
+
 def _compute_binop_const(op: str, av: int, bv: int) -> Tuple[bool, Optional[int]]:
-    if op == "+":  return True, av + bv
-    if op == "-":  return True, av - bv
-    if op == "*":  return True, av * bv
-    if op == "/":  return True, (av // bv) if bv != 0 else None
-    if op == "%":  return True, (av %  bv) if bv != 0 else None
+    if op == "+":  return True, _wrap32(av + bv)
+    if op == "-":  return True, _wrap32(av - bv)
+    if op == "*":  return True, _wrap32(av * bv)
+    if op == "/":  return True, _wrap32(_div_trunc(av, bv)) if bv != 0 else None
+    if op == "%":  return True, _wrap32(av - _div_trunc(av, bv) * bv) if bv != 0 else None
     return False, None
 
 def _compute_unary_const(op: str, av: int) -> Tuple[bool, Optional[int]]:
-    if op == "neg": return True, -av
+    if op == "neg": return True, _wrap32(-av)
     if op == "not": return True, 0 if av else 1
     return False, None
 
@@ -62,17 +78,20 @@ def _instr_uses(ins: Instr) -> List[Operand]:
     elif isinstance(ins, Cmp):   uses = [ins.a, ins.b]
     elif isinstance(ins, Call):  uses = list(ins.args)
     elif isinstance(ins, CJump): uses = [ins.a, ins.b]
+    elif isinstance(ins, SwitchJump): uses = [ins.value]
+    elif isinstance(ins, Throw): uses = [ins.value]
     elif isinstance(ins, Load):  uses = [ins.base]
     elif isinstance(ins, Store): uses = [ins.base, ins.src]
     elif isinstance(ins, LoadI): uses = [ins.base, ins.index]
     elif isinstance(ins, StoreI): uses = [ins.base, ins.index, ins.src]
+    elif isinstance(ins, CheckIndex): uses = [ins.base, ins.index, ins.msg]
     elif isinstance(ins, Return) and ins.value is not None:
         uses = [ins.value]
     return uses
 
 def _instr_def_temp(ins: Instr) -> Optional[str]:
     dst = None
-    if isinstance(ins, (Move, BinOp, UnaryOp, Cmp, Load, LoadI)):
+    if isinstance(ins, (Move, BinOp, UnaryOp, Cmp, Load, LoadI, Catch)):
         dst = ins.dst
     elif isinstance(ins, Call):
         dst = ins.dst
@@ -82,7 +101,7 @@ def _instr_def_temp(ins: Instr) -> Optional[str]:
 
 def _safe_side_effect(ins: Instr) -> bool:
     # Barreras: no borrar ni reordenar
-    if isinstance(ins, (Store, StoreI, Return, Jump, CJump, Label)):
+    if isinstance(ins, (Store, StoreI, CheckIndex, Return, Jump, CJump, SwitchJump, Label, Throw, Catch)):
         return True
     if isinstance(ins, Call):
         return True
@@ -268,6 +287,12 @@ def _simplify_and_cse_blockwise(fn: IRFunction) -> None:
             flush_maps()
             continue
 
+        if isinstance(ins, CheckIndex):
+            # puede lanzar, pero no escribe nada: no es barrera para los mapas
+            new_body.append(CheckIndex(base=_replace_operand(ins.base, copy_map),
+                                       index=_replace_operand(ins.index, copy_map), msg=ins.msg))
+            continue
+
         if isinstance(ins, CJump):
             a = _replace_operand(ins.a, copy_map)
             b = _replace_operand(ins.b, copy_map)
@@ -290,6 +315,20 @@ def _simplify_and_cse_blockwise(fn: IRFunction) -> None:
             flush_maps()
             continue
 
+        if isinstance(ins, SwitchJump):
+            v = _replace_operand(ins.value, copy_map)
+            # valor conocido: salto directo al caso (o al default)
+            if _is_const_int(v):
+                target = ins.default
+                for k, lab in ins.cases:
+                    if k == _const_val(v):
+                        target = lab
+                new_body.append(Jump(target=target))
+            else:
+                new_body.append(SwitchJump(value=v, cases=list(ins.cases), default=ins.default))
+            flush_maps()
+            continue
+
         if isinstance(ins, Call):
             # Sustituye args con copy-prop antes del flush
             args = tuple(_replace_operand(a, copy_map) for a in ins.args)
@@ -306,6 +345,17 @@ def _simplify_and_cse_blockwise(fn: IRFunction) -> None:
             flush_maps()
             continue
 
+        if isinstance(ins, Throw):
+            new_body.append(Throw(value=_replace_operand(ins.value, copy_map)))
+            flush_maps()
+            continue
+
+        if isinstance(ins, Catch):
+            # inicio del manejador: el valor llega del unwinder
+            _kill_var_in_maps(ins.dst, copy_map, expr_map)
+            new_body.append(ins)
+            continue
+
         if isinstance(ins, Jump):
             new_body.append(ins)
             flush_maps()
@@ -354,13 +404,14 @@ def _remove_unreachable(fn: IRFunction) -> None:
         if not reachable:
             continue
         new_body.append(ins)
-        if isinstance(ins, (Jump, Return)):
+        if isinstance(ins, (Jump, Return, SwitchJump, Throw)):
             reachable = False
     fn.body = new_body
 
 # PASO D: Limpiar saltos triviales y etiquetas muertas
 #  - goto L justo antes de 'L:' se elimina
-#  - etiquetas sin referencias se eliminan
+#  - etiquetas sin referencias se eliminan, salvo los manejadores de
+#    excepción y las que cambian de manejador (inicio/fin de un try)
 
 def _remove_trivial_jumps_and_dead_labels(fn: IRFunction) -> None:
     body = fn.body
@@ -385,13 +436,20 @@ def _remove_trivial_jumps_and_dead_labels(fn: IRFunction) -> None:
             targets.add(ins.target)
         elif isinstance(ins, CJump):
             targets.add(ins.if_true); targets.add(ins.if_false)
+        elif isinstance(ins, SwitchJump):
+            targets.update(lab for _, lab in ins.cases); targets.add(ins.default)
 
+    pads = set(fn.handlers.values())
+    cur: Optional[str] = None           # manejador del bloque en curso
     out2: List[Instr] = []
     for ins in body:
         if isinstance(ins, Label):
-            if ins.name in targets:
+            h = fn.handlers.get(ins.name)
+            if ins.name in targets or ins.name in pads or h != cur:
                 out2.append(ins)
+                cur = h
             else:
+                fn.handlers.pop(ins.name, None)
                 continue  # etiqueta sin referencias: eliminarla
         else:
             out2.append(ins)
@@ -403,12 +461,19 @@ def _remove_trivial_jumps_and_dead_labels(fn: IRFunction) -> None:
 
 def _rewrite_operands(ins: Instr,
                       map_temp: Optional[callable] = None,
-                      map_str: Optional[callable] = None) -> Instr:
+                      map_str: Optional[callable] = None,
+                      map_var: Optional[callable] = None,
+                      map_label: Optional[callable] = None) -> Instr:
     """
     Devuelve una nueva instrucción con Temp/ConstStr reescritos via map_temp/map_str.
+    map_var reescribe Temp/Local/Param y map_label las etiquetas (inlining).
     Si no hay cambios, devuelve un objeto equivalente.
     """
+    ml = map_label or (lambda lab: lab)
+
     def mop(op: Operand) -> Operand:
+        if map_var and isinstance(op, (Temp, Local, Param)):
+            return map_var(op)
         if map_temp and isinstance(op, Temp):
             return map_temp(op)
         if map_str and isinstance(op, ConstStr):
@@ -419,12 +484,15 @@ def _rewrite_operands(ins: Instr,
 
     # Clases de instrucción con sus campos
     if isinstance(ins, Label):
-        return ins
+        return Label(ml(ins.name)) if map_label else ins
     if isinstance(ins, Jump):
-        return Jump(target=ins.target)
+        return Jump(target=ml(ins.target))
     if isinstance(ins, CJump):
         return CJump(op=ins.op, a=mop(ins.a), b=mop(ins.b),
-                     if_true=ins.if_true, if_false=ins.if_false)
+                     if_true=ml(ins.if_true), if_false=ml(ins.if_false))
+    if isinstance(ins, SwitchJump):
+        return SwitchJump(value=mop(ins.value), cases=[(k, ml(l)) for k, l in ins.cases],
+                          default=ml(ins.default))
     if isinstance(ins, Move):
         return Move(dst=mop(ins.dst), src=mop(ins.src))
     if isinstance(ins, BinOp):
@@ -439,6 +507,10 @@ def _rewrite_operands(ins: Instr,
         return Call(func=ins.func, dst=new_dst, args=new_args)
     if isinstance(ins, Return):
         return Return(value=mop(ins.value) if ins.value is not None else None)
+    if isinstance(ins, Throw):
+        return Throw(value=mop(ins.value))
+    if isinstance(ins, Catch):
+        return Catch(dst=mop(ins.dst))
     if isinstance(ins, Load):
         return Load(dst=mop(ins.dst), base=mop(ins.base), offset=ins.offset)
     if isinstance(ins, Store):
@@ -447,6 +519,8 @@ def _rewrite_operands(ins: Instr,
         return LoadI(dst=mop(ins.dst), base=mop(ins.base), index=mop(ins.index))
     if isinstance(ins, StoreI):
         return StoreI(base=mop(ins.base), index=mop(ins.index), src=mop(ins.src))
+    if isinstance(ins, CheckIndex):
+        return CheckIndex(base=mop(ins.base), index=mop(ins.index), msg=mop(ins.msg))
     # fallback
     return ins
 
@@ -500,6 +574,8 @@ def _pool_strings(prog: IRProgram) -> None:
                 for a in ins.args: collect(a)
             elif isinstance(ins, Return):
                 if ins.value is not None: collect(ins.value)
+            elif isinstance(ins, Throw):
+                collect(ins.value)
             elif isinstance(ins, Load):
                 collect(ins.dst); collect(ins.base)
             elif isinstance(ins, Store):
@@ -508,6 +584,8 @@ def _pool_strings(prog: IRProgram) -> None:
                 collect(ins.dst); collect(ins.base); collect(ins.index)
             elif isinstance(ins, StoreI):
                 collect(ins.base); collect(ins.index); collect(ins.src)
+            elif isinstance(ins, CheckIndex):
+                collect(ins.msg)
             # Label, Jump, CJump no tienen ConstStr
 
     # 4) Filtrar prog.strings: conservamos sólo labels canónicos en uso
@@ -572,35 +650,343 @@ def _renumber_temps_per_function(prog: IRProgram, prefix: str = "t") -> None:
         fn.body = [_rewrite_operands(ins, map_temp=map_temp, map_str=None) for ins in fn.body]
 
 
+# PASO F: liberar strings intermedios de concatenaciones
+#  t = __concat(...) cuyo único uso antes de redefinirse es otro __concat
+#  (en el mismo bloque) -> '__str_free(t)' justo después de ese uso
+#  (libera el bloque del string: cabecera de longitud incluida).
+#  Sólo temps sin usos expuestos hacia arriba (muertos a la entrada de
+#  todo bloque), así ningún otro camino puede leer el bloque liberado.
+
+def _upward_exposed_temps(fn: IRFunction) -> set:
+    exposed: set = set()
+    defined: set = set()
+    for ins in fn.body:
+        if isinstance(ins, Label):
+            defined = set()
+            continue
+        for u in _instr_uses(ins):
+            if isinstance(u, Temp) and u.name not in defined:
+                exposed.add(u.name)
+        d = _instr_def_temp(ins)
+        if d is not None:
+            defined.add(d)
+    return exposed
+
+def _free_concat_temps(fn: IRFunction) -> int:
+    exposed = _upward_exposed_temps(fn)
+    frees: Dict[int, List[str]] = {}             # índice -> temps a liberar después
+    pending: Dict[str, List[int]] = {}           # temp -> [usos, índice del único uso]
+
+    def close(name: str, k: int):
+        uses, at = pending.pop(name)
+        if uses == 1 and at >= 0 and at != k:
+            frees.setdefault(at, []).append(name)
+
+    for k, ins in enumerate(fn.body):
+        if isinstance(ins, Label):
+            for name in list(pending):
+                close(name, -1)
+            continue
+        is_concat = isinstance(ins, Call) and ins.func == "__concat"
+        for u in _instr_uses(ins):
+            st = pending.get(u.name) if isinstance(u, Temp) else None
+            if st is not None:
+                st[0] += 1
+                st[1] = k if (is_concat and st[0] == 1) else -1
+        d = _instr_def_temp(ins)
+        if d is not None and d in pending:
+            close(d, k)                          # redefinido: no liberar el nuevo valor
+        if is_concat and d is not None and d not in exposed:
+            pending[d] = [0, -1]
+    for name in list(pending):
+        close(name, -1)
+
+    if not frees:
+        return 0
+    body: List[Instr] = []
+    for k, ins in enumerate(fn.body):
+        body.append(ins)
+        for name in frees.get(k, ()):
+            body.append(Call(None, "__str_free", [Temp(name)]))
+    fn.body = body
+    return sum(len(v) for v in frees.values())
+
+# PASO W: print(__concat(...)) -> un print por operando
+#  t = __concat(a1..an) ; __print_str(t)   (t de un solo uso)
+#    -> printString(a1) ... __print_str(an)
+#  y un operando ai = toString(x) de un solo uso pasa a printInteger(x)
+#  (el último a print(x), que agrega el '\n'). Sin reservas en el heap.
+
+def _defines(ins: Instr, op: Operand) -> bool:
+    return getattr(ins, "dst", None) == op
+
+def _single_use_at(body: List[Instr], d: int, exposed: set) -> int:
+    """Índice del único uso del temp definido en body[d] (-1 si hay otro
+    número de usos o el valor sale del bloque); como en el PASO F."""
+    name = _instr_def_temp(body[d])
+    if name is None or name in exposed:
+        return -1
+    at = -1
+    for k in range(d + 1, len(body)):
+        ins = body[k]
+        if isinstance(ins, Label):
+            break
+        if any(isinstance(u, Temp) and u.name == name for u in _instr_uses(ins)):
+            if at >= 0:
+                return -1
+            at = k
+        if _instr_def_temp(ins) == name:
+            break
+    return at
+
+def _fuse_print_concat(fn: IRFunction) -> int:
+    body = fn.body
+    exposed = _upward_exposed_temps(fn)
+    dead: set = set()                   # índices a eliminar (concat / toString)
+    repl: Dict[int, List[Instr]] = {}   # índice del print -> secuencia nueva
+    for k in range(1, len(body)):
+        pr, cat = body[k], body[k - 1]
+        if not (isinstance(pr, Call) and pr.func == "__print_str" and len(pr.args) == 1
+                and isinstance(cat, Call) and cat.func == "__concat"
+                and cat.dst == pr.args[0] and _single_use_at(body, k - 1, exposed) == k):
+            continue
+        # los toString candidatos están en el mismo bloque, antes del concat
+        start = k - 1
+        while start > 0 and not isinstance(body[start - 1], Label):
+            start -= 1
+        pieces: List[Tuple[str, Operand]] = []
+        for a in cat.args:
+            j = None
+            if isinstance(a, Temp):
+                j = next((j for j in range(k - 2, start - 1, -1) if _defines(body[j], a)), None)
+            src = body[j] if j is not None else None
+            if (isinstance(src, Call) and src.func == "toString" and len(src.args) == 1
+                    and _single_use_at(body, j, exposed) == k - 1
+                    and not any(_defines(body[m], src.args[0]) for m in range(j + 1, k - 1))):
+                pieces.append(("int", src.args[0]))
+                dead.add(j)
+            else:
+                pieces.append(("str", a))
+        seq: List[Instr] = []
+        for i, (kind, v) in enumerate(pieces):
+            last = i == len(pieces) - 1
+            if kind == "int":
+                seq.append(Call(pr.dst if last else None, "print" if last else "printInteger", [v]))
+            else:
+                seq.append(Call(pr.dst if last else None, "__print_str" if last else "printString", [v]))
+        dead.add(k - 1)
+        repl[k] = seq
+
+    if not repl:
+        return 0
+    out: List[Instr] = []
+    for k, ins in enumerate(body):
+        if k in repl:
+            out += repl[k]
+        elif k not in dead:
+            out.append(ins)
+    fn.body = out
+    return len(repl)
+
+# PASO V: devirtualización local
+#  r = __new(size, id) ... __vcall(slot, r, args..)  (mismo bloque, r sin
+#  redefinir) -> llamada directa a vtables[id][slot]. IRGen ya resuelve
+#  las llamadas cuyo destino es único en la jerarquía; esto cubre los
+#  receptores de tipo base cuya clase exacta se ve en el código (p.ej.
+#  tras inlinear una fábrica).
+
+def _devirtualize_calls(fn: IRFunction, vtables: List[List[str]]) -> int:
+    known: Dict[str, int] = {}          # variable -> id de clase exacta
+    n = 0
+    body: List[Instr] = []
+    for ins in fn.body:
+        if isinstance(ins, Label):
+            known.clear()
+        elif (isinstance(ins, Call) and ins.func == "__vcall" and len(ins.args) >= 2
+                and _is_const_int(ins.args[0]) and _op_key(ins.args[1]) in known):
+            slots = vtables[known[_op_key(ins.args[1])]]
+            ins = Call(ins.dst, slots[_const_val(ins.args[0])], tuple(ins.args[1:]))
+            n += 1
+        dst = getattr(ins, "dst", None)
+        if isinstance(dst, (Temp, Local, Param)):
+            key = _op_key(dst)
+            if (isinstance(ins, Call) and ins.func == "__new" and len(ins.args) == 2
+                    and _is_const_int(ins.args[1])):
+                known[key] = _const_val(ins.args[1])
+            elif isinstance(ins, Move) and _op_key(ins.src) in known:
+                known[key] = known[_op_key(ins.src)]
+            else:
+                known.pop(key, None)
+        body.append(ins)
+    fn.body = body
+    return n
+
+# PASO P: inlining guiado por perfil
+#  - sólo aristas (llamador, llamado) con >= INLINE_MIN_CALLS llamadas
+#  - llamado pequeño (<= INLINE_MAX_INSTRS) y no recursivo directo
+#  - parámetros/locales/temps del llamado pasan a locales/temps frescos
+#    del llamador; 'return v' -> dst = v; goto fin
+#  - los bloques del llamado fuera de todo try heredan el manejador del
+#    bloque de la llamada (un throw del llamado llegaba ahí)
+
+INLINE_MIN_CALLS = 8
+INLINE_MAX_INSTRS = 24
+INLINE_MAX_CALLER = 600     # no crecer un llamador por encima de esto
+
+def _fn_size(fn: IRFunction) -> int:
+    return sum(1 for ins in fn.body if not isinstance(ins, Label))
+
+def _inline_call(caller: IRFunction, callee: IRFunction, call: Call, n: int,
+                 handler: Optional[str] = None) -> List[Instr]:
+    pre = f"__inl{n}_"
+
+    def new_local(name: str) -> Local:
+        loc = Local(pre + name)
+        if loc.name not in caller.locals:
+            caller.locals.append(loc.name)
+        if caller.frame is not None:
+            caller.frame.ensure_local(loc.name)
+        return loc
+
+    def map_var(op: Operand) -> Operand:
+        if isinstance(op, Temp):
+            return Temp(pre + op.name)
+        # un Local de bloque puede sombrear a un Param con el mismo nombre
+        return new_local(("p_" if isinstance(op, Param) else "l_") + op.name)
+
+    L_ret = f"Lret{pre}"
+    for ins in callee.body:
+        if isinstance(ins, Label):
+            h = callee.handlers.get(ins.name)
+            h = h + pre if h is not None else handler
+            if h is not None:
+                caller.handlers[ins.name + pre] = h
+    if handler is not None:
+        caller.handlers[L_ret] = handler
+    out: List[Instr] = []
+    for i, p in enumerate(callee.params):
+        out.append(Move(new_local("p_" + p), call.args[i] if i < len(call.args) else ConstInt(0)))
+    for ins in callee.body:
+        if isinstance(ins, Return):
+            if call.dst is not None:
+                v = map_var(ins.value) if isinstance(ins.value, (Temp, Local, Param)) else ins.value
+                out.append(Move(call.dst, v if v is not None else ConstInt(0)))
+            out.append(Jump(L_ret))
+            continue
+        out.append(_rewrite_operands(ins, map_var=map_var, map_label=lambda lab: lab + pre))
+    if call.dst is not None and not isinstance(out[-1] if out else None, Jump):
+        out.append(Move(call.dst, ConstInt(0)))     # caer al final = return sin valor
+    out.append(Label(L_ret))
+    return out
+
+def _inline_hot_calls(prog: IRProgram, profile) -> int:
+    """Inlining de las aristas de llamada calientes; devuelve sitios expandidos."""
+    edges = sorted(profile.call_edges.items(), key=lambda kv: -kv[1])
+    n = 0
+    for (src, dst), hits in edges:
+        if hits < INLINE_MIN_CALLS or src == dst:
+            continue
+        caller, callee = prog.functions.get(src), prog.functions.get(dst)
+        if caller is None or callee is None:
+            continue
+        size = _fn_size(callee)
+        if size > INLINE_MAX_INSTRS:
+            continue
+        if any(isinstance(i, Call) and i.func == dst for i in callee.body):
+            continue
+        body: List[Instr] = []
+        handler: Optional[str] = None
+        for ins in caller.body:
+            if isinstance(ins, Label):
+                handler = caller.handlers.get(ins.name)
+            if (isinstance(ins, Call) and ins.func == dst
+                    and _fn_size(caller) + len(body) + size <= INLINE_MAX_CALLER):
+                body += _inline_call(caller, callee, ins, n, handler)
+                n += 1
+            else:
+                body.append(ins)
+        caller.body = body
+    return n
+
 # Orquestador
 
-def optimize_program(prog: IRProgram, *, max_iter: int = 2) -> IRProgram:
+def opt_stamp(prog: IRProgram) -> tuple:
+    """
+    Forma del IR sin recorrer instrucciones: cada cuerpo por referencia y
+    largo, manejadores, strings, vtables y entrada. La comparación es por
+    igualdad, con atajo por identidad: el mismo cuerpo se compara en O(1).
+    Detecta pases que reemplazan o alargan/acortan un cuerpo y cualquier
+    cambio fuera de los cuerpos; no la edición de una instrucción en su
+    lugar (ningún pase posterior a optimize_program lo hace: los backends
+    trabajan sobre copias).
+    """
+    fns = tuple((name, fn.body, len(fn.body), tuple(fn.handlers.items()))
+                for name, fn in prog.functions.items())
+    vts = tuple((cls, tuple(slots)) for cls, slots in prog.vtables.items())
+    return fns, tuple(prog.strings.items()), vts, prog.entry
+
+
+def is_optimized(prog: IRProgram, level: int = OPT_LEVEL) -> bool:
+    """True si prog ya pasó por optimize_program (y no cambió después)."""
+    return (prog.opt_level >= level
+            and prog.opt_stamp is not None
+            and prog.opt_stamp == opt_stamp(prog))
+
+
+def optimize_program(prog: IRProgram, *, max_iter: int = 2, profile=None) -> IRProgram:
     """
     Optimiza el IR de forma segura (semantics-preserving).
     Pases:
       - S1: pooling/dedup de strings (global)
+      - P:  inlining de llamadas calientes (sólo con profile, ver ir/profile.py)
       - A:  CSE/propagación/folding (por bloque)
+      - V:  devirtualización de __vcall con receptor de clase conocida
       - B:  DCE de temps
       - C:  poda de inalcanzable
       - D:  limpieza de saltos/etiquetas
+      - R:  quitar CheckIndex redundantes (análisis de rangos, ver ir/bounds.py)
+      - W:  print(__concat(...)) -> un print por operando
+      - F:  liberar strings intermedios de '+' (runtime __alloc/__free)
+      - L:  layout de bloques (rotación de bucles, fríos al final; ver ir/layout.py)
       - S2: renumeración de temporales por función (t0..tn)
     Varias vueltas A–D para estabilizar. S1 y S2 son idempotentes.
+    Si prog ya está optimizado (opt_level/opt_stamp) se devuelve sin tocarlo,
+    salvo que se pase un perfil nuevo.
     """
+    if profile is None and is_optimized(prog):
+        return prog
+
     # Deduplicar strings antes, para que toda la optimización los vea ya canónicos
     _pool_strings(prog)
 
+    if profile is not None:
+        _inline_hot_calls(prog, profile)
+
+    vtables = list(prog.vtables.values())
     for _ in range(max_iter):
         for fn in prog.functions.values():
             _simplify_and_cse_blockwise(fn)    # CSE local + copy-prop + folding
+            _devirtualize_calls(fn, vtables)   # __vcall -> llamada directa
             _dce_temps_function(fn)            # dead temps
             _remove_unreachable(fn)            # inalcanzable lineal
             _remove_trivial_jumps_and_dead_labels(fn)
 
+    # Layout de bloques (estático o con el perfil) y limpieza de los goto que sobren
+    shrinks = shrinking_functions(prog)
+    for fn in prog.functions.values():
+        eliminate_bounds_checks(fn, shrinks)
+        _fuse_print_concat(fn)
+        _free_concat_temps(fn)
+        layout_function(fn, profile.blocks.get(fn.name) if profile is not None else None)
+        _remove_trivial_jumps_and_dead_labels(fn)
+
     # Limpiar strings otra vez por si DCE u otras pases quitaron uses
     _pool_strings(prog)
 
     # Renumerar temps por función al final (legibilidad; backends ya compactan slots)
     _renumber_temps_per_function(prog)
 
+    prog.opt_level = OPT_LEVEL
+    prog.opt_stamp = opt_stamp(prog)
     return prog
 
@@ -5,7 +5,7 @@ from compiscript.ir.tac import (
     IRProgram, IRFunction, Instr, Operand,
     Label, Jump, CJump, Move, BinOp, UnaryOp, Cmp, Call, Return,
     Temp, Local, Param, ConstInt, ConstStr,
-    Load, Store, LoadI, StoreI
+    Load, Store, LoadI, StoreI, CheckIndex, SwitchJump, Throw, Catch
 )
 
 
@@ -24,6 +24,9 @@ def _ins(i: Instr) -> str:
         return f"  goto {i.target}"
     if isinstance(i, CJump):
         return f"  if {_opnd(i.a)} {i.op} {_opnd(i.b)} goto {i.if_true} else {i.if_false}"
+    if isinstance(i, SwitchJump):
+        cs = ", ".join(f"{k}: {lab}" for k, lab in i.cases)
+        return f"  switch {_opnd(i.value)} [{cs}] else {i.default}"
     if isinstance(i, Move):
         return f"  {_opnd(i.dst)} = {_opnd(i.src)}"
     if isinstance(i, BinOp):
@@ -38,9 +41,11 @@ def _ins(i: Instr) -> str:
     if isinstance(i, Store):
         return f"  *({_opnd(i.base)} + {i.offset}) = {_opnd(i.src)}"
     if isinstance(i, LoadI):
-        return f"  {_opnd(i.dst)} = *({_opnd(i.base)} + 4 + {_opnd(i.index)}*4)"
+        return f"  {_opnd(i.dst)} = {_opnd(i.base)}[{_opnd(i.index)}]"
     if isinstance(i, StoreI):
-        return f"  *({_opnd(i.base)} + 4 + {_opnd(i.index)}*4) = {_opnd(i.src)}"
+        return f"  {_opnd(i.base)}[{_opnd(i.index)}] = {_opnd(i.src)}"
+    if isinstance(i, CheckIndex):
+        return f"  check {_opnd(i.index)} < len({_opnd(i.base)}) else throw {_opnd(i.msg)}"
 
     if isinstance(i, Call):
         args = ", ".join(_opnd(a) for a in i.args)
@@ -49,6 +54,10 @@ def _ins(i: Instr) -> str:
         return f"  {_opnd(i.dst)} = call {i.func}({args})"
     if isinstance(i, Return):
         return "  return" if i.value is None else f"  return {_opnd(i.value)}"
+    if isinstance(i, Throw):
+        return f"  throw {_opnd(i.value)}"
+    if isinstance(i, Catch):
+        return f"  {_opnd(i.dst)} = catch"
     return f"  ; {i}"
 
 def format_ir(prog: IRProgram) -> str:
@@ -62,11 +71,20 @@ def format_ir(prog: IRProgram) -> str:
             s = s.replace("\n", "\\n").replace("\r", "\\r")
             out.append(f";   {k}: {s}")
         out.append("")
+    # vtables: id de clase (el que usa __new) y métodos por slot
+    if prog.vtables:
+        out.append("; .vtables")
+        for cid, (cls, slots) in enumerate(prog.vtables.items()):
+            out.append(f";   {cid} {cls}: {', '.join(slots)}")
+        out.append("")
     # functions
     for fname, fn in prog.functions.items():
         out.append(f"func {fname}({', '.join(fn.params)})")
         if fn.locals:
             out.append(f"  ; locals: {', '.join(fn.locals)}")
+        if fn.handlers:
+            hs = ", ".join(f"{b} -> {h}" for b, h in fn.handlers.items())
+            out.append(f"  ; handlers: {hs}")
         for ins in fn.body:
             out.append(_ins(ins))
         out.append("endfunc\n")
@@ -0,0 +1,101 @@
+# src/compiscript/ir/profile.py
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from compiscript.ir.tac import IRProgram, Label, Jump, CJump, SwitchJump
+from compiscript.ir.interp import TACInterpreter, DEFAULT_MAX_STEPS
+
+# -------------------------------------------------------------------
+# Perfil de ejecución del IR (intérprete TAC instrumentado).
+#   - bloques: ejecuciones por etiqueta (y '@entry') en cada función
+#   - funciones: llamadas e instrucciones TAC propias (sin callees)
+#   - aristas de llamada (llamador, llamado) -> llamadas
+#   - bucles: cabeceras de back edges (salto a una etiqueta anterior)
+# optimize_program(prog, profile=...) lo usa para inlining guiado.
+# -------------------------------------------------------------------
+
+
+@dataclass
+class Profile:
+    steps: int = 0
+    calls: Dict[str, int] = field(default_factory=dict)
+    call_edges: Dict[Tuple[str, str], int] = field(default_factory=dict)
+    blocks: Dict[str, Dict[str, int]] = field(default_factory=dict)      # fn -> {bloque: ejecuciones}
+    fn_instrs: Dict[str, int] = field(default_factory=dict)              # fn -> instrucciones propias
+    loops: List[Tuple[str, str, int]] = field(default_factory=list)      # (fn, cabecera, iteraciones)
+    fault: Optional[str] = None                                          # la ejecución no terminó
+
+    def block_count(self, fn: str, label: str) -> int:
+        return self.blocks.get(fn, {}).get(label, 0)
+
+    def hot_functions(self, top: int = 10) -> List[Tuple[str, int]]:
+        return sorted(self.fn_instrs.items(), key=lambda kv: (-kv[1], kv[0]))[:top]
+
+
+def _loop_headers(prog: IRProgram) -> List[Tuple[str, str]]:
+    """(fn, etiqueta) destino de algún salto hacia atrás."""
+    out: List[Tuple[str, str]] = []
+    for fname, fn in prog.functions.items():
+        seen: set = set()
+        heads: List[str] = []
+        for ins in fn.body:
+            if isinstance(ins, Label):
+                seen.add(ins.name)
+                continue
+            targets: List[str] = []
+            if isinstance(ins, Jump):
+                targets = [ins.target]
+            elif isinstance(ins, CJump):
+                targets = [ins.if_true, ins.if_false]
+            elif isinstance(ins, SwitchJump):
+                targets = [lab for _, lab in ins.cases] + [ins.default]
+            for t in targets:
+                if t in seen and t not in heads:
+                    heads.append(t)
+        out += [(fname, h) for h in heads]
+    return out
+
+
+def profile_program(prog: IRProgram, *, max_steps: int = DEFAULT_MAX_STEPS) -> Profile:
+    """Ejecuta prog con contadores; si la ejecución falla, el perfil es parcial."""
+    it = TACInterpreter(prog, max_steps=max_steps, profile=True)
+    prof = Profile()
+    try:
+        it.run()
+    except RuntimeError:
+        prof.fault = it.fault
+    prof.steps = it.steps
+    prof.calls = dict(it.calls)
+    prof.call_edges = dict(it.call_edges)
+    for name, lf in it.fns.items():
+        prof.blocks[name] = dict(zip(lf.blocks, lf.block_hits))
+        prof.fn_instrs[name] = sum(h * n for h, n in zip(lf.block_hits, lf.block_sizes))
+    for fname, head in _loop_headers(prog):
+        hits = prof.block_count(fname, head)
+        if hits:
+            prof.loops.append((fname, head, hits))
+    prof.loops.sort(key=lambda x: -x[2])
+    return prof
+
+
+def format_profile(p: Profile, top: int = 10) -> str:
+    total = max(p.steps, 1)
+    lines = [f"instrucciones TAC ejecutadas: {p.steps}"]
+    if p.fault:
+        lines.append(f"(ejecución interrumpida: {p.fault})")
+    lines.append("")
+    lines.append("funciones calientes (instrucciones propias):")
+    for name, n in p.hot_functions(top):
+        if n:
+            lines.append(f"  {name:<32} {n:>12}  {100.0 * n / total:5.1f}%  llamadas: {p.calls.get(name, 0)}")
+    lines.append("")
+    lines.append("bucles calientes (iteraciones de la cabecera):")
+    for fname, head, hits in p.loops[:top]:
+        lines.append(f"  {fname}:{head:<24} {hits:>12}")
+    lines.append("")
+    lines.append("llamadas (llamador -> llamado):")
+    edges = sorted(p.call_edges.items(), key=lambda kv: (-kv[1], kv[0]))
+    for (src, dst), n in edges[:top]:
+        lines.append(f"  {src} -> {dst:<32} {n:>10}")
+    return "\n".join(lines)
@@ -1,7 +1,7 @@
 # compiscript/ir/tac.py
 from __future__ import annotations
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, TYPE_CHECKING
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from compiscript.codegen.frame import Frame
@@ -61,6 +61,15 @@ class CJump(Instr):
     if_false: str
 
 
+@dataclass
+class SwitchJump(Instr):
+    """goto L_k si value == k para (k, L_k) en cases; si ninguno, goto default.
+    Salto indexado: el backend decide tabla de saltos o árbol de búsqueda."""
+    value: Operand
+    cases: List[Tuple[int, str]]   # ordenado por valor, sin repetidos
+    default: str
+
+
 @dataclass
 class Move(Instr):
     dst: Operand
@@ -103,6 +112,19 @@ class Return(Instr):
     value: Optional[Operand] = None
 
 
+# --- excepciones: el manejador de cada bloque está en IRFunction.handlers ---
+@dataclass
+class Throw(Instr):
+    """Lanza value (un string): salta al manejador del bloque o desapila."""
+    value: Operand
+
+
+@dataclass
+class Catch(Instr):
+    """Primera instrucción de un manejador: dst = valor lanzado."""
+    dst: Operand
+
+
 # --- NUEVO: acceso a memoria para campos/miembros ---
 @dataclass
 class Load(Instr):
@@ -121,18 +143,39 @@ class Store(Instr):
 
 @dataclass
 class LoadI(Instr):
-    """dst = *(base + 4 + index*4)   ; header de 4 bytes para length"""
+    """dst = *(*(base + 8) + index*4)   ; elementos vía el puntero de datos (ARR_HEADER)"""
     dst: Operand
     base: Operand
     index: Operand  # int
 
 @dataclass
 class StoreI(Instr):
-    """*(base + 4 + index*4) = src"""
+    """*(*(base + 8) + index*4) = src"""
     base: Operand
     index: Operand
     src: Operand
 
+@dataclass
+class CheckIndex(Instr):
+    """Modo seguro (IRGen(safe=True)): si no 0 <= index < *(base + 0),
+    lanza msg como Throw. ir/bounds.py quita las que se pueden probar."""
+    base: Operand
+    index: Operand
+    msg: Operand    # ConstStr
+
+
+OBJ_HEADER = 4  # bytes antes del primer campo (puntero a la vtable)
+
+# Arreglo: cabecera [longitud, capacidad, datos] y, al crearlo, los
+# elementos a continuación (datos = base + ARR_HEADER). __push(arr, v)
+# duplica la capacidad al llenarse: copia a un bloque nuevo y libera el
+# anterior salvo que sea el del literal. La capacidad nunca baja.
+ARR_HEADER = 12
+
+
+def vtable_label(cls: str) -> str:
+    return f"__vt_{cls}"
+
 
 # -------------------------
 # Unidades IR
@@ -143,6 +186,9 @@ class IRFunction:
     params: List[str]
     body: List[Instr] = field(default_factory=list)
     locals: List[str] = field(default_factory=list)  # nombres de locales (let/const)
+    # etiqueta de bloque -> etiqueta del manejador (bloques dentro de un try);
+    # el bloque de entrada y los que no figuran no tienen manejador
+    handlers: Dict[str, str] = field(default_factory=dict)
     frame: Optional["Frame"] = None  # rellenado por IRGen/x86
 
 
@@ -150,4 +196,16 @@ class IRFunction:
 class IRProgram:
     functions: Dict[str, IRFunction] = field(default_factory=dict)
     strings: Dict[str, bytes] = field(default_factory=dict)  # label -> bytes
+    # clase -> métodos por slot (nombres IR); el id de clase que usa
+    # '__new' es la posición en este dict. Objeto: palabra 0 = vtable,
+    # campos desde OBJ_HEADER.
+    #   __new(size, id)             -> reserva + vtable de la clase id
+    #   __vcall(slot, recv, args..) -> vtable(recv)[slot](recv, args..)
+    vtables: Dict[str, List[str]] = field(default_factory=dict)
     entry: Optional[str] = None
+    # estado de optimización: 0 = IR tal cual sale de IRGen.
+    # opt_stamp es la forma del IR al terminar optimize_program (ver
+    # optimize.opt_stamp); si el IR cambia después, deja de coincidir y
+    # vuelve a considerarse sin optimizar.
+    opt_level: int = 0
+    opt_stamp: Optional[tuple] = field(default=None, compare=False, repr=False)
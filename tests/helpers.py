@@ -19,3 +19,10 @@ def analyze_source(src: str):
 
 def errors_of(src: str):
     return analyze_source(src)[1].errors
+
+
+def build_ir(src: str, safe: bool = False):
+    from compiscript.codegen.irgen import IRGen
+    ast, checker = analyze_source(src)
+    assert checker.errors == [], checker.errors
+    return IRGen(safe=safe).build(ast)
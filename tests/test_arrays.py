@@ -0,0 +1,100 @@
+from helpers import build_ir, errors_of
+from compiscript.codegen.ass_mips import MIPSNaive
+from compiscript.codegen.mips_sim import MIPSSim
+from compiscript.ir.interp import TACInterpreter
+from compiscript.ir.optimize import optimize_program
+
+
+SRC = r"""
+function fill(xs: integer[], n: integer): integer {
+  let i: integer = 0;
+  while (i < n) { push(xs, i * i); i = i + 1; }
+  return length(xs);
+}
+function drop(xs: integer[]): integer {
+  return pop(xs);
+}
+let a: integer[] = [];
+print(fill(a, 10));
+let b: integer[] = [7, 8];
+push(b, 9);
+push(b, 10);
+print(length(b) + b[3]);
+let s: integer = 0;
+foreach (x in a) { s = s + x; }
+print(s);
+print(pop(a) + drop(b));
+print(length(a) * 100 + length(b));
+let names: string[] = ["x"];
+push(names, "y");
+print(pop(names) + pop(names));
+try {
+  print(pop(names));
+} catch (e) {
+  print("atrapado: " + e);
+}
+let c: integer[] = b;
+drop(c);
+print(b[2]);
+"""
+
+EXPECTED = ("10\n14\n285\n91\n903\nyx\natrapado: pop de un arreglo vacío\n"
+            "Excepción no capturada: Índice fuera de rango\n")
+
+
+def test_push_grows_past_capacity_and_pop_shrinks_through_aliases():
+    # a crece desde [] y b más allá de su literal; b[2] tras el pop de su
+    # alias c ya no existe: el check de b[2] no se puede quitar
+    for safe in (False, True):
+        raw = build_ir(SRC, safe=safe)
+        opt = optimize_program(build_ir(SRC, safe=safe))
+        for prog in (raw, opt):
+            it = TACInterpreter(prog)
+            it.run()
+            if safe:
+                assert (it.output, it.exit_code) == (EXPECTED, 1)
+            else:
+                assert it.output.startswith(EXPECTED[:EXPECTED.index("Excepción")])
+        if safe:
+            for ds in (False, True):
+                sim = MIPSSim(MIPSNaive(delay_slots=ds).compile(opt))
+                assert (sim.run(), sim.exit_code) == (EXPECTED, 1)
+
+
+def test_array_builtins_are_typed():
+    errs = errors_of(r"""
+let a: integer[] = [1];
+push(a, "s");
+let n: integer = 3;
+push(n, 1);
+let s: string = pop(a);
+let e: string[] = [];
+push(e, "ok");
+""")
+    assert len(errs) == 3
+    assert "No se puede agregar string" in errs[0]
+    assert "'push' espera un arreglo" in errs[1]
+    assert "'s'" in errs[2]
+
+
+def test_user_declarations_shadow_the_array_builtins():
+    src = r"""
+print(length([1, 2, 3]));
+function length(xs: integer[]): integer { return 100; }
+function f(xs: integer[]): integer {
+  function push(a: integer[], v: integer): integer { return v * 2; }
+  return push(xs, 4);
+}
+let pop: integer = 5;
+let a: integer[] = [1];
+print(f(a) + pop + a[0]);
+print(push(a, 7));
+"""
+    assert errors_of(src) == []
+    assert errors_of(src + "pop(a);\n") != []     # 'pop' ya es la variable
+    prog = optimize_program(build_ir(src))
+    it = TACInterpreter(prog)
+    it.run()
+    # el push global sigue siendo el builtin
+    assert it.output == "100\n14\n2\n"
+    assert MIPSSim(MIPSNaive().compile(prog)).run() == "100\n14\n2\n"
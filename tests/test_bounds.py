@@ -0,0 +1,55 @@
+from helpers import build_ir
+from compiscript.codegen.ass_mips import MIPSNaive
+from compiscript.codegen.mips_sim import MIPSSim
+from compiscript.codegen.x86_naive import X86Naive
+from compiscript.ir.interp import TACInterpreter
+from compiscript.ir.optimize import optimize_program
+from compiscript.ir.tac import CheckIndex
+
+
+SRC = r"""
+function sum(xs: integer[]): integer {
+  let s: integer = 0;
+  foreach (x in xs) { s = s + x; }
+  return s;
+}
+function at(xs: integer[], i: integer): integer {
+  return xs[i] + xs[i];
+}
+let a: integer[] = [4, 5, 6];
+let i: integer = 0;
+while (i < 3) { a[i] = a[i] * 2; i = i + 1; }
+print(sum(a) + a[2]);
+try {
+  print(at(a, 3));
+} catch (e) {
+  print("atrapado: " + e);
+}
+print(at(a, 0 - 1));
+"""
+
+EXPECTED = "42\natrapado: Índice fuera de rango\nExcepción no capturada: Índice fuera de rango\n"
+
+
+def checks(prog, fn):
+    return sum(isinstance(i, CheckIndex) for i in prog.functions[fn].body)
+
+
+def test_bounds_checks_throw_and_redundant_ones_are_removed():
+    raw = build_ir(SRC, safe=True)
+    opt = optimize_program(build_ir(SRC, safe=True))
+    # bucle acotado por la constante y a[2] sobre el literal: probados; en
+    # 'at' sólo queda el primero de los dos xs[i]; foreach no necesita checks
+    assert checks(raw, "sum") == 0 and checks(opt, "sum") == 0
+    assert checks(raw, "__toplevel") == 3 and checks(opt, "__toplevel") == 0
+    assert checks(raw, "at") == 2 and checks(opt, "at") == 1
+    assert checks(build_ir(SRC), "at") == 0         # sin safe no hay checks
+
+    for prog in (raw, opt):
+        it = TACInterpreter(prog)
+        it.run()
+        assert (it.output, it.exit_code) == (EXPECTED, 1)
+    for ds in (False, True):
+        sim = MIPSSim(MIPSNaive(delay_slots=ds).compile(opt))
+        assert (sim.run(), sim.exit_code) == (EXPECTED, 1)
+    assert "jae oob_" in X86Naive().compile(opt)
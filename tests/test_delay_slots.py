@@ -0,0 +1,97 @@
+from helpers import build_ir
+from compiscript.codegen.ass_mips import MIPSNaive
+from compiscript.codegen.delay_slots import fill_delay_slots, pad_delay_slots
+from compiscript.codegen.mips_sim import MIPSSim
+from compiscript.ir.interp import run_program
+from compiscript.ir.optimize import optimize_program
+
+
+def _asm(text):
+    return text.strip("\n").split("\n")
+
+
+def test_slots_take_independent_instructions_and_simplify_jumps():
+    out, st = fill_delay_slots(_asm("""
+main:
+  addiu $t0, $zero, 1
+  addiu $t1, $zero, 2
+  beq $t1, $zero, L1
+  nop
+  addiu $t2, $t0, 3
+  lw $t3, 0($sp)
+  bne $t3, $zero, L1
+  nop
+  j L2
+  nop
+L1:
+  addiu $v0, $zero, 10
+L2:
+  syscall
+"""))
+    # el que define $t1 no puede ir al slot del beq que lo lee; bne+j se invierte
+    assert out == _asm("""
+main:
+  addiu $t1, $zero, 2
+  beq $t1, $zero, L1
+  addiu $t0, $zero, 1
+  lw $t3, 0($sp)
+  beq $t3, $zero, L2
+  addiu $t2, $t0, 3
+L1:
+  addiu $v0, $zero, 10
+L2:
+  syscall
+""")
+    assert (st["filled_above"], st["branches_inverted"], st["nops_out"]) == (2, 1, 0)
+
+
+def test_slot_stays_nop_without_an_independent_instruction():
+    src = _asm("""
+main:
+  lw $t0, 0($sp)
+  beq $t0, $zero, L1
+  nop
+  syscall
+L1:
+  jr $ra
+  nop
+""")
+    out, st = fill_delay_slots(src)
+    # lw define lo que lee el beq; syscall y el inicio de bloque cortan la búsqueda
+    assert out == src and st["nops_out"] == 2
+    padded, _ = pad_delay_slots(_asm("""
+main:
+  beq $t0, $zero, L1
+  jal f
+L1:
+  jr $ra
+"""))
+    assert [ln.strip() for ln in padded if ln.strip() == "nop"] == ["nop"] * 3
+
+
+def test_filled_slots_beat_nop_padding_in_delayed_mode():
+    src = r"""
+    function fib(n: integer): integer {
+      if (n < 2) { return n; }
+      return fib(n - 1) + fib(n - 2);
+    }
+    let s: integer = 0;
+    let i: integer = 0;
+    while (i < 40) {
+      switch (i % 3) {
+        case 0: s = s + fib(i % 9); break;
+        case 1: s = s - i; break;
+        default: s = s * 2 % 1000;
+      }
+      i = i + 1;
+    }
+    print(s);
+    """
+    prog = optimize_program(build_ir(src))
+    expected = run_program(prog)
+    cycles = {}
+    for fill in (False, True):
+        sim = MIPSSim(MIPSNaive(delay_slots=True, fill_slots=fill).compile(prog))
+        assert sim.delayed and sim.run() == expected
+        cycles[fill] = sim.stats["cycles"]
+    assert cycles[True] < cycles[False]
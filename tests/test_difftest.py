@@ -0,0 +1,30 @@
+from helpers import build_ir
+from compiscript.difftest import diff_file, example_files, run_stages
+
+
+def test_examples_agree_across_pipeline_stages():
+    results = [diff_file(p, max_steps=200_000) for p in example_files()]
+    compared = [r for r in results if r.complete]
+    assert len(compared) >= 10
+    assert {r.path: r.mismatches() for r in compared if r.mismatches()} == {}
+
+
+def test_constant_folding_matches_runtime_semantics():
+    src = r"""
+    let a: integer = -7;
+    let big: integer = 2147483647;
+    print(-7 / 2);
+    print(-7 % 2);
+    print(a / 2);
+    print(a % 2);
+    print(2147483647 + 1);
+    print(big + 1);
+    let ok: boolean = (a > 0) || (a < -5);
+    print(ok);
+    ok = (a > 0) || (a > 5);
+    print(ok);
+    """
+    stages = run_stages(build_ir(src))
+    ref = stages[0].output
+    assert ref == "-3\n-1\n-3\n-1\n-2147483648\n-2147483648\n1\n0\n"
+    assert all(s.output == ref and s.fault is None for s in stages)
@@ -0,0 +1,63 @@
+from tools.analysis_core import IncrementalAnalyzer
+
+
+SRC = """let x: integer = 1;
+function f(x: string, n: integer): string {
+  let y: boolean = true;
+  return x + n;
+}
+class P {
+  let v: integer;
+  function m(k: integer): integer { return k + v; }
+}
+print(f("a", x));
+"""
+
+
+def kind_type(h):
+    return (h["token"], h["kind"], h["type"])
+
+
+def test_hover_resolves_locals_params_and_members_from_the_index():
+    inc = IncrementalAnalyzer()
+    assert kind_type(inc.hover(SRC, 1, 4)) == ("x", "var", "int")
+    assert kind_type(inc.hover(SRC, 2, 11)) == ("x", "param", "string")    # declaración
+    assert kind_type(inc.hover(SRC, 4, 9)) == ("x", "param", "string")     # uso: tapa a la global
+    assert kind_type(inc.hover(SRC, 3, 6)) == ("y", "var", "bool")
+    assert kind_type(inc.hover(SRC, 8, 43)) == ("k", "param", "int")
+    assert kind_type(inc.hover(SRC, 8, 47)) == ("v", "field", "int")
+    assert kind_type(inc.hover(SRC, 7, 6)) == ("v", "field", "int")
+    assert kind_type(inc.hover(SRC, 10, 13)) == ("x", "var", "int")
+    assert kind_type(inc.hover(SRC, 10, 6)) == ("f", "function", "string")
+    assert inc.hover(SRC, 4, 40)["token"] is None
+    # mismo código: el índice se reutiliza
+    index = inc.index()
+    inc.hover(SRC, 4, 13)
+    assert inc.index() is index
+
+    # tras una edición arriba, los nodos reutilizados quedan corridos
+    code = "// nuevo\n" + SRC
+    assert kind_type(inc.hover(code, 5, 9)) == ("x", "param", "string")
+    assert kind_type(inc.hover(code, 9, 43)) == ("k", "param", "int")
+    assert inc.index() is not index
+
+
+def test_hover_from_several_threads_sees_its_own_code():
+    import threading
+
+    inc = IncrementalAnalyzer()
+    other = SRC.replace("let x: integer = 1;", "let x: string = \"s\";")
+    bad = []
+
+    def run(code, typ):
+        for _ in range(20):
+            h = inc.hover(code, 1, 4)
+            if (h["token"], h["type"]) != ("x", typ):
+                bad.append(h)
+
+    ts = [threading.Thread(target=run, args=a) for a in ((SRC, "int"), (other, "string")) * 2]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    assert bad == []
@@ -0,0 +1,122 @@
+from tools.analysis_core import IncrementalAnalyzer, LRUCache, RESULTS, analyze_internal, cached_analysis
+
+
+SRC = """function f(a: integer): integer {
+  return a + 1;
+}
+
+function g(b: integer): integer {
+  let c: integer = f(b);
+  return c * 2;
+}
+let x: integer = g(3);
+print(x);
+"""
+
+
+def _same(inc, code):
+    got = inc.update(code, include_tokens=True)
+    n = got.pop("reparsedLines")
+    assert got == analyze_internal(code, include_tokens=True)
+    return n
+
+
+def test_incremental_analysis_reparses_only_touched_declarations():
+    inc = IncrementalAnalyzer()
+    assert _same(inc, SRC) == 10
+    assert _same(inc, SRC) == 0
+    # cambio dentro de g: sólo sus líneas; lo de abajo se corre una línea
+    code = SRC.replace("  return c * 2;", "  c = c + f(1);\n  return c * 2;")
+    assert _same(inc, code) == 6      # línea en blanco + g
+    # error de sintaxis y su arreglo: el trozo roto se re-parsea con el siguiente cambio
+    broken = code.replace("return a + 1;", "return a + 1")
+    assert inc.update(broken)["syntaxErrors"]
+    fixed = broken.replace("return a + 1", "return a + 2;")
+    assert _same(inc, fixed) <= 3
+    # error semántico en un trozo no tocado sigue reportándose
+    bad = fixed.replace("print(x);", "print(x);\nlet s: string = g(1);")
+    assert _same(inc, bad) < 5
+    assert len(inc.update(bad)["semanticErrors"]) == 1
+
+
+def test_results_are_cached_by_source_hash_and_options():
+    cache = LRUCache(2)
+    calls = []
+    for key in ("a", "b", "a", "c", "b"):
+        cache.get_or_compute(key, lambda: calls.append(key) or key.upper())
+    # 'a' se usó hace menos que 'b' cuando entró 'c': sale 'b'
+    assert calls == ["a", "b", "c", "b"] and len(cache) == 2
+
+    RESULTS.clear()
+    inc = IncrementalAnalyzer()
+    r1 = cached_analysis(SRC, analyzer=inc)
+    r1["symbols"]["globals"]["vars"].clear()      # es una copia: no toca la caché
+    r2 = cached_analysis(SRC, analyzer=inc)
+    assert r2 is not r1 and r2["symbols"]["globals"]["vars"]
+    assert cached_analysis(SRC, include_ast=False, analyzer=inc) is not r1
+    assert cached_analysis(SRC + "print(1);\n", analyzer=inc) is not r1
+    assert (RESULTS.hits, RESULTS.misses) == (1, 3)
+
+
+def test_open_comment_swallows_the_reused_chunks():
+    inc = IncrementalAnalyzer()
+    _same(inc, SRC)
+    # '/*' sin cerrar: lo de abajo deja de reutilizarse
+    got = inc.update("/*\n" + SRC)
+    ref = analyze_internal("/*\n" + SRC)
+    assert got["semanticErrors"] == ref["semanticErrors"] == []
+    assert got["symbols"] == ref["symbols"]
+    assert [(e["line"], e["col"]) for e in got["syntaxErrors"]] == [(e["line"], e["col"]) for e in ref["syntaxErrors"]]
+    assert _same(inc, SRC) == 10
+    # un comentario entre dos sentencias no corta trozos: editar la de
+    # abajo no la re-parsea dentro del comentario
+    code = SRC.replace("print(x);", "print(x); /* uno\ndos */ print(x + 1);")
+    _same(inc, code)
+    assert _same(inc, code.replace("x + 1", "x + 2")) == 2
+
+
+def test_a_key_is_computed_once_under_concurrent_requests():
+    import threading
+    import time
+
+    cache = LRUCache(4)
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.05)
+        return [1]
+
+    got = []
+    ts = [threading.Thread(target=lambda: got.append(cache.get_or_compute("k", slow))) for _ in range(4)]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    assert len(calls) == 1 and len(got) == 4
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_body_edits_recheck_only_the_touched_functions():
+    src = "let k: integer = 2;\n" + SRC + "let late: integer = 1;\n"
+    inc = IncrementalAnalyzer()
+    _same(inc, src)
+    assert inc.rechecked is None
+    # errores en los cuerpos de f y g: sólo esas dos
+    code = src.replace("  return a + 1;", "  let s: string = a;\n  return a + 1;")
+    code = code.replace("  return c * 2;", "  return c * \"x\";")
+    _same(inc, code)
+    assert inc.rechecked == 2
+    # f pierde una línea: el error de g (no se re-chequea) sube con ella
+    _same(inc, code.replace("  let s: string = a;\n", ""))
+    assert inc.rechecked == 1
+    fixed = code.replace("  let s: string = a;\n", "  print(late);\n")
+    _same(inc, fixed)
+    assert inc.rechecked == 1
+    # una global de más abajo no existe todavía para f
+    assert "'late'" in inc.update(fixed)["semanticErrors"][0]
+    # otra firma, o una captura nueva (k): todo el programa
+    _same(inc, fixed.replace("g(b: integer)", "g(b: string)"))
+    assert inc.rechecked is None
+    _same(inc, fixed.replace("  let c: integer = f(b);", "  let c: integer = f(b) + k;"))
+    assert inc.rechecked is None
@@ -0,0 +1,31 @@
+import copy
+
+from helpers import build_ir
+from compiscript.ir.interp import run_program
+from compiscript.ir.optimize import optimize_program
+
+
+def test_interp_runs_program_before_and_after_optimize():
+    src = r"""
+    class Caja {
+      let v: integer;
+      function constructor(v: integer) { this.v = v; }
+      function doble(): integer { return this.v * 2; }
+    }
+    function fact(n: integer): integer {
+      if (n <= 1) { return 1; }
+      return n * fact(n - 1);
+    }
+    let xs: integer[] = [3, -7, 10];
+    let c: Caja = new Caja(21);
+    print(fact(10));
+    print(xs[1] / 2);
+    print(xs[1] % 2);
+    print(c.doble());
+    print("fin");
+    """
+    prog = build_ir(src)
+    expected = "3628800\n-3\n-1\n42\nfin\n"
+    out_raw = run_program(copy.deepcopy(prog))
+    assert out_raw == expected
+    assert out_raw == run_program(optimize_program(prog))
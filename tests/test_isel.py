@@ -0,0 +1,97 @@
+from helpers import build_ir
+from compiscript.codegen.ass_mips import MIPSNaive
+from compiscript.codegen.isel import LoadIK, StoreIK, imm_binop, imm_compare, select_trees
+from compiscript.codegen.mips_sim import MIPSSim
+from compiscript.codegen.x86_naive import X86Naive
+from compiscript.ir.interp import run_program
+from compiscript.ir.optimize import optimize_program
+from compiscript.ir.tac import (
+    BinOp, CJump, Cmp, ConstInt, IRFunction, Jump, Label, LoadI, Local, Move, Param, Return, StoreI, Temp,
+)
+
+T0, T1, I, A = Temp("t0"), Temp("t1"), Local("i"), Param("a")
+
+
+def test_trees_fuse_single_use_temps():
+    fn = IRFunction("f", ["a"], body=[
+        Cmp("<", T0, I, ConstInt(10)),
+        CJump("==", T0, ConstInt(0), "L1", "L2"),
+        Label("L1"),
+        BinOp("+", T0, I, ConstInt(1)),
+        LoadI(T1, A, T0),
+        BinOp("-", T0, I, ConstInt(2)),
+        StoreI(A, T0, T1),
+        BinOp("*", T0, I, ConstInt(3)),
+        Move(I, T0),
+        Label("L2"),
+        Return(I),
+    ])
+    assert select_trees(fn) == [
+        CJump(">=", I, ConstInt(10), "L1", "L2"),
+        Label("L1"),
+        LoadIK(T1, A, I, 1),
+        StoreIK(A, I, -2, T1),
+        BinOp("*", I, I, ConstInt(3)),
+        Label("L2"),
+        Return(I),
+    ]
+    assert fn.body[0] == Cmp("<", T0, I, ConstInt(10))     # el IR no cambia
+
+
+def test_trees_keep_temps_that_stay_live():
+    fn = IRFunction("f", ["a"], body=[
+        BinOp("+", T0, I, ConstInt(1)),
+        LoadI(T1, A, T0),            # t0 se lee otra vez después
+        Move(I, T0),
+        Cmp("<", T0, I, ConstInt(3)),
+        CJump("!=", T0, ConstInt(0), "L1", "L2"),
+        Label("L1"),                 # t0 vive en el bloque siguiente
+        Return(T0),
+        Label("L2"),
+        BinOp("+", T1, T0, ConstInt(1)),
+        Label("L3"),                 # etiqueta entre la definición y el uso
+        Move(I, T1),
+        BinOp("+", T0, I, ConstInt(5)),
+        StoreI(A, T0, T0),           # dos usos en el consumidor
+        BinOp("+", T0, I, ConstInt(9000)),
+        LoadI(T1, A, T0),            # 9000*4 no cabe en 16 bits
+        Jump("L3"),
+    ])
+    assert select_trees(fn) == fn.body
+
+
+def test_leaf_patterns_normalize_constants():
+    assert imm_binop(BinOp("+", T0, ConstInt(4), I)) == ("add", I, 4)
+    assert imm_binop(BinOp("-", T0, I, ConstInt(4))) == ("add", I, -4)
+    assert imm_binop(BinOp("-", T0, ConstInt(4), I)) is None
+    assert imm_compare("<", ConstInt(3), I) == (">", I, 3)
+
+
+def test_selection_shrinks_both_backends_and_keeps_output():
+    src = r"""
+    function f(a: integer[], n: integer): integer {
+      let s: integer = 0;
+      let i: integer = 0;
+      while (i < n) {
+        if (a[i] > 3 && i != 2) { s = s + a[i + 1] * 2; }
+        i = i + 1;
+      }
+      return s - 1;
+    }
+    print(f([1, 5, 7, 9], 3));
+    """
+    prog = optimize_program(build_ir(src))
+    expected = run_program(prog)
+    ran = {}
+    for sel in (False, True):
+        sim = MIPSSim(MIPSNaive(imm_select=sel).compile(prog))
+        assert sim.run() == expected
+        ran[sel] = sim.stats["instructions"]
+    assert ran[True] < ran[False]
+
+    mips = MIPSNaive(peephole=False).compile(prog)
+    assert "  lw $t2, 4($t1)" in mips and "  slti $t2, $t0, " in mips
+    x86 = X86Naive(peephole=False).compile(prog)
+    base = X86Naive(peephole=False, imm_select=False).compile(prog)
+    assert "[eax + ebx*4+4]" in x86 and "sub eax, 1" in x86
+    assert x86.count("\n") < base.count("\n")
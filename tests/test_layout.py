@@ -0,0 +1,43 @@
+import copy
+
+from helpers import build_ir
+from compiscript.ir.interp import run_program
+from compiscript.ir.layout import layout_function
+from compiscript.ir.optimize import optimize_program
+from compiscript.ir.profile import profile_program
+from compiscript.ir.tac import Label, Jump, CJump
+
+
+SRC = r"""
+function f(n: integer): integer {
+  let s: integer = 0;
+  let i: integer = 0;
+  while (i < n) {
+    if (i > 1000) { s = s - 1; } else { s = s + i; }
+    i = i + 1;
+  }
+  return s;
+}
+print(f(30));
+"""
+
+
+def test_loop_rotated_and_cold_block_last():
+    prog = optimize_program(build_ir(SRC))
+    body = prog.functions["f"].body
+    # sin 'goto' de vuelta: la prueba del while quedó al fondo del bucle
+    heads = {a.name for a, b in zip(body, body[1:])
+             if isinstance(a, Label) and isinstance(b, CJump) and b.op == "<"}
+    assert not any(isinstance(i, Jump) and i.target in heads for i in body)
+    assert sum(isinstance(i, CJump) and i.op == "<" for i in body) == 2
+    assert run_program(copy.deepcopy(prog)) == "435\n"
+
+    # con perfil, la rama 'i > 1000' (nunca tomada) pasa al final
+    prof = profile_program(copy.deepcopy(prog))
+    fn = prog.functions["f"]
+    cold = [lab for lab, n in prof.blocks["f"].items() if n == 0]
+    assert cold
+    layout_function(fn, prof.blocks["f"])
+    labels = [i.name for i in fn.body if isinstance(i, Label)]
+    assert labels[-len(cold):] == [lab for lab in labels if lab in cold]
+    assert run_program(prog) == "435\n"
@@ -0,0 +1,150 @@
+import io
+import json
+
+from tools.lsp_server import LanguageServer, read_message, write_message
+
+
+URI = "file:///tmp/demo.cps"
+SRC = """class P {
+let v: integer;
+function m(k: integer): integer { return k + v; }
+}
+let p: P = new P();
+function f(x: string): string {
+return x;
+}
+print(f("a"));
+"""
+
+
+def _read_all(out):
+    out.seek(0)
+    got = []
+    while True:
+        m = read_message(out)
+        if m is None:
+            return got
+        got.append(m)
+
+
+# mensajes por handle(); None = momento sin nada en la cola (publica diagnósticos)
+def _session(msgs):
+    out = io.BytesIO()
+    srv = LanguageServer(out)
+    for m in msgs:
+        if m is None:
+            srv.flush()
+        else:
+            srv.handle(dict(m, jsonrpc="2.0"))
+    return _read_all(out)
+
+
+def _at(line, ch):
+    return {"textDocument": {"uri": URI}, "position": {"line": line, "character": ch}}
+
+
+def _edit(l1, c1, l2, c2, text):
+    return {"range": {"start": {"line": l1, "character": c1}, "end": {"line": l2, "character": c2}}, "text": text}
+
+
+def test_language_server_session():
+    out = _session([
+        {"id": 1, "method": "initialize", "params": {}},
+        {"method": "initialized", "params": {}},
+        {"method": "textDocument/didOpen",
+         "params": {"textDocument": {"uri": URI, "version": 1, "text": SRC}}},
+        None,
+        {"id": 2, "method": "textDocument/hover", "params": _at(2, 41)},
+        # 'return x;' -> 'return x + 1;' y una línea nueva con error
+        {"method": "textDocument/didChange",
+         "params": {"textDocument": {"uri": URI, "version": 2},
+                    "contentChanges": [_edit(6, 8, 6, 8, " + 1"), _edit(8, 14, 8, 14, "\nlet n: integer = \"s\";")]}},
+        {"id": 3, "method": "textDocument/hover", "params": _at(9, 4)},
+        {"id": 4, "method": "textDocument/completion", "params": _at(8, 0)},
+        {"method": "textDocument/didChange",
+         "params": {"textDocument": {"uri": URI, "version": 3}, "contentChanges": [_edit(10, 0, 10, 0, "p.")]}},
+        {"id": 5, "method": "textDocument/completion", "params": _at(10, 2)},
+        None,
+        {"id": 6, "method": "textDocument/formatting", "params": {"textDocument": {"uri": URI}, "options": {}}},
+        {"id": 7, "method": "textDocument/definition", "params": _at(0, 0)},
+    ])
+    res = {m["id"]: m for m in out if "id" in m}
+    caps = res[1]["result"]["capabilities"]
+    assert caps["textDocumentSync"]["change"] == 2 and caps["hoverProvider"]
+
+    assert "(param) k: int" in res[2]["result"]["contents"]["value"]
+    assert res[2]["result"]["range"]["start"] == {"line": 2, "character": 41}
+    assert "(var) n: int" in res[3]["result"]["contents"]["value"]
+
+    labels = {i["label"]: i for i in res[4]["result"]["items"]}
+    assert labels["f"]["detail"] == "(x: string) -> string" and labels["p"]["kind"] == 6
+    assert {"P", "n", "print"} <= set(labels)     # 'p' y 'f' vienen después de la clase
+    assert [i["label"] for i in res[5]["result"]["items"]] == ["v", "m"]
+
+    edit = res[6]["result"][0]
+    assert "\n  return x + 1;\n" in edit["newText"] and edit["range"]["end"]["line"] == 10
+    assert res[7]["error"]["code"] == -32601
+
+    # un documento sin errores y luego dos versiones seguidas: se publica sólo la última
+    diags = [m["params"] for m in out if m.get("method") == "textDocument/publishDiagnostics"]
+    assert [d["version"] for d in diags] == [1, 3] and diags[0]["diagnostics"] == []
+    last = diags[-1]    # el string en 'n' y el 'p.' sin terminar
+    sev = sorted((d["severity"], d["range"]["start"]["line"]) for d in last["diagnostics"])
+    assert (1, 9) in sev and any(s == 1 and line == 10 for s, line in sev)
+    assert all(line != 6 for _, line in sev)
+
+
+def test_stdio_framing_and_exit_code():
+    inp = io.BytesIO()
+    for m in ({"id": 1, "method": "initialize", "params": {}},
+              {"method": "textDocument/didOpen",
+               "params": {"textDocument": {"uri": URI, "version": 1, "text": "let s: integer = \"é\";\n"}}},
+              {"id": 2, "method": "shutdown"},
+              {"method": "exit"}):
+        write_message(inp, dict(m, jsonrpc="2.0"))
+    inp.seek(0)
+    out = io.BytesIO()
+    assert LanguageServer(out).serve(inp) == 0
+    ids = [m.get("id") for m in _read_all(out) if "id" in m]
+    assert ids == [1, 2]
+    # sin shutdown previo, exit termina con 1
+    inp = io.BytesIO()
+    write_message(inp, {"jsonrpc": "2.0", "method": "exit"})
+    inp.seek(0)
+    assert LanguageServer(io.BytesIO()).serve(inp) == 1
+
+
+def test_broken_document_keeps_the_server_answering():
+    broken = "let a: integer = 3;\nwhile (a > 0    a = a - 1;\nprint(a);\n"
+    inp = io.BytesIO()
+    for m in ({"method": "textDocument/didOpen",
+               "params": {"textDocument": {"uri": URI, "version": 1, "text": broken}}},
+              {"id": 1, "method": "textDocument/hover", "params": _at(0, 4)},
+              {"id": 2, "method": "textDocument/completion", "params": _at(2, 0)},
+              {"method": "textDocument/didChange",
+               "params": {"textDocument": {"uri": URI, "version": 2}, "contentChanges": [{"text": SRC}]}},
+              {"id": 3, "method": "textDocument/hover", "params": _at(2, 41)},
+              {"id": 4, "method": "shutdown"},
+              {"method": "exit"}):
+        write_message(inp, dict(m, jsonrpc="2.0"))
+    inp.seek(0)
+    out = io.BytesIO()
+    assert LanguageServer(out).serve(inp) == 0
+    got = _read_all(out)
+    res = {m["id"]: m for m in got if "id" in m}
+    assert res[1]["result"] is None and res[2]["result"]["items"] == []
+    # arreglado el texto, el mismo documento vuelve a analizarse
+    assert "(param) k: int" in res[3]["result"]["contents"]["value"]
+    assert 4 in res
+
+    # sin pedidos en medio, el documento roto publica sus errores de sintaxis
+    out = _session([
+        {"method": "textDocument/didOpen",
+         "params": {"textDocument": {"uri": URI, "version": 1, "text": broken}}},
+        None,
+        {"id": 1, "method": "textDocument/formatting", "params": {"textDocument": {"uri": URI}, "options": {}}},
+    ])
+    diags = [m["params"] for m in out if m.get("method") == "textDocument/publishDiagnostics"]
+    assert len(diags) == 1 and diags[0]["diagnostics"]
+    assert all(d["severity"] == 1 and d["range"]["start"]["line"] == 1 for d in diags[0]["diagnostics"])
+    assert any(m.get("id") == 1 and "result" in m for m in out)
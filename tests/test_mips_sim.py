@@ -0,0 +1,295 @@
+from helpers import build_ir
+from compiscript.codegen.ass_mips import MIPSNaive
+from compiscript.codegen.mips_sim import MIPSSim
+from compiscript.ir.interp import TACInterpreter, run_program
+from compiscript.ir.optimize import optimize_program
+
+
+def test_mips_sim_matches_interpreter_in_both_branch_modes():
+    src = r"""
+    function fib(n: integer): integer {
+      if (n < 2) { return n; }
+      return fib(n - 1) + fib(n - 2);
+    }
+    let i: integer = 0;
+    while (i < 6) {
+      switch (i) {
+        case 0: print("cero"); break;
+        case 1: print(fib(12)); break;
+        case 2: print(-7 * i / 3); break;
+        case 3: print((i - 20) % 7); break;
+        default: print(i * 5);
+      }
+      i = i + 1;
+    }
+    """
+    prog = optimize_program(build_ir(src))
+    expected = run_program(prog)
+    assert expected == "cero\n144\n-4\n-3\n20\n25\n"
+    for ds in (False, True):
+        sim = MIPSSim(MIPSNaive(delay_slots=ds).compile(prog))
+        assert sim.delayed == ds
+        assert sim.run() == expected
+        assert sim.stats["instructions"] > sim.stats["branches"] > 0
+        assert sim.stats["loads"] > 0 and sim.stats["stores"] > 0
+
+
+def test_runtime_allocator_reuses_freed_blocks():
+    from compiscript.ir.tac import IRProgram, IRFunction, Call, BinOp, Temp, ConstInt
+
+    def t(n):
+        return Temp(f"t{n}")
+    body = [
+        Call(t(0), "malloc", [ConstInt(8)]),
+        Call(t(1), "malloc", [ConstInt(200)]),       # bloque grande
+        Call(None, "free", [t(0)]),
+        Call(None, "free", [t(1)]),
+        Call(t(2), "malloc", [ConstInt(5)]),         # misma clase (2 palabras)
+        Call(t(3), "malloc", [ConstInt(150)]),       # cabe en el grande liberado
+        Call(t(4), "malloc", [ConstInt(8)]),         # lista vacía: bloque nuevo
+        BinOp("-", t(5), t(2), t(0)),
+        Call(None, "print", [t(5)]),
+        BinOp("-", t(5), t(3), t(1)),
+        Call(None, "print", [t(5)]),
+        BinOp("-", t(5), t(4), t(0)),
+        Call(None, "print", [t(5)]),
+    ]
+    prog = IRProgram(functions={"__toplevel": IRFunction("__toplevel", [], body)},
+                     entry="__toplevel")
+    prog = optimize_program(prog)
+    expected = run_program(prog)
+    assert expected == "0\n0\n12\n"
+    for ds in (False, True):
+        sim = MIPSSim(MIPSNaive(delay_slots=ds).compile(prog))
+        assert sim.run() == expected
+        # sbrk del trozo + sbrk del grande + 3 x (print + '\n') + exit
+        assert sim.stats["syscalls"] == 9
+
+
+def test_concat_chain_is_one_allocation():
+    from compiscript.ir.tac import Call
+    src = r"""
+    function printString(x: string): string { return x; }
+    let i: integer = 0;
+    let s: string = "";
+    let t: string = "x";
+    while (i < 100) {
+      s = "a" + t + "bc" + t;
+      i = i + 1;
+    }
+    printString(s + "!");
+    """
+    prog = optimize_program(build_ir(src))
+    cats = [ins for fn in prog.functions.values() for ins in fn.body
+            if isinstance(ins, Call) and ins.func == "__concat"]
+    assert sorted(len(c.args) for c in cats) == [2, 4]
+    expected = run_program(prog)
+    assert expected == "axbcx!"
+    for ds in (False, True):
+        sim = MIPSSim(MIPSNaive(delay_slots=ds).compile(prog))
+        assert sim.run() == expected
+        # 100 reservas de 16 bytes (cabecera + longitud + 5 bytes + NUL): un solo trozo
+        assert sim.brk - 0x10040000 == MIPSNaive.ALLOC_CHUNK
+
+
+def test_concat_intermediate_is_freed():
+    from compiscript.ir.tac import IRProgram, IRFunction, Call, Temp, ConstStr
+    t0, t1 = Temp("t0"), Temp("t1")
+    body = [
+        Call(t0, "__concat", [ConstStr("s0"), ConstStr("s1")]),
+        Call(t1, "__concat", [t0, ConstStr("s0")]),
+        Call(None, "printString", [t1]),
+    ]
+    prog = IRProgram(functions={"__toplevel": IRFunction("__toplevel", [], body)},
+                     strings={"s0": b"ab\0", "s1": b"cde\0"}, entry="__toplevel")
+    prog = optimize_program(prog)
+    frees = [ins.args for ins in prog.functions["__toplevel"].body
+             if isinstance(ins, Call) and ins.func == "__str_free"]
+    assert len(frees) == 1
+    assert run_program(prog) == "abcdeab"
+    assert MIPSSim(MIPSNaive().compile(prog)).run() == "abcdeab"
+
+
+def test_print_concat_is_fused_and_itoa_handles_negatives():
+    from compiscript.ir.tac import Call
+    src = r"""
+    let i: integer = -2147483647 - 1;
+    let b: boolean = false;
+    print("i=" + i + " b=" + b + " " + 7 + (i + 1));
+    let s: string = "n" + (i + 1) + "/" + (0 - 42) + "/" + 0;
+    print(s);
+    """
+    raw = build_ir(src)
+    expected = "i=-2147483648 b=false 7-2147483647\nn-2147483647/-42/0\n"
+    assert run_program(raw) == expected
+    prog = optimize_program(build_ir(src))
+    calls = [ins.func for ins in prog.functions["__toplevel"].body if isinstance(ins, Call)]
+    # el primer print no reserva nada; el segundo necesita el string de verdad
+    assert calls.count("__concat") == 1
+    assert "print" in calls and "printString" in calls
+    assert run_program(prog) == expected
+    for ds in (False, True):
+        assert MIPSSim(MIPSNaive(delay_slots=ds).compile(prog)).run() == expected
+
+
+def test_virtual_dispatch_and_devirtualization():
+    from compiscript.ir.tac import Call
+    src = r"""
+    class Figura {
+      function area(): integer { return 0; }
+      function doble(): integer { return this.area() * 2; }
+      function id(): integer { return 7; }
+    }
+    class Cuadrado : Figura {
+      let lado: integer;
+      function constructor(l: integer) { this.lado = l; }
+      function area(): integer { return this.lado * this.lado; }
+    }
+    function crear(k: integer): Figura {
+      if (k > 2) { return new Cuadrado(k); }
+      return new Figura();
+    }
+    let f: Figura = crear(3);
+    print(f.doble() + f.id());
+    print(crear(1).area());
+    let g: Figura = new Cuadrado(5);
+    print(g.area());
+    """
+    expected = "25\n0\n25\n"
+    raw = build_ir(src)
+    assert list(raw.vtables) == ["Figura", "Cuadrado"]
+    assert raw.vtables["Cuadrado"] == ["Cuadrado__area", "Figura__doble", "Figura__id"]
+
+    def calls(prog, fn):
+        return [(i.func, i.args[0].value if i.func == "__vcall" else None)
+                for i in prog.functions[fn].body if isinstance(i, Call)]
+    # this.area() y f.area() son virtuales; id() tiene un único destino
+    assert ("__vcall", 0) in calls(raw, "Figura__doble")
+    assert ("Figura__id", None) in calls(raw, "__toplevel")
+    assert run_program(raw) == expected
+
+    prog = optimize_program(build_ir(src))
+    top = calls(prog, "__toplevel")
+    # g = new Cuadrado(5): la clase exacta se conoce -> llamada directa
+    assert ("Cuadrado__area", None) in top
+    assert top.count(("__vcall", 0)) == 1
+    assert run_program(prog) == expected
+    for ds in (False, True):
+        assert MIPSSim(MIPSNaive(delay_slots=ds).compile(prog)).run() == expected
+
+
+def test_exceptions_unwind_frames_and_nested_handlers():
+    src = r"""
+    function check(x: integer): integer {
+      if (x > 3) { throw("demasiado: " + x); }
+      return x * 2;
+    }
+    function total(n: integer): integer {
+      let s: integer = 0;
+      let i: integer = 0;
+      while (i < n) { s = s + check(i); i = i + 1; }
+      return s;
+    }
+    try {
+      print("a " + total(3));
+      print("b " + total(10));
+      print("no llega");
+    } catch (e) {
+      print("atrapado: " + e);
+    }
+    try {
+      try { throw("interno"); } catch (e) { print("1: " + e); throw("re-" + e); }
+    } catch (e2) {
+      print("2: " + e2);
+    }
+    let k: integer = 0;
+    while (k < 3) {
+      try { if (k == 1) { throw(k); } print(k); } catch (e) { print("c" + e); }
+      k = k + 1;
+    }
+    throw("sin manejar");
+    print("nunca");
+    """
+    expected = ("a 6\natrapado: demasiado: 4\n1: interno\n2: re-interno\n"
+                "0\nc1\n2\nExcepción no capturada: sin manejar\n")
+    raw = build_ir(src)
+    assert raw.functions["__toplevel"].handlers
+    for prog in (raw, optimize_program(build_ir(src))):
+        it = TACInterpreter(prog)
+        it.run()
+        assert (it.output, it.exit_code) == (expected, 1)
+    for ds in (False, True):
+        sim = MIPSSim(MIPSNaive(delay_slots=ds).compile(prog))
+        assert (sim.run(), sim.exit_code) == (expected, 1)
+
+
+def test_nested_functions_capture_by_value_and_share_assigned_vars():
+    src = r"""
+    function outer(n: integer): integer {
+      let total: integer = 0;
+      let base: integer = 10;
+      function add(k: integer): integer { total = total + k + base; return total; }
+      function twice(k: integer): integer { add(k); return add(k); }
+      function fact(m: integer): integer {
+        if (m <= 1) { return 1; }
+        return m * fact(m - 1);
+      }
+      let i: integer = 0;
+      while (i < n) { twice(i); i = i + 1; }
+      print("fact " + fact(5));
+      return total;
+    }
+    function counter(start: integer): integer {
+      function bump(): integer {
+        start = start + 1;
+        function deep(): integer { start = start * 2; return start; }
+        return deep();
+      }
+      bump();
+      bump();
+      return start;
+    }
+    print("outer " + outer(4));
+    print("counter " + counter(3));
+    """
+    expected = "fact 120\nouter 92\ncounter 18\n"
+    raw = build_ir(src)
+    # sólo 'total' y 'start' van al entorno; 'base' se pasa por valor
+    assert raw.functions["outer__add"].params == ["k", "base", "__env_outer"]
+    assert raw.functions["outer__fact"].params == ["m"]
+    assert raw.functions["counter__bump__deep"].params == ["__env_counter"]
+    for prog in (raw, optimize_program(build_ir(src))):
+        assert run_program(prog) == expected
+    for ds in (False, True):
+        assert MIPSSim(MIPSNaive(delay_slots=ds).compile(prog)).run() == expected
+
+
+def test_exception_leaving_a_function_frees_its_environment():
+    src = r"""
+    function f(k: integer): integer {
+      let acc: integer = k;
+      function bump(): integer { acc = acc + 1; return acc; }
+      if (bump() %% 2 == 0) { throw("par"); }
+      return acc;
+    }
+    let i: integer = 0;
+    let caught: integer = 0;
+    while (i < %d) {
+      try { f(i); } catch (e) { caught = caught + 1; }
+      i = i + 1;
+    }
+    print(caught);
+    """
+    brk = {}
+    for n in (4, 2000):
+        expected = f"{n // 2}\n"
+        for prog in (build_ir(src % n), optimize_program(build_ir(src % n))):
+            it = TACInterpreter(prog)
+            it.run()
+            assert it.output == expected
+            brk.setdefault(("ir", n), set()).add(it.brk)
+        sim = MIPSSim(MIPSNaive().compile(prog))
+        assert sim.run() == expected
+        brk[("mips", n)] = {sim.brk}
+    # el entorno de cada f que lanzó vuelve a la lista libre: el heap no crece
+    assert brk[("ir", 4)] == brk[("ir", 2000)] and brk[("mips", 4)] == brk[("mips", 2000)]
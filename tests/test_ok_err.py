@@ -1,5 +1,5 @@
 import pytest
-from helpers import errors_of
+from helpers import analyze_source, errors_of
 
 
 def test_string_plus_any_ok():
@@ -185,3 +185,68 @@ def test_mod_type_err():
     """
     errs = errors_of(src)
     assert any("%" in e for e in errs)
+
+
+def test_subclass_upcast_ok_downcast_err():
+    src = r"""
+    class A { function f(): integer { return 1; } }
+    class B : A { }
+    function mk(): A { return new B(); }
+    let a: A = new B();
+    let b: B = new A();
+    """
+    errs = errors_of(src)
+    assert len(errs) == 1 and "class(A)" in errs[0]
+
+
+def test_class_hierarchy_is_per_checker():
+    # otro chequeo (p. ej. de otro hilo) a mitad de este no borra su herencia
+    from antlr.sema.checker import Checker
+
+    ast, _ = analyze_source("class A { }\nclass B : A { }\nlet a: A = new B();\n")
+    other, _ = analyze_source("let n: integer = 1;\n")
+    ch = Checker()
+    ch._declare_builtins()
+    ch._in_collect = True
+    ch._collect(ast)
+    ch._in_collect = False
+    Checker().run(other)
+    ch.visit(ast)
+    assert ch.errors == []
+
+
+def test_throw_counts_as_return_path():
+    src = r"""
+    function pick(k: integer): integer {
+      if (k > 0) { return k; }
+      throw("negativo: " + k);
+    }
+    function bad(k: integer): integer {
+      if (k > 0) { return k; }
+      print("negativo");
+    }
+    """
+    errs = errors_of(src)
+    assert len(errs) == 1 and "'bad'" in errs[0]
+
+
+def test_class_scope_closes_after_declaration():
+    # lo declarado después de una clase queda en el ámbito que la contiene
+    errs = errors_of(r"""
+    {
+      class A { let v: integer; }
+      function g(): integer { return 1; }
+    }
+    let y: integer = g();
+    function h(): integer {
+      class B { let w: integer; }
+      let z: integer = 2;
+      return z;
+    }
+    class C { let u: integer; }
+    let q: integer = h();
+    print(u);
+    """)
+    assert len(errs) == 3
+    assert "'g'" in errs[0]
+    assert "'u'" in errs[2]
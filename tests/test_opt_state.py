@@ -0,0 +1,52 @@
+import copy
+
+import compiscript.codegen.ass_mips as ass_mips
+from helpers import build_ir
+from compiscript.codegen.ass_mips import MIPSNaive
+from compiscript.codegen.mips_sim import MIPSSim
+from compiscript.ir.optimize import is_optimized, optimize_program
+from compiscript.ir.pretty import format_ir
+from compiscript.ir.tac import Return
+
+
+SRC = r"""
+class A { function f(): integer { return 1; } }
+class B : A { function f(): integer { return 2; } }
+function g(x: A): integer {
+  try { return x.f(); } catch (e) { return 0; }
+}
+print(g(new B()) + g(new A()));
+"""
+
+
+def test_optimized_program_is_stamped_and_not_reoptimized(monkeypatch):
+    prog = optimize_program(build_ir(SRC))
+    assert is_optimized(prog) and is_optimized(copy.deepcopy(prog))
+    text = format_ir(prog)
+    assert optimize_program(prog) is prog and format_ir(prog) == text
+
+    # el backend usa el IR tal cual: ni lo optimiza ni lo toca
+    def boom(*a, **k):
+        raise AssertionError("optimize_program otra vez")
+    monkeypatch.setattr(ass_mips, "optimize_program", boom)
+    assert MIPSSim(MIPSNaive().compile(prog)).run() == "3\n"
+    assert format_ir(prog) == text and is_optimized(prog)
+
+
+def test_changes_after_optimizing_drop_the_stamp():
+    assert not is_optimized(build_ir(SRC))
+    fn_name = next(n for n, fn in optimize_program(build_ir(SRC)).functions.items() if fn.handlers)
+
+    def edited(change):
+        prog = optimize_program(build_ir(SRC))
+        change(prog)
+        return is_optimized(prog)
+
+    fn = lambda p: p.functions[fn_name]
+    assert not edited(lambda p: fn(p).body.append(Return()))
+    assert not edited(lambda p: setattr(fn(p), "body", fn(p).body[:-1]))
+    assert not edited(lambda p: fn(p).handlers.clear())
+    assert not edited(lambda p: next(iter(p.vtables.values())).append("A__f"))
+    assert not edited(lambda p: p.strings.update(extra=b"x\x00"))
+    # un cuerpo nuevo pero igual sigue contando como optimizado
+    assert edited(lambda p: setattr(fn(p), "body", list(fn(p).body)))
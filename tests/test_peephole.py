@@ -0,0 +1,211 @@
+from helpers import build_ir
+from compiscript.codegen.ass_mips import MIPSNaive
+from compiscript.codegen.mips_sim import MIPSSim
+from compiscript.codegen.peephole import _MIPS, _X86, _rule_fold, _rule_forward, _rule_jumps
+from compiscript.ir.interp import run_program
+from compiscript.ir.optimize import optimize_program
+
+
+def _apply(isa, rule, text):
+    """Aplica una sola regla; compara sin sangría (x86 re-renderiza con otra)."""
+    out, n = rule(isa, isa.parse(text.strip("\n").split("\n")))
+    return [ln.strip() for ln in isa.render(out)], n
+
+
+def _lines(text):
+    return [ln.strip() for ln in text.strip("\n").split("\n")]
+
+
+def test_forward_reuses_registers_within_the_block():
+    got, n = _apply(_MIPS, _rule_forward, """
+f:
+  sw $t0, -4($fp)
+  lw $t1, -4($fp)
+  lw $t2, 8($sp)
+  lw $t2, 8($sp)
+  sb $t3, -2($fp)
+  lw $t4, -4($fp)
+L1:
+  lw $t5, 8($sp)
+""")
+    # el sb pisa parte de -4($fp) y la etiqueta corta el bloque: esos lw quedan
+    assert got == _lines("""
+f:
+  sw $t0, -4($fp)
+  move $t1, $t0
+  lw $t2, 8($sp)
+  sb $t3, -2($fp)
+  lw $t4, -4($fp)
+L1:
+  lw $t5, 8($sp)
+""") and n == 2
+
+    got, n = _apply(_X86, _rule_forward, """
+f:
+  mov dword [ebp-4], eax
+  mov ebx, dword [ebp-4]
+  mov ecx, dword [ebp-8]
+  call g
+  mov ecx, dword [ebp-8]
+""")
+    assert got[2] == "mov ebx, eax" and got[-1] == "mov ecx, dword [ebp-8]" and n == 1
+
+
+def test_fold_needs_the_constant_register_dead():
+    got, n = _apply(_MIPS, _rule_fold, """
+f:
+  li $t1, 5
+  addu $t2, $t0, $t1
+  li $t1, 7
+  subu $t3, $t0, $t1
+  li $t1, 0
+  sw $t1, 0($sp)
+  li $t4, 9
+  addu $t5, $t0, $t4
+  move $v0, $t4
+  jr $ra
+""")
+    # $t4 sigue vivo (se copia a $v0): su li no se pliega
+    assert got == _lines("""
+f:
+  addiu $t2, $t0, 5
+  addiu $t3, $t0, -7
+  sw $zero, 0($sp)
+  li $t4, 9
+  addu $t5, $t0, $t4
+  move $v0, $t4
+  jr $ra
+""") and n == 3
+
+    src = """
+f:
+  li $t1, 5
+L1:
+  addu $t2, $t0, $t1
+  li $t1, 70000
+  addu $t3, $t0, $t1
+  jr $ra
+"""
+    # etiqueta entre las dos instrucciones / constante fuera de 16 bits
+    assert _apply(_MIPS, _rule_fold, src) == (_lines(src), 0)
+
+    got, n = _apply(_X86, _rule_fold, """
+f:
+  mov ecx, 4
+  add eax, ecx
+  mov ecx, 3
+  imul eax, ecx
+  mov ebx, 2
+  push ebx
+  mov ecx, 6
+  sub eax, ecx
+  mov eax, ecx
+  ret
+""")
+    assert got == _lines("""
+f:
+  add eax, 4
+  imul eax, eax, 3
+  push 2
+  mov ecx, 6
+  sub eax, ecx
+  mov eax, ecx
+  ret
+""") and n == 3
+
+
+def test_jumps_chain_invert_and_drop_fallthrough():
+    got, n = _apply(_MIPS, _rule_jumps, """
+f:
+  beq $t0, $zero, L1
+  j L2
+  nop
+L1:
+  addiu $t1, $t1, 1
+  j L3
+  nop
+L3:
+  bne $t1, $zero, L4
+L4:
+  j L5
+L2:
+  j L6
+L5:
+  jr $ra
+L6:
+  jr $ra
+""")
+    # beq+j se invierte (y sigue la cadena L2 -> L6), el j a L3 cae solo y el
+    # bne salta directo a L5
+    assert got == _lines("""
+f:
+  bne $t0, $zero, L6
+L1:
+  addiu $t1, $t1, 1
+L3:
+  bne $t1, $zero, L5
+L4:
+  j L5
+L2:
+  j L6
+L5:
+  jr $ra
+L6:
+  jr $ra
+""") and n == 4
+
+    src = """
+f:
+  beq $t0, $zero, L3
+X:
+  j L2
+L3:
+  jr $ra
+L2:
+  jr $ra
+"""
+    # 'X' puede ser destino de otro salto: no se invierte ni se borra el j
+    assert _apply(_MIPS, _rule_jumps, src) == (_lines(src), 0)
+
+    got, n = _apply(_X86, _rule_jumps, """
+f:
+  jl L1
+  jmp L2
+L1:
+  inc eax
+  jmp L2
+L2:
+  ret
+""")
+    assert got == _lines("""
+f:
+  jge L2
+L1:
+  inc eax
+L2:
+  ret
+""") and n == 2
+
+
+def test_peephole_keeps_program_output():
+    src = r"""
+    function f(a: integer[], k: integer): integer {
+      let s: integer = 0;
+      foreach (x in a) {
+        if (x > k) { s = s + x * 3; } else { s = s - 1; }
+      }
+      return s;
+    }
+    let v: integer[] = [5, 1, 9, 2, 7];
+    let i: integer = 0;
+    while (i < 4) { print(f(v, i)); i = i + 1; }
+    """
+    prog = optimize_program(build_ir(src))
+    expected = run_program(prog)
+    sizes = []
+    for on in (False, True):
+        be = MIPSNaive(peephole=on)
+        asm = be.compile(prog)
+        assert MIPSSim(asm).run() == expected
+        sizes.append(sum(1 for ln in asm.split("\n") if ln.startswith("  ") and ln.strip()))
+    assert sizes[1] < sizes[0] and be.peephole_stats["removed"] > 0
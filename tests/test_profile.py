@@ -0,0 +1,49 @@
+import copy
+
+from helpers import build_ir
+from compiscript.ir.interp import run_program
+from compiscript.ir.optimize import optimize_program
+from compiscript.ir.profile import profile_program
+from compiscript.ir.tac import Call
+
+
+def test_profile_counts_and_guided_inlining():
+    src = r"""
+    function sq(x: integer): integer { return x * x; }
+    function suma(n: integer): integer {
+      let s: integer = 0;
+      let i: integer = 0;
+      while (i < n) { s = s + sq(i); i = i + 1; }
+      return s;
+    }
+    print(suma(20));
+    """
+    prog = optimize_program(build_ir(src))
+    prof = profile_program(prog)
+    assert prof.fault is None
+    assert prof.calls["sq"] == 20
+    assert prof.call_edges[("suma", "sq")] == 20
+    assert any(fn == "suma" and hits >= 20 for fn, _, hits in prof.loops)
+    assert prof.hot_functions(1)[0][0] == "suma"
+
+    pgo = optimize_program(copy.deepcopy(prog), profile=prof)
+    assert not any(isinstance(i, Call) and i.func == "sq" for i in pgo.functions["suma"].body)
+    assert run_program(pgo) == run_program(prog) == "2470\n"
+
+
+def test_inlining_keeps_params_and_shadowing_locals_apart():
+    src = r"""
+    function f(x: integer): integer {
+      if (x > 0) { let x: integer = 5; print("" + x); }
+      return x;
+    }
+    let s: integer = 0;
+    let i: integer = 0;
+    while (i < 50) { s = s + f(i); i = i + 1; }
+    print(s);
+    """
+    prog = optimize_program(build_ir(src))
+    pgo = optimize_program(copy.deepcopy(prog), profile=profile_program(prog))
+    assert not any(isinstance(i, Call) and i.func == "f" for fn in pgo.functions.values() for i in fn.body)
+    assert run_program(pgo) == run_program(prog)
+    assert run_program(pgo).endswith("\n1225\n")
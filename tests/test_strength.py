@@ -0,0 +1,37 @@
+import random
+
+from compiscript.codegen.strength import plan_for, run_plan, strength_plan
+from compiscript.ir.tac import BinOp, ConstInt, ConstStr, Temp
+
+
+def _ref(op, x, d):
+    def s32(v):
+        v &= 0xFFFFFFFF
+        return v - (1 << 32) if v & 0x80000000 else v
+    if op == "*":
+        return s32(x * d)
+    q = abs(x) // abs(d)
+    q = s32(q if (x < 0) == (d < 0) else -q)   # división truncada
+    return q if op == "/" else s32(x - q * d)
+
+
+def test_strength_plans_match_32bit_semantics():
+    rnd = random.Random(7)
+    xs = [0, 1, -1, 7, -7, 99, -100, 2**31 - 1, -2**31, -2**31 + 1]
+    xs += [rnd.randint(-2**31, 2**31 - 1) for _ in range(100)]
+    ds = list(range(-40, 41)) + [100, 641, 1000, -1000, 2**20, -(2**20), 2**30, 2**31 - 1]
+    for op in ("*", "/", "%"):
+        for d in ds:
+            plan = plan_for(op, d)
+            if plan is None:
+                continue
+            for x in xs:
+                assert run_plan(plan, x) == _ref(op, x, d), (op, d, x)
+
+
+def test_strength_plan_picks_the_constant_operand():
+    x, r = Temp("x"), Temp("r")
+    assert strength_plan(BinOp("*", r, ConstInt(8), x)) == (plan_for("*", 8), x)
+    assert strength_plan(BinOp("/", r, x, ConstInt(3))) == (plan_for("/", 3), x)
+    assert strength_plan(BinOp("/", r, ConstInt(3), x)) == (None, None)    # divisor variable
+    assert strength_plan(BinOp("*", r, ConstStr("s"), ConstInt(2))) == (None, None)
@@ -0,0 +1,85 @@
+import re
+
+from helpers import build_ir
+from compiscript.codegen.ass_mips import MIPSNaive
+from compiscript.codegen.mips_sim import MIPSSim
+from compiscript.codegen.switch_plan import jump_table
+from compiscript.codegen.x86_naive import X86Naive
+from compiscript.ir.interp import run_program
+from compiscript.ir.optimize import optimize_program
+from compiscript.ir.tac import SwitchJump
+
+# (valores de los casos, ¿tabla de saltos?)
+SWITCHES = {
+    "densa": ([0, 1, 2, 3, 4, 5, 7], True),
+    "negativa": ([-3, -2, 0, 2, 5], True),
+    "dispersa": ([-1000, -7, 3, 40, 41, 900, 5000, 77777], False),
+    "unica": ([7], False),
+}
+EXTREMES = [2**31 - 1, -2**31]
+
+
+def _source(cases):
+    body = "".join(f"    case {k}: return {i};\n" for i, k in enumerate(cases))
+    probes = sorted({v for k in cases for v in (k - 1, k, k + 1)} | {0, -1})
+    calls = [f"print(f({v}));" for v in probes]
+    calls += ["print(f(2147483647));", "print(f(0 - 2147483647 - 1));"]
+    src = ("function f(x: integer): integer {\n  switch (x) {\n" + body
+           + "    default: return -1;\n  }\n  return -2;\n}\n" + "\n".join(calls) + "\n")
+    expected = "".join(f"{cases.index(v) if v in cases else -1}\n" for v in probes + EXTREMES)
+    return src, probes + EXTREMES, expected
+
+
+def _x86_dispatch(asm, x):
+    """Sigue el despacho de f en el x86 emitido para eax = x: valor que retorna."""
+    lines = [ln.strip() for ln in asm.split("\n")]
+    tables = {m.group(1): m.group(2).split(", ")
+              for m in (re.match(r"(swtab_\d+) dd (.*)", ln) for ln in lines) if m}
+    labels = {ln[:-1]: i for i, ln in enumerate(lines) if ln.endswith(":")}
+    i = lines.index("mov eax, dword [ebp+8]", labels["f"]) + 1
+    eax, cmp = x, None
+    while True:
+        op, _, rest = lines[i].partition(" ")
+        args = rest.split(", ")
+        i += 1
+        if lines[i - 1].endswith(":"):
+            continue
+        if op == "mov":                     # 'mov eax, K' del caso alcanzado
+            return int(args[1])
+        if op == "sub":
+            eax = (eax - int(args[1]) + 2**31) % 2**32 - 2**31
+            continue
+        if op == "cmp":
+            cmp = int(args[1])
+            continue
+        m = re.match(r"\[(swtab_\d+) \+ eax\*4\]", rest)
+        if op == "jmp" and m:
+            target = tables[m.group(1)][eax]
+        else:
+            taken = {"jmp": True, "je": eax == cmp, "jne": eax != cmp,
+                     "jl": eax < cmp, "jge": eax >= cmp,
+                     "jae": eax % 2**32 >= cmp % 2**32, "jb": eax % 2**32 < cmp % 2**32}[op]
+            if not taken:
+                continue
+            target = rest
+        i = labels[target] + 1
+
+
+def test_switch_lowering_in_both_backends():
+    for name, (cases, dense) in SWITCHES.items():
+        src, probes, expected = _source(cases)
+        prog = optimize_program(build_ir(src))
+        sw = [i for i in prog.functions["f"].body if isinstance(i, SwitchJump)]
+        assert len(sw) == 1 and [k for k, _ in sw[0].cases] == cases, name
+        assert (jump_table(sw[0].cases, sw[0].default) is not None) == dense, name
+        assert run_program(prog) == expected, name
+
+        for ds in (False, True):
+            mips = MIPSNaive(delay_slots=ds).compile(prog)
+            assert ("jr $t0" in mips) == dense, name
+            assert MIPSSim(mips).run() == expected, (name, ds)
+
+        x86 = X86Naive().compile(prog)
+        assert ("swtab_" in x86) == dense, name
+        got = "".join(f"{_x86_dispatch(x86, v)}\n" for v in probes)
+        assert got == expected, name
@@ -0,0 +1,69 @@
+import threading
+
+from tools.analysis_core import RESULTS, analysis_key, build_key, cached_analysis
+from tools.compile_worker import CompileWorker, build_ir_and_mips_cached
+
+
+SRC = """function f(a: integer): integer {
+  return a * 2;
+}
+print(f(%d));
+"""
+
+
+def test_worker_streams_phases_and_drops_superseded_versions():
+    RESULTS.clear()
+    seen = []
+    gate = threading.Event()
+
+    def on_phase(job, phase, value):
+        seen.append((job.version, phase))
+        gate.wait()         # retiene al hilo en la primera fase
+
+    w = CompileWorker(on_phase=on_phase)
+    try:
+        j1 = w.submit("doc", 1, SRC % 1)
+        assert j1.wait_for("diagnostics", timeout=10)
+        # mientras j1 está retenido: j2 queda pendiente y j3 lo reemplaza
+        j2 = w.submit("doc", 2, SRC % 2)
+        j3 = w.submit("doc", 3, SRC % 3)
+        assert w.submit("doc", 3, SRC % 3) is j3
+        assert j2.finished and j2.cancelled
+        gate.set()
+        assert j3.done.wait(10)
+        assert j1.cancelled and "ir" not in j1.phases
+        assert list(j3.phases) == ["diagnostics", "ir", "mips"] and j3.error is None
+        assert seen == [(1, "diagnostics"), (3, "diagnostics"), (3, "ir"), (3, "mips")]
+        # lo calculado queda en la caché que usa la vía síncrona
+        assert RESULTS.get(build_key(SRC % 3))[1] == j3.phases["mips"]
+        assert build_ir_and_mips_cached(SRC % 3) == (j3.phases["ir"], j3.phases["mips"])
+        assert RESULTS.get(analysis_key(SRC % 3, True, True, False)) == j3.phases["diagnostics"]
+
+        # análisis ya en caché: el incremental del documento no se toca
+        cached_analysis(SRC % 5)
+        j5 = w.submit("otro", 1, SRC % 5)
+        assert j5.done.wait(10) and "mips" in j5.phases
+        assert w._analyzers["otro"].code is None
+
+        bad = w.submit("doc", 4, "let x: integer = \"s\";\n")
+        assert bad.done.wait(10)
+        assert bad.phases["diagnostics"]["semanticErrors"] and bad.error
+        assert "ir" not in bad.phases
+    finally:
+        gate.set()
+        w.shutdown()
+
+
+def test_worker_reports_analysis_that_raises():
+    w = CompileWorker()
+    try:
+        # el ASTBuilder no soporta este árbol con errores: el análisis lanza
+        job = w.submit("roto", 1, "let a: integer = 3;\nwhile (a > 0    a = a - 1;\n")
+        assert job.wait_for("diagnostics", timeout=10) and job.done.wait(10)
+        assert job.phases == {"diagnostics": None} and job.error.startswith("Error de análisis: ")
+        assert "roto" not in w._analyzers
+
+        ok = w.submit("roto", 2, SRC % 7)
+        assert ok.done.wait(10) and ok.error is None and "mips" in ok.phases
+    finally:
+        w.shutdown()
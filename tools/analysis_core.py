@@ -1,7 +1,11 @@
 # tools/analysis_core.py
 from __future__ import annotations
 
+import copy
+import hashlib
 import sys
+import threading
+from collections import OrderedDict
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
@@ -17,10 +21,11 @@ from antlr4.error.ErrorListener import ErrorListener
 from antlr.parser.generated.CompiscriptLexer import CompiscriptLexer
 from antlr.parser.generated.CompiscriptParser import CompiscriptParser
 
+from antlr.sema.ast import Node, Loc, Program
 from antlr.sema.ast_builder import ASTBuilder
 from antlr.sema.astviz import DotBuilder
 from antlr.sema.checker import Checker
-from antlr.sema.types import Type, T_INT, T_STRING, is_func, is_void, is_string, is_int
+from antlr.sema.types import Type, T_INT, T_STRING, is_func, is_void, is_string, is_int, is_unknown
 
 
 # Utilidades SIN re/strip
@@ -256,43 +261,113 @@ def collect_tokens(ts: CommonTokenStream) -> List[Dict[str, Any]]:
     return toks
 
 
-# busca token en posición (línea, columna)
+# busca token en posición (línea, columna); los tokens vienen en orden
 def find_token_at(ts: CommonTokenStream, line: int, col: int):
     if ts.tokens is None:
         return None
-    i = 0
-    while i < len(ts.tokens):
-        t = ts.tokens[i]
-        if t.line == line:
-            # longitud segura
-            length = 0
-            if t.start is not None and t.stop is not None:
-                length = t.stop - t.start + 1
-            elif t.text is not None:
-                length = len(t.text)
-            if length < 1:
-                length = 1
-            if col >= t.column and col < (t.column + length):
-                return t
-        i += 1
-    return None
-
-
-# hover en posición (línea, columna)
-def hover_at(code: str, line: int, col: int) -> Dict[str, Any]:
-    # prepara lexer/parser para tokens
-    input_stream = InputStream(code)
-    lex = CompiscriptLexer(input_stream)
-    ts = CommonTokenStream(lex)
-    parser = CompiscriptParser(ts)
-    tree = parser.program()
-
-    # checker para symbols globales
-    ast = ASTBuilder().visit(tree)
-    checker = Checker()
-    checker.run(ast)
-
-    tok = find_token_at(ts, line, col)
+    return _token_at(ts.tokens, line, col)
+
+
+def _token_len(t) -> int:
+    length = 0
+    if t.start is not None and t.stop is not None:
+        length = t.stop - t.start + 1
+    elif t.text is not None:
+        length = len(t.text)
+    return length if length >= 1 else 1
+
+
+# búsqueda binaria del último token que empieza en o antes de (line, col)
+def _token_at(tokens, line: int, col: int):
+    lo, hi = 0, len(tokens)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        t = tokens[mid]
+        if (t.line, t.column) <= (line, col):
+            lo = mid + 1
+        else:
+            hi = mid
+    if lo == 0:
+        return None
+    t = tokens[lo - 1]
+    if t.type == -1 or t.line != line or col >= t.column + _token_len(t):
+        return None
+    return t
+
+
+# Índice de posiciones: tokens en orden (línea, columna) y los rangos
+# [loc, end) de los nodos del AST. Los rangos están anidados como el
+# árbol, así que ordenados por inicio (el más largo primero) cada uno
+# conoce a su padre: el nodo más interno en una posición es el último
+# que empieza antes, o el primer ancestro suyo que la contiene.
+class PositionIndex:
+    def __init__(self, tokens: List[Any], ast):
+        self.tokens = tokens
+        spans = []
+        stack = [ast]
+        seen = {}
+        while len(stack) > 0:
+            x = stack.pop()
+            if isinstance(x, (list, tuple)):
+                stack.extend(x)
+                continue
+            if not isinstance(x, Node) or id(x) in seen:
+                continue
+            seen[id(x)] = True
+            end = getattr(x, "end", None)
+            if isinstance(x.loc, Loc) and isinstance(end, Loc):
+                spans.append(((x.loc.line, x.loc.col), (-end.line, -end.col), x))
+            for v in vars(x).values():
+                if isinstance(v, (Node, list, tuple)):
+                    stack.append(v)
+        spans.sort(key=lambda sp: (sp[0], sp[1]))
+        self.starts = [sp[0] for sp in spans]
+        self.ends = [(-sp[1][0], -sp[1][1]) for sp in spans]
+        self.nodes = [sp[2] for sp in spans]
+        self.parent: List[int] = []
+        open_: List[int] = []
+        i = 0
+        while i < len(spans):
+            while len(open_) > 0 and self.ends[open_[-1]] <= self.starts[i]:
+                open_.pop()
+            self.parent.append(open_[-1] if len(open_) > 0 else -1)
+            open_.append(i)
+            i += 1
+
+    def token_at(self, line: int, col: int):
+        return _token_at(self.tokens, line, col)
+
+    # nodos que contienen (line, col), del más interno hacia afuera
+    def nodes_at(self, line: int, col: int) -> List[Any]:
+        pos = (line, col)
+        lo, hi = 0, len(self.starts)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.starts[mid] <= pos:
+                lo = mid + 1
+            else:
+                hi = mid
+        out = []
+        i = lo - 1
+        while i >= 0:
+            if pos < self.ends[i]:
+                out.append(self.nodes[i])
+            i = self.parent[i]
+        return out
+
+
+def _hover_symbol(sym, text: str) -> Dict[str, Any]:
+    if sym.kind == "func":
+        return {"token": text, "kind": "function", "type": _type_str(sym.return_type)}
+    if sym.kind == "class":
+        return {"token": text, "kind": "class", "type": "class"}
+    return {"token": text, "kind": sym.kind, "type": _type_str(sym.typ)}
+
+
+# hover sobre un índice ya armado: el símbolo que el checker resolvió en
+# ese nodo (o que declaró ahí) o, si no, el nombre en el ámbito activo
+def hover_in(index: PositionIndex, env, line: int, col: int) -> Dict[str, Any]:
+    tok = index.token_at(line, col)
     if tok is None or tok.text is None:
         return {"token": None, "kind": None, "type": None}
 
@@ -302,21 +377,51 @@ def hover_at(code: str, line: int, col: int) -> Dict[str, Any]:
     if _is_quoted_string(text):
         return {"token": text, "kind": "Literal", "type": str(T_STRING())}
 
-    sym, _ = checker.env.resolve(text)
+    nodes = index.nodes_at(tok.line, tok.column)
+    for n in nodes:
+        sym = getattr(n, "sym", None)
+        if sym is not None and getattr(sym, "name", None) == text:
+            return _hover_symbol(sym, text)
+    for n in nodes:
+        if n.__class__.__name__ == "ClassDecl":
+            # campos y métodos declarados en la clase (o heredados)
+            csym = env.resolve_class(n.name)
+            mem = env.class_lookup_member(csym, text) if csym is not None else None
+            if mem is not None:
+                return _hover_symbol(mem, text)
+        scope = getattr(n, "scope", None)
+        if scope is not None:
+            sym, _ = scope.lookup(text)
+            if sym is not None:
+                return _hover_symbol(sym, text)
+            break
+    sym, _ = env.global_scope.lookup(text)
     if sym is not None:
-        if sym.kind == "var" or sym.kind == "const" or sym.kind == "param":
-            return {"token": text, "kind": sym.kind, "type": _type_str(sym.typ)}
-        if sym.kind == "func":
-            return {
-                "token": text,
-                "kind": "function",
-                "type": _type_str(sym.return_type),
-            }
-        if sym.kind == "class":
-            return {"token": text, "kind": "class", "type": "class"}
+        return _hover_symbol(sym, text)
     return {"token": text, "kind": "identifier", "type": None}
 
 
+# hover en posición (línea, columna); el análisis del último código se
+# reutiliza (y se actualiza incrementalmente) entre consultas
+def hover_at(code: str, line: int, col: int) -> Dict[str, Any]:
+    return _HOVER_DOC.hover(code, line, col)
+
+
+# sólo lexer y parser: los errores de sintaxis cuando el AST no se
+# pudo construir (el ASTBuilder no tolera todos los árboles con errores)
+def syntax_errors(code: str) -> List[Dict[str, Any]]:
+    lex = CompiscriptLexer(InputStream(code))
+    lex_err = CollectingErrorListener("lexer")
+    lex.removeErrorListeners()
+    lex.addErrorListener(lex_err)
+    parser = CompiscriptParser(CommonTokenStream(lex))
+    parse_err = CollectingErrorListener("parser")
+    parser.removeErrorListeners()
+    parser.addErrorListener(parse_err)
+    parser.program()
+    return lex_err.errors + parse_err.errors
+
+
 # Análisis principal
 def analyze_internal(
     code: str,
@@ -354,6 +459,593 @@ def analyze_internal(
     return out
 
 
+# Análisis incremental (IDE)
+#
+# El documento se parte en trozos de líneas completas, cada uno con una o
+# más sentencias de nivel superior (las que comparten línea van juntas).
+# Ante un cambio, sólo se re-lexean y re-parsean los trozos que tocan las
+# líneas editadas (más los que quedaron con errores de sintaxis, que se
+# juntan con la región por si el cambio los cierra); los de después se
+# reutilizan corriendo líneas y offsets. Si el lexer de la región termina
+# dentro de un comentario /* o con errores, se re-parsea hasta el final
+# (lo de después cambia de significado). El chequeo semántico sí se hace
+# sobre el programa entero: depende del orden de las declaraciones
+# globales y cuesta ~1% de lo que cuesta parsear.
+# Sin errores de sintaxis el resultado es el de analyze_internal. Con
+# errores, las posiciones coinciden pero la recuperación de ANTLR puede
+# no hacerlo: la región se parsea sin las sentencias de antes.
+
+
+# divide en líneas conservando el '\n' final de cada una
+def _split_keep_ends(s: str) -> List[str]:
+    out: List[str] = []
+    start = 0
+    i = 0
+    while i < len(s):
+        if s[i] == "\n":
+            out.append(s[start : i + 1])
+            start = i + 1
+        i += 1
+    if start < len(s):
+        out.append(s[start:])
+    return out
+
+
+# corre líneas/offsets de tokens y nodos (Loc compartidas una sola vez)
+def _shift_tokens(tokens, dline: int, dchar: int) -> None:
+    for t in tokens:
+        t.line += dline
+        t.start += dchar
+        t.stop += dchar
+
+
+def _shift_ast(root, dline: int) -> None:
+    seen = {}
+    stack = [root]
+    while len(stack) > 0:
+        x = stack.pop()
+        if isinstance(x, (list, tuple)):
+            stack.extend(x)
+            continue
+        if not isinstance(x, Node) or id(x) in seen:
+            continue
+        seen[id(x)] = True
+        for loc in (x.loc, getattr(x, "end", None)):
+            if isinstance(loc, Loc) and id(loc) not in seen:
+                seen[id(loc)] = True
+                loc.line += dline
+        for v in vars(x).values():
+            if isinstance(v, (Node, list, tuple)):
+                stack.append(v)
+
+
+class _Chunk:
+    def __init__(self, first: int, nlines: int):
+        self.first = first          # primera línea (0-based)
+        self.nlines = nlines
+        self.tokens: List[Any] = []
+        self.stmts: List[Any] = []
+        self.lex_errors: List[Dict[str, Any]] = []
+        self.parse_errors: List[Dict[str, Any]] = []
+        self.runaway = False        # el lexer terminó dentro de un comentario/cadena
+
+    @property
+    def end(self) -> int:
+        return self.first + self.nlines
+
+    @property
+    def dirty(self) -> bool:
+        return len(self.lex_errors) > 0 or len(self.parse_errors) > 0
+
+    def shift(self, dline: int, dchar: int) -> None:
+        if dline == 0 and dchar == 0:
+            return
+        self.first += dline
+        _shift_tokens(self.tokens, dline, dchar)
+        for e in self.lex_errors + self.parse_errors:
+            e["line"] += dline
+        for st in self.stmts:
+            _shift_ast(st, dline)
+
+
+# '/' y '*' pegados: un '/*' que el lexer no pudo cerrar (los cerrados
+# se descartan enteros), así que el comentario sigue más allá de la región
+def _open_comment(tokens) -> bool:
+    i = 0
+    while i + 1 < len(tokens):
+        if tokens[i].text == "/" and tokens[i + 1].text == "*" and tokens[i].stop + 1 == tokens[i + 1].start:
+            return True
+        i += 1
+    return False
+
+
+# lexea y parsea las líneas [first, first+len(lines)) como un programa
+def _parse_region(lines: List[str], first: int, char_off: int) -> List[_Chunk]:
+    src = "".join(lines)
+    lex = CompiscriptLexer(InputStream(src))
+    lex.line = first + 1
+    lex_err = CollectingErrorListener("lexer")
+    lex.removeErrorListeners()
+    lex.addErrorListener(lex_err)
+    ts = CommonTokenStream(lex)
+    parser = CompiscriptParser(ts)
+    parse_err = CollectingErrorListener("parser")
+    parser.removeErrorListeners()
+    parser.addErrorListener(parse_err)
+    tree = parser.program()
+    stmts = ASTBuilder().visit(tree).statements
+    tokens = [t for t in ts.tokens if t.type != -1]
+    for t in tokens:
+        t.text = t.text     # el texto se lee de la región por start/stop: se fija
+
+    if lex_err.errors or parse_err.errors or len(stmts) == 0:
+        # con errores la región queda entera (se vuelve a parsear junta)
+        c = _Chunk(first, len(lines))
+        c.tokens, c.stmts = tokens, stmts
+        c.lex_errors, c.parse_errors = lex_err.errors, parse_err.errors
+        c.runaway = len(lex_err.errors) > 0 or _open_comment(tokens)
+        _shift_tokens(tokens, 0, char_off)
+        return [c] if len(lines) > 0 else []
+
+    # un trozo termina en la última línea de su sentencia, salvo que la
+    # siguiente empiece en esa misma línea o que entre ambas haya un
+    # comentario /* */ (el trozo siguiente empezaría dentro de él)
+    ctxs = tree.statement()
+    chunks: List[_Chunk] = []
+    start = first
+    i = 0
+    while i < len(ctxs):
+        last = ctxs[i].stop.line - 1
+        nxt = ctxs[i + 1].start.line - 1 if i + 1 < len(ctxs) else None
+        if nxt is not None and "/*" in src[ctxs[i].stop.stop + 1 : ctxs[i + 1].start.start]:
+            nxt = last
+        if nxt is None or nxt > last:
+            end = last + 1 if nxt is not None else first + len(lines)
+            chunks.append(_Chunk(start, end - start))
+            start = end
+        i += 1
+    # reparte sentencias y tokens por línea
+    k = 0
+    i = 0
+    while i < len(ctxs):
+        line = ctxs[i].start.line - 1
+        while chunks[k].end <= line:
+            k += 1
+        chunks[k].stmts.append(stmts[i])
+        i += 1
+    k = 0
+    for t in tokens:
+        while k + 1 < len(chunks) and chunks[k].end <= t.line - 1:
+            k += 1
+        chunks[k].tokens.append(t)
+    _shift_tokens(tokens, 0, char_off)
+    return chunks
+
+
+# firma de una función top-level: lo que ven de ella las demás sentencias
+def _fn_signature(n):
+    return (n.name, [getattr(p, "type_ann", None) for p in n.params], getattr(n, "ret_ann", None))
+
+
+# corre la línea de un error "[l:c] ..." en d
+def _shift_error(msg: str, d: int) -> str:
+    line, col, rest = parse_loc_prefix(msg)
+    if line is None:
+        return msg
+    return "[" + str(line + d) + ":" + str(col) + "] " + rest
+
+
+# borra lo que el checker anota en los nodos (los trozos reusados
+# conservan sus nodos entre chequeos)
+def _forget_check(root) -> None:
+    stack = [root]
+    while len(stack) > 0:
+        x = stack.pop()
+        if isinstance(x, (list, tuple)):
+            stack.extend(x)
+            continue
+        if not isinstance(x, Node):
+            continue
+        for attr in ("scope", "sym", "sem_type", "captures", "array_builtin"):
+            x.__dict__.pop(attr, None)
+        for v in vars(x).values():
+            if isinstance(v, (Node, list, tuple)):
+                stack.append(v)
+
+
+class _StmtCheck:
+    """Lo que dejó el chequeo de una sentencia top-level: sus errores (con
+    la línea de la sentencia en ese momento) y la global que declaró."""
+
+    def __init__(self, node, errors: List[str], declared: Optional[str]):
+        self.node = node
+        self.line = node.loc.line
+        self.errors = errors
+        self.declared = declared
+
+
+class _RecordingChecker(Checker):
+    """Checker que guarda un _StmtCheck por sentencia top-level. reusable:
+    el estado global sólo cambia por las firmas (sin errores del collect,
+    código muerto ni globales de tipo desconocido, que una asignación
+    dentro de una función podría fijar), así que se puede re-chequear una
+    función sola contra él (ver IncrementalAnalyzer._recheck)."""
+
+    def __init__(self):
+        super().__init__()
+        self.stmt_checks: List[_StmtCheck] = []
+        self.reusable = True
+
+    def visit_Program(self, n):
+        self.reusable = len(self.errors) == 0
+        table = self.env.global_scope.table
+        self._dead_push()
+        for st in n.statements:
+            if self._dead_is():
+                self.err(st.loc, "Código muerto no alcanzable")
+                self.reusable = False
+                _forget_check(st)   # no se visita: que no quede lo de un chequeo anterior
+                continue
+            if st is None:          # sentencia que el parser no pudo armar
+                self.reusable = False
+                continue
+            start, before = len(self.errors), len(table)
+            self.visit(st)
+            declared = None
+            if len(table) > before:
+                declared = getattr(st, "name", None)
+                sym = table.get(declared) if declared is not None else None
+                if sym is None or sym.typ is None or is_unknown(sym.typ):
+                    self.reusable = False
+            self.stmt_checks.append(_StmtCheck(st, self.errors[start:], declared))
+        self._dead_pop()
+        return None
+
+
+class IncrementalAnalyzer:
+    """analyze_internal que recuerda el análisis anterior: update(code)
+    re-parsea sólo los trozos que el cambio tocó y, si lo único que cambió
+    son cuerpos de funciones top-level, re-chequea sólo esas funciones.
+    Devuelve lo mismo que analyze_internal más 'reparsedLines' (cuántas
+    líneas se parsearon); rechecked dice cuántas sentencias se volvieron a
+    chequear en el último update (None: el programa entero).
+    Se puede usar desde varios hilos: update/index/hover van con lock."""
+
+    def __init__(self):
+        self.lines: List[str] = []
+        self.code: Optional[str] = None
+        self.chunks: List[_Chunk] = []
+        self.ast = None
+        self.checker: Optional[Checker] = None
+        self._index: Optional[PositionIndex] = None
+        self.rechecked: Optional[int] = None
+        self.lock = threading.RLock()
+
+    def update(
+        self,
+        code: str,
+        include_ast: bool = True,
+        include_symbols: bool = True,
+        include_tokens: bool = False,
+    ) -> Dict[str, Any]:
+        with self.lock:
+            return self._update(code, include_ast, include_symbols, include_tokens)
+
+    def index(self) -> PositionIndex:
+        with self.lock:
+            if self._index is None:
+                tokens: List[Any] = []
+                for c in self.chunks:
+                    tokens.extend(c.tokens)
+                self._index = PositionIndex(tokens, self.ast)
+            return self._index
+
+    # hover sobre code; sólo se re-analiza si cambió desde la última vez
+    def hover(self, code: str, line: int, col: int) -> Dict[str, Any]:
+        with self.lock:
+            if code != self.code:
+                self._update(code, False, False, False)
+            return hover_in(self.index(), self.checker.env, line, col)
+
+    def _update(
+        self, code: str, include_ast: bool, include_symbols: bool, include_tokens: bool
+    ) -> Dict[str, Any]:
+        new = _split_keep_ends(code)
+        reparsed = self._apply(new)
+        self.lines = new
+        self.code = code
+        self._index = None
+
+        stmts: List[Any] = []
+        for c in self.chunks:
+            stmts.extend(c.stmts)
+        first = self.chunks[0].tokens[0] if self.chunks and self.chunks[0].tokens else None
+        ast = Program(Loc(first.line, first.column) if first is not None else Loc(len(new) or 1, 0), stmts)
+        checker = self._recheck(ast)
+        if checker is None:
+            checker = _RecordingChecker()
+            checker.run(ast)
+            self.rechecked = None
+        self.ast, self.checker = ast, checker
+
+        lex_errors: List[Dict[str, Any]] = []
+        parse_errors: List[Dict[str, Any]] = []
+        for c in self.chunks:
+            # copias: al correr el trozo se mueven los suyos
+            lex_errors.extend(dict(e) for e in c.lex_errors)
+            parse_errors.extend(dict(e) for e in c.parse_errors)
+        return {
+            "syntaxErrors": lex_errors + parse_errors,
+            "semanticErrors": checker.errors,
+            "astDot": DotBuilder().build(ast) if include_ast else None,
+            "symbols": snapshot_symbols(checker) if include_symbols else None,
+            "tokens": self._token_dicts() if include_tokens else None,
+            "reparsedLines": reparsed,
+        }
+
+    # re-chequea sobre el checker anterior sólo las funciones top-level que
+    # cambiaron sin cambiar de firma; None si hace falta chequear todo
+    def _recheck(self, ast) -> Optional[Checker]:
+        old = self.checker
+        stmts = ast.statements
+        if not isinstance(old, _RecordingChecker) or not old.reusable or len(old.stmt_checks) != len(stmts):
+            return None
+        changed: List[int] = []
+        i = 0
+        while i < len(stmts):
+            prev = old.stmt_checks[i].node
+            if stmts[i] is not prev:
+                if (stmts[i].__class__.__name__ != "FunctionDecl" or prev.__class__.__name__ != "FunctionDecl"
+                        or _fn_signature(stmts[i]) != _fn_signature(prev)):
+                    return None
+                changed.append(i)
+            i += 1
+
+        scope = old.env.global_scope
+        table = scope.table
+        old.env.scope = scope
+        old.errors = []
+        for i in changed:
+            fsym = table.get(stmts[i].name)
+            if fsym is None or fsym.kind != "func":
+                return None
+            # la función se chequea como en el orden del programa: las globales
+            # de más abajo todavía no existen y las funciones de más abajo
+            # todavía no tienen capturas (llamarlas no le pasa ninguna)
+            later = old.stmt_checks[i + 1:]
+            hidden = {sc.declared for sc in later if sc.declared is not None}
+            later_fns = [table[sc.node.name] for sc in later if sc.node.__class__.__name__ == "FunctionDecl"]
+            saved_caps = [(f, f.captures) for f in later_fns]
+            prev_caps = fsym.captures
+            for f in later_fns:
+                f.captures = []
+            fsym.captures = []
+            scope.table = {k: v for k, v in table.items() if k not in hidden}
+            try:
+                old.visit(stmts[i])
+            finally:
+                scope.table = table
+                for f, caps in saved_caps:
+                    f.captures = caps
+            # con otras capturas cambian las de quienes la llaman
+            if len(fsym.captures) != len(prev_caps) or any(a is not b for a, b in zip(fsym.captures, prev_caps)):
+                return None
+            old.stmt_checks[i] = _StmtCheck(stmts[i], old.errors, None)
+            old.errors = []
+
+        errors: List[str] = []
+        for sc in old.stmt_checks:
+            d = sc.node.loc.line - sc.line
+            if d != 0:
+                sc.errors = [_shift_error(e, d) for e in sc.errors]
+                sc.line = sc.node.loc.line
+            errors.extend(sc.errors)
+        old.errors = errors
+        ast.scope = scope
+        self.rechecked = len(changed)
+        return old
+
+    def _token_dicts(self) -> List[Dict[str, Any]]:
+        out: List[Dict[str, Any]] = []
+        for c in self.chunks:
+            for t in c.tokens:
+                out.append(
+                    {
+                        "text": t.text,
+                        "line": t.line,
+                        "col": t.column,
+                        "start": t.start,
+                        "stop": t.stop,
+                        "type": t.type,
+                    }
+                )
+        return out
+
+    # re-parsea lo necesario para pasar de self.lines a new; devuelve
+    # cuántas líneas se parsearon
+    def _apply(self, new: List[str]) -> int:
+        old = self.lines
+        if len(self.chunks) == 0 or len(old) == 0:
+            self.chunks = _parse_region(new, 0, 0)
+            return len(new)
+        # líneas iguales al principio y al final
+        p = 0
+        while p < len(old) and p < len(new) and old[p] == new[p]:
+            p += 1
+        if p == len(old) and p == len(new):
+            return 0
+        s = 0
+        while s < len(old) - p and s < len(new) - p and old[len(old) - 1 - s] == new[len(new) - 1 - s]:
+            s += 1
+        old_end = len(old) - s          # líneas cambiadas: [p, old_end)
+
+        # trozos tocados (una inserción pura toca el trozo donde cae)
+        lo, hi = None, None
+        i = 0
+        while i < len(self.chunks):
+            c = self.chunks[i]
+            touches = c.first < old_end and c.end > p
+            if p == old_end:
+                touches = c.first <= p < c.end or (p == len(old) and i == len(self.chunks) - 1)
+            if touches or c.dirty:
+                lo = i if lo is None else lo
+                hi = i
+            i += 1
+        if lo is None:
+            lo, hi = len(self.chunks) - 1, len(self.chunks) - 1
+
+        dline = len(new) - len(old)
+        first = self.chunks[lo].first
+        end_new = self.chunks[hi].end + dline
+        char_off = 0
+        j = 0
+        while j < first:
+            char_off += len(new[j])
+            j += 1
+        dchar = 0
+        j = 0
+        while j < len(new):
+            dchar += len(new[j])
+            j += 1
+        j = 0
+        while j < len(old):
+            dchar -= len(old[j])
+            j += 1
+
+        region = _parse_region(new[first:end_new], first, char_off)
+        rest = self.chunks[hi + 1 :]
+        if end_new < len(new) and any(c.runaway for c in region):
+            # un comentario o cadena abierta se traga lo que sigue: hasta el final
+            region = _parse_region(new[first:], first, char_off)
+            rest, end_new = [], len(new)
+        for c in rest:
+            c.shift(dline, dchar)
+        self.chunks = self.chunks[:lo] + region + rest
+        return end_new - first
+
+
+# compartido por todas las sesiones de Streamlit (que corren en hilos):
+# su lock serializa las consultas
+_HOVER_DOC = IncrementalAnalyzer()
+
+
+# Caché de resultados (IDE)
+# Los resultados dependen sólo del código y de las opciones, así que se
+# guardan por (tipo, hash del código, opciones...). Vive en el módulo:
+# la comparten todos los reruns y sesiones de Streamlit (que corren en
+# hilos, de ahí el lock). Acotada: sale el usado hace más tiempo. Cada
+# clave se calcula una sola vez aunque la pidan dos hilos a la vez, y
+# cached_analysis/cached_hover entregan copias: lo guardado no lo toca
+# nadie.
+def source_key(code: str) -> str:
+    return hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+
+class LRUCache:
+    def __init__(self, maxsize: int = 64):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Any, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._computing: Dict[Any, Any] = {}    # clave -> lock del que la calcula
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    # valor de key; si no está, compute() y se guarda. compute corre fuera
+    # del lock de la caché pero con uno por clave: quien pida la misma
+    # clave mientras tanto espera y se lleva ese valor. Si compute lanza,
+    # no se guarda nada
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            klock = self._computing.setdefault(key, threading.Lock())
+        with klock:
+            with self._lock:
+                if key in self._data:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return self._data[key]
+                self.misses += 1
+            try:
+                value = compute()
+                self.put(key, value)
+            finally:
+                with self._lock:
+                    self._computing.pop(key, None)
+        return value
+
+    # valor de key o None (sin calcular nada)
+    def get(self, key):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+RESULTS = LRUCache(64)
+
+
+def analysis_key(code: str, include_ast: bool, include_symbols: bool, include_tokens: bool):
+    return ("analyze", source_key(code), include_ast, include_symbols, include_tokens)
+
+
+# (ir_text, mips_text, error) del código (ver build_ir_and_mips_cached en app.py)
+def build_key(code: str):
+    return ("build", source_key(code))
+
+
+# analyze_internal con caché (analyzer: el incremental de la sesión, si hay)
+def cached_analysis(
+    code: str,
+    include_ast: bool = True,
+    include_symbols: bool = True,
+    include_tokens: bool = False,
+    analyzer: Optional[IncrementalAnalyzer] = None,
+) -> Dict[str, Any]:
+    key = analysis_key(code, include_ast, include_symbols, include_tokens)
+    if analyzer is None:
+        res = RESULTS.get_or_compute(
+            key, lambda: analyze_internal(code, include_ast, include_symbols, include_tokens)
+        )
+    else:
+        res = RESULTS.get_or_compute(
+            key, lambda: analyzer.update(code, include_ast, include_symbols, include_tokens)
+        )
+    return copy.deepcopy(res)
+
+
+# hover_at con caché (analyzer: el de la sesión; si no, el compartido)
+def cached_hover(
+    code: str, line: int, col: int, analyzer: Optional[IncrementalAnalyzer] = None
+) -> Dict[str, Any]:
+    doc = analyzer if analyzer is not None else _HOVER_DOC
+    res = RESULTS.get_or_compute(
+        ("hover", source_key(code), line, col), lambda: doc.hover(code, line, col)
+    )
+    return dict(res)
+
+
 # Quick-Fixes sin regex
 def _class_members_from_symbols(symbols: Dict[str, Any], cls_name: str) -> List[str]:
     gl = symbols.get("globals", {})
@@ -393,6 +1085,33 @@ def _class_members_from_symbols(symbols: Dict[str, Any], cls_name: str) -> List[
     return []
 
 
+# ubicación de un error semántico
+def parse_loc_prefix(msg: str):
+    # Espera: "[l:c] resto..." → devuelve (l, c, resto)
+    if (len(msg) >= 4) and (msg[0] == "["):
+        # busca ":" y "]"
+        i = 1
+        # leer número línea
+        lnum = 0
+        while i < len(msg) and msg[i] >= "0" and msg[i] <= "9":
+            lnum = lnum * 10 + (ord(msg[i]) - ord("0"))
+            i += 1
+        if i < len(msg) and msg[i] == ":":
+            i += 1
+            cnum = 0
+            while i < len(msg) and msg[i] >= "0" and msg[i] <= "9":
+                cnum = cnum * 10 + (ord(msg[i]) - ord("0"))
+                i += 1
+            if i < len(msg) and msg[i] == "]":
+                i += 1
+                # salta espacio si hay
+                if i < len(msg) and msg[i] == " ":
+                    i += 1
+                rest = msg[i:] if i < len(msg) else ""
+                return lnum, cnum, rest
+    return None, None, msg
+
+
 # Quick-Fixes sin regex
 def suggest_fixes(
     code: str, sem_errors: List[str], symbols: Dict[str, Any]
@@ -406,35 +1125,10 @@ def suggest_fixes(
             {"kind": "info", "title": title, "detail": detail, "line": line, "col": col}
         )
 
-    def _parse_loc_prefix(msg: str):
-        # Espera: "[l:c] resto..." → devuelve (l, c, resto)
-        if (len(msg) >= 4) and (msg[0] == "["):
-            # busca ":" y "]"
-            i = 1
-            # leer número línea
-            lnum = 0
-            while i < len(msg) and msg[i] >= "0" and msg[i] <= "9":
-                lnum = lnum * 10 + (ord(msg[i]) - ord("0"))
-                i += 1
-            if i < len(msg) and msg[i] == ":":
-                i += 1
-                cnum = 0
-                while i < len(msg) and msg[i] >= "0" and msg[i] <= "9":
-                    cnum = cnum * 10 + (ord(msg[i]) - ord("0"))
-                    i += 1
-                if i < len(msg) and msg[i] == "]":
-                    i += 1
-                    # salta espacio si hay
-                    if i < len(msg) and msg[i] == " ":
-                        i += 1
-                    rest = msg[i:] if i < len(msg) else ""
-                    return lnum, cnum, rest
-        return None, None, msg
-
     i = 0
     while i < len(sem_errors):
         e = sem_errors[i]
-        line, col, msg = _parse_loc_prefix(e)
+        line, col, msg = parse_loc_prefix(e)
 
         if _contains(msg, "Uso de variable no declarada: '"):
             var = _extract_between(msg, "Uso de variable no declarada: '", "'")
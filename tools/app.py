@@ -6,6 +6,7 @@ from typing import Any, Dict, List, Optional
 import streamlit as st
 import time
 import json
+import uuid
 import streamlit.components.v1 as components
 
 # Detección robusta del ROOT
@@ -36,25 +37,15 @@ if str(SRC) not in sys.path:
 if str(TOOLS) not in sys.path:
     sys.path.insert(0, str(TOOLS))
 
-from analysis_core import analyze_internal, suggest_fixes, hover_at  # noqa
-
-# ANTLR y pipeline para IR/MIPS
-from antlr4 import InputStream, CommonTokenStream  # type: ignore
-from antlr4.error.ErrorListener import ErrorListener  # type: ignore
+from analysis_core import (  # noqa
+    IncrementalAnalyzer,
+    cached_hover,
+    suggest_fixes,
+)
+from compile_worker import build_ir_and_mips_cached, shared_worker  # noqa
 
 # Para mostrar nombres de tokens:
 from antlr.parser.generated.CompiscriptLexer import CompiscriptLexer  # noqa
-from antlr.parser.generated.CompiscriptParser import CompiscriptParser  # noqa
-from antlr.sema.ast_builder import ASTBuilder  # noqa
-from antlr.sema.checker import Checker  # noqa
-
-from compiscript.codegen.irgen import IRGen
-from compiscript.ir.pretty import format_ir
-
-# --- Cambiado: x86 -> MIPS ---
-# from compiscript.codegen.x86_naive import X86Naive
-from compiscript.codegen.ass_mips import MIPSNaive
-from compiscript.ir.optimize import optimize_program
 
 # Estilos y estado base
 
@@ -73,6 +64,16 @@ if "mips_text" not in st.session_state:
     st.session_state.mips_text = ""
 if "last_sample" not in st.session_state:
     st.session_state.last_sample = "(ninguno)"
+# documento para el worker: cada cambio del código es una versión nueva
+if "doc_id" not in st.session_state:
+    st.session_state.doc_id = uuid.uuid4().hex
+    st.session_state.doc_version = 0
+    st.session_state.doc_code = None
+if "last_result" not in st.session_state:
+    st.session_state.last_result = None
+# análisis propio para el hover (no se pisa con otras sesiones)
+if "hover_doc" not in st.session_state:
+    st.session_state.hover_doc = IncrementalAnalyzer()
 
 st.markdown(
     """
@@ -394,61 +395,7 @@ def _tok_type_name(tid: int) -> str:
     return str(tid)
 
 
-# IR/MIPS: helpers
-
-
-class _SyntaxErrorListener(ErrorListener):
-    def __init__(self):
-        super().__init__()
-        self.errors: List[str] = []
-
-    def syntaxError(self, recognizer, offendingSymbol, line, column, msg, e):  # type: ignore
-        self.errors.append(f"[{line}:{column}] {msg}")
-
-
-def build_ir_and_mips(src_code: str) -> tuple[str, str]:
-    """
-    Parsea + chequea + genera IR optimizado y MIPS.
-    Devuelve (ir_text, mips_text).
-    """
-    inp = InputStream(src_code)
-    lexer = CompiscriptLexer(inp)
-    tokens = CommonTokenStream(lexer)
-    parser = CompiscriptParser(tokens)
-
-    listener = _SyntaxErrorListener()
-    parser.removeErrorListeners()
-    parser.addErrorListener(listener)
-
-    tree = parser.program()
-    if len(listener.errors) > 0:
-        raise ValueError("Errores de sintaxis:\n" + "\n".join(listener.errors))
-
-    ast = ASTBuilder().visit(tree)
-
-    checker = Checker()
-    checker.run(ast)
-    if len(checker.errors) > 0:
-        raise ValueError("Errores semánticos:\n" + "\n".join(checker.errors))
-
-    # IR → optimización
-    ir_prog = IRGen().build(ast)
-    ir_prog_opt = optimize_program(ir_prog)
-
-    # Seguridad: si algún pase dejó listas de bytes, normalízalas a bytes reales
-    # (format_ir espera bytes)
-    if isinstance(ir_prog_opt.strings, dict):
-        ir_prog_opt.strings = {
-            k: (bytes(v) if isinstance(v, (list, tuple)) else v)
-            for k, v in ir_prog_opt.strings.items()
-        }
-
-    ir_text = format_ir(ir_prog_opt)
-    mips_text = MIPSNaive().compile(
-        ir_prog_opt
-    )  # el backend también optimiza si está disponible
-
-    return ir_text, mips_text
+# IR/MIPS: build_ir_and_mips_cached (compile_worker.py; el mismo que usa el worker)
 
 
 # --- Utilidad: copiar al portapapeles sin f-strings (evita llaves '{{}}' en JS) ---
@@ -531,18 +478,50 @@ with right:
 
 # Análisis
 
+# el análisis y la compilación corren en el worker (tools/compile_worker.py);
+# la página muestra lo que haya y se vuelve a dibujar hasta tener todo
+ANALYSIS_WAIT = 0.3     # segundos que se espera a los diagnósticos antes de dibujar
+POLL_INTERVAL = 0.25
+
 result: Optional[Dict[str, Any]] = None
+job = None
+if st.session_state.code != st.session_state.doc_code:
+    st.session_state.doc_version += 1
+    st.session_state.doc_code = st.session_state.code
 do_analyze = bool(run_click) or bool(use_auto_flag)
 if do_analyze:
-    try:
-        result = analyze_internal(
-            st.session_state.code,
-            include_ast=show_ast,
-            include_symbols=show_symbols,
-            include_tokens=True,  # siempre recogemos tokens; los mostramos si el toggle está on
-        )
-    except Exception as ex:
-        st.error("Error de análisis: " + str(ex))
+    job = shared_worker().submit(
+        st.session_state.doc_id,
+        st.session_state.doc_version,
+        st.session_state.code,
+        include_ast=show_ast,
+        include_symbols=show_symbols,
+        include_tokens=True,  # siempre recogemos tokens; los mostramos si el toggle está on
+    )
+else:
+    # el trabajo pedido con el botón sigue hasta terminar (los reruns de
+    # espera no traen el clic); si el código cambió, ya no corresponde
+    job = shared_worker().latest(st.session_state.doc_id)
+    if job is not None and job.version != st.session_state.doc_version:
+        job = None
+if job is not None:
+    if job.wait_for("diagnostics", timeout=ANALYSIS_WAIT):
+        # None: el análisis lanzó (job.error dice por qué)
+        result = st.session_state.last_result = job.phases["diagnostics"]
+    else:
+        # mientras tanto, el análisis anterior
+        result = st.session_state.last_result
+        st.caption("Analizando en segundo plano…")
+    if "ir" in job.phases:
+        st.session_state.ir_text = job.phases["ir"]
+    if "mips" in job.phases:
+        st.session_state.mips_text = job.phases["mips"]
+    if job.finished and job.error is not None and "diagnostics" in job.phases:
+        d = job.phases["diagnostics"]
+        if d is None:
+            st.error(job.error)
+        elif not d["syntaxErrors"] and not d["semanticErrors"]:
+            st.error("Error al generar IR/MIPS: " + job.error)
 
 
 # Resultados
@@ -657,7 +636,9 @@ with tabs[t]:
         )
         if st.button("Consultar (línea/columna)"):
             try:
-                h = hover_at(st.session_state.code, int(h_line), int(h_col))
+                h = cached_hover(
+                    st.session_state.code, int(h_line), int(h_col), st.session_state.hover_doc
+                )
                 st.json(h)
             except Exception as ex:
                 st.error("Hover falló: " + str(ex))
@@ -701,7 +682,7 @@ with tabs[t]:
                     ln = int(tokens[idx].get("line", 1))
                     cl = int(tokens[idx].get("col", 0))
                     try:
-                        h = hover_at(st.session_state.code, ln, cl)
+                        h = cached_hover(st.session_state.code, ln, cl, st.session_state.hover_doc)
                         st.json(h)
                     except Exception as ex:
                         st.error("Hover falló: " + str(ex))
@@ -724,7 +705,7 @@ with tabs[t]:
             ln = int(found.get("line", 1))
             cl = int(found.get("col", 0))
             try:
-                h = hover_at(st.session_state.code, ln, cl)
+                h = cached_hover(st.session_state.code, ln, cl, st.session_state.hover_doc)
                 st.json(h)
             except Exception as ex:
                 st.error("Hover falló: " + str(ex))
@@ -867,7 +848,7 @@ with tabs[t]:
         help="Generar representación intermedia optimizada y ensamblador MIPS a partir del código actual",
     ):
         try:
-            ir_text, mips_text = build_ir_and_mips(st.session_state.code)
+            ir_text, mips_text = build_ir_and_mips_cached(st.session_state.code)
             st.session_state.ir_text = ir_text
             st.session_state.mips_text = mips_text
             st.success("IR/MIPS generados correctamente.")
@@ -895,7 +876,7 @@ with tabs[t]:
         help="Generar representación intermedia y ensamblador MIPS a partir del código actual",
     ):
         try:
-            ir_text, mips_text = build_ir_and_mips(st.session_state.code)
+            ir_text, mips_text = build_ir_and_mips_cached(st.session_state.code)
             st.session_state.ir_text = ir_text
             st.session_state.mips_text = mips_text
             st.success("IR/MIPS generados correctamente.")
@@ -950,3 +931,8 @@ if show_tokens:
         st.dataframe(rows, use_container_width=True)
 
 st.caption("VSCompi+ — Compiscript • Streamlit UI")
+
+# faltan fases del trabajo actual: redibujar cuando lleguen
+if job is not None and not job.finished:
+    time.sleep(POLL_INTERVAL)
+    (getattr(st, "rerun", None) or st.experimental_rerun)()
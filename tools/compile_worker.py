@@ -0,0 +1,288 @@
+# tools/compile_worker.py
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+try:    # como tools.compile_worker (tests) o suelto junto a app.py
+    from .analysis_core import (
+        RESULTS,
+        CollectingErrorListener,
+        IncrementalAnalyzer,
+        build_key,
+        cached_analysis,
+    )
+except ImportError:
+    from analysis_core import (
+        RESULTS,
+        CollectingErrorListener,
+        IncrementalAnalyzer,
+        build_key,
+        cached_analysis,
+    )
+
+from antlr4 import CommonTokenStream, InputStream
+
+from antlr.parser.generated.CompiscriptLexer import CompiscriptLexer
+from antlr.parser.generated.CompiscriptParser import CompiscriptParser
+from antlr.sema.ast_builder import ASTBuilder
+from antlr.sema.checker import Checker
+from compiscript.codegen.irgen import IRGen
+from compiscript.codegen.ass_mips import MIPSNaive
+from compiscript.ir.optimize import optimize_program
+from compiscript.ir.pretty import format_ir
+
+# -------------------------------------------------------------------
+# Compilación en segundo plano para el IDE.
+# Cada trabajo lleva (documento, versión) y pasa por fases que se
+# publican en cuanto terminan:
+#   diagnostics   resultado de analyze (errores, AST, símbolos, tokens)
+#   ir            IR optimizado (sólo si no hubo errores)
+#   mips          ensamblador del IR anterior
+# Un hilo atiende la cola; por documento sólo queda pendiente el último
+# trabajo (uno nuevo reemplaza al que esperaba) y el que está corriendo
+# se abandona entre fases si llegó una versión más nueva. El parseo de
+# una fase no se interrumpe. Es un hilo y no un proceso: el análisis
+# incremental de cada documento y la caché RESULTS viven en memoria y
+# se reutilizan entre trabajos. Lo calculado queda en RESULTS, así que
+# la UI lo encuentra aunque lo pida por la vía síncrona: IR y MIPS salen
+# de build_outputs en los dos casos (parseo completo, no el incremental).
+# -------------------------------------------------------------------
+
+PHASES = ("diagnostics", "ir", "mips")
+MAX_DOCS = 32       # análisis incrementales que se conservan (uno por documento)
+
+
+class Superseded(Exception):
+    """El trabajo quedó viejo: build_outputs lo abandona (y no se cachea)."""
+
+
+# IR optimizado del código; ValueError con los errores si no compila
+def build_program(src_code: str):
+    lexer = CompiscriptLexer(InputStream(src_code))
+    lex_err = CollectingErrorListener("lexer")
+    lexer.removeErrorListeners()
+    lexer.addErrorListener(lex_err)
+    parser = CompiscriptParser(CommonTokenStream(lexer))
+    parse_err = CollectingErrorListener("parser")
+    parser.removeErrorListeners()
+    parser.addErrorListener(parse_err)
+    tree = parser.program()
+    errors = lex_err.errors + parse_err.errors
+    if errors:
+        raise ValueError(
+            "Errores de sintaxis:\n"
+            + "\n".join("[" + str(e["line"]) + ":" + str(e["col"]) + "] " + e["message"] for e in errors)
+        )
+
+    ast = ASTBuilder().visit(tree)
+    checker = Checker()
+    checker.run(ast)
+    if checker.errors:
+        raise ValueError("Errores semánticos:\n" + "\n".join(checker.errors))
+    return optimize_program(IRGen().build(ast))
+
+
+# (ir_text, mips_text, error) del código: lo que se guarda en
+# RESULTS[build_key(code)]. on_ir recibe el IR apenas está; check() se
+# llama antes del MIPS y puede lanzar Superseded
+def build_outputs(
+    src_code: str,
+    on_ir: Optional[Callable[[str], None]] = None,
+    check: Optional[Callable[[], None]] = None,
+) -> Tuple[str, str, Optional[str]]:
+    try:
+        prog = build_program(src_code)
+    except ValueError as ex:
+        return ("", "", str(ex))
+    ir_text = format_ir(prog)
+    if on_ir is not None:
+        on_ir(ir_text)
+    if check is not None:
+        check()
+    # IR ya optimizado: el backend no vuelve a correr los pases
+    return (ir_text, MIPSNaive().compile(prog), None)
+
+
+# (ir_text, mips_text) con caché por hash del código; el error (sintaxis o
+# semántica) también se guarda: para el mismo código es el mismo
+def build_ir_and_mips_cached(src_code: str) -> Tuple[str, str]:
+    ir_text, mips_text, err = RESULTS.get_or_compute(
+        build_key(src_code), lambda: build_outputs(src_code)
+    )
+    if err is not None:
+        raise ValueError(err)
+    return ir_text, mips_text
+
+
+class Job:
+    def __init__(self, doc: str, version: int, code: str, options: Dict[str, bool]):
+        self.doc = doc
+        self.version = version
+        self.code = code
+        self.options = options
+        self.phases: Dict[str, Any] = {}    # fase -> resultado, en orden
+        self.error: Optional[str] = None    # por qué no hubo IR/MIPS (o diagnósticos)
+        self.cancelled = False
+        self.done = threading.Event()       # terminó, falló o se abandonó
+        self._changed = threading.Condition()
+
+    @property
+    def finished(self) -> bool:
+        return self.done.is_set()
+
+    # espera a que la fase esté (True) o a que el trabajo termine sin ella
+    def wait_for(self, phase: str, timeout: Optional[float] = None) -> bool:
+        with self._changed:
+            self._changed.wait_for(lambda: phase in self.phases or self.finished, timeout)
+            return phase in self.phases
+
+    def _notify(self) -> None:
+        with self._changed:
+            self._changed.notify_all()
+
+
+class CompileWorker:
+    """Cola de trabajos por documento con un hilo que los ejecuta.
+    on_phase(job, fase, resultado) se llama desde ese hilo."""
+
+    def __init__(self, on_phase: Optional[Callable[[Job, str, Any], None]] = None):
+        self.on_phase = on_phase
+        self._cond = threading.Condition()
+        self._pending: "OrderedDict[str, Job]" = OrderedDict()
+        self._latest: Dict[str, Job] = {}
+        self._analyzers: "OrderedDict[str, IncrementalAnalyzer]" = OrderedDict()
+        self._stop = False
+        self._thread = threading.Thread(target=self._loop, name="compile-worker", daemon=True)
+        self._thread.start()
+
+    def submit(
+        self,
+        doc: str,
+        version: int,
+        code: str,
+        include_ast: bool = True,
+        include_symbols: bool = True,
+        include_tokens: bool = False,
+    ) -> Job:
+        options = {
+            "include_ast": include_ast,
+            "include_symbols": include_symbols,
+            "include_tokens": include_tokens,
+        }
+        with self._cond:
+            cur = self._latest.get(doc)
+            if cur is not None and cur.version == version and cur.code == code and cur.options == options:
+                return cur          # ya está (o estuvo) en marcha
+            job = Job(doc, version, code, options)
+            old = self._pending.pop(doc, None)
+            if old is not None:
+                self._drop(old)
+            self._pending[doc] = job
+            self._latest[doc] = job
+            self._cond.notify()
+        return job
+
+    # último trabajo pedido para doc (puede estar en curso)
+    def latest(self, doc: str) -> Optional[Job]:
+        with self._cond:
+            return self._latest.get(doc)
+
+    def shutdown(self) -> None:
+        with self._cond:
+            self._stop = True
+            for job in self._pending.values():
+                self._drop(job)
+            self._pending.clear()
+            self._cond.notify()
+        self._thread.join()
+
+    def _drop(self, job: Job) -> None:
+        job.cancelled = True
+        self._finish(job)
+
+    def _finish(self, job: Job) -> None:
+        job.done.set()
+        job._notify()
+
+    def _superseded(self, job: Job) -> bool:
+        with self._cond:
+            return self._latest.get(job.doc) is not job
+
+    def _loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._stop:
+                    self._cond.wait()
+                if self._stop:
+                    return
+                _, job = self._pending.popitem(last=False)
+            try:
+                self._run(job)
+            except Exception as ex:         # el hilo sigue con el próximo trabajo
+                job.error = str(ex)
+            self._finish(job)
+
+    def _publish(self, job: Job, phase: str, value: Any) -> None:
+        job.phases[phase] = value
+        job._notify()
+        if self.on_phase is not None:
+            self.on_phase(job, phase, value)
+
+    def _run(self, job: Job) -> None:
+        if self._superseded(job):
+            self._drop(job)
+            return
+        # diagnósticos: de la caché si ya están; si no, el incremental del documento
+        analyzer = self._analyzers.pop(job.doc, None) or IncrementalAnalyzer()
+        self._analyzers[job.doc] = analyzer
+        while len(self._analyzers) > MAX_DOCS:
+            self._analyzers.popitem(last=False)
+        try:
+            result = cached_analysis(job.code, analyzer=analyzer, **job.options)
+        except Exception as ex:
+            # diagnósticos None: la página deja de mostrar los anteriores; el
+            # incremental pudo quedar a medias y el próximo parte de cero
+            self._analyzers.pop(job.doc, None)
+            job.error = "Error de análisis: " + str(ex)
+            self._publish(job, "diagnostics", None)
+            return
+        self._publish(job, "diagnostics", result)
+        if result["syntaxErrors"] or result["semanticErrors"]:
+            job.error = "el código tiene errores"
+            return
+
+        def check():
+            if self._superseded(job):
+                raise Superseded()
+
+        try:
+            check()
+            ir_text, mips_text, err = RESULTS.get_or_compute(
+                build_key(job.code),
+                lambda: build_outputs(job.code, lambda ir: self._publish(job, "ir", ir), check),
+            )
+        except Superseded:
+            self._drop(job)
+            return
+        if err is not None:
+            job.error = err
+            return
+        if "ir" not in job.phases:      # vino de la caché
+            self._publish(job, "ir", ir_text)
+        self._publish(job, "mips", mips_text)
+
+
+_SHARED: Optional[CompileWorker] = None
+_SHARED_LOCK = threading.Lock()
+
+
+# worker del proceso (Streamlit re-ejecuta app.py en cada rerun: el hilo
+# no puede crearse ahí)
+def shared_worker() -> CompileWorker:
+    global _SHARED
+    with _SHARED_LOCK:
+        if _SHARED is None:
+            _SHARED = CompileWorker()
+        return _SHARED
@@ -0,0 +1,458 @@
+# tools/lsp_server.py
+from __future__ import annotations
+
+import json
+import os
+import queue
+import sys
+import threading
+from typing import Any, BinaryIO, Dict, List, Optional
+
+try:    # como tools.lsp_server (tests) o suelto: python tools/lsp_server.py
+    from .analysis_core import (
+        IncrementalAnalyzer,
+        format_code,
+        hover_in,
+        parse_loc_prefix,
+        suggest_fixes,
+        syntax_errors,
+    )
+except ImportError:
+    from analysis_core import (
+        IncrementalAnalyzer,
+        format_code,
+        hover_in,
+        parse_loc_prefix,
+        suggest_fixes,
+        syntax_errors,
+    )
+
+# -------------------------------------------------------------------
+# Servidor de lenguaje (LSP) por stdio: JSON-RPC con cabecera
+# Content-Length. El proceso vive lo que dura la sesión del editor, así
+# que el ATN del parser se deserializa una vez y la caché DFA de ANTLR
+# (que es de la clase) se va llenando entre pedidos; cada documento
+# abierto guarda su IncrementalAnalyzer, y didChange sólo re-parsea las
+# declaraciones tocadas.
+#
+# Los mensajes los lee un hilo y se atienden en orden en el principal.
+# didChange no analiza en el momento: marca el documento y los
+# diagnósticos se publican cuando no queda nada en la cola, así una
+# ráfaga de teclas cuesta un solo análisis. hover/completion sobre un
+# documento marcado lo analizan antes de responder. Si el análisis falla
+# (hay textos a medio escribir que el ASTBuilder no soporta) se publican
+# los errores de sintaxis y el servidor sigue atendiendo.
+#
+# Posiciones: LSP cuenta líneas desde 0 y el parser desde 1; las
+# columnas son desde 0 en ambos (en caracteres, no en unidades UTF-16).
+# -------------------------------------------------------------------
+
+SOURCE = "compiscript"
+
+SYNC_INCREMENTAL = 2
+SEVERITY_ERROR = 1
+SEVERITY_HINT = 4
+
+KIND_METHOD = 2
+KIND_FUNCTION = 3
+KIND_FIELD = 5
+KIND_VARIABLE = 6
+KIND_CLASS = 7
+KIND_CONSTANT = 21
+
+METHOD_NOT_FOUND = -32601
+INTERNAL_ERROR = -32603
+
+
+# Transporte
+def read_message(stream: BinaryIO) -> Optional[Dict[str, Any]]:
+    length = None
+    while True:
+        line = stream.readline()
+        if not line:
+            return None
+        line = line.strip()
+        if not line:
+            if length is None:
+                continue
+            break
+        name, _, value = line.decode("ascii").partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    body = stream.read(length)
+    if len(body) < length:
+        return None
+    return json.loads(body.decode("utf-8"))
+
+
+def write_message(stream: BinaryIO, msg: Dict[str, Any]) -> None:
+    body = json.dumps(msg, ensure_ascii=False).encode("utf-8")
+    stream.write(b"Content-Length: " + str(len(body)).encode("ascii") + b"\r\n\r\n" + body)
+    stream.flush()
+
+
+# Texto y posiciones
+def _offset(text: str, line: int, ch: int) -> int:
+    off = 0
+    cur = 0
+    while cur < line:
+        nl = text.find("\n", off)
+        if nl < 0:
+            return len(text)
+        off = nl + 1
+        cur += 1
+    nl = text.find("\n", off)
+    end = len(text) if nl < 0 else nl
+    return min(off + ch, end)
+
+
+# aplica un contentChange de didChange (con rango o el texto entero)
+def apply_change(text: str, change: Dict[str, Any]) -> str:
+    rng = change.get("range")
+    if rng is None:
+        return change["text"]
+    a = _offset(text, rng["start"]["line"], rng["start"]["character"])
+    b = _offset(text, rng["end"]["line"], rng["end"]["character"])
+    return text[:a] + change["text"] + text[b:]
+
+
+def _pos(line: int, col: int) -> Dict[str, int]:
+    return {"line": max(line - 1, 0), "character": max(col, 0)}
+
+
+def _is_ident(ch: str) -> bool:
+    return ch == "_" or ch.isalnum()
+
+
+class Document:
+    def __init__(self, uri: str, version: int, text: str):
+        self.uri = uri
+        self.version = version
+        self.text = text
+        self.analyzer = IncrementalAnalyzer()
+        self.result: Optional[Dict[str, Any]] = None
+        self.failure: List[Dict[str, Any]] = []     # errores si el análisis falló
+        self.stale = True       # cambió desde el último análisis
+        self.unpublished = True  # cambió desde los últimos diagnósticos
+
+    def line(self, n: int) -> str:
+        lines = self.text.split("\n")
+        return lines[n] if 0 <= n < len(lines) else ""
+
+
+class LanguageServer:
+    def __init__(self, out: BinaryIO):
+        self.out = out
+        self.docs: Dict[str, Document] = {}
+        self.running = True
+        self.shutdown_requested = False
+        self.handlers = {
+            "initialize": self.initialize,
+            "initialized": lambda params: None,
+            "shutdown": self.shutdown,
+            "exit": self.exit,
+            "textDocument/didOpen": self.did_open,
+            "textDocument/didChange": self.did_change,
+            "textDocument/didClose": self.did_close,
+            "textDocument/hover": self.hover,
+            "textDocument/completion": self.completion,
+            "textDocument/formatting": self.formatting,
+        }
+
+    # lee de inp hasta 'exit' o fin de entrada; código de salida según LSP
+    def serve(self, inp: BinaryIO) -> int:
+        inbox: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+
+        def reader():
+            while True:
+                try:
+                    msg = read_message(inp)
+                except ValueError:      # JSON roto: se descarta el mensaje
+                    continue
+                inbox.put(msg)
+                if msg is None:
+                    return
+
+        threading.Thread(target=reader, name="lsp-reader", daemon=True).start()
+        while self.running:
+            try:
+                msg = inbox.get_nowait()
+            except queue.Empty:
+                self.flush()
+                msg = inbox.get()
+            if msg is None:
+                break
+            self.handle(msg)
+        return 0 if self.shutdown_requested else 1
+
+    def handle(self, msg: Dict[str, Any]) -> None:
+        method = msg.get("method")
+        if method is None:
+            return      # respuesta del cliente: no pedimos nada
+        handler = self.handlers.get(method)
+        has_id = "id" in msg
+        if handler is None:
+            if has_id:
+                self._error(msg["id"], METHOD_NOT_FOUND, "Método no soportado: " + method)
+            return
+        try:
+            result = handler(msg.get("params") or {})
+        except Exception as ex:
+            if has_id:
+                self._error(msg["id"], INTERNAL_ERROR, str(ex))
+            return
+        if has_id:
+            self.send({"jsonrpc": "2.0", "id": msg["id"], "result": result})
+
+    # publica los diagnósticos de los documentos que cambiaron
+    def flush(self) -> None:
+        for doc in list(self.docs.values()):
+            if doc.unpublished:
+                self._analyze(doc)
+                doc.unpublished = False
+                try:
+                    diags = self._diagnostics(doc)
+                except Exception as ex:
+                    doc.result, doc.failure = None, _failure(doc.text, ex)
+                    diags = self._diagnostics(doc)
+                self.notify(
+                    "textDocument/publishDiagnostics",
+                    {"uri": doc.uri, "version": doc.version, "diagnostics": diags},
+                )
+
+    def send(self, msg: Dict[str, Any]) -> None:
+        write_message(self.out, msg)
+
+    def notify(self, method: str, params: Dict[str, Any]) -> None:
+        self.send({"jsonrpc": "2.0", "method": method, "params": params})
+
+    def _error(self, id_, code: int, message: str) -> None:
+        self.send({"jsonrpc": "2.0", "id": id_, "error": {"code": code, "message": message}})
+
+    # Ciclo de vida
+    def initialize(self, params):
+        return {
+            "capabilities": {
+                "textDocumentSync": {"openClose": True, "change": SYNC_INCREMENTAL},
+                "hoverProvider": True,
+                "completionProvider": {"triggerCharacters": ["."]},
+                "documentFormattingProvider": True,
+            },
+            "serverInfo": {"name": "compiscript-lsp"},
+        }
+
+    def shutdown(self, params):
+        self.shutdown_requested = True
+        return None
+
+    def exit(self, params):
+        self.running = False
+
+    # Documentos
+    def did_open(self, params):
+        td = params["textDocument"]
+        self.docs[td["uri"]] = Document(td["uri"], td.get("version", 0), td["text"])
+
+    def did_change(self, params):
+        td = params["textDocument"]
+        doc = self.docs[td["uri"]]
+        for change in params["contentChanges"]:
+            doc.text = apply_change(doc.text, change)
+        doc.version = td.get("version", doc.version)
+        doc.stale = doc.unpublished = True
+
+    def did_close(self, params):
+        uri = params["textDocument"]["uri"]
+        if self.docs.pop(uri, None) is not None:
+            self.notify("textDocument/publishDiagnostics", {"uri": uri, "diagnostics": []})
+
+    def _analyze(self, doc: Document) -> Document:
+        if doc.stale:
+            try:
+                doc.result = doc.analyzer.update(doc.text, include_ast=False, include_symbols=True)
+                doc.failure = []
+            except Exception as ex:
+                # el analizador pudo quedar a medias: el próximo parte de cero
+                doc.analyzer = IncrementalAnalyzer()
+                doc.result = None
+                doc.failure = _failure(doc.text, ex)
+            doc.stale = False
+        return doc
+
+    def _doc(self, params) -> Document:
+        return self._analyze(self.docs[params["textDocument"]["uri"]])
+
+    # rango del token que empieza en (line, col), o de un carácter
+    def _range(self, doc: Document, line: int, col: int) -> Dict[str, Any]:
+        tok = doc.analyzer.index().token_at(line, col)
+        width = 1
+        if tok is not None and tok.line == line and tok.column == col and tok.text:
+            width = len(tok.text)
+        return {"start": _pos(line, col), "end": _pos(line, col + width)}
+
+    def _diagnostics(self, doc: Document) -> List[Dict[str, Any]]:
+        res = doc.result
+        out: List[Dict[str, Any]] = []
+        if res is None:
+            for e in doc.failure:
+                out.append(
+                    {
+                        "range": {"start": _pos(e["line"], e["col"]), "end": _pos(e["line"], e["col"] + 1)},
+                        "severity": SEVERITY_ERROR,
+                        "source": SOURCE,
+                        "message": e["message"],
+                    }
+                )
+            return out
+        for e in res["syntaxErrors"]:
+            out.append(
+                {
+                    "range": self._range(doc, e["line"], e["col"]),
+                    "severity": SEVERITY_ERROR,
+                    "source": SOURCE,
+                    "message": e["message"],
+                }
+            )
+        for e in res["semanticErrors"]:
+            line, col, msg = parse_loc_prefix(e)
+            if line is None:
+                line, col = 1, 0
+            out.append(
+                {
+                    "range": self._range(doc, line, col),
+                    "severity": SEVERITY_ERROR,
+                    "source": SOURCE,
+                    "message": msg,
+                }
+            )
+        # los quick-fixes van como pistas en la misma posición
+        for fx in suggest_fixes(doc.text, res["semanticErrors"], res["symbols"]):
+            line = fx["line"] if fx["line"] is not None else 1
+            col = fx["col"] if fx["col"] is not None else 0
+            out.append(
+                {
+                    "range": self._range(doc, line, col),
+                    "severity": SEVERITY_HINT,
+                    "source": SOURCE,
+                    "message": fx["title"] + ": " + fx["detail"],
+                }
+            )
+        return out
+
+    # Consultas
+    def hover(self, params):
+        doc = self._doc(params)
+        if doc.result is None:
+            return None
+        line = params["position"]["line"] + 1
+        col = params["position"]["character"]
+        index = doc.analyzer.index()
+        info = hover_in(index, doc.analyzer.checker.env, line, col)
+        if info["token"] is None:
+            return None
+        text = "(" + info["kind"] + ") " + info["token"]
+        if info["type"] is not None:
+            text += ": " + info["type"]
+        tok = index.token_at(line, col)
+        return {
+            "contents": {"kind": "markdown", "value": "```compiscript\n" + text + "\n```"},
+            "range": {"start": _pos(tok.line, tok.column), "end": _pos(tok.line, tok.column + len(tok.text))},
+        }
+
+    def completion(self, params):
+        doc = self._doc(params)
+        if doc.result is None:
+            return {"isIncomplete": False, "items": []}
+        line = params["position"]["line"]
+        prefix = doc.line(line)[: params["position"]["character"]]
+        j = len(prefix)
+        while j > 0 and _is_ident(prefix[j - 1]):
+            j -= 1
+        if j > 0 and prefix[j - 1] == ".":
+            i = j - 1
+            while i > 0 and _is_ident(prefix[i - 1]):
+                i -= 1
+            cls = self._class_of(doc, prefix[i : j - 1], line + 1, i)
+            items = self._member_items(doc, cls) if cls is not None else []
+        else:
+            items = self._global_items(doc)
+        return {"isIncomplete": False, "items": items}
+
+    # clase del receptor 'name' (en line, col) de un acceso a miembro
+    def _class_of(self, doc: Document, name: str, line: int, col: int) -> Optional[str]:
+        index = doc.analyzer.index()
+        if name == "this":
+            for n in index.nodes_at(line, col):
+                if n.__class__.__name__ == "ClassDecl":
+                    return n.name
+            return None
+        typ = hover_in(index, doc.analyzer.checker.env, line, col)["type"]
+        if typ is not None and typ.startswith("class(") and typ.endswith(")"):
+            return typ[len("class(") : -1]
+        return None
+
+    def _global_items(self, doc: Document) -> List[Dict[str, Any]]:
+        gl = doc.result["symbols"]["globals"]
+        items: List[Dict[str, Any]] = []
+        for v in gl["vars"]:
+            items.append({"label": v["name"], "kind": KIND_VARIABLE, "detail": v["type"]})
+        for c in gl["consts"]:
+            items.append({"label": c["name"], "kind": KIND_CONSTANT, "detail": c["type"]})
+        for f in gl["functions"]:
+            items.append({"label": f["name"], "kind": KIND_FUNCTION, "detail": _signature(f)})
+        for c in gl["classes"]:
+            items.append({"label": c["name"], "kind": KIND_CLASS, "detail": "class"})
+        return items
+
+    def _member_items(self, doc: Document, cls: str) -> List[Dict[str, Any]]:
+        for c in doc.result["symbols"]["globals"]["classes"]:
+            if c["name"] != cls:
+                continue
+            items: List[Dict[str, Any]] = []
+            for f in c["fields"]:
+                items.append({"label": f["name"], "kind": KIND_FIELD, "detail": f["type"]})
+            for m in c["methods"]:
+                items.append({"label": m["name"], "kind": KIND_METHOD, "detail": _signature(m)})
+            for h in c["inherited"]:
+                kind = KIND_FIELD if h["kind"] == "field" else KIND_METHOD
+                items.append({"label": h["member"], "kind": kind, "detail": h["from"] + "." + h["member"]})
+            return items
+        return []
+
+    def formatting(self, params):
+        doc = self.docs[params["textDocument"]["uri"]]
+        new = format_code(doc.text)
+        if new == doc.text:
+            return []
+        lines = doc.text.split("\n")
+        end = {"line": len(lines) - 1, "character": len(lines[-1])}
+        return [{"range": {"start": {"line": 0, "character": 0}, "end": end}, "newText": new}]
+
+
+# diagnósticos de un análisis que lanzó: los de sintaxis, o uno con la excepción
+def _failure(text: str, ex: Exception) -> List[Dict[str, Any]]:
+    try:
+        errs = syntax_errors(text)
+    except Exception:
+        errs = []
+    if len(errs) == 0:
+        errs = [{"line": 1, "col": 0, "message": "Error de análisis: " + str(ex)}]
+    return errs
+
+
+def _signature(f: Dict[str, Any]) -> str:
+    ps = []
+    for p in f["params"]:
+        ps.append(p["name"] + ": " + str(p["type"]))
+    return "(" + ", ".join(ps) + ") -> " + str(f["return"])
+
+
+def main() -> int:
+    return LanguageServer(sys.stdout.buffer).serve(sys.stdin.buffer)
+
+
+if __name__ == "__main__":
+    code = main()
+    sys.stdout.flush()
+    # el hilo lector puede seguir bloqueado en stdin: salir sin esperarlo
+    os._exit(code)